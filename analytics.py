@@ -4,12 +4,173 @@ Analytics and Statistics
 """
 
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
+import numpy as np
 import pandas as pd
 from config import PRODUCTIVITY_LEVELS, DAYS_OF_WEEK_AR
+from storage.columnar import LogColumns
 
-def calculate_daily_score(logs: List[Dict]) -> int:
+
+class AnalyticsSnapshot:
+    """
+    مجاميع السجلات في مرور واحد: لكل يوم، ساعة، يوم أسبوع، فئة ودرجة
+
+    دوال التحليل تقبل اللقطة بدل قائمة السجلات، فتبني صفحة التحليلات لقطة
+    واحدة وتمررها لكل الرسوم بدل إعادة المرور على السجلات وتحليل التواريخ.
+    """
+
+    def __init__(self, logs: List[Dict] = ()):
+        self.total_score = 0
+        self.total_entries = 0
+        # {المفتاح: [مجموع النقاط، عدد السجلات]} بترتيب الظهور الأول
+        self.daily: Dict[date, List[int]] = {}
+        self.hourly: Dict[int, List[int]] = {}
+        self.weekdays: Dict[int, List[int]] = {}
+        self.categories: Dict[str, List[int]] = {}
+        self.scores = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0}
+        # خلايا خريطة الحرارة: [الساعة][يوم الأسبوع] = [المجموع، العدد]
+        self.cells = [[[0, 0] for _ in range(7)] for _ in range(24)]
+
+        parsed = {}
+        for log in logs:
+            log_date = log.get("log_date")
+            if isinstance(log_date, str):
+                day = parsed.get(log_date)
+                if day is None:
+                    day = parsed[log_date] = datetime.strptime(log_date, "%Y-%m-%d").date()
+                log_date = day
+
+            score = log.get("score", 0)
+            hour = log.get("time_slot", 0) // 2
+
+            self.total_score += score
+            self.total_entries += 1
+            _accumulate(self.daily, log_date, score)
+            _accumulate(self.hourly, hour, score)
+            _accumulate(self.categories, log.get("category", "غير محدد"), score)
+            if score in self.scores:
+                self.scores[score] += 1
+
+            # سجل بلا تاريخ يُحسب في مجاميع الساعات والفئات فقط
+            if log_date is None:
+                continue
+            weekday = log_date.weekday()
+            _accumulate(self.weekdays, weekday, score)
+            cell = self.cells[hour][weekday]
+            cell[0] += score
+            cell[1] += 1
+
+    def __len__(self) -> int:
+        return self.total_entries
+
+    @classmethod
+    def from_totals(cls, days: Dict[str, Dict], cells: List[Dict]) -> "AnalyticsSnapshot":
+        """
+        بناء اللقطة من مجاميع جاهزة بدل السجلات (التجميع في الخادم)
+        days: ملخص الأيام بشكل DailyRollup، cells: [{hour, weekday, score, slots}]
+        """
+        snapshot = cls()
+        for log_date in sorted(days):
+            day = days[log_date]
+            snapshot.total_score += day["score"]
+            snapshot.total_entries += day["slots"]
+            snapshot.daily[datetime.strptime(log_date, "%Y-%m-%d").date()] = [day["score"], day["slots"]]
+            for category, (score, slots) in day["categories"].items():
+                entry = snapshot.categories.setdefault(category, [0, 0])
+                entry[0] += score
+                entry[1] += slots
+            for score, count in enumerate(day["scores"]):
+                snapshot.scores[score] += count
+
+        for cell in cells:
+            hour, weekday = cell["hour"], cell["weekday"]
+            snapshot.cells[hour][weekday] = [cell["score"], cell["slots"]]
+            for bucket, key in ((snapshot.hourly, hour), (snapshot.weekdays, weekday)):
+                entry = bucket.setdefault(key, [0, 0])
+                entry[0] += cell["score"]
+                entry[1] += cell["slots"]
+        return snapshot
+
+    @classmethod
+    def from_columns(cls, columns: LogColumns) -> "AnalyticsSnapshot":
+        """
+        بناء اللقطة من الأعمدة المضغوطة (get_log_columns) بعمليات bincount
+        بدل المرور على قواميس السجلات، بنفس ترتيب الظهور الأول للمفاتيح
+        """
+        snapshot = cls()
+        if not len(columns):
+            return snapshot
+        scores = columns.score.astype(np.int64)
+        hours = columns.hours().astype(np.intp)
+        weekdays = columns.weekdays().astype(np.intp)
+
+        snapshot.total_score = int(scores.sum())
+        snapshot.total_entries = len(columns)
+        for day, entry in _column_buckets(columns.day, scores):
+            snapshot.daily[date.fromordinal(day)] = entry
+        for hour, entry in _column_buckets(hours, scores):
+            snapshot.hourly[hour] = entry
+        for weekday, entry in _column_buckets(weekdays, scores):
+            snapshot.weekdays[weekday] = entry
+        for code, entry in _column_buckets(columns.category, scores):
+            snapshot.categories[columns.categories[code]] = entry
+
+        counts = np.bincount(scores, minlength=5)
+        for score in snapshot.scores:
+            snapshot.scores[score] = int(counts[score])
+
+        cells = hours * 7 + weekdays
+        totals = np.bincount(cells, weights=scores, minlength=24 * 7)
+        slots = np.bincount(cells, minlength=24 * 7)
+        for cell in np.flatnonzero(slots):
+            snapshot.cells[cell // 7][cell % 7] = [int(totals[cell]), int(slots[cell])]
+        return snapshot
+
+    @classmethod
+    def of(cls, logs) -> "AnalyticsSnapshot":
+        """إرجاع اللقطة كما هي أو بناؤها من قائمة السجلات"""
+        return logs if isinstance(logs, cls) else cls(logs)
+
+    def logs_by_date(self) -> Dict[date, int]:
+        """مجموع النقاط لكل تاريخ"""
+        return {d: v[0] for d, v in self.daily.items()}
+
+    @staticmethod
+    def averages(bucket: Dict) -> Dict:
+        """متوسط النقاط لكل مفتاح في أحد المجاميع"""
+        return {k: v[0] / v[1] for k, v in bucket.items()}
+
+
+def _accumulate(bucket: Dict, key, score: int):
+    """إضافة سجل إلى [المجموع، العدد] لمفتاح"""
+    entry = bucket.get(key)
+    if entry is None:
+        bucket[key] = [score, 1]
+    else:
+        entry[0] += score
+        entry[1] += 1
+
+
+def _column_buckets(keys: np.ndarray, scores: np.ndarray):
+    """(المفتاح، [المجموع، العدد]) لكل مفتاح في عمود بترتيب ظهوره الأول"""
+    uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=scores, minlength=len(uniq))
+    counts = np.bincount(inverse, minlength=len(uniq))
+    for i in np.argsort(first, kind="stable"):
+        yield int(uniq[i]), [int(totals[i]), int(counts[i])]
+
+
+# الدوال التجميعية البسيطة تقبل قائمة القواميس أو الأعمدة المضغوطة أو اللقطة
+Logs = Union[List[Dict], LogColumns, AnalyticsSnapshot]
+# باقي الدوال تقبل قائمة القواميس أو اللقطة
+LogsOrSnapshot = Union[List[Dict], AnalyticsSnapshot]
+
+def calculate_daily_score(logs: Logs) -> int:
     """حساب النقاط اليومية"""
+    if isinstance(logs, LogColumns):
+        return int(logs.score.sum(dtype=np.int64))
+    if isinstance(logs, AnalyticsSnapshot):
+        return logs.total_score
     return sum(log.get("score", 0) for log in logs)
 
 def calculate_max_daily_score(slots_logged: int = 48) -> int:
@@ -52,49 +213,28 @@ def calculate_streak(logs_by_date: Dict[date, int], daily_goal: int) -> int:
     
     return streak
 
-def get_logs_summary_by_date(logs: List[Dict]) -> Dict[date, int]:
+def get_logs_summary_by_date(logs: Logs) -> Dict[date, int]:
     """تجميع النقاط حسب التاريخ"""
-    summary = {}
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        
-        if log_date not in summary:
-            summary[log_date] = 0
-        summary[log_date] += log.get("score", 0)
-    
-    return summary
+    if isinstance(logs, LogColumns):
+        days, inverse = np.unique(logs.day, return_inverse=True)
+        totals = np.bincount(inverse, weights=logs.score, minlength=len(days))
+        return {date.fromordinal(int(d)): int(t) for d, t in zip(days, totals)}
+
+    return AnalyticsSnapshot.of(logs).logs_by_date()
 
-def generate_heatmap_data(logs: List[Dict]) -> pd.DataFrame:
+def generate_heatmap_data(logs: LogsOrSnapshot) -> pd.DataFrame:
     """
     تجهيز بيانات خريطة الحرارة (الساعات × أيام الأسبوع)
-    
+
     Returns:
         DataFrame مع الساعات كصفوف وأيام الأسبوع كأعمدة
     """
-    # إنشاء مصفوفة فارغة (24 ساعة × 7 أيام)
-    data = [[0 for _ in range(7)] for _ in range(24)]
-    counts = [[0 for _ in range(7)] for _ in range(24)]
-    
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        
-        time_slot = log.get("time_slot", 0)
-        hour = time_slot // 2
-        day_of_week = log_date.weekday()  # 0 = Monday
-        
-        data[hour][day_of_week] += log.get("score", 0)
-        counts[hour][day_of_week] += 1
-    
-    # حساب المتوسط
-    for h in range(24):
-        for d in range(7):
-            if counts[h][d] > 0:
-                data[h][d] = data[h][d] / counts[h][d]
-    
+    # متوسط كل خلية (24 ساعة × 7 أيام)، وصفر للخلايا الفارغة
+    data = [
+        [total / count if count > 0 else 0 for total, count in row]
+        for row in AnalyticsSnapshot.of(logs).cells
+    ]
+
     df = pd.DataFrame(
         data,
         index=[f"{h:02d}:00" for h in range(24)],
@@ -124,126 +264,73 @@ def generate_daily_heatmap(logs: List[Dict], target_date: date) -> List[Dict]:
     
     return slots_data
 
-def calculate_trends(logs: List[Dict], period: str = "week") -> pd.DataFrame:
+def calculate_trends(logs: LogsOrSnapshot, period: str = "week") -> pd.DataFrame:
     """
     حساب الاتجاهات الأسبوعية أو الشهرية
-    
+
     Args:
-        logs: قائمة السجلات
+        logs: قائمة السجلات أو لقطة التحليلات
         period: "week" أو "month"
-    
+
     Returns:
         DataFrame مع التواريخ والنقاط
     """
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return pd.DataFrame(columns=["date", "score", "count"])
-    
-    # تجميع حسب التاريخ
-    daily_data = {}
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        
-        if log_date not in daily_data:
-            daily_data[log_date] = {"score": 0, "count": 0}
-        
-        daily_data[log_date]["score"] += log.get("score", 0)
-        daily_data[log_date]["count"] += 1
-    
+
     # تحويل إلى DataFrame
     df = pd.DataFrame([
-        {"date": d, "score": v["score"], "count": v["count"]}
-        for d, v in sorted(daily_data.items())
+        {"date": d, "score": v[0], "count": v[1]}
+        for d, v in sorted(snapshot.daily.items())
     ])
-    
+
     return df
 
-def get_category_breakdown(logs: List[Dict]) -> pd.DataFrame:
+def get_category_breakdown(logs: LogsOrSnapshot) -> pd.DataFrame:
     """تحليل حسب الفئات"""
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return pd.DataFrame(columns=["category", "total_score", "count", "avg_score"])
-    
-    category_data = {}
-    for log in logs:
-        cat = log.get("category", "غير محدد")
-        if cat not in category_data:
-            category_data[cat] = {"total": 0, "count": 0}
-        
-        category_data[cat]["total"] += log.get("score", 0)
-        category_data[cat]["count"] += 1
-    
+
     df = pd.DataFrame([
         {
             "category": cat,
-            "total_score": v["total"],
-            "count": v["count"],
-            "avg_score": v["total"] / v["count"] if v["count"] > 0 else 0
+            "total_score": v[0],
+            "count": v[1],
+            "avg_score": v[0] / v[1]
         }
-        for cat, v in category_data.items()
+        for cat, v in snapshot.categories.items()
     ])
-    
+
     return df.sort_values("total_score", ascending=False)
 
-def get_best_hour(logs: List[Dict]) -> Tuple[int, float]:
+def get_best_hour(logs: LogsOrSnapshot) -> Tuple[int, float]:
     """الحصول على أفضل ساعة في اليوم"""
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return (0, 0)
-    
-    hourly_data = {}
-    for log in logs:
-        hour = log.get("time_slot", 0) // 2
-        if hour not in hourly_data:
-            hourly_data[hour] = {"total": 0, "count": 0}
-        
-        hourly_data[hour]["total"] += log.get("score", 0)
-        hourly_data[hour]["count"] += 1
-    
+
     # حساب المتوسط لكل ساعة
-    hour_avgs = {
-        h: v["total"] / v["count"] if v["count"] > 0 else 0
-        for h, v in hourly_data.items()
-    }
-    
-    if not hour_avgs:
-        return (0, 0)
-    
+    hour_avgs = snapshot.averages(snapshot.hourly)
     best_hour = max(hour_avgs, key=hour_avgs.get)
     return (best_hour, hour_avgs[best_hour])
 
-def get_best_day(logs: List[Dict]) -> Tuple[str, float]:
+def get_best_day(logs: LogsOrSnapshot) -> Tuple[str, float]:
     """الحصول على أفضل يوم في الأسبوع"""
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return (DAYS_OF_WEEK_AR[0], 0)
-    
-    daily_data = {}
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        
-        day = log_date.weekday()
-        if day not in daily_data:
-            daily_data[day] = {"total": 0, "count": 0}
-        
-        daily_data[day]["total"] += log.get("score", 0)
-        daily_data[day]["count"] += 1
-    
+
     # حساب المتوسط لكل يوم
-    day_avgs = {
-        d: v["total"] / v["count"] if v["count"] > 0 else 0
-        for d, v in daily_data.items()
-    }
-    
-    if not day_avgs:
-        return (DAYS_OF_WEEK_AR[0], 0)
-    
+    day_avgs = snapshot.averages(snapshot.weekdays)
     best_day = max(day_avgs, key=day_avgs.get)
     return (DAYS_OF_WEEK_AR[best_day], day_avgs[best_day])
 
-def get_statistics_summary(logs: List[Dict], daily_goal: int) -> Dict:
+def get_statistics_summary(logs: LogsOrSnapshot, daily_goal: int) -> Dict:
     """الحصول على ملخص الإحصائيات"""
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return {
             "total_score": 0,
             "total_entries": 0,
@@ -254,29 +341,20 @@ def get_statistics_summary(logs: List[Dict], daily_goal: int) -> Dict:
             "days_tracked": 0
         }
     
-    total_score = sum(log.get("score", 0) for log in logs)
-    total_entries = len(logs)
-    
-    # عدد الأيام المسجلة
-    unique_dates = set()
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        unique_dates.add(log_date)
-    
+    total_score = snapshot.total_score
+    total_entries = snapshot.total_entries
+
     # حساب السلسلة
-    logs_by_date = get_logs_summary_by_date(logs)
-    streak = calculate_streak(logs_by_date, daily_goal)
-    
+    streak = calculate_streak(snapshot.logs_by_date(), daily_goal)
+
     return {
         "total_score": total_score,
         "total_entries": total_entries,
         "avg_score": total_score / total_entries if total_entries > 0 else 0,
-        "best_hour": get_best_hour(logs),
-        "best_day": get_best_day(logs),
+        "best_hour": get_best_hour(snapshot),
+        "best_day": get_best_day(snapshot),
         "streak": streak,
-        "days_tracked": len(unique_dates)
+        "days_tracked": len(snapshot.daily)
     }
 
 
@@ -284,13 +362,13 @@ def get_statistics_summary(logs: List[Dict], daily_goal: int) -> Dict:
 # تحليلات متقدمة - Advanced Analytics
 # =============================================
 
-def compare_periods(current_logs: List[Dict], previous_logs: List[Dict]) -> Dict:
+def compare_periods(current_logs: LogsOrSnapshot, previous_logs: LogsOrSnapshot) -> Dict:
     """
     مقارنة فترتين زمنيتين
     مثال: الأسبوع الحالي vs الأسبوع الماضي
     """
-    current_score = sum(log.get("score", 0) for log in current_logs)
-    previous_score = sum(log.get("score", 0) for log in previous_logs)
+    current_score = calculate_daily_score(current_logs)
+    previous_score = calculate_daily_score(previous_logs)
     
     current_entries = len(current_logs)
     previous_entries = len(previous_logs)
@@ -322,7 +400,7 @@ def compare_periods(current_logs: List[Dict], previous_logs: List[Dict]) -> Dict
     }
 
 
-def calculate_longest_streak(logs: List[Dict], daily_goal: int) -> int:
+def calculate_longest_streak(logs: Logs, daily_goal: int) -> int:
     """حساب أطول سلسلة متتالية على الإطلاق"""
     logs_by_date = get_logs_summary_by_date(logs)
     if not logs_by_date:
@@ -345,65 +423,45 @@ def calculate_longest_streak(logs: List[Dict], daily_goal: int) -> int:
     return longest
 
 
-def count_full_goal_days(logs: List[Dict], daily_goal: int) -> int:
+def count_full_goal_days(logs: Logs, daily_goal: int) -> int:
     """عدد الأيام التي تحقق فيها الهدف الكامل"""
     logs_by_date = get_logs_summary_by_date(logs)
     return sum(1 for score in logs_by_date.values() if score >= daily_goal)
 
 
-def get_score_distribution(logs: List[Dict]) -> Dict[int, int]:
+def get_score_distribution(logs: Logs) -> Dict[int, int]:
     """توزيع الدرجات (كم مرة حصل المستخدم على كل درجة)"""
-    dist = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0}
-    for log in logs:
-        score = log.get("score", 0)
-        if score in dist:
-            dist[score] += 1
-    return dist
+    if isinstance(logs, LogColumns):
+        counts = np.bincount(logs.score, minlength=5)
+        return {score: int(counts[score]) for score in range(5)}
+    
+    return dict(AnalyticsSnapshot.of(logs).scores)
 
 
-def get_time_patterns(logs: List[Dict]) -> Dict:
+def get_time_patterns(logs: LogsOrSnapshot) -> Dict:
     """
     تحليل الأنماط الزمنية المتقدمة
     - ترتيب أيام الأسبوع من الأفضل للأسوأ
     - ترتيب ساعات اليوم من الأفضل للأسوأ
     - فترات الذروة والهبوط
     """
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return {"days_ranking": [], "hours_ranking": [], "peak_hours": [], "low_hours": []}
     
     # تحليل الأيام
-    daily_data = {}
-    for log in logs:
-        log_date = log.get("log_date")
-        if isinstance(log_date, str):
-            log_date = datetime.strptime(log_date, "%Y-%m-%d").date()
-        day = log_date.weekday()
-        if day not in daily_data:
-            daily_data[day] = {"total": 0, "count": 0}
-        daily_data[day]["total"] += log.get("score", 0)
-        daily_data[day]["count"] += 1
-    
+    daily_data = snapshot.weekdays
     days_ranking = []
     for d in range(7):
-        if d in daily_data and daily_data[d]["count"] > 0:
-            avg = daily_data[d]["total"] / daily_data[d]["count"]
-            days_ranking.append({"day": DAYS_OF_WEEK_AR[d], "avg": round(avg, 2), "count": daily_data[d]["count"]})
+        if d in daily_data:
+            total, count = daily_data[d]
+            days_ranking.append({"day": DAYS_OF_WEEK_AR[d], "avg": round(total / count, 2), "count": count})
     days_ranking.sort(key=lambda x: x["avg"], reverse=True)
     
     # تحليل الساعات
-    hourly_data = {}
-    for log in logs:
-        hour = log.get("time_slot", 0) // 2
-        if hour not in hourly_data:
-            hourly_data[hour] = {"total": 0, "count": 0}
-        hourly_data[hour]["total"] += log.get("score", 0)
-        hourly_data[hour]["count"] += 1
-    
     hours_ranking = []
-    for h, v in hourly_data.items():
-        if v["count"] > 0:
-            avg = v["total"] / v["count"]
-            hours_ranking.append({"hour": h, "label": f"{h:02d}:00", "avg": round(avg, 2), "count": v["count"]})
+    for h, (total, count) in snapshot.hourly.items():
+        hours_ranking.append({"hour": h, "label": f"{h:02d}:00", "avg": round(total / count, 2), "count": count})
     hours_ranking.sort(key=lambda x: x["avg"], reverse=True)
     
     peak_hours = hours_ranking[:3] if len(hours_ranking) >= 3 else hours_ranking
@@ -417,13 +475,14 @@ def get_time_patterns(logs: List[Dict]) -> Dict:
     }
 
 
-def generate_recommendations(logs: List[Dict], daily_goal: int) -> List[Dict]:
+def generate_recommendations(logs: LogsOrSnapshot, daily_goal: int) -> List[Dict]:
     """
     توليد توصيات ذكية بناءً على البيانات
     """
     recommendations = []
+    snapshot = AnalyticsSnapshot.of(logs)
     
-    if not logs:
+    if not snapshot:
         recommendations.append({
             "icon": "🚀",
             "title": "ابدأ رحلتك!",
@@ -432,10 +491,10 @@ def generate_recommendations(logs: List[Dict], daily_goal: int) -> List[Dict]:
         })
         return recommendations
     
-    logs_by_date = get_logs_summary_by_date(logs)
-    patterns = get_time_patterns(logs)
-    score_dist = get_score_distribution(logs)
-    total_entries = len(logs)
+    logs_by_date = snapshot.logs_by_date()
+    patterns = get_time_patterns(snapshot)
+    score_dist = get_score_distribution(snapshot)
+    total_entries = len(snapshot)
     
     # 1. تقدم نحو الهدف
     today = date.today()
@@ -511,28 +570,25 @@ def generate_recommendations(logs: List[Dict], daily_goal: int) -> List[Dict]:
     return recommendations
 
 
-def generate_period_report(logs: List[Dict], daily_goal: int, period_name: str) -> Dict:
+def generate_period_report(logs: LogsOrSnapshot, daily_goal: int, period_name: str) -> Dict:
     """
     توليد تقرير شامل لفترة معينة
     """
-    if not logs:
+    snapshot = AnalyticsSnapshot.of(logs)
+    if not snapshot:
         return {"has_data": False}
     
-    logs_by_date = get_logs_summary_by_date(logs)
-    total_score = sum(log.get("score", 0) for log in logs)
-    total_entries = len(logs)
-    days_tracked = len(logs_by_date)
+    total_score = snapshot.total_score
+    total_entries = snapshot.total_entries
+    days_tracked = len(snapshot.daily)
     daily_avg = total_score / days_tracked if days_tracked > 0 else 0
-    full_days = count_full_goal_days(logs, daily_goal)
-    longest = calculate_longest_streak(logs, daily_goal)
-    patterns = get_time_patterns(logs)
-    score_dist = get_score_distribution(logs)
+    full_days = count_full_goal_days(snapshot, daily_goal)
+    longest = calculate_longest_streak(snapshot, daily_goal)
+    patterns = get_time_patterns(snapshot)
+    score_dist = get_score_distribution(snapshot)
     
     # حساب الفئة الأكثر استخداماً
-    cat_data = {}
-    for log in logs:
-        cat = log.get("category", "غير محدد")
-        cat_data[cat] = cat_data.get(cat, 0) + 1
+    cat_data = {cat: v[1] for cat, v in snapshot.categories.items()}
     top_category = max(cat_data, key=cat_data.get) if cat_data else "غير محدد"
     
     return {
@@ -553,14 +609,14 @@ def generate_period_report(logs: List[Dict], daily_goal: int, period_name: str)
         )
     }
 
-def generate_calendar_data(logs: List[Dict], daily_goal: int, start_date: date, end_date: date) -> Dict:
+def generate_calendar_data(logs: Union[Logs, Dict[date, int]], daily_goal: int, start_date: date, end_date: date) -> Dict:
     """
     تجهيز بيانات عرض التقويم
     """
     calendar_days = []
     
-    # تحويل السجلات إلى قاموس للوصول السريع
-    logs_by_date = get_logs_summary_by_date(logs)
+    # تحويل السجلات إلى قاموس للوصول السريع (أو استخدام مجاميع الملخص اليومي مباشرة)
+    logs_by_date = logs if isinstance(logs, dict) else get_logs_summary_by_date(logs)
     
     # إحصائيات
     achieved_days = 0
@@ -15,7 +15,7 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-from database import get_user_theme
+from database import get_user_theme, user_request
 from auth import get_current_user
 
 def setup_pwa():
@@ -85,35 +85,38 @@ def main():
         render_footer()
         return
     
-    # عرض الشريط الجانبي
-    render_sidebar()
-    
-    # الحصول على الصفحة الحالية
-    current_page = get_current_page()
-    
-    # عرض الصفحة المناسبة
-    if current_page == "dashboard":
-        render_dashboard()
-    elif current_page == "log_activity":
-        render_log_activity()
-    elif current_page == "tasks":
-        render_tasks()
-    elif current_page == "analytics":
-        render_analytics()
-    elif current_page == "leaderboard":
-        from components.leaderboard_page import render_leaderboard
-        render_leaderboard()
-    elif current_page == "settings":
-        render_settings()
-    else:
-        render_dashboard()
+    # ملفات المستخدم (الملف الشخصي، الفئات، المهام) تُقرأ مرة واحدة في هذا
+    # التشغيل وتُكتب مرة واحدة في نهايته
+    with user_request(get_current_user().id):
+        # عرض الشريط الجانبي
+        render_sidebar()
         
-    # حقن المؤقت العالمي للإشعارات (يعمل في الخلفية)
-    from components.global_timer import render_global_timer
-    render_global_timer()
-    
-    # عرض الفوتر
-    render_footer()
+        # الحصول على الصفحة الحالية
+        current_page = get_current_page()
+        
+        # عرض الصفحة المناسبة
+        if current_page == "dashboard":
+            render_dashboard()
+        elif current_page == "log_activity":
+            render_log_activity()
+        elif current_page == "tasks":
+            render_tasks()
+        elif current_page == "analytics":
+            render_analytics()
+        elif current_page == "leaderboard":
+            from components.leaderboard_page import render_leaderboard
+            render_leaderboard()
+        elif current_page == "settings":
+            render_settings()
+        else:
+            render_dashboard()
+            
+        # حقن المؤقت العالمي للإشعارات (يعمل في الخلفية)
+        from components.global_timer import render_global_timer
+        render_global_timer()
+        
+        # عرض الفوتر
+        render_footer()
 
 def render_footer():
     """عرض الفوتر في أسفل الصفحة"""
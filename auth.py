@@ -1,40 +1,169 @@
 """
-نظام المصادقة - الوضع المحلي
-Authentication System - Local Mode
+نظام المصادقة - الوضع المحلي أو Supabase Auth حسب USE_LOCAL_STORAGE
+Authentication System - Local Mode or Supabase Auth
 """
 
 import streamlit as st
-import json
 import hashlib
+import os
+import secrets
 from pathlib import Path
 from datetime import datetime
-from config import USE_LOCAL_STORAGE, LOCAL_DATA_DIR
+from typing import Dict, Optional
+from config import (
+    USE_LOCAL_STORAGE, LOCAL_DATA_DIR, SESSION_SECRET, SESSION_TTL_HOURS, SUPABASE_URL, SUPABASE_KEY
+)
+from storage import serializer
+from storage.session_tokens import SessionTokens
+from storage.supabase_auth import SupabaseAuth
+from storage.supabase_store import PostgrestError, get_client
+from storage.user_registry import UserRegistry
+
+# سجل المستخدمين ورموز الجلسات وجلسات Supabase لكل مجلد بيانات
+_registries = {}
+_session_tokens = {}
+_supabase_auths = {}
+
+# اسم كوكي رمز الجلسة في المتصفح، واسم المعامل البديل في الرابط (?session=)
+SESSION_COOKIE = "tempo_session"
+SESSION_PARAM = "session"
 
 def init_auth_state():
-    """تهيئة حالة المصادقة في الجلسة"""
+    """تهيئة حالة المصادقة في الجلسة (مع استعادة الدخول من رمز الجلسة)"""
     if "user" not in st.session_state:
         st.session_state.user = None
     if "access_token" not in st.session_state:
         st.session_state.access_token = None
+    # مرة واحدة لكل جلسة متصفح: الكوكي يُقرأ من طلب الاتصال الأول فقط
+    if st.session_state.user is None and not st.session_state.get("session_checked"):
+        st.session_state.session_checked = True
+        restore_session()
+    _sync_session_cookie()
 
 def _get_users_file():
-    """الحصول على مسار ملف المستخدمين"""
+    """الحصول على مسار ملف المستخدمين القديم (يُستورد إلى السجل مرة واحدة)"""
     LOCAL_DATA_DIR.mkdir(exist_ok=True)
     return LOCAL_DATA_DIR / "users.json"
 
+def _get_registry() -> UserRegistry:
+    """الحصول على سجل المستخدمين (مع استيراد users.json إن وجد)"""
+    registry = _registries.get(LOCAL_DATA_DIR)
+    if registry is None:
+        LOCAL_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        registry = UserRegistry(LOCAL_DATA_DIR / "users.db")
+        legacy = _get_users_file()
+        if legacy.exists():
+            registry.import_users(serializer.loads(legacy.read_bytes()))
+            # إعادة التسمية بعد الاستيراد: الملف لا يُقرأ مرة أخرى ويبقى نسخة احتياطية
+            try:
+                legacy.rename(legacy.with_name("users.json.imported"))
+            except FileNotFoundError:
+                pass
+        _registries[LOCAL_DATA_DIR] = registry
+    return registry
+
+def _get_supabase_auth() -> SupabaseAuth:
+    """الدخول عبر Supabase Auth مع جلسات المستخدمين في users.db"""
+    key = (LOCAL_DATA_DIR, SUPABASE_URL, SUPABASE_KEY)
+    supabase_auth = _supabase_auths.get(key)
+    if supabase_auth is None:
+        LOCAL_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        supabase_auth = SupabaseAuth(get_client(SUPABASE_URL, SUPABASE_KEY), LOCAL_DATA_DIR / "users.db")
+        _supabase_auths[key] = supabase_auth
+    return supabase_auth
+
+def supabase_access_token(user_id: str) -> Optional[str]:
+    """رمز دخول المستخدم لطلبات Supabase (None إن لم يسجل الدخول)"""
+    return _get_supabase_auth().token(user_id)
+
+def _remember_account(user: Dict) -> Dict:
+    """نسخة من حساب Supabase في سجل المستخدمين (الأسماء واستعادة الجلسة)"""
+    user_data = {
+        "id": user["id"],
+        "email": user["email"],
+        "password": "",
+        "metadata": user.get("user_metadata") or {},
+        "created_at": user.get("created_at") or datetime.now().isoformat()
+    }
+    _get_registry().save(user_data)
+    return user_data
+
+def _session_secret() -> bytes:
+    """سر التوقيع: SESSION_SECRET أو سر عشوائي يُنشأ مرة ويُحفظ للمالك فقط"""
+    if SESSION_SECRET:
+        return SESSION_SECRET.encode("utf-8")
+    path = LOCAL_DATA_DIR / ".session_secret"
+    if not path.exists():
+        # السر يُكتب كاملاً في ملف مؤقت ثم يُربط باسمه: لا ترى عملية أخرى ملفاً فارغاً،
+        # وإن سبقتنا عملية فالربط يفشل ونقرأ سرها
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_bytes(32))
+                f.flush()
+                os.fsync(f.fileno())
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink(missing_ok=True)
+    secret = path.read_bytes()
+    if not secret:
+        raise ValueError(f"ملف سر الجلسات فارغ: {path}")
+    return secret
+
+def _get_session_tokens() -> SessionTokens:
+    """الحصول على مخزن رموز الجلسات (جدول sessions في users.db)"""
+    tokens = _session_tokens.get(LOCAL_DATA_DIR)
+    if tokens is None:
+        LOCAL_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        tokens = SessionTokens(LOCAL_DATA_DIR / "users.db", _session_secret(), SESSION_TTL_HOURS * 3600)
+        _session_tokens[LOCAL_DATA_DIR] = tokens
+    return tokens
+
+def restore_session() -> bool:
+    """استعادة الدخول من رمز الكوكي أو ?session= (تحقق من التوقيع بدل كلمة المرور)"""
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if SESSION_PARAM in st.query_params:
+        token = token or st.query_params[SESSION_PARAM]
+        # لا يبقى الرمز ظاهراً في الرابط أو سجل المتصفح
+        del st.query_params[SESSION_PARAM]
+    if not token:
+        return False
+    
+    user_id = _get_session_tokens().verify(token)
+    user_data = _get_registry().get_by_id(user_id) if user_id else None
+    if user_data is None:
+        # رمز منتهٍ أو ملغى: يُحذف من المتصفح
+        st.session_state.session_cookie = "clear"
+        return False
+    
+    st.session_state.user = LocalUser(user_data)
+    st.session_state.access_token = token
+    st.session_state.session_cookie = "set"
+    return True
+
+def _sync_session_cookie():
+    """كتابة كوكي الرمز أو حذفه في المتصفح بعد الدخول أو الخروج"""
+    action = st.session_state.get("session_cookie")
+    if action is None:
+        return
+    st.session_state.session_cookie = None
+    if action == "set":
+        value, max_age = st.session_state.access_token, SESSION_TTL_HOURS * 3600
+    else:
+        value, max_age = "", 0
+    import streamlit.components.v1 as components
+    components.html(f"""
+    <script>
+    window.parent.document.cookie = "{SESSION_COOKIE}={value}; path=/; max-age={max_age}; SameSite=Strict";
+    </script>
+    """, height=0)
+
 def _load_users():
-    """تحميل المستخدمين من الملف"""
-    users_file = _get_users_file()
-    if users_file.exists():
-        with open(users_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def _save_users(users):
-    """حفظ المستخدمين في الملف"""
-    users_file = _get_users_file()
-    with open(users_file, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    """كل المستخدمين {البريد: الحساب} (للأدوات فقط؛ الصفحات تستخدم البحث المفهرس)"""
+    return {user["email"]: user for user in _get_registry().iter_users()}
 
 def _hash_password(password: str) -> str:
     """تشفير كلمة المرور"""
@@ -50,9 +179,18 @@ class LocalUser:
 def sign_up(email: str, password: str, display_name: str = None) -> dict:
     """إنشاء حساب جديد"""
     try:
-        users = _load_users()
+        if not USE_LOCAL_STORAGE:
+            # الحساب في auth.users: معرفه هو ما تشير إليه مفاتيح جداول Supabase
+            user = _get_supabase_auth().sign_up(email, password, display_name or email.split("@")[0])
+            return {
+                "status": "success",
+                "message": "تم إنشاء الحساب بنجاح! يمكنك تسجيل الدخول الآن.",
+                "user": LocalUser(_remember_account(user))
+            }
         
-        if email in users:
+        registry = _get_registry()
+        
+        if registry.get_by_email(email) is not None:
             return {"status": "error", "message": "هذا البريد الإلكتروني مسجل بالفعل"}
         
         if len(password) < 6:
@@ -60,7 +198,7 @@ def sign_up(email: str, password: str, display_name: str = None) -> dict:
         
         user_id = hashlib.md5(email.encode()).hexdigest()
         
-        users[email] = {
+        user_data = {
             "id": user_id,
             "email": email,
             "password": _hash_password(password),
@@ -70,12 +208,14 @@ def sign_up(email: str, password: str, display_name: str = None) -> dict:
             "created_at": datetime.now().isoformat()
         }
         
-        _save_users(users)
+        # إضافة صف واحد؛ القيد الفريد يرفض تسجيلاً متزامناً لنفس البريد
+        if not registry.add(user_data):
+            return {"status": "error", "message": "هذا البريد الإلكتروني مسجل بالفعل"}
         
         return {
             "status": "success",
             "message": "تم إنشاء الحساب بنجاح! يمكنك تسجيل الدخول الآن.",
-            "user": LocalUser(users[email])
+            "user": LocalUser(user_data)
         }
         
     except Exception as e:
@@ -84,19 +224,27 @@ def sign_up(email: str, password: str, display_name: str = None) -> dict:
 def sign_in(email: str, password: str) -> dict:
     """تسجيل الدخول"""
     try:
-        users = _load_users()
-        
-        if email not in users:
-            return {"status": "error", "message": "بيانات الدخول غير صحيحة"}
-        
-        user_data = users[email]
-        
-        if user_data["password"] != _hash_password(password):
-            return {"status": "error", "message": "بيانات الدخول غير صحيحة"}
+        if not USE_LOCAL_STORAGE:
+            try:
+                user_data = _remember_account(_get_supabase_auth().sign_in(email, password))
+            except PostgrestError as e:
+                if e.status >= 500:
+                    raise
+                return {"status": "error", "message": "بيانات الدخول غير صحيحة"}
+        else:
+            user_data = _get_registry().get_by_email(email)
+            
+            if user_data is None:
+                return {"status": "error", "message": "بيانات الدخول غير صحيحة"}
+            
+            if user_data["password"] != _hash_password(password):
+                return {"status": "error", "message": "بيانات الدخول غير صحيحة"}
         
         user = LocalUser(user_data)
         st.session_state.user = user
-        st.session_state.access_token = user.id
+        # رمز جلسة موقع يُحفظ في كوكي فلا يلزم الدخول مجدداً بعد تحديث الصفحة
+        st.session_state.access_token = _get_session_tokens().issue(user.id)
+        st.session_state.session_cookie = "set"
         
         return {
             "status": "success",
@@ -108,13 +256,23 @@ def sign_in(email: str, password: str) -> dict:
         return {"status": "error", "message": f"خطأ: {str(e)}"}
 
 def sign_out():
-    """تسجيل الخروج"""
+    """تسجيل الخروج (مع إلغاء رمز الجلسة وحذف الكوكي)"""
+    token = st.session_state.get("access_token")
+    if token:
+        _get_session_tokens().revoke(token)
     st.session_state.user = None
     st.session_state.access_token = None
+    st.session_state.session_cookie = "clear"
     return {"status": "success", "message": "تم تسجيل الخروج"}
 
 def reset_password(email: str) -> dict:
-    """إعادة تعيين كلمة المرور (غير متاحة في الوضع المحلي)"""
+    """إعادة تعيين كلمة المرور (برابط من Supabase Auth، وغير متاحة في الوضع المحلي)"""
+    if not USE_LOCAL_STORAGE:
+        try:
+            _get_supabase_auth().recover(email)
+            return {"status": "success", "message": "تم إرسال رابط إعادة تعيين كلمة المرور إلى بريدك"}
+        except Exception as e:
+            return {"status": "error", "message": f"خطأ: {str(e)}"}
     return {
         "status": "info",
         "message": "هذه الميزة غير متاحة في الوضع المحلي"
@@ -0,0 +1,73 @@
+"""
+قياس زمن استيراد تاريخ كبير من CSV
+Bulk import benchmark
+
+يولد ملف CSV بعدد الصفوف المطلوب (كل الفترات لأيام متتالية) ويستورده لمستخدم
+جديد ثم يعيد استيراده (كل الصفوف مطابقة للمحفوظ). البيانات في مجلد مؤقت.
+
+تشغيل:
+    python benchmarks/bulk_import.py --rows 1000000 --backend partitioned
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_csv(rows: int, seed: int = 7) -> bytes:
+    """ملف CSV بكل الفترات لأيام متتالية وفئات بالاسم والاسم العربي"""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-01-01", periods=rows // 48 + 1).strftime("%Y-%m-%d").to_numpy()
+    index = np.arange(rows)
+    frame = pd.DataFrame({
+        "log_date": days[index // 48],
+        "time_slot": index % 48,
+        "score": rng.integers(0, 5, rows),
+        "category": rng.choice(["Work", "Study", "الصحة"], rows),
+        "notes": np.where(rng.random(rows) < 0.05, "ملاحظة", ""),
+    })
+    return frame.to_csv(index=False).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--backend", default="partitioned",
+                        choices=["partitioned", "json", "journal", "sqlite", "grid"])
+    args = parser.parse_args()
+
+    import database
+
+    data = make_csv(args.rows)
+    print(f"{args.rows} صف ({len(data) / 1024 / 1024:.1f} MB)، المحرك: {args.backend}")
+
+    data_dir = Path(tempfile.mkdtemp())
+    try:
+        with patch("config.LOCAL_DATA_DIR", data_dir), \
+             patch("database.LOCAL_DATA_DIR", data_dir), \
+             patch("database.LOG_STORAGE_BACKEND", args.backend):
+            for label in ("استيراد أول", "إعادة الاستيراد"):
+                start = time.perf_counter()
+                result = database.import_logs("bench_user", io.BytesIO(data), "csv")
+                elapsed = time.perf_counter() - start
+                assert result["status"] == "success", result
+                summary = result["data"]
+                print(f"{label:<18}{elapsed:>8.2f} s   مكتوبة: {summary['imported']:>9}"
+                      f"   متروكة: {summary['unchanged']:>9}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+قياس إنتاجية الكتابة المتوازية لسجلات الإنتاجية
+Parallel writer throughput benchmark
+
+يقارن قفلاً عاماً واحداً (شريحة واحدة) بالأقفال المقسمة لكل مستخدم، لكتّاب
+لمستخدمين مختلفين ولكتّاب لنفس المستخدم. البيانات في مجلد مؤقت.
+
+تشغيل:
+    python benchmarks/parallel_writes.py --writers 8 --writes 100 --backend partitioned
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(writers: int, writes: int, backend: str, same_user: bool, stripes: int) -> float:
+    """عدد الكتابات في الثانية لكل الكتّاب معاً"""
+    import database
+    from storage.atomic import StripedLocks
+
+    data_dir = Path(tempfile.mkdtemp())
+    locks = StripedLocks(lambda: data_dir / ".locks", name="user", stripes=stripes)
+    try:
+        with patch("config.LOCAL_DATA_DIR", data_dir), \
+             patch("database.LOCAL_DATA_DIR", data_dir), \
+             patch("auth.LOCAL_DATA_DIR", data_dir), \
+             patch("database.LOG_STORAGE_BACKEND", backend), \
+             patch("database._user_locks", locks):
+
+            def writer(n: int):
+                user_id = "bench_shared" if same_user else f"bench_{n}"
+                first_day = date(2024, 1, 1) + timedelta(days=n * writes)
+                for i in range(writes):
+                    result = database.log_productivity(
+                        user_id, first_day + timedelta(days=i // 48), i % 48, i % 5, "Work"
+                    )
+                    assert result["status"] == "success", result
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=writers) as pool:
+                list(pool.map(writer, range(writers)))
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return writers * writes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=100, help="كتابات لكل كاتب")
+    parser.add_argument("--backend", default="partitioned",
+                        choices=["partitioned", "json", "journal", "sqlite", "grid"])
+    args = parser.parse_args()
+
+    print(f"{args.writers} كتّاب × {args.writes} كتابة - محرك {args.backend}")
+    print(f"{'السيناريو':<28}{'قفل عام':>12}{'أقفال مقسمة':>14}")
+    for label, same_user in (("مستخدمون مختلفون", False), ("نفس المستخدم", True)):
+        global_rate = run(args.writers, args.writes, args.backend, same_user, stripes=1)
+        striped_rate = run(args.writers, args.writes, args.backend, same_user, stripes=64)
+        print(f"{label:<28}{global_rate:>10.0f}/s{striped_rate:>12.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
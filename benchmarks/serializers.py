@@ -0,0 +1,86 @@
+"""
+قياس صيغ ملفات البيانات على تاريخ اصطناعي لعدة سنوات
+Serializer benchmark: dump/parse time and file size
+
+يقارن الصيغة القديمة (json القياسي مع indent=2) بكل صيغة متاحة في
+storage/serializer.py على ملف سجلات واحد بحجم سنوات من التسجيل.
+
+تشغيل:
+    python benchmarks/serializers.py --years 3 --density 0.6
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import serializer
+
+
+def make_history(years: int, density: float, seed: int = 7) -> list:
+    """سجلات اصطناعية بنفس شكل سجلات التطبيق"""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=365 * years)
+    categories = ["Work", "Study", "Health", "عمل", "دراسة"]
+    logs = []
+    for d in range(365 * years):
+        log_date = str(start + timedelta(days=d))
+        for slot in range(48):
+            if rng.random() < density:
+                logs.append({
+                    "id": f"{log_date}_{slot}_{1700000000 + d * 48 + slot}.123456",
+                    "user_id": "5f4dcc3b5aa765d61d8327deb882cf99",
+                    "log_date": log_date,
+                    "time_slot": slot,
+                    "score": rng.randint(0, 4),
+                    "category": rng.choice(categories),
+                    "notes": "ملاحظة قصيرة" if rng.random() < 0.1 else None,
+                    "updated_at": f"{log_date}T{slot // 2:02d}:{(slot % 2) * 30:02d}:00.000000",
+                })
+    return logs
+
+
+def timed(fn, repeat: int) -> float:
+    """أفضل زمن (بالملي ثانية) من عدة تكرارات"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--density", type=float, default=0.6, help="نسبة الفترات المسجلة يومياً")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logs = make_history(args.years, args.density)
+    print(f"{len(logs)} سجل ({args.years} سنوات)")
+    print(f"{'الصيغة':<22}{'كتابة (ms)':>12}{'قراءة (ms)':>12}{'الحجم (KB)':>12}")
+
+    # الصيغة السابقة في database._save_json
+    legacy = lambda: json.dumps(logs, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+    raw = legacy()
+    rows = [("json indent=2 (قديم)", timed(legacy, args.repeat),
+             timed(lambda: json.loads(raw.decode("utf-8")), args.repeat), len(raw))]
+
+    for fmt in serializer.available():
+        raw = serializer.dumps(logs, fmt)
+        assert serializer.loads(raw) == logs
+        rows.append((fmt, timed(lambda: serializer.dumps(logs, fmt), args.repeat),
+                     timed(lambda: serializer.loads(raw), args.repeat), len(raw)))
+
+    for name, dump_ms, load_ms, size in rows:
+        print(f"{name:<22}{dump_ms:>12.1f}{load_ms:>12.1f}{size / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
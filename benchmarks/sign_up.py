@@ -0,0 +1,95 @@
+"""
+قياس إنتاجية إنشاء الحسابات مع 100 ألف مستخدم مسجل
+Sign-up throughput benchmark with a large user base
+
+يقارن سجل المستخدمين (SQLite، صف لكل حساب) بالطريقة السابقة: قراءة
+users.json كاملاً وإعادة كتابته مع كل حساب. البيانات في مجلد مؤقت.
+
+تشغيل:
+    python benchmarks/sign_up.py --users 100000 --signups 200
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_users(count: int) -> dict:
+    """حسابات بنفس شكل sign_up"""
+    users = {}
+    for i in range(count):
+        email = f"user{i}@example.com"
+        users[email] = {
+            "id": hashlib.md5(email.encode()).hexdigest(),
+            "email": email,
+            "password": hashlib.sha256(b"password").hexdigest(),
+            "metadata": {"display_name": f"user{i}"},
+            "created_at": "2025-01-01T00:00:00",
+        }
+    return users
+
+
+def legacy_sign_up(users_file: Path, email: str):
+    """الطريقة السابقة: قراءة الملف كاملاً ثم إعادة كتابته"""
+    from storage import serializer
+    from storage.atomic import write_atomic
+
+    users = serializer.loads(users_file.read_bytes())
+    users[email] = dict(next(iter(users.values())), email=email,
+                        id=hashlib.md5(email.encode()).hexdigest())
+    write_atomic(users_file, serializer.dumps(users, "auto"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--signups", type=int, default=200)
+    args = parser.parse_args()
+
+    import auth
+    from storage import serializer
+
+    users = make_users(args.users)
+    new_emails = [f"new{i}@example.com" for i in range(args.signups)]
+    print(f"{args.users} مستخدم مسجل، {args.signups} حساب جديد")
+
+    data_dir = Path(tempfile.mkdtemp())
+    try:
+        users_file = data_dir / "users.json"
+        users_file.write_bytes(serializer.dumps(users, "auto"))
+        start = time.perf_counter()
+        for email in new_emails:
+            legacy_sign_up(users_file, email)
+        legacy = args.signups / (time.perf_counter() - start)
+        users_file.unlink()
+
+        with patch("auth.LOCAL_DATA_DIR", data_dir):
+            auth._get_registry().import_users(users)
+            start = time.perf_counter()
+            for email in new_emails:
+                result = auth.sign_up(email, "password123")
+                assert result["status"] == "success", result
+            registry = args.signups / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(0, args.users, max(1, args.users // 1000)):
+                assert auth._get_registry().get_by_email(f"user{i}@example.com")
+            lookups = min(1000, args.users) / (time.perf_counter() - start)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"users.json (قراءة وكتابة كاملة): {legacy:>10.1f} حساب/ث")
+    print(f"سجل SQLite (INSERT واحد):        {registry:>10.1f} حساب/ث")
+    print(f"بحث بالبريد:                      {lookups:>10.0f} بحث/ث")
+
+
+if __name__ == "__main__":
+    main()
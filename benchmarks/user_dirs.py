@@ -0,0 +1,70 @@
+"""
+قياس إنشاء مجلدات المستخدمين والبحث فيها وسردها بالتوزيعين flat و sharded
+User directory layout benchmark
+
+لكل توزيع: إنشاء مجلد وملف صغير لكل مستخدم، ثم فتح ملف كل مستخدم بترتيب
+عشوائي، ثم سرد كل المستخدمين (iter_users). البيانات في مجلد مؤقت، ويفضل
+تشغيله على نفس نظام ملفات النشر (TMPDIR) لأن الفرق يعتمد عليه.
+
+تشغيل:
+    python benchmarks/user_dirs.py --users 100000
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(users: int, layout_name: str) -> dict:
+    """أزمنة (إنشاء، بحث، سرد) بالثواني لتوزيع واحد"""
+    from storage import layout
+
+    user_ids = [hashlib.md5(f"user{i}@example.com".encode()).hexdigest() for i in range(users)]
+    # التطبيق يحفظ المسار المحسوم في الذاكرة، فالبحث هنا هو فتح الملف بمساره
+    path_for = layout.flat_dir if layout_name == "flat" else layout.sharded_dir
+    root = Path(tempfile.mkdtemp())
+    try:
+        start = time.perf_counter()
+        for user_id in user_ids:
+            user_dir = path_for(root, user_id)
+            user_dir.mkdir(parents=True)
+            (user_dir / "profile.json").write_bytes(b"{}")
+        created = time.perf_counter() - start
+
+        random.Random(7).shuffle(user_ids)
+        start = time.perf_counter()
+        for user_id in user_ids:
+            (path_for(root, user_id) / "profile.json").read_bytes()
+        looked_up = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = sum(1 for _ in layout.iter_users(root))
+        listed = time.perf_counter() - start
+        assert found == users, found
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {"create": created, "lookup": looked_up, "enumerate": listed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.users} مستخدم في {tempfile.gettempdir()}")
+    print(f"{'التوزيع':<10}{'إنشاء':>10}{'بحث':>10}{'سرد':>10}")
+    for layout_name in ("flat", "sharded"):
+        times = run(args.users, layout_name)
+        print(f"{layout_name:<10}{times['create']:>9.2f}s{times['lookup']:>9.2f}s{times['enumerate']:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
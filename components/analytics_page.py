@@ -7,11 +7,13 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import date, datetime, timedelta
-import pandas as pd
+from typing import Dict, Union
 import math
+import tempfile
 from auth import get_current_user
-from database import get_logs_by_range, get_user_profile
+from database import get_user_profile, get_daily_scores, get_analytics_snapshot, export_logs
 from analytics import (
+    LogsOrSnapshot,
     generate_heatmap_data,
     calculate_trends,
     get_category_breakdown,
@@ -28,6 +30,7 @@ from analytics import (
     generate_calendar_data
 )
 from config import PRODUCTIVITY_LEVELS, DAYS_OF_WEEK_AR
+from storage import export
 
 def render_analytics():
     """عرض صفحة التحليلات"""
@@ -87,28 +90,21 @@ def render_analytics():
         with c3:
             end_date = st.date_input("إلى", value=today, key="analytics_end", label_visibility="collapsed")
             
-        # جلب البيانات الأولية
-        all_logs = get_logs_by_range(user.id, start_date, end_date)
+        # مجاميع الفترة كلها (في وضع Supabase تُجمع في الخادم بدل جلب السجلات)
+        overview = get_analytics_snapshot(user.id, start_date, end_date)
         
         with c4:
-            # زر التصدير
-            if all_logs:
-                df_export = pd.DataFrame(all_logs)
-                csv = df_export.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    label="📥 تصدير CSV",
-                    data=csv,
-                    file_name=f"productivity_logs_{start_date}_{end_date}.csv",
-                    mime="text/csv",
-                )
-    
-    if not all_logs:
+            # التصدير يُبنى عند الطلب فقط
+            if overview:
+                render_export_menu(user.id, start_date, end_date)
+    
+    if not overview:
         st.warning("لا توجد بيانات في هذه الفترة. ابدأ بتسجيل إنتاجيتك! 🚀")
         return
 
     # فلترة الفئات - Category Filter
     # نستخرج الفئات الموجودة في السجلات
-    available_categories = sorted(list(set([log.get("category", "بدون فئة") for log in all_logs])))
+    available_categories = sorted(overview.categories)
     
     if available_categories:
         with st.expander("🔍 تصفية حسب الفئة", expanded=False):
@@ -120,13 +116,18 @@ def render_analytics():
             
         # تطبيق الفلتر
         if selected_categories:
-            logs = [log for log in all_logs if log.get("category", "بدون فئة") in selected_categories]
+            filter_categories = None if len(selected_categories) == len(available_categories) else selected_categories
         else:
-            logs = []
             st.warning("يرجى اختيار فئة واحدة على الأقل.")
             return
     else:
-        logs = all_logs
+        filter_categories = None
+    
+    # لقطة واحدة تقرأ منها كل الرسوم والبطاقات التالية
+    if filter_categories is None:
+        snapshot = overview
+    else:
+        snapshot = get_analytics_snapshot(user.id, start_date, end_date, filter_categories)
 
     profile = get_user_profile(user.id)
     daily_goal = profile.get("daily_goal", 100) if profile else 100
@@ -134,7 +135,7 @@ def render_analytics():
     monthly_goal = profile.get("monthly_goal", 2000) if profile else 2000
     
     # 1. بطاقات الأداء الرئيسية (KPIs)
-    stats = get_statistics_summary(logs, daily_goal)
+    stats = get_statistics_summary(snapshot, daily_goal)
     render_stats_cards(stats)
     
     st.markdown("---")
@@ -144,11 +145,11 @@ def render_analytics():
     
     with col_main:
         # الاتجاه العام + الهدف
-        render_trends_simplified(logs, daily_goal)
+        render_trends_simplified(snapshot, daily_goal)
         
     with col_side:
         # تقدم الأهداف (دائري أو شريطي مبسط)
-        render_goals_progress_simplified(user.id, weekly_goal, monthly_goal, logs)
+        render_goals_progress_simplified(user.id, weekly_goal, monthly_goal, snapshot)
 
     st.markdown("---")
 
@@ -163,24 +164,68 @@ def render_analytics():
     ])
     
     with tab_calendar:
-        render_calendar_view(logs, daily_goal, start_date, end_date)
+        # التقويم يقرأ مجموع كل يوم من الملخص اليومي بنفس فلتر الفئات
+        daily_scores = get_daily_scores(user.id, start_date, end_date, filter_categories)
+        render_calendar_view(daily_scores, daily_goal, start_date, end_date)
         
     with tab_cat:
-        render_category_analysis(logs)
+        render_category_analysis(snapshot)
         
     with tab_heat:
-         render_heatmap(logs)
+         render_heatmap(snapshot)
          
     with tab_time:
-        render_time_patterns(logs)
+        render_time_patterns(snapshot)
         
     with tab_compare:
         render_period_comparison(user.id, start_date, end_date)
         
     with tab_details:
-        render_detailed_stats(logs, stats)
+        render_detailed_stats(snapshot, stats)
 
-def render_calendar_view(logs: list, daily_goal: int, start_date: date, end_date: date):
+def render_export_menu(user_id: str, start_date: date, end_date: date):
+    """
+    تصدير السجلات عند الطلب: الملف يُكتب على دفعات في ملف مؤقت بلا اسم،
+    ويُقرأ مرة واحدة عند التجهيز ثم يُغلق، وتُحرر بياناته بعد التحميل
+    """
+    with st.expander("📥 تصدير"):
+        fmt = st.selectbox("الصيغة", export.available(), format_func=str.upper, key="export_format")
+        scope = st.radio("النطاق", ["الفترة المحددة", "كامل الحساب"], key="export_scope")
+        
+        if st.button("تجهيز الملف", key="export_prepare", use_container_width=True):
+            full = scope == "كامل الحساب"
+            mime, ext = export.FORMATS[fmt]
+            suffix = "all" if full else f"{start_date}_{end_date}"
+            st.session_state.pop("export_file", None)
+            
+            # TemporaryFile لا يبقى له اسم في /tmp: يُحذف عند إغلاقه
+            with tempfile.TemporaryFile() as sink:
+                with st.spinner("جاري تجهيز الملف..."):
+                    result = export_logs(user_id, fmt, sink,
+                                         None if full else start_date, None if full else end_date)
+                if result["status"] == "success":
+                    sink.seek(0)
+                    st.session_state.export_file = {
+                        "data": sink.read(), "name": f"productivity_logs_{suffix}.{ext}", "mime": mime
+                    }
+                else:
+                    st.error(result["message"])
+        
+        prepared = st.session_state.get("export_file")
+        if prepared:
+            served = st.download_button(
+                label=f"⬇️ {prepared['name']}",
+                data=prepared["data"],
+                file_name=prepared["name"],
+                mime=prepared["mime"],
+                key="export_download",
+                use_container_width=True,
+            )
+            if served:
+                # تم التحميل: لا حاجة لبيانات الملف في الجلسة بعد الآن
+                st.session_state.pop("export_file", None)
+
+def render_calendar_view(logs: Union[LogsOrSnapshot, Dict[date, int]], daily_goal: int, start_date: date, end_date: date):
     """عرض التقويم التفاعلي"""
     st.markdown("### 📅 تقويم الإنتاجية")
     
@@ -287,8 +332,7 @@ def render_calendar_view(logs: list, daily_goal: int, start_date: date, end_date
         # Week Stats
         days_since_sat = (today.weekday() + 2) % 7
         week_start = today - timedelta(days=days_since_sat)
-        w_logs = get_logs_by_range(curr_user.id, week_start, today)
-        w_score = sum(l.get("score", 0) for l in w_logs)
+        w_score = sum(get_daily_scores(curr_user.id, week_start, today).values())
         w_remaining = max(0, w_goal - w_score)
         w_days_left = 7 - days_since_sat # Includes today if we haven't synced yet? Assuming end of day calculation logic usually.
         # If "today" adds to score, then days left includes today.
@@ -300,8 +344,7 @@ def render_calendar_view(logs: list, daily_goal: int, start_date: date, end_date
             
         # Month Stats
         m_start = today.replace(day=1)
-        m_logs = get_logs_by_range(curr_user.id, m_start, today)
-        m_score = sum(l.get("score", 0) for l in m_logs)
+        m_score = sum(get_daily_scores(curr_user.id, m_start, today).values())
         m_remaining = max(0, m_goal - m_score)
         
         # Days in month
@@ -344,13 +387,9 @@ def render_goals_progress(user_id: str, weekly_goal: int, monthly_goal: int):
     # حساب بداية الشهر
     month_start = today.replace(day=1)
     
-    # جلب البيانات
-    week_logs = get_logs_by_range(user_id, week_start, today)
-    month_logs = get_logs_by_range(user_id, month_start, today)
-    
-    # حساب النقاط
-    week_score = sum(log.get("score", 0) for log in week_logs)
-    month_score = sum(log.get("score", 0) for log in month_logs)
+    # حساب النقاط من الملخص اليومي
+    week_score = sum(get_daily_scores(user_id, week_start, today).values())
+    month_score = sum(get_daily_scores(user_id, month_start, today).values())
     
     # حساب النسب
     week_progress = min((week_score / weekly_goal * 100), 100) if weekly_goal > 0 else 0
@@ -447,7 +486,7 @@ def render_stats_cards(stats: dict):
 </div>
 """, unsafe_allow_html=True)
 
-def render_heatmap(logs: list):
+def render_heatmap(logs: LogsOrSnapshot):
     """عرض خريطة الحرارة"""
     
     st.markdown("### 🗓️ خريطة الحرارة (الساعات × أيام الأسبوع)")
@@ -483,7 +522,7 @@ def render_heatmap(logs: list):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def render_trends(logs: list, daily_goal: int):
+def render_trends(logs: LogsOrSnapshot, daily_goal: int):
     """عرض الاتجاهات"""
     
     st.markdown("### 📈 اتجاه الإنتاجية")
@@ -559,7 +598,7 @@ def render_trends(logs: list, daily_goal: int):
     
     st.plotly_chart(fig2, use_container_width=True)
 
-def render_category_analysis(logs: list):
+def render_category_analysis(logs: LogsOrSnapshot):
     """عرض تحليل الفئات"""
     
     st.markdown("### 📊 تحليل الفئات")
@@ -622,7 +661,7 @@ def render_category_analysis(logs: list):
     
     st.dataframe(display_df, use_container_width=True, hide_index=True)
 
-def render_detailed_stats(logs: list, stats: dict):
+def render_detailed_stats(logs: LogsOrSnapshot, stats: dict):
     """عرض الإحصائيات التفصيلية"""
     
     st.markdown("### 📋 إحصائيات تفصيلية")
@@ -654,10 +693,7 @@ def render_detailed_stats(logs: list, stats: dict):
     # توزيع التقييمات
     st.markdown("#### 📊 توزيع مستويات الإنتاجية")
     
-    score_counts = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0}
-    for log in logs:
-        score = log.get("score", 0)
-        score_counts[score] = score_counts.get(score, 0) + 1
+    score_counts = get_score_distribution(logs)
     
     # عرض البطاقات في صف واحد مع تصميم محسن
     cards_html = '<div style="display: flex; flex-wrap: wrap; gap: 10px; justify-content: center;">'
@@ -703,8 +739,8 @@ def render_period_comparison(user_id: str, current_start: date, current_end: dat
     previous_start = previous_end - timedelta(days=period_days)
     
     # جلب البيانات
-    current_logs = get_logs_by_range(user_id, current_start, current_end)
-    previous_logs = get_logs_by_range(user_id, previous_start, previous_end)
+    current_logs = get_analytics_snapshot(user_id, current_start, current_end)
+    previous_logs = get_analytics_snapshot(user_id, previous_start, previous_end)
     
     comparison = compare_periods(current_logs, previous_logs)
     
@@ -801,7 +837,7 @@ def render_period_comparison(user_id: str, current_start: date, current_end: dat
         st.plotly_chart(fig, use_container_width=True)
 
 
-def render_time_patterns(logs: list):
+def render_time_patterns(logs: LogsOrSnapshot):
     """عرض تحليل أنماط الوقت"""
     
     st.markdown("### ⏰ أنماط الوقت")
@@ -926,7 +962,7 @@ def render_time_patterns(logs: list):
                     """, unsafe_allow_html=True)
 
 
-def render_recommendations(logs: list, daily_goal: int):
+def render_recommendations(logs: LogsOrSnapshot, daily_goal: int):
     """عرض التوصيات الذكية"""
     
     recommendations = generate_recommendations(logs, daily_goal)
@@ -973,7 +1009,7 @@ def render_recommendations(logs: list, daily_goal: int):
                 """, unsafe_allow_html=True)
 
 
-def render_period_report(logs: list, daily_goal: int, period_name: str):
+def render_period_report(logs: LogsOrSnapshot, daily_goal: int, period_name: str):
     """عرض تقرير شامل للفترة"""
     
     st.markdown("### 📃 تقرير الفترة")
@@ -1104,7 +1140,7 @@ def render_period_report(logs: list, daily_goal: int, period_name: str):
         
         st.plotly_chart(fig, use_container_width=True)
 
-def render_trends_simplified(logs: list, daily_goal: int):
+def render_trends_simplified(logs: LogsOrSnapshot, daily_goal: int):
     """عرض مبسط للاتجاهات للوحة القيادة"""
     st.markdown("##### 📈 اتجاه الإنتاجية")
     
@@ -1151,7 +1187,7 @@ def render_trends_simplified(logs: list, daily_goal: int):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def render_goals_progress_simplified(user_id: str, weekly_goal: int, monthly_goal: int, current_logs: list):
+def render_goals_progress_simplified(user_id: str, weekly_goal: int, monthly_goal: int, current_logs: LogsOrSnapshot):
     """عرض مبسط للأهداف للوحة القيادة"""
     st.markdown("##### 🎯 الأهداف")
     
@@ -1168,18 +1204,12 @@ def render_goals_progress_simplified(user_id: str, weekly_goal: int, monthly_goa
     week_start = today - timedelta(days=days_since_saturday)
     month_start = today.replace(day=1)
     
-    # نستخدم get_logs_by_range لجلب البيانات "الخام" للأهداف، بغض النظر عن الفلتر
+    # نستخدم الملخص اليومي لكل الفئات، بغض النظر عن الفلتر
     # لأن الهدف هو "هدفي الأسبوعي" وليس "هدفي الأسبوعي في العمل فقط" (عادة)
     # إلا إذا أراد المستخدم تخصيص أهداف للفئات (feature creep)
     
-    week_logs = get_logs_by_range(user_id, week_start, today)
-    month_logs = get_logs_by_range(user_id, month_start, today)
-    
-    week_score = sum(log.get("score", 0) for log in week_logs)
-    month_score = sum(log.get("score", 0) for log in month_logs)
-    
-    week_ids = {l['id'] for l in week_logs}
-    month_ids = {l['id'] for l in month_logs}
+    week_score = sum(get_daily_scores(user_id, week_start, today).values())
+    month_score = sum(get_daily_scores(user_id, month_start, today).values())
 
     week_progress = min((week_score / weekly_goal * 100), 100) if weekly_goal > 0 else 0
     month_progress = min((month_score / monthly_goal * 100), 100) if monthly_goal > 0 else 0
@@ -6,7 +6,8 @@ Dashboard Component
 import streamlit as st
 from datetime import date, datetime, timedelta
 from auth import get_current_user
-from database import get_logs_by_date, log_productivity, get_user_profile, get_categories
+from database import get_logs_by_date, get_slot_mask, log_productivity, get_user_profile, get_categories
+from storage import slot_mask
 from analytics import calculate_daily_score, calculate_progress_percentage
 from config import (
     PRODUCTIVITY_LEVELS, 
@@ -115,6 +116,8 @@ def render_dashboard():
     # الحصول على البيانات
     today = date.today()
     logs = get_logs_by_date(user.id, today)
+    # الفترات المسجلة اليوم كخريطة بتات من الملخص اليومي
+    logged_mask = get_slot_mask(user.id, today)
     profile = get_user_profile(user.id)
     daily_goal = profile.get("daily_goal", 100) if profile else 100
     
@@ -151,8 +154,7 @@ def render_dashboard():
     
     # التحقق هل الفترة السابقة مسجلة (لإيقاف المنبه)
     prev_slot = get_previous_time_slot()
-    logged_slots_set = {log.get("time_slot") for log in logs}
-    prev_slot_logged = prev_slot in logged_slots_set
+    prev_slot_logged = slot_mask.is_logged(logged_mask, prev_slot)
     # هل الوقت انتهى فعلاً؟
     should_alert = (not prev_slot_logged) and (remaining_min <= 0 if (remaining_min := get_time_remaining_in_slot()[0]) is not None else False)
     
@@ -345,8 +347,7 @@ def render_dashboard():
     target_slot_label = get_time_slot_label(target_slot)
     
     # التحقق مما إذا كانت الفترة مسجلة
-    logged_slots = {log.get("time_slot"): log for log in logs}
-    is_target_logged = target_slot in logged_slots
+    is_target_logged = slot_mask.is_logged(logged_mask, target_slot)
     
     if is_editing:
         title = "✏️ تعديل فترة"
@@ -429,7 +430,7 @@ def render_dashboard():
     import streamlit.components.v1 as components
     
     prev_slot = get_previous_time_slot()
-    prev_logged = prev_slot in {log.get("time_slot") for log in logs}
+    prev_logged = slot_mask.is_logged(logged_mask, prev_slot)
     btn_text = "✏️ تعديل الفترة السابقة" if prev_logged else "⚡ سجّل الفترة السابقة"
     btn_bg = "#FF9800" if prev_logged else "#4CAF50"
     
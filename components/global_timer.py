@@ -7,7 +7,7 @@ import streamlit as st
 import streamlit.components.v1 as components
 from datetime import datetime
 from config import get_current_time_slot, get_time_slot_label
-from database import get_logs_by_date
+from database import is_slot_logged
 from datetime import date
 from auth import get_current_user
 
@@ -36,16 +36,12 @@ def render_global_timer():
     end_timestamp = int(time.mktime(now.replace(hour=end_hour % 24, minute=end_minute, second=0, microsecond=0).timetuple()) * 1000)
     
     # Check if previous slot is logged (to stop alert)
-    # We need to fetch logs for today to know this.
-    # This adds a database call on every rerun, but it's lightweight.
+    # A single bit of today's logged-slots bitmap, no log records are loaded.
     today = date.today()
-    logs = get_logs_by_date(user.id, today)
-    
-    logged_slots_set = {log.get("time_slot") for log in logs}
     
     current_slot = get_current_time_slot()
     prev_slot = max(0, current_slot - 1)
-    prev_slot_logged = prev_slot in logged_slots_set
+    prev_slot_logged = is_slot_logged(user.id, today, prev_slot)
     
     # Calculate remaining minutes for Python-side check (optional, mostly for specific UI warnings)
     if now.minute < 30:
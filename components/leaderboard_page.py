@@ -5,75 +5,41 @@ Leaderboard Component
 
 import streamlit as st
 import pandas as pd
-from datetime import date, timedelta
-from database import _get_logs_file, _load_json, get_user_profile
-from auth import _load_users, get_current_user
+from database import get_leaderboard, get_user_profile
+from auth import _get_registry, get_current_user
 from config import LOCAL_DATA_DIR
 
 def get_leaderboard_data(period="weekly"):
     """
-    تجميع بيانات المتصدرين
+    تجميع بيانات المتصدرين من الترتيب المحفوظ
     period: 'weekly', 'monthly', 'all_time'
     """
     users_data = []
-    all_users = _load_users()
+    registry = _get_registry()
     
-    today = date.today()
-    if period == "weekly":
-        # بداية الأسبوع (السبت)
-        days_since_sat = (today.weekday() + 2) % 7
-        start_date = today - timedelta(days=days_since_sat)
-        end_date = today
-    elif period == "monthly":
-        start_date = today.replace(day=1)
-        end_date = today
-    else:
-        start_date = date(2000, 1, 1) # All time
-        end_date = today
-    
-    for email, user_info in all_users.items():
-        user_id = user_info.get("id")
-        # الاسم المعروض
-        display_name = user_info.get("metadata", {}).get("display_name", email.split("@")[0])
+    # الترتيب جاهز ومرتب: لا قراءة لسجلات أي مستخدم هنا، وحسابات المتصدرين فقط من السجل
+    entries = get_leaderboard(period)
+    accounts = registry.get_many(entry["id"] for entry in entries)
+    hide_demo = registry.count() > 5
+    for entry in entries:
+        user_info = accounts.get(entry["id"])
+        if user_info is None:
+            continue
+        email = user_info["email"]
         
         # تجاهل المستخدمين التجريبيين إذا لزم الأمر
-        if "demo" in email and len(all_users) > 5:
-            continue
-
-        # قراءة السجلات
-        logs_file = _get_logs_file(user_id)
-        if not logs_file.exists():
+        if "demo" in email and hide_demo:
             continue
-            
-        logs = _load_json(logs_file, [])
-        
-        # حساب النقاط للفترة
-        score = 0
-        logs_count = 0
-        
-        for log in logs:
-            log_date_str = log.get("log_date")
-            if not log_date_str: continue
-            
-            # تحويل التاريخ للتأكد
-            try:
-                l_date = date.fromisoformat(log_date_str)
-                if start_date <= l_date <= end_date:
-                    score += log.get("score", 0)
-                    logs_count += 1
-            except:
-                continue
         
-        if score > 0:
-            users_data.append({
-                "name": display_name,
-                "score": score,
-                "logs_count": logs_count,
-                "id": user_id
-            })
+        # الاسم المعروض
+        display_name = user_info.get("metadata", {}).get("display_name", email.split("@")[0])
+        users_data.append({
+            "name": display_name,
+            "score": entry["score"],
+            "logs_count": entry["logs_count"],
+            "id": entry["id"]
+        })
     
-    # الترتيب
-    users_data.sort(key=lambda x: x["score"], reverse=True)
     return users_data
 
 def render_leaderboard():
@@ -103,7 +69,7 @@ def render_leaderboard():
     
     # جلب البيانات
     with st.spinner("جاري تحديث الترتيب..."):
-        # لا نستخدم الـ cache هنا حالياً لتحديث فوري، يمكن إضافته لاحقاً
+        # الترتيب محفوظ ويُحدث مع كل تسجيل، فالقراءة فورية ودقيقة
         data = get_leaderboard_data(period)
     
     if not data:
@@ -8,12 +8,15 @@ from datetime import date, datetime, timedelta
 from auth import get_current_user
 from database import (
     log_productivity, 
+    log_productivity_bulk,
     get_logs_by_date, 
+    get_logs_by_range,
     get_categories,
     delete_log
 )
 from config import (
     PRODUCTIVITY_LEVELS, 
+    TOTAL_TIME_SLOTS,
     get_time_slot_label,
     get_all_time_slots,
     DAYS_OF_WEEK_AR
@@ -40,7 +43,16 @@ def render_log_activity():
     tab1, tab2 = st.tabs(["📝 تسجيل جديد", "📋 سجلات اليوم"])
     
     with tab1:
-        render_new_log_form(user)
+        mode = st.radio(
+            "طريقة التسجيل",
+            options=["فترة واحدة", "نطاق فترات"],
+            horizontal=True,
+            key="log_mode"
+        )
+        if mode == "فترة واحدة":
+            render_new_log_form(user)
+        else:
+            render_range_log_form(user)
     
     with tab2:
         render_today_logs(user)
@@ -148,10 +160,108 @@ def render_new_log_form(user):
                 if result["status"] == "success":
                     action = "تحديث" if existing_log else "تسجيل"
                     st.success(f"✅ تم {action} {level['name']} ({score} نقاط) بنجاح!")
+                    if result.get("rejected"):
+                        st.warning(result["message"])
                     st.balloons()
                 else:
                     st.error(result["message"])
 
+def _slot_boundaries() -> list:
+    """حدود الفترات الزمنية من 00:00 إلى 24:00"""
+    return [f"{b // 2:02d}:{(b % 2) * 30:02d}" for b in range(TOTAL_TIME_SLOTS + 1)]
+
+def render_range_log_form(user):
+    """تسجيل نطاق فترات (لعدة أيام) بفئة وتقييم واحد في عملية كتابة واحدة"""
+    
+    st.markdown("### 📅 اختر الأيام والنطاق الزمني")
+    
+    selected_dates = st.date_input(
+        "الأيام",
+        value=(date.today(), date.today()),
+        max_value=date.today(),
+        format="YYYY-MM-DD",
+        key="range_log_dates"
+    )
+    # أثناء اختيار النطاق في التقويم يرجع تاريخ واحد فقط
+    if isinstance(selected_dates, (list, tuple)):
+        start_date = selected_dates[0]
+        end_date = selected_dates[-1]
+    else:
+        start_date = end_date = selected_dates
+    
+    boundaries = _slot_boundaries()
+    start_label, end_label = st.select_slider(
+        "النطاق الزمني",
+        options=boundaries,
+        value=("09:00", "13:00"),
+        key="range_log_time"
+    )
+    slots = range(boundaries.index(start_label), boundaries.index(end_label))
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    
+    if not slots:
+        st.warning("اختر نطاقاً زمنياً من فترة واحدة على الأقل")
+        return
+    
+    st.markdown(f"**{len(days)} يوم × {len(slots)} فترة = {len(days) * len(slots)} فترة**")
+    
+    st.markdown("---")
+    
+    # الحصول على الفئات
+    categories = get_categories(user.id)
+    category_options = {
+        f"{cat.get('icon', '📌')} {cat.get('name_ar', cat.get('name', ''))}": cat.get('name', '') 
+        for cat in categories
+    }
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        selected_category_display = st.selectbox(
+            "📁 الفئة",
+            options=list(category_options.keys()),
+            key="range_log_category"
+        )
+        selected_category = category_options.get(selected_category_display, "Work")
+    
+    with col2:
+        notes = st.text_input("📝 ملاحظات (اختياري)", key="range_log_notes")
+    
+    # الفترات المسجلة مسبقاً ضمن النطاق
+    existing = [
+        l for l in get_logs_by_range(user.id, start_date, end_date)
+        if l.get("time_slot") in slots
+    ]
+    if existing:
+        st.info(f"⚠️ {len(existing)} فترة مسجلة بالفعل ضمن النطاق وسيتم تحديثها.")
+    
+    st.markdown("### 🎯 اختر مستوى الإنتاجية")
+    
+    cols = st.columns(5)
+    
+    for i, (score, level) in enumerate(PRODUCTIVITY_LEVELS.items()):
+        with cols[i]:
+            if st.button(
+                f"{level['emoji']} {score}\n{level['name']}",
+                key=f"range_score_{score}",
+                use_container_width=True
+            ):
+                entries = [
+                    {
+                        "log_date": day,
+                        "time_slot": slot,
+                        "score": score,
+                        "category": selected_category,
+                        "notes": notes if notes else None
+                    }
+                    for day in days for slot in slots
+                ]
+                result = log_productivity_bulk(user.id, entries)
+                if result["status"] == "success":
+                    st.success(f"✅ {result['message']}")
+                else:
+                    st.error(result["message"])
+
 def render_today_logs(user):
     """عرض سجلات اليوم"""
     
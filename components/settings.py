@@ -13,10 +13,12 @@ from database import (
     add_category,
     add_category,
     delete_category,
+    import_logs,
     _get_categories_file,
     _save_json,
     _load_json
 )
+from storage import importer
 import os
 
 def render_settings():
@@ -34,7 +36,7 @@ def render_settings():
     """, unsafe_allow_html=True)
     
     # تبويبات (تم حذف المظهر الذكي)
-    tab1, tab2, tab3 = st.tabs(["👤 الملف الشخصي", "🎯 الأهداف", "📁 الفئات"])
+    tab1, tab2, tab3, tab4 = st.tabs(["👤 الملف الشخصي", "🎯 الأهداف", "📁 الفئات", "📥 استيراد"])
     
     with tab1:
         render_profile_settings(user)
@@ -44,6 +46,9 @@ def render_settings():
     
     with tab3:
         render_categories_settings(user)
+    
+    with tab4:
+        render_import_settings(user)
 
 def render_profile_settings(user):
     """إعدادات الملف الشخصي"""
@@ -282,3 +287,59 @@ def render_categories_settings(user):
                     st.error(result["message"])
             else:
                 st.warning("يرجى كتابة اسم الفئة")
+
+def render_import_settings(user):
+    """استيراد تاريخ الإنتاجية من ملف CSV أو JSONL"""
+    
+    st.markdown("### 📥 استيراد السجلات")
+    st.caption(
+        "الأعمدة: log_date (YYYY-MM-DD)، time_slot (0-47)، score (0-4)، category، "
+        "و notes اختياري. ملف التصدير من صفحة التحليلات يصلح للاستيراد."
+    )
+    
+    uploaded = st.file_uploader("ملف السجلات", type=list(importer.FORMATS), key="import_file")
+    
+    policies = {
+        "overwrite": "الملف يستبدل الفترات المسجلة",
+        "keep": "الإبقاء على الفترات المسجلة",
+        "max": "التقييم الأعلى يفوز",
+    }
+    policy = st.radio(
+        "عند تكرار نفس الفترة",
+        options=list(policies.keys()),
+        format_func=lambda p: policies[p],
+        key="import_policy"
+    )
+    
+    if uploaded is None:
+        return
+    
+    fmt = uploaded.name.rsplit(".", 1)[-1].lower()
+    col1, col2 = st.columns(2)
+    with col1:
+        preview = st.button("🔍 معاينة", use_container_width=True, key="import_preview")
+    with col2:
+        run = st.button("📥 استيراد", type="primary", use_container_width=True, key="import_run")
+    
+    if not (preview or run):
+        return
+    
+    uploaded.seek(0)
+    with st.spinner("جاري الاستيراد..."):
+        result = import_logs(user.id, uploaded, fmt, policy, dry_run=preview)
+    
+    if result["status"] != "success":
+        st.error(result["message"])
+        return
+    
+    summary = result["data"]
+    st.success(result["message"])
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("الصفوف", summary["rows"])
+    col2.metric("مرفوضة", summary["invalid"])
+    col3.metric("مكررة في الملف", summary["duplicates"])
+    col4.metric("متروكة", summary["unchanged"])
+    
+    rejected = {column: count for column, count in summary["rejected"].items() if count}
+    if rejected:
+        st.warning("صفوف مرفوضة حسب العمود: " + "، ".join(f"{c}: {n}" for c, n in rejected.items()))
@@ -5,9 +5,7 @@ Sidebar Component
 
 import streamlit as st
 from auth import sign_out, get_user_display_name, get_current_user
-from database import get_user_profile, get_logs_by_range
-from analytics import calculate_streak, get_logs_summary_by_date
-from datetime import date, timedelta
+from database import get_user_profile, get_streak
 
 def render_sidebar():
     """عرض الشريط الجانبي"""
@@ -30,19 +28,16 @@ def render_sidebar():
                 profile = get_user_profile(user.id)
                 daily_goal = profile.get("daily_goal", 100) if profile else 100
                 
-                # جلب سجلات آخر 30 يوم لحساب السلسلة
-                end_date = date.today()
-                start_date = end_date - timedelta(days=30)
-                logs = get_logs_by_range(user.id, start_date, end_date)
-                
-                logs_by_date = get_logs_summary_by_date(logs)
-                streak = calculate_streak(logs_by_date, daily_goal)
+                # حالة السلسلة المحفوظة (تُحدث مع كل تسجيل) دون قراءة السجلات
+                streak_state = get_streak(user.id, daily_goal)
+                streak = streak_state["current"]
                 
                 st.markdown(f"""
                 <div style="text-align: center; padding: 1rem; background: linear-gradient(135deg, #2d1f3d 0%, #1a1a2e 100%); border-radius: 10px; margin-bottom: 1rem;">
                     <p style="margin: 0; color: #aaa; font-size: 0.9rem;">🔥 سلسلة الإنتاجية</p>
                     <h1 style="margin: 0.5rem 0 0 0; color: #ff9800; font-size: 2.5rem;">{streak}</h1>
                     <p style="margin: 0; color: #888;">يوم متتالي</p>
+                    <p style="margin: 0.3rem 0 0 0; color: #666; font-size: 0.8rem;">🏅 الأطول: {streak_state["longest"]} يوم</p>
                 </div>
                 """, unsafe_allow_html=True)
             except:
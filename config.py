@@ -23,15 +23,24 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 USE_LOCAL_STORAGE = not SUPABASE_URL or not SUPABASE_KEY
 LOCAL_DATA_DIR = Path(__file__).parent / "local_data"
 
-def get_supabase_client():
-    """إنشاء عميل Supabase"""
-    if USE_LOCAL_STORAGE:
-        return None
-    try:
-        from supabase import create_client, Client
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
-    except ImportError:
-        return None
+# محرك تخزين سجلات الإنتاجية في الوضع المحلي: partitioned | json | journal | sqlite | grid
+LOG_STORAGE_BACKEND = os.getenv("LOG_STORAGE_BACKEND", "partitioned").strip().lower()
+
+# توزيع مجلدات المستخدمين: flat (local_data/<id>) | sharded (local_data/ab/cd/<id>)
+# للانتقال: اضبط sharded ثم شغّل python migrate_layout.py (انظر storage/layout.py)
+LOCAL_DATA_LAYOUT = os.getenv("LOCAL_DATA_LAYOUT", "flat").strip().lower()
+
+# صيغة ملفات البيانات المحلية: auto | orjson | msgpack | json (انظر storage/serializer.py)
+LOCAL_DATA_FORMAT = os.getenv("LOCAL_DATA_FORMAT", "auto").strip().lower()
+
+# رموز الجلسات: تبقى مسجلاً بعد تحديث الصفحة حتى تنتهي المدة أو تسجل الخروج
+# SESSION_SECRET فارغ = سر عشوائي يُحفظ في LOCAL_DATA_DIR/.session_secret
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_TTL_HOURS = int(os.getenv("SESSION_TTL_HOURS", "168"))
+
+# الكتابة المؤجلة لتقييم الفترات (اختيارية): التسجيل يعود فوراً والتفريغ في الخلفية
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0").strip().lower() in ("1", "true", "yes")
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "300"))
 
 # =============================================
 # الثوابت - Constants
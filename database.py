@@ -1,50 +1,335 @@
 """
-عمليات قاعدة البيانات - الوضع المحلي
-Database Operations - Local Mode
+عمليات قاعدة البيانات - الوضع المحلي أو Supabase حسب USE_LOCAL_STORAGE
+Database Operations - Local Mode or Supabase
 """
 
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import date, datetime, timedelta
-from typing import List, Optional, Dict
-import json
+from typing import BinaryIO, Iterator, List, Optional, Dict, Union
 from pathlib import Path
 import streamlit as st
-from config import LOCAL_DATA_DIR, DEFAULT_CATEGORIES
+from config import (
+    LOCAL_DATA_DIR, LOCAL_DATA_LAYOUT, DEFAULT_CATEGORIES, LOG_STORAGE_BACKEND, LOCAL_DATA_FORMAT,
+    USE_LOCAL_STORAGE, SUPABASE_URL, SUPABASE_KEY, WRITE_BEHIND, WRITE_BEHIND_INTERVAL_MS,
+    TOTAL_TIME_SLOTS, PRODUCTIVITY_LEVELS
+)
+from storage.json_store import JsonLogStore
+from storage.journal_store import JournalLogStore
+from storage.partitioned_store import PartitionedLogStore
+from storage.grid_store import GridLogStore
+from storage.sqlite_store import SQLiteLogStore
+from storage.supabase_store import SupabaseStore, PostgrestError, get_client
+from storage.write_behind import WriteBehindBuffer
+from storage.user_store import UserStore, PROFILE, CATEGORIES, HIDDEN_DEFAULTS, THEME, TASKS
+from storage.columnar import LogColumns
+from storage.rollup import DailyRollup, ServerRollup, ALL_DATES
+from storage.leaderboard import Leaderboard
+from storage.atomic import StripedLocks, write_atomic
+from storage import export, importer, layout, serializer, slot_mask
+
+# مجلدات المستخدمين التي أُنشئت في هذه العملية (mkdir مرة واحدة لكل مجلد)
+_user_dirs = set()
+
+# {(المجلد الجذر، التوزيع، المستخدم): مجلده} للأماكن النهائية فقط
+_user_paths = {}
+
+def _user_path(user_id: str) -> Path:
+    """مسار مجلد بيانات المستخدم حسب LOCAL_DATA_LAYOUT (دون إنشائه)"""
+    key = (LOCAL_DATA_DIR, LOCAL_DATA_LAYOUT, user_id)
+    path = _user_paths.get(key)
+    if path is None:
+        path, settled = layout.resolve(LOCAL_DATA_DIR, user_id, LOCAL_DATA_LAYOUT)
+        # المجلد القديم قبل نقله لا يُحفظ: يُبحث عنه من جديد بعد النقل
+        if settled:
+            _user_paths[key] = path
+    return path
+
+def _user_dir(user_id: str) -> Path:
+    """مجلد بيانات المستخدم (يُنشأ عند أول طلب فقط)"""
+    user_dir = _user_path(user_id)
+    if user_dir not in _user_dirs:
+        user_dir.mkdir(parents=True, exist_ok=True)
+        _user_dirs.add(user_dir)
+    return user_dir
 
 def _get_logs_file(user_id: str):
     """الحصول على مسار ملف السجلات"""
-    user_dir = LOCAL_DATA_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir / "productivity_logs.json"
+    return _user_dir(user_id) / "productivity_logs.json"
+
+def _get_logs_dir(user_id: str):
+    """الحصول على مجلد ملفات السجلات الشهرية"""
+    return _user_path(user_id) / "logs"
+
+def _get_grid_dir(user_id: str):
+    """الحصول على مجلد ملفات الشبكة السنوية"""
+    return _user_path(user_id) / "grid"
 
 def _get_profile_file(user_id: str):
     """الحصول على مسار ملف الملف الشخصي"""
-    user_dir = LOCAL_DATA_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir / "profile.json"
+    return _user_dir(user_id) / PROFILE
 
 def _get_categories_file(user_id: str):
     """الحصول على مسار ملف الفئات"""
-    user_dir = LOCAL_DATA_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir / "categories.json"
+    return _user_dir(user_id) / CATEGORIES
+
+def _get_rollup_file(user_id: str):
+    """الحصول على مسار ملف الملخص اليومي"""
+    return _user_dir(user_id) / "daily_rollup.json"
 
 def _get_hidden_defaults_file(user_id: str):
     """الحصول على مسار ملف الفئات الافتراضية المخفية"""
-    user_dir = LOCAL_DATA_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir / "hidden_defaults.json"
+    return _user_dir(user_id) / HIDDEN_DEFAULTS
+
+def _get_leaderboard_db():
+    """الحصول على مسار قاعدة عدادات المتصدرين"""
+    LOCAL_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    return LOCAL_DATA_DIR / "leaderboard.db"
 
 def _load_json(file_path: Path, default=None):
-    """تحميل ملف JSON"""
+    """تحميل ملف بيانات (JSON أو msgpack، تُكتشف الصيغة تلقائياً)"""
     if file_path.exists():
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return serializer.loads(file_path.read_bytes())
     return default if default is not None else []
 
 def _save_json(file_path: Path, data):
-    """حفظ ملف JSON"""
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    """حفظ ملف بيانات ذرياً بصيغة LOCAL_DATA_FORMAT (لا يرى القارئ ملفاً نصف مكتوب)"""
+    write_atomic(file_path, serializer.dumps(data, LOCAL_DATA_FORMAT))
+
+# أقفال كتابة ملفات المستخدمين: شرائح داخل العملية + fcntl بين العمليات
+_user_locks = StripedLocks(lambda: LOCAL_DATA_DIR / ".locks", name="user")
+
+def _user_lock(user_id: str):
+    """قفل قراءة-تعديل-كتابة ملفات مستخدم واحد"""
+    return _user_locks.hold(user_id)
+
+# =============================================
+# ملفات المستخدم لكل تشغيل (UserStore)
+# =============================================
+
+# UserStore التشغيل الحالي في هذا الخيط (Streamlit يشغّل كل تشغيل في خيطه)
+_rerun = threading.local()
+
+def _new_user_store(user_id: str) -> UserStore:
+    return UserStore(user_id, _user_dir, _load_json, _save_json, _user_lock)
+
+@contextmanager
+def user_request(user_id: str) -> Iterator[UserStore]:
+    """
+    تشغيل واحد للصفحة: ملفات المستخدم تُقرأ مرة واحدة وتُكتب مرة واحدة في النهاية
+    (app.py يلف به عرض الصفحة، والكتابة تتم حتى عند st.rerun أو st.stop)
+    """
+    active = getattr(_rerun, "files", None)
+    if active is not None and active.user_id == user_id:
+        yield active
+        return
+    files = _new_user_store(user_id)
+    _rerun.files = files
+    try:
+        yield files
+    finally:
+        _rerun.files = active
+        files.flush()
+
+@contextmanager
+def _user_files(user_id: str) -> Iterator[UserStore]:
+    """UserStore التشغيل الحالي، أو مخزن مؤقت يُكتب فور انتهاء العملية (خارج الصفحة)"""
+    active = getattr(_rerun, "files", None)
+    if active is not None and active.user_id == user_id:
+        yield active
+        return
+    files = _new_user_store(user_id)
+    yield files
+    files.flush()
+
+# =============================================
+# محرك تخزين السجلات
+# =============================================
+
+# محرك واحد لكل (نوع المحرك، مجلد البيانات) طوال عمر العملية
+_log_stores = {}
+
+def _backend_key() -> tuple:
+    """مفتاح كائنات المحرك: Supabase (لكل رابط) أو المحرك المحلي، مع مجلد البيانات"""
+    backend = LOG_STORAGE_BACKEND if USE_LOCAL_STORAGE else f"supabase:{SUPABASE_URL}"
+    return (backend, str(LOCAL_DATA_DIR))
+
+def _supabase_token(user_id: str) -> Optional[str]:
+    """رمز دخول المستخدم من Supabase Auth لسياسات RLS"""
+    from auth import supabase_access_token
+    return supabase_access_token(user_id)
+
+def _get_supabase_store() -> SupabaseStore:
+    """مخزن Supabase فوق العميل المشترك لهذه البيانات"""
+    return _get_log_store()
+
+def _get_log_store():
+    """الحصول على محرك تخزين السجلات (Supabase إن توفرت بياناته وإلا LOG_STORAGE_BACKEND)"""
+    key = _backend_key()
+    store = _log_stores.get(key)
+    if store is None:
+        if not USE_LOCAL_STORAGE:
+            store = SupabaseStore(get_client(SUPABASE_URL, SUPABASE_KEY), lambda user_id: _supabase_token(user_id))
+        elif LOG_STORAGE_BACKEND == "partitioned":
+            store = PartitionedLogStore(_get_logs_dir, _get_logs_file, _load_json, _save_json)
+        elif LOG_STORAGE_BACKEND == "json":
+            store = JsonLogStore(_get_logs_file, _load_json, _save_json)
+        elif LOG_STORAGE_BACKEND == "journal":
+            store = JournalLogStore(_get_logs_file, _load_json, _save_json)
+        elif LOG_STORAGE_BACKEND == "grid":
+            store = GridLogStore(_get_grid_dir, _load_json, _save_json, lambda: LOCAL_DATA_DIR / ".locks")
+        elif LOG_STORAGE_BACKEND == "sqlite":
+            LOCAL_DATA_DIR.mkdir(parents=True, exist_ok=True)
+            store = SQLiteLogStore(LOCAL_DATA_DIR / "productivity.db")
+        else:
+            raise ValueError(f"محرك تخزين غير معروف: {LOG_STORAGE_BACKEND}")
+        _log_stores[key] = store
+    return store
+
+def migrate_data_layout() -> dict:
+    """
+    نقل مجلدات المستخدمين من التوزيع المسطح إلى المقسم أثناء عمل التطبيق
+    (كل مستخدم تحت قفله، والقراءة تجد المجلد في أي من المكانين)
+    """
+    try:
+        if LOCAL_DATA_LAYOUT != "sharded":
+            return {"status": "error", "message": "LOCAL_DATA_LAYOUT الحالي ليس sharded"}
+        
+        migrated = []
+        flat = sorted(user_id for user_id, user_dir in layout.iter_users(LOCAL_DATA_DIR)
+                      if user_dir.parent == LOCAL_DATA_DIR)
+        for user_id in flat:
+            with _user_lock(user_id):
+                if layout.migrate_user(LOCAL_DATA_DIR, user_id):
+                    migrated.append(user_id)
+        
+        return {"status": "success", "message": f"تم نقل مجلدات {len(migrated)} مستخدم", "data": migrated}
+    except Exception as e:
+        return {"status": "error", "message": f"خطأ: {str(e)}"}
+
+def migrate_log_partitions() -> dict:
+    """نقل سجلات كل المستخدمين من productivity_logs.json إلى ملفات شهرية (مرة واحدة)"""
+    try:
+        store = _get_log_store()
+        if not isinstance(store, PartitionedLogStore):
+            return {"status": "error", "message": "محرك التخزين الحالي ليس partitioned"}
+        
+        migrated = []
+        # الملف الواحد أو سجل journal (قد يوجد أحدهما دون الآخر)
+        user_ids = sorted({
+            user_id for user_id, user_dir in layout.iter_users(LOCAL_DATA_DIR)
+            if any(user_dir.glob("productivity_logs.*"))
+        })
+        for user_id in user_ids:
+            with _user_lock(user_id):
+                if store.migrate(user_id):
+                    migrated.append(user_id)
+        
+        return {"status": "success", "message": f"تم نقل سجلات {len(migrated)} مستخدم", "data": migrated}
+    except Exception as e:
+        return {"status": "error", "message": f"خطأ: {str(e)}"}
+
+# ملخص يومي واحد فوق كل محرك
+_daily_rollups = {}
+
+def _get_daily_rollup() -> Union[DailyRollup, ServerRollup]:
+    """الحصول على الملخص اليومي الذي تمر عبره كتابة السجلات"""
+    key = _backend_key()
+    rollup = _daily_rollups.get(key)
+    if rollup is None:
+        if USE_LOCAL_STORAGE:
+            rollup = DailyRollup(_get_log_store(), _get_rollup_file, _load_json, _save_json)
+            rollup.listeners.append(lambda *changes: _get_leaderboard().record(*changes))
+        else:
+            # الخادم يجمع الأيام والمتصدرين: لا ملف ملخص ولا عدادات محلية
+            rollup = ServerRollup(_get_log_store())
+        _daily_rollups[key] = rollup
+    return rollup
+
+def _log_lock(user_id: str):
+    """
+    قفل كتابة سجلات مستخدم حول المحرك والملخص المحلي
+    في وضع Supabase يحل الخادم تعارض الكتابة فلا قفل ملفات محلي
+    """
+    return _user_lock(user_id) if USE_LOCAL_STORAGE else nullcontext()
+
+# مخزن الكتابة المؤجلة لكل محرك (عند تفعيل WRITE_BEHIND)
+_write_buffers = {}
+
+def _check_log(record: Dict):
+    """رفض سجل لن يقبله المحرك (نفس قيود جدول productivity_logs) قبل تأجيل كتابته"""
+    date.fromisoformat(str(record["log_date"]))
+    slot, score = record["time_slot"], record["score"]
+    if isinstance(slot, bool) or not isinstance(slot, int) or not 0 <= slot < TOTAL_TIME_SLOTS:
+        raise ValueError(f"فترة زمنية غير صالحة: {slot}")
+    if isinstance(score, bool) or score not in PRODUCTIVITY_LEVELS:
+        raise ValueError(f"تقييم غير صالح: {score}")
+    if not isinstance(record["category"], str) or not record["category"]:
+        raise ValueError("الفئة مطلوبة")
+
+def _is_permanent(error: Exception) -> bool:
+    """خطأ لن تنجح إعادة المحاولة فيه: قيد في القاعدة أو طلب رفضه الخادم (4xx)"""
+    if isinstance(error, PostgrestError):
+        return 400 <= error.status < 500 and error.status not in (408, 429)
+    return isinstance(error, (ValueError, sqlite3.IntegrityError))
+
+def _get_write_buffer() -> WriteBehindBuffer:
+    """المخزن المؤقت الذي تُفرغ منه التقييمات إلى الملخص اليومي في الخلفية"""
+    key = _backend_key()
+    buffer = _write_buffers.get(key)
+    if buffer is None:
+        rollup = _get_daily_rollup()
+        
+        def flush(user_id: str, records: List[Dict]) -> List[Dict]:
+            with _log_lock(user_id):
+                return rollup.upsert_many(user_id, records)
+        
+        buffer = WriteBehindBuffer(
+            flush, WRITE_BEHIND_INTERVAL_MS / 1000, validate=_check_log, is_permanent=_is_permanent
+        )
+        _write_buffers[key] = buffer
+    return buffer
+
+def _flush_pending(user_id: str):
+    """كتابة التقييمات المعلقة لمستخدم قبل أي كتابة مباشرة تمس نفس الفترات"""
+    buffer = _write_buffers.get(_backend_key())
+    if buffer is not None:
+        buffer.flush(user_id)
+
+def _with_pending(user_id: str, logs: List[Dict], start_date: str, end_date: str) -> List[Dict]:
+    """دمج التقييمات المعلقة في سجلات المحرك (يبقى معرف السجل المحفوظ إن وجد)"""
+    buffer = _write_buffers.get(_backend_key())
+    pending = buffer.pending(user_id) if buffer is not None else {}
+    pending = {key: r for key, r in pending.items() if start_date <= key[0] <= end_date}
+    if not pending:
+        return logs
+    
+    by_slot = {(str(l["log_date"]), l["time_slot"]): l for l in logs}
+    for key, record in pending.items():
+        saved = by_slot.get(key)
+        by_slot[key] = {**record, "id": saved["id"]} if saved else record
+    return sorted(by_slot.values(), key=lambda l: (str(l["log_date"]), l["time_slot"]))
+
+# ترتيب المتصدرين المحفوظ لكل مجلد بيانات
+_leaderboards = {}
+
+def _all_user_ids() -> Iterator[str]:
+    """معرفات كل المستخدمين المسجلين (على دفعات من سجل المستخدمين)"""
+    from auth import _get_registry
+    return _get_registry().iter_ids()
+
+def _get_leaderboard() -> Leaderboard:
+    """الحصول على ترتيب المتصدرين الذي تحدثه كتابة السجلات"""
+    key = _backend_key()
+    leaderboard = _leaderboards.get(key)
+    if leaderboard is None:
+        leaderboard = Leaderboard(
+            _get_leaderboard_db, _all_user_ids,
+            lambda user_id, start, end: _get_daily_rollup().get_range(user_id, start, end)
+        )
+        _leaderboards[key] = leaderboard
+    return leaderboard
 
 # =============================================
 # عمليات سجلات الإنتاجية
@@ -60,16 +345,6 @@ def log_productivity(
 ) -> dict:
     """تسجيل الإنتاجية"""
     try:
-        logs_file = _get_logs_file(user_id)
-        logs = _load_json(logs_file, [])
-        
-        # البحث عن سجل موجود
-        existing_idx = None
-        for i, log in enumerate(logs):
-            if log.get("log_date") == str(log_date) and log.get("time_slot") == time_slot:
-                existing_idx = i
-                break
-        
         log_data = {
             "id": f"{log_date}_{time_slot}_{datetime.now().timestamp()}",
             "user_id": user_id,
@@ -81,13 +356,25 @@ def log_productivity(
             "updated_at": datetime.now().isoformat()
         }
         
-        if existing_idx is not None:
-            log_data["id"] = logs[existing_idx]["id"]
-            logs[existing_idx] = log_data
+        if WRITE_BEHIND:
+            # يعود فوراً بعد التحقق: القراءة ترى السجل مباشرة والكتابة تتم في الخلفية
+            buffer = _get_write_buffer()
+            buffer.put(user_id, [log_data])
+            rejected = buffer.rejected(user_id)
+            if rejected:
+                # تقييمات سابقة رفضها المحرك أثناء التفريغ ولم تُحفظ
+                return {
+                    "status": "success",
+                    "message": "تم تسجيل الإنتاجية، لكن لم تُحفظ تقييمات سابقة: "
+                               + "; ".join(f"{r['log_date']} #{r['time_slot']}: {reason}" for r, reason in rejected),
+                    "data": log_data,
+                    "rejected": [r for r, _ in rejected]
+                }
         else:
-            logs.append(log_data)
-        
-        _save_json(logs_file, logs)
+            # المحرك يحتفظ بمعرف السجل القديم إذا كانت الفترة مسجلة مسبقاً
+            # والملخص اليومي يُحدث لنفس اليوم فقط
+            with _log_lock(user_id):
+                log_data = _get_daily_rollup().upsert(user_id, log_data)
         
         return {
             "status": "success",
@@ -98,44 +385,264 @@ def log_productivity(
     except Exception as e:
         return {"status": "error", "message": f"خطأ: {str(e)}"}
 
-def get_logs_by_date(user_id: str, log_date: date) -> List[Dict]:
-    """الحصول على سجلات يوم معين"""
+def log_productivity_bulk(user_id: str, entries: List[Dict]) -> dict:
+    """
+    تسجيل عدة فترات دفعة واحدة (قراءة وكتابة واحدة أو معاملة واحدة)
+    entries: [{"log_date", "time_slot", "score", "category", "notes"}]
+    """
     try:
-        logs_file = _get_logs_file(user_id)
-        logs = _load_json(logs_file, [])
+        now = datetime.now()
+        records = [
+            {
+                "id": f"{entry['log_date']}_{entry['time_slot']}_{now.timestamp()}",
+                "user_id": user_id,
+                "log_date": str(entry["log_date"]),
+                "time_slot": entry["time_slot"],
+                "score": entry["score"],
+                "category": entry["category"],
+                "notes": entry.get("notes"),
+                "updated_at": now.isoformat()
+            }
+            for entry in entries
+        ]
         
-        filtered = [l for l in logs if l.get("log_date") == str(log_date)]
-        return sorted(filtered, key=lambda x: x.get("time_slot", 0))
+        _flush_pending(user_id)
+        with _log_lock(user_id):
+            saved = _get_daily_rollup().upsert_many(user_id, records) if records else []
+        
+        return {
+            "status": "success",
+            "message": f"تم تسجيل {len(saved)} فترة بنجاح!",
+            "data": saved
+        }
         
+    except Exception as e:
+        return {"status": "error", "message": f"خطأ: {str(e)}"}
+
+def get_logs_by_date(user_id: str, log_date: date) -> List[Dict]:
+    """الحصول على سجلات يوم معين"""
+    try:
+        logs = _get_log_store().get_by_date(user_id, str(log_date))
+        return _with_pending(user_id, logs, str(log_date), str(log_date))
     except Exception as e:
         return []
 
 def get_logs_by_range(user_id: str, start_date: date, end_date: date) -> List[Dict]:
     """الحصول على سجلات فترة زمنية"""
     try:
-        logs_file = _get_logs_file(user_id)
-        logs = _load_json(logs_file, [])
-        
-        filtered = []
-        for log in logs:
-            log_date_str = log.get("log_date")
-            if log_date_str:
-                log_date = datetime.strptime(log_date_str, "%Y-%m-%d").date()
-                if start_date <= log_date <= end_date:
-                    filtered.append(log)
+        logs = _get_log_store().get_by_range(user_id, str(start_date), str(end_date))
+        return _with_pending(user_id, logs, str(start_date), str(end_date))
+    except Exception as e:
+        return []
+
+def get_analytics_snapshot(user_id: str, start_date: date, end_date: date,
+                           categories: Optional[List[str]] = None):
+    """
+    مجاميع التحليلات لفترة (لفئات محددة إن طُلب) كـ AnalyticsSnapshot
+    محلياً تُبنى من الأعمدة المضغوطة (get_log_columns)
+    في وضع Supabase تُجمع في الخادم وتُنقل عشرات الصفوف بدل كل السجلات
+    """
+    from analytics import AnalyticsSnapshot
+    try:
+        if USE_LOCAL_STORAGE:
+            # الأعمدة المضغوطة تُبنى مرة من المحرك، واللقطة منها بعمليات NumPy
+            columns = get_log_columns(user_id, start_date, end_date)
+            if categories is not None:
+                columns = columns.select_categories(categories)
+            return AnalyticsSnapshot.from_columns(columns)
         
-        return sorted(filtered, key=lambda x: (x.get("log_date"), x.get("time_slot", 0)))
+        store = _get_supabase_store()
+        return AnalyticsSnapshot.from_totals(
+            store.daily_totals(user_id, str(start_date), str(end_date), categories),
+            store.hour_weekday_totals(user_id, str(start_date), str(end_date), categories)
+        )
+    except Exception as e:
+        return AnalyticsSnapshot()
+
+def _month_windows(start_date: str, end_date: str) -> Iterator[tuple]:
+    """تقسيم فترة (نصوص ISO) إلى أشهر: (أول يوم، آخر يوم) ضمن الفترة"""
+    current = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    while current <= end:
+        next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        yield str(current), str(min(end, next_month - timedelta(days=1)))
+        current = next_month
+
+def iter_logs(user_id: str, start_date: date = None, end_date: date = None) -> Iterator[List[Dict]]:
+    """
+    سجلات فترة (أو كل الحساب إذا لم تُحدد) على دفعات بذاكرة محدودة
+    المحرك الذي يدعم iter_range يقرأ بمؤشره، والباقي شهراً بشهر
+    """
+    _flush_pending(user_id)
+    if start_date is None or end_date is None:
+        # حدود الحساب من الملخص اليومي (O(أيام)) بدل قراءة السجلات
+        days = _get_daily_rollup().get_range(user_id, *ALL_DATES)
+        if not days:
+            return
+        start_date = start_date or min(days)
+        end_date = end_date or max(days)
+    
+    store = _get_log_store()
+    iter_range = getattr(store, "iter_range", None)
+    if iter_range is not None:
+        yield from iter_range(user_id, str(start_date), str(end_date))
+        return
+    for first, last in _month_windows(str(start_date), str(end_date)):
+        logs = store.get_by_range(user_id, first, last)
+        if logs:
+            yield logs
+
+def export_logs(user_id: str, fmt: str, sink: BinaryIO,
+                start_date: date = None, end_date: date = None) -> dict:
+    """تصدير سجلات فترة (أو كل الحساب) إلى ملف مفتوح بصيغة csv أو jsonl أو parquet"""
+    try:
+        rows = export.write(fmt, iter_logs(user_id, start_date, end_date), sink)
+        return {"status": "success", "message": f"تم تصدير {rows} سجل", "data": rows}
+    except Exception as e:
+        return {"status": "error", "message": f"خطأ: {str(e)}"}
+
+def import_logs(user_id: str, source: BinaryIO, fmt: str,
+                policy: str = "overwrite", dry_run: bool = False) -> dict:
+    """
+    استيراد تاريخ من ملف csv أو jsonl: تحقق متجه ثم كتابة واحدة في المحرك والملخص
+    policy: overwrite أو keep أو max لحل التعارض على (اليوم، الفترة) - انظر storage/importer.py
+    data: {"rows", "imported", "invalid", "duplicates", "unchanged", "rejected": {عمود: عدد}}
+    """
+    try:
+        with importer.paused_gc():
+            frame = importer.read(source, fmt)
+            rows = len(frame)
+            frame, rejected = importer.validate(frame, importer.category_aliases(get_categories(user_id)))
+            valid = len(frame)
+            frame = importer.dedupe(frame, policy)
+            duplicates = valid - len(frame)
+            
+            _flush_pending(user_id)
+            with _log_lock(user_id):
+                existing = {}
+                if len(frame):
+                    # قراءة واحدة للفترة التي يغطيها الملف بدل قراءة كل فترة على حدة
+                    saved = _get_log_store().get_by_range(
+                        user_id, frame["log_date"].min(), frame["log_date"].max()
+                    )
+                    existing = {(str(l["log_date"]), l["time_slot"]): l for l in saved}
+                frame, unchanged = importer.resolve(frame, existing, policy)
+                records = importer.to_records(frame, user_id, datetime.now())
+                if records and not dry_run:
+                    _get_daily_rollup().upsert_many(user_id, records, existing)
         
+        summary = {
+            "rows": rows,
+            "imported": len(records),
+            "invalid": rows - valid,
+            "duplicates": duplicates,
+            "unchanged": unchanged,
+            "rejected": rejected,
+        }
+        message = f"سيتم استيراد {len(records)} سجل" if dry_run else f"تم استيراد {len(records)} سجل"
+        return {"status": "success", "message": message, "data": summary}
+    except Exception as e:
+        return {"status": "error", "message": f"خطأ: {str(e)}"}
+
+def get_log_columns(user_id: str, start_date: date, end_date: date) -> LogColumns:
+    """الحصول على سجلات فترة زمنية بتمثيل عمودي مضغوط للتحليلات"""
+    store = _get_log_store()
+    if hasattr(store, "columns"):
+        # محرك الشبكة يبني الأعمدة من الخلايا مباشرة دون قواميس
+        try:
+            _flush_pending(user_id)
+            return store.columns(user_id, str(start_date), str(end_date))
+        except Exception as e:
+            return LogColumns.empty()
+    return LogColumns.from_logs(get_logs_by_range(user_id, start_date, end_date))
+
+def get_daily_rollup(user_id: str, start_date: date, end_date: date) -> Dict[date, Dict]:
+    """الملخص اليومي لفترة زمنية: {التاريخ: {score, slots, categories, scores}}"""
+    try:
+        days = _get_daily_rollup().get_range(user_id, str(start_date), str(end_date))
+        return {date.fromisoformat(d): v for d, v in days.items()}
+    except Exception as e:
+        return {}
+
+def get_daily_scores(user_id: str, start_date: date, end_date: date,
+                     categories: Optional[List[str]] = None) -> Dict[date, int]:
+    """مجموع النقاط لكل يوم (لفئات محددة إن طُلب) من الملخص اليومي"""
+    days = get_daily_rollup(user_id, start_date, end_date)
+    if categories is None:
+        return {d: v["score"] for d, v in days.items()}
+    return {
+        d: sum(v["categories"].get(cat, [0, 0])[0] for cat in categories)
+        for d, v in days.items()
+    }
+
+def get_slot_masks(user_id: str, start_date: date, end_date: date) -> Dict[date, int]:
+    """خرائط بتات الفترات المسجلة لكل يوم من الملخص اليومي (دون قراءة السجلات)"""
+    try:
+        masks = _get_daily_rollup().slot_masks(user_id, str(start_date), str(end_date))
+        buffer = _write_buffers.get(_backend_key())
+        if buffer is not None:
+            # التقييمات المعلقة في الكتابة المؤجلة مسجلة من وجهة نظر المستخدم
+            for log_date, slot in buffer.pending(user_id):
+                if str(start_date) <= log_date <= str(end_date):
+                    masks[log_date] = masks.get(log_date, 0) | slot_mask.bit(slot)
+        return {date.fromisoformat(d): mask for d, mask in masks.items()}
+    except Exception as e:
+        return {}
+
+def get_slot_mask(user_id: str, log_date: date) -> int:
+    """خريطة بتات الفترات المسجلة في يوم (البت n = الفترة n)"""
+    return get_slot_masks(user_id, log_date, log_date).get(log_date, 0)
+
+def is_slot_logged(user_id: str, log_date: date, time_slot: int) -> bool:
+    """هل الفترة مسجلة"""
+    return slot_mask.is_logged(get_slot_mask(user_id, log_date), time_slot)
+
+def logged_slot_count(user_id: str, log_date: date) -> int:
+    """عدد الفترات المسجلة في يوم"""
+    return slot_mask.count(get_slot_mask(user_id, log_date))
+
+def first_unlogged_slot(user_id: str, log_date: date, until: int = slot_mask.SLOTS) -> Optional[int]:
+    """أول فترة غير مسجلة في يوم قبل until (أو None)"""
+    return slot_mask.first_unlogged(get_slot_mask(user_id, log_date), until)
+
+def count_missed_slots(user_id: str, start_date: date, end_date: date) -> int:
+    """عدد الفترات غير المسجلة في فترة زمنية (popcount لكل يوم)"""
+    masks = get_slot_masks(user_id, start_date, end_date)
+    return slot_mask.missed(masks.values(), (end_date - start_date).days + 1)
+
+def get_streak(user_id: str, daily_goal: int) -> Dict:
+    """السلسلة الحالية والأطول من الحالة المحفوظة (بلا حد لطول السلسلة)"""
+    try:
+        streak = _get_daily_rollup().get_streak(user_id, daily_goal, date.today())
+        for key in ("run_start", "last_day"):
+            if streak[key]:
+                streak[key] = date.fromisoformat(streak[key])
+        return streak
+    except Exception as e:
+        return {"current": 0, "longest": 0, "run_start": None, "last_day": None}
+
+def get_leaderboard(period: str = "weekly", limit: Optional[int] = None) -> List[Dict]:
+    """الأوائل في فترة: weekly أو monthly أو all_time"""
+    try:
+        if USE_LOCAL_STORAGE:
+            entries = _get_leaderboard().top(period, limit)
+        else:
+            entries = _get_supabase_store().leaderboard(period, limit)
+        return [
+            {"id": user_id, "score": score, "logs_count": logs_count}
+            for user_id, score, logs_count in entries
+        ]
     except Exception as e:
         return []
 
 def get_log_by_slot(user_id: str, log_date: date, time_slot: int) -> Optional[Dict]:
     """الحصول على سجل فترة زمنية محددة"""
-    logs = get_logs_by_date(user_id, log_date)
-    for log in logs:
-        if log.get("time_slot") == time_slot:
-            return log
-    return None
+    try:
+        log = _get_log_store().get_by_slot(user_id, str(log_date), time_slot)
+        merged = _with_pending(user_id, [log] if log else [], str(log_date), str(log_date))
+        return next((l for l in merged if l["time_slot"] == time_slot), None)
+    except Exception as e:
+        return None
 
 def delete_log(log_id: str, user_id: str = None) -> dict:
     """حذف سجل"""
@@ -149,11 +656,13 @@ def delete_log(log_id: str, user_id: str = None) -> dict:
         if not user_id:
             return {"status": "error", "message": "المستخدم غير موجود"}
         
-        logs_file = _get_logs_file(user_id)
-        logs = _load_json(logs_file, [])
-        
-        logs = [l for l in logs if l.get("id") != log_id]
-        _save_json(logs_file, logs)
+        _flush_pending(user_id)
+        buffer = _write_buffers.get(_backend_key())
+        if buffer is not None:
+            # معرف سجل عرضته الواجهة قبل تفريغه قد يختلف عن معرف المحرك
+            log_id = buffer.saved_id(user_id, log_id)
+        with _log_lock(user_id):
+            _get_daily_rollup().delete(user_id, log_id)
         
         return {"status": "success", "message": "تم الحذف بنجاح"}
     except Exception as e:
@@ -166,8 +675,11 @@ def delete_log(log_id: str, user_id: str = None) -> dict:
 def get_user_profile(user_id: str) -> Optional[Dict]:
     """الحصول على ملف المستخدم"""
     try:
-        profile_file = _get_profile_file(user_id)
-        profile = _load_json(profile_file, None)
+        if USE_LOCAL_STORAGE:
+            with _user_files(user_id) as files:
+                profile = files.get(PROFILE, None)
+        else:
+            profile = _get_supabase_store().get_profile(user_id)
         
         if profile is None:
             # إنشاء ملف شخصي افتراضي
@@ -179,7 +691,11 @@ def get_user_profile(user_id: str) -> Optional[Dict]:
                 "monthly_goal": 2000,
                 "created_at": datetime.now().isoformat()
             }
-            _save_json(profile_file, profile)
+            if not USE_LOCAL_STORAGE:
+                return _get_supabase_store().save_profile(profile)
+            with _user_files(user_id) as files:
+                # لا نستبدل ملفاً أنشأته جلسة أخرى في الأثناء
+                profile = files.update(PROFILE, lambda current: current or profile, None)
         
         return profile
         
@@ -198,8 +714,11 @@ def create_user_profile(user_id: str, display_name: str = None) -> dict:
             "created_at": datetime.now().isoformat()
         }
         
-        profile_file = _get_profile_file(user_id)
-        _save_json(profile_file, profile)
+        if not USE_LOCAL_STORAGE:
+            return {"status": "success", "data": _get_supabase_store().save_profile(profile)}
+        
+        with _user_files(user_id) as files:
+            files.update(PROFILE, lambda _: dict(profile), None)
         
         return {"status": "success", "data": profile}
         
@@ -209,12 +728,24 @@ def create_user_profile(user_id: str, display_name: str = None) -> dict:
 def update_user_profile(user_id: str, updates: Dict) -> dict:
     """تحديث ملف المستخدم"""
     try:
-        profile = get_user_profile(user_id) or {}
-        profile.update(updates)
-        profile["updated_at"] = datetime.now().isoformat()
+        updated_at = datetime.now().isoformat()
         
-        profile_file = _get_profile_file(user_id)
-        _save_json(profile_file, profile)
+        def apply(profile):
+            profile = profile or {}
+            profile.update(updates)
+            profile["updated_at"] = updated_at
+            return profile
+        
+        with _user_lock(user_id):
+            if USE_LOCAL_STORAGE:
+                with _user_files(user_id) as files:
+                    profile = files.update(PROFILE, apply, None)
+            else:
+                profile = _get_supabase_store().save_profile(apply(get_user_profile(user_id)))
+            
+            # حالة السلسلة المحلية محسوبة لهدف يومي محدد (Supabase يحسبها عند القراءة)
+            if "daily_goal" in updates and USE_LOCAL_STORAGE:
+                _get_daily_rollup().set_goal(user_id, profile["daily_goal"])
         
         return {"status": "success", "message": "تم التحديث بنجاح", "data": profile}
         
@@ -239,8 +770,8 @@ def get_categories(user_id: str = None) -> List[Dict]:
     hidden_names = []
     if user_id:
         try:
-            hidden_file = _get_hidden_defaults_file(user_id)
-            hidden_names = _load_json(hidden_file, [])
+            with _user_files(user_id) as files:
+                hidden_names = files.get(HIDDEN_DEFAULTS, [])
         except:
             pass
     
@@ -255,8 +786,11 @@ def get_categories(user_id: str = None) -> List[Dict]:
     
     if user_id:
         try:
-            cats_file = _get_categories_file(user_id)
-            custom_cats = _load_json(cats_file, [])
+            if USE_LOCAL_STORAGE:
+                with _user_files(user_id) as files:
+                    custom_cats = files.get(CATEGORIES, [])
+            else:
+                custom_cats = _get_supabase_store().get_categories(user_id)
             for cat in custom_cats:
                 cat["is_default"] = False
             categories.extend(custom_cats)
@@ -269,12 +803,12 @@ def get_categories(user_id: str = None) -> List[Dict]:
 def hide_default_category(user_id: str, category_name: str) -> dict:
     """إخفاء/حذف فئة افتراضية للمستخدم"""
     try:
-        hidden_file = _get_hidden_defaults_file(user_id)
-        hidden = _load_json(hidden_file, [])
-        
-        if category_name not in hidden:
-            hidden.append(category_name)
-            _save_json(hidden_file, hidden)
+        with _user_files(user_id) as files:
+            files.update(
+                HIDDEN_DEFAULTS,
+                lambda hidden: hidden if category_name in hidden else hidden + [category_name],
+                []
+            )
         
         return {"status": "success", "message": "تم حذف الفئة بنجاح"}
     except Exception as e:
@@ -283,9 +817,6 @@ def hide_default_category(user_id: str, category_name: str) -> dict:
 def add_category(user_id: str, name: str, name_ar: str, color: str, icon: str) -> dict:
     """إضافة فئة جديدة"""
     try:
-        cats_file = _get_categories_file(user_id)
-        cats = _load_json(cats_file, [])
-        
         new_cat = {
             "id": f"custom_{datetime.now().timestamp()}",
             "name": name,
@@ -295,8 +826,11 @@ def add_category(user_id: str, name: str, name_ar: str, color: str, icon: str) -
             "is_default": False
         }
         
-        cats.append(new_cat)
-        _save_json(cats_file, cats)
+        if not USE_LOCAL_STORAGE:
+            return {"status": "success", "data": _get_supabase_store().add_category(user_id, new_cat)}
+        
+        with _user_files(user_id) as files:
+            files.update(CATEGORIES, lambda cats: cats + [dict(new_cat)], [])
         
         return {"status": "success", "data": new_cat}
         
@@ -306,25 +840,30 @@ def add_category(user_id: str, name: str, name_ar: str, color: str, icon: str) -
 def update_category(user_id: str, category_id: str, updates: dict) -> dict:
     """تحديث بيانات فئة مخصصة"""
     try:
-        cats_file = _get_categories_file(user_id)
-        if not cats_file.exists():
-            return {"status": "error", "message": "لم يتم العثور على ملف الفئات"}
-            
-        cats = _load_json(cats_file, [])
-        updated = False
-        
-        for cat in cats:
-            if cat.get("id") == category_id:
-                # تحديث الحقول المسموح بها فقط
-                if "name" in updates: cat["name"] = updates["name"]
-                if "name_ar" in updates: cat["name_ar"] = updates["name_ar"]
-                if "color" in updates: cat["color"] = updates["color"]
-                if "icon" in updates: cat["icon"] = updates["icon"]
-                updated = True
-                break
+        if not USE_LOCAL_STORAGE:
+            if _get_supabase_store().update_category(user_id, category_id, updates) is None:
+                return {"status": "error", "message": "الفئة غير موجودة"}
+            return {"status": "success", "message": "تم التحديث بنجاح"}
+        
+        def apply(cats):
+            for cat in cats:
+                if cat.get("id") == category_id:
+                    # تحديث الحقول المسموح بها فقط
+                    if "name" in updates: cat["name"] = updates["name"]
+                    if "name_ar" in updates: cat["name_ar"] = updates["name_ar"]
+                    if "color" in updates: cat["color"] = updates["color"]
+                    if "icon" in updates: cat["icon"] = updates["icon"]
+                    break
+            return cats
+        
+        with _user_files(user_id) as files:
+            if not files.path(CATEGORIES).exists() and not files.dirty:
+                return {"status": "error", "message": "لم يتم العثور على ملف الفئات"}
+            updated = any(cat.get("id") == category_id for cat in files.get(CATEGORIES, []))
+            if updated:
+                files.update(CATEGORIES, apply, [])
         
         if updated:
-            _save_json(cats_file, cats)
             return {"status": "success", "message": "تم التحديث بنجاح"}
         else:
             return {"status": "error", "message": "الفئة غير موجودة"}
@@ -344,11 +883,12 @@ def delete_category(category_id: str, user_id: str = None) -> dict:
         if not user_id:
             return {"status": "error", "message": "المستخدم غير موجود"}
         
-        cats_file = _get_categories_file(user_id)
-        cats = _load_json(cats_file, [])
+        if not USE_LOCAL_STORAGE:
+            _get_supabase_store().delete_category(user_id, category_id)
+            return {"status": "success", "message": "تم الحذف بنجاح"}
         
-        cats = [c for c in cats if c.get("id") != category_id]
-        _save_json(cats_file, cats)
+        with _user_files(user_id) as files:
+            files.update(CATEGORIES, lambda cats: [c for c in cats if c.get("id") != category_id], [])
         
         return {"status": "success", "message": "تم الحذف بنجاح"}
     except Exception as e:
@@ -357,9 +897,8 @@ def delete_category(category_id: str, user_id: str = None) -> dict:
 def get_user_theme(user_id: str) -> dict:
     """الحصول على ثيم المستخدم"""
     try:
-        user_dir = LOCAL_DATA_DIR / user_id
-        theme_file = user_dir / "theme.json"
-        return _load_json(theme_file, {})
+        with _user_files(user_id) as files:
+            return files.get(THEME, {})
     except:
         return {}
 
@@ -369,38 +908,36 @@ def get_user_theme(user_id: str) -> dict:
 
 def _get_tasks_file(user_id: str):
     """الحصول على مسار ملف المهام"""
-    user_dir = LOCAL_DATA_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    return user_dir / "tasks.json"
+    return _user_dir(user_id) / TASKS
+
+def _task_expired(task: Dict, today: date) -> bool:
+    """هل انتهت المهمة حسب نوعها"""
+    t_type = task.get("type", "daily")
+    created = datetime.strptime(task.get("created_at", str(today)), "%Y-%m-%d").date()
+    
+    if t_type == "daily":
+        return created < today  # حذف المهام اليومية القديمة
+    if t_type == "weekly":
+        # حذف إذا مر أسبوع
+        return (today - created).days >= 7
+    if t_type == "monthly":
+        # حذف إذا تغير الشهر
+        return created.month != today.month or created.year != today.year
+    return False
 
 def get_tasks(user_id: str, task_type: str = None) -> List[Dict]:
     """الحصول على المهام (مع تنظيف المنتهية تلقائياً)"""
     try:
-        tasks_file = _get_tasks_file(user_id)
-        tasks = _load_json(tasks_file, [])
-        
-        # تنظيف المهام المنتهية
-        today = date.today()
-        cleaned = []
-        for task in tasks:
-            t_type = task.get("type", "daily")
-            created = datetime.strptime(task.get("created_at", str(today)), "%Y-%m-%d").date()
+        with _user_files(user_id) as files:
+            tasks = files.get(TASKS, [])
+            
+            # تنظيف المهام المنتهية
+            today = date.today()
+            cleaned = [t for t in tasks if not _task_expired(t, today)]
             
-            if t_type == "daily" and created < today:
-                continue  # حذف المهام اليومية القديمة
-            elif t_type == "weekly":
-                # حذف إذا مر أسبوع
-                if (today - created).days >= 7:
-                    continue
-            elif t_type == "monthly":
-                # حذف إذا تغير الشهر
-                if created.month != today.month or created.year != today.year:
-                    continue
-            cleaned.append(task)
-        
-        # حفظ النسخة المنظفة إذا تغيرت
-        if len(cleaned) != len(tasks):
-            _save_json(tasks_file, cleaned)
+            # حفظ النسخة المنظفة إذا تغيرت (التنظيف يُعاد فوق أحدث نسخة عند الكتابة)
+            if len(cleaned) != len(tasks):
+                files.update(TASKS, lambda ts: [t for t in ts if not _task_expired(t, today)], [])
         
         if task_type:
             return [t for t in cleaned if t.get("type") == task_type]
@@ -414,9 +951,6 @@ def add_task(user_id: str, title: str, task_type: str = "daily",
              list_id: str = None, parent_id: str = None) -> dict:
     """إضافة مهمة جديدة مع الخصائص الجديدة"""
     try:
-        tasks_file = _get_tasks_file(user_id)
-        tasks = _load_json(tasks_file, [])
-        
         new_task = {
             "id": f"task_{datetime.now().timestamp()}",
             "title": title,
@@ -431,8 +965,8 @@ def add_task(user_id: str, title: str, task_type: str = "daily",
             "updated_at": datetime.now().isoformat()
         }
         
-        tasks.append(new_task)
-        _save_json(tasks_file, tasks)
+        with _user_files(user_id) as files:
+            files.update(TASKS, lambda tasks: tasks + [dict(new_task)], [])
         
         return {"status": "success", "data": new_task}
     except Exception as e:
@@ -441,19 +975,22 @@ def add_task(user_id: str, title: str, task_type: str = "daily",
 def update_task(user_id: str, task_id: str, updates: dict) -> dict:
     """تحديث بيانات المهمة"""
     try:
-        tasks_file = _get_tasks_file(user_id)
-        tasks = _load_json(tasks_file, [])
+        updated_at = datetime.now().isoformat()
+        
+        def apply(tasks):
+            for task in tasks:
+                if task.get("id") == task_id:
+                    task.update(updates)
+                    task["updated_at"] = updated_at
+                    break
+            return tasks
         
-        updated = False
-        for task in tasks:
-            if task.get("id") == task_id:
-                task.update(updates)
-                task["updated_at"] = datetime.now().isoformat()
-                updated = True
-                break
+        with _user_files(user_id) as files:
+            updated = any(t.get("id") == task_id for t in files.get(TASKS, []))
+            if updated:
+                files.update(TASKS, apply, [])
         
         if updated:
-            _save_json(tasks_file, tasks)
             return {"status": "success", "message": "تم التحديث"}
         return {"status": "error", "message": "المهمة غير موجودة"}
     except Exception as e:
@@ -463,16 +1000,18 @@ def toggle_task(user_id: str, task_id: str) -> dict:
     """تبديل حالة المهمة (مكتملة/غير مكتملة)"""
     # This can now use update_task, but keeping separate for backward compatibility wrapping
     try:
-        tasks_file = _get_tasks_file(user_id)
-        tasks = _load_json(tasks_file, [])
+        updated_at = datetime.now().isoformat()
         
-        for task in tasks:
-            if task.get("id") == task_id:
-                task["completed"] = not task.get("completed", False)
-                task["updated_at"] = datetime.now().isoformat()
-                break
+        def apply(tasks):
+            for task in tasks:
+                if task.get("id") == task_id:
+                    task["completed"] = not task.get("completed", False)
+                    task["updated_at"] = updated_at
+                    break
+            return tasks
         
-        _save_json(tasks_file, tasks)
+        with _user_files(user_id) as files:
+            files.update(TASKS, apply, [])
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": f"خطأ: {str(e)}"}
@@ -480,13 +1019,9 @@ def toggle_task(user_id: str, task_id: str) -> dict:
 def delete_task(user_id: str, task_id: str) -> dict:
     """حذف مهمة"""
     try:
-        tasks_file = _get_tasks_file(user_id)
-        tasks = _load_json(tasks_file, [])
-        
-        tasks = [t for t in tasks if t.get("id") != task_id]
-        _save_json(tasks_file, tasks)
+        with _user_files(user_id) as files:
+            files.update(TASKS, lambda tasks: [t for t in tasks if t.get("id") != task_id], [])
         
         return {"status": "success", "message": "تم الحذف"}
     except Exception as e:
         return {"status": "error", "message": f"خطأ: {str(e)}"}
-
@@ -0,0 +1,62 @@
+"""
+استيراد تاريخ إنتاجية من ملف CSV أو JSONL إلى حساب مستخدم
+Bulk import CLI for historical productivity data
+
+الأعمدة: log_date, time_slot, score, category ثم notes اختياري (ملف التصدير
+نفسه يصلح للاستيراد). الفئة باسمها أو اسمها العربي من فئات المستخدم.
+
+تشغيل:
+    python import_logs.py user@example.com history.csv
+    python import_logs.py user@example.com history.jsonl --policy max --dry-run
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional
+
+from auth import _get_registry
+from database import import_logs
+from storage import importer
+
+
+def resolve_user_id(user: str) -> Optional[str]:
+    """معرف مستخدم مسجل من بريده أو معرفه (None إن لم يوجد حتى لا يُنشأ مجلد يتيم)"""
+    registry = _get_registry()
+    info = registry.get_by_email(user) or registry.get_by_id(user)
+    return info["id"] if info else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="استيراد سجلات الإنتاجية من CSV أو JSONL")
+    parser.add_argument("user", help="البريد الإلكتروني أو معرف المستخدم")
+    parser.add_argument("path", type=Path, help="ملف .csv أو .jsonl")
+    parser.add_argument("--format", choices=importer.FORMATS,
+                        help="صيغة الملف (افتراضياً من الامتداد)")
+    parser.add_argument("--policy", choices=importer.POLICIES, default="overwrite",
+                        help="حل التعارض على (اليوم، الفترة): overwrite أو keep أو max")
+    parser.add_argument("--dry-run", action="store_true", help="تحقق وعد فقط دون كتابة")
+    args = parser.parse_args(argv)
+
+    user_id = resolve_user_id(args.user)
+    if user_id is None:
+        print(f"المستخدم غير موجود: {args.user}", file=sys.stderr)
+        return 1
+
+    fmt = args.format or args.path.suffix.lstrip(".").lower()
+    with open(args.path, "rb") as source:
+        result = import_logs(user_id, source, fmt, args.policy, args.dry_run)
+
+    print(result["message"])
+    if result["status"] != "success":
+        return 1
+    summary = result["data"]
+    print(f"  الصفوف: {summary['rows']}")
+    print(f"  مرفوضة: {summary['invalid']} {summary['rejected']}")
+    print(f"  مكررة في الملف: {summary['duplicates']}")
+    print(f"  متروكة (مسجلة مسبقاً): {summary['unchanged']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
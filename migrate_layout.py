@@ -0,0 +1,24 @@
+"""
+نقل مجلدات المستخدمين إلى التوزيع المقسم local_data/ab/cd/<user_id>
+Online migration of LOCAL_DATA_DIR to the sharded layout
+
+التطبيق يعمل أثناء النقل: شغّله أولاً بـ LOCAL_DATA_LAYOUT=sharded (يجد المجلدات
+القديمة والمنقولة معاً) ثم شغّل هذا الأمر بنفس الإعداد. يمكن إعادة تشغيله بأمان.
+
+تشغيل:
+    LOCAL_DATA_LAYOUT=sharded python migrate_layout.py
+"""
+
+import sys
+
+from database import migrate_data_layout
+
+
+def main() -> int:
+    result = migrate_data_layout()
+    print(result["message"])
+    return 0 if result["status"] == "success" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""
+محركات تخزين سجلات الإنتاجية
+Productivity Log Storage Engines
+
+كل محرك يوفر نفس الواجهة التي يستدعيها database.py:
+    upsert(user_id, record) -> dict
+    upsert_many(user_id, records) -> List[Dict]   (كتابة واحدة أو معاملة واحدة)
+    get_by_date(user_id, log_date) -> List[Dict]
+    get_by_range(user_id, start_date, end_date) -> List[Dict]
+    get_by_slot(user_id, log_date, time_slot) -> Optional[Dict]
+    delete(user_id, log_id) -> Optional[Dict]
+    version(user_id) -> str   (تتغير مع كل كتابة، تستخدمها الملخصات المشتقة مثل rollup.py)
+
+التواريخ تمرر كنصوص ISO (YYYY-MM-DD) لذا تكفي المقارنة النصية للترتيب.
+"""
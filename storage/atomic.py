@@ -0,0 +1,110 @@
+"""
+كتابة ذرية للملفات وأقفال مقسمة لكل مستخدم
+Atomic file writes and striped per-user locks
+
+الكتابة تتم في ملف مؤقت بنفس المجلد ثم fsync ثم os.replace، فالقارئ يرى إما
+الملف القديم أو الجديد كاملاً ولا يرى ملفاً نصف مكتوب.
+
+الأقفال مقسمة إلى STRIPES شريحة حسب المفتاح (معرف المستخدم): مستخدمان مختلفان
+لا ينتظر أحدهما الآخر إلا إذا وقعا في نفس الشريحة. كل شريحة قفل RLock داخل
+العملية، ومعه قفل fcntl على ملف الشريحة بين العمليات (إن توفر fcntl).
+"""
+
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: أقفال داخل العملية فقط
+    fcntl = None
+
+# عدد الشرائح: احتمال تصادم مستخدمين نشطين معاً 1/64
+STRIPES = 64
+
+
+def _fsync_dir(directory: Path):
+    """تثبيت إعادة التسمية في المجلد (POSIX فقط)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: Path, data: Union[str, bytes]):
+    """استبدال محتوى الملف دفعة واحدة: ملف مؤقت ثم fsync ثم os.replace"""
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+
+
+class StripedLocks:
+    """أقفال مقسمة حسب المفتاح، قابلة للتداخل داخل نفس الخيط"""
+
+    def __init__(self, lock_dir: Optional[Callable[[], Path]] = None,
+                 name: str = "stripe", stripes: int = STRIPES):
+        # lock_dir=None: أقفال داخل العملية فقط
+        self._lock_dir = lock_dir
+        self._name = name
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        # عمق التداخل وملف القفل المفتوح لكل شريحة (يحميهما قفل الشريحة نفسه)
+        self._depth = [0] * stripes
+        self._files = [None] * stripes
+
+    def stripe(self, key: str) -> int:
+        """رقم شريحة المفتاح (ثابت بين العمليات بخلاف hash)"""
+        return zlib.crc32(str(key).encode("utf-8")) % len(self._locks)
+
+    def _lock_file(self, stripe: int):
+        """فتح ملف الشريحة وقفله حصرياً بين العمليات"""
+        lock_dir = self._lock_dir()
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        f = open(lock_dir / f"{self._name}-{stripe:02d}.lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    @contextmanager
+    def hold(self, key: str):
+        """حجز شريحة المفتاح طوال كتلة with"""
+        stripe = self.stripe(key)
+        with self._locks[stripe]:
+            # flock لكل فتح للملف: يُقفل مرة واحدة فقط عند أول دخول في الخيط
+            if self._depth[stripe] == 0 and self._lock_dir is not None and fcntl is not None:
+                self._files[stripe] = self._lock_file(stripe)
+            self._depth[stripe] += 1
+            try:
+                yield
+            finally:
+                self._depth[stripe] -= 1
+                f = self._files[stripe]
+                if self._depth[stripe] == 0 and f is not None:
+                    self._files[stripe] = None
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    finally:
+                        f.close()
@@ -0,0 +1,121 @@
+"""
+تمثيل عمودي مضغوط للسجلات (مصفوفات NumPy) للتحليلات
+Compact columnar log representation (NumPy arrays) for analytics
+
+كل سجل يشغل 7 بايت تقريباً بدل مئات البايتات لقاموس Python:
+    day       int32   رقم اليوم الترتيبي (date.toordinal)
+    slot      uint8   الفترة 0-47
+    score     uint8   التقييم 0-4
+    category  uint8   رمز الفئة في جدول categories (uint16 إذا تجاوزت 255 فئة)
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# نفس القيمة الافتراضية المستخدمة في analytics.py عند غياب الفئة
+UNKNOWN_CATEGORY = "غير محدد"
+
+
+class LogColumns:
+    """أعمدة السجلات مرتبة حسب (اليوم، الفترة)"""
+
+    __slots__ = ("day", "slot", "score", "category", "categories")
+
+    def __init__(self, day: np.ndarray, slot: np.ndarray, score: np.ndarray,
+                 category: np.ndarray, categories: List[str]):
+        self.day = day
+        self.slot = slot
+        self.score = score
+        self.category = category
+        # جدول البحث: الرمز -> اسم الفئة
+        self.categories = categories
+
+    @classmethod
+    def empty(cls) -> "LogColumns":
+        """أعمدة فارغة"""
+        return cls(
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint8),
+            np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint8), []
+        )
+
+    @classmethod
+    def from_logs(cls, logs: Iterable[Dict]) -> "LogColumns":
+        """بناء الأعمدة من قائمة قواميس (تحليل كل تاريخ مرة واحدة فقط)"""
+        logs = list(logs)
+        if not logs:
+            return cls.empty()
+
+        ordinals: Dict[str, int] = {}
+        codes: Dict[str, int] = {}
+        day = np.empty(len(logs), dtype=np.int32)
+        slot = np.empty(len(logs), dtype=np.uint8)
+        score = np.empty(len(logs), dtype=np.uint8)
+        category = np.empty(len(logs), dtype=np.uint16)
+
+        for i, log in enumerate(logs):
+            log_date = log.get("log_date")
+            ordinal = ordinals.get(log_date)
+            if ordinal is None:
+                d = log_date if isinstance(log_date, date) else date.fromisoformat(log_date)
+                ordinal = ordinals[log_date] = d.toordinal()
+            day[i] = ordinal
+            slot[i] = log.get("time_slot", 0)
+            score[i] = log.get("score", 0)
+            category[i] = codes.setdefault(log.get("category", UNKNOWN_CATEGORY), len(codes))
+
+        if len(codes) <= 256:
+            category = category.astype(np.uint8)
+
+        columns = cls(day, slot, score, category, list(codes))
+        order = np.lexsort((slot, day))
+        if np.any(order != np.arange(len(order))):
+            columns = columns.take(order)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @property
+    def nbytes(self) -> int:
+        """حجم المصفوفات بالبايت"""
+        return self.day.nbytes + self.slot.nbytes + self.score.nbytes + self.category.nbytes
+
+    def take(self, indexer) -> "LogColumns":
+        """اختيار صفوف بمصفوفة فهارس أو قناع منطقي"""
+        return LogColumns(
+            self.day[indexer], self.slot[indexer], self.score[indexer],
+            self.category[indexer], self.categories
+        )
+
+    def between(self, start_date: date, end_date: date) -> "LogColumns":
+        """صفوف فترة زمنية بالبحث الثنائي على عمود اليوم المرتب"""
+        lo = np.searchsorted(self.day, start_date.toordinal(), side="left")
+        hi = np.searchsorted(self.day, end_date.toordinal(), side="right")
+        return self.take(slice(lo, hi))
+
+    def select_categories(self, names: Iterable[str]) -> "LogColumns":
+        """صفوف الفئات المختارة فقط"""
+        names = set(names)
+        wanted = [code for code, name in enumerate(self.categories) if name in names]
+        return self.take(np.isin(self.category, wanted))
+
+    def category_code(self, name: str) -> Optional[int]:
+        """رمز فئة في جدول البحث"""
+        try:
+            return self.categories.index(name)
+        except ValueError:
+            return None
+
+    def weekdays(self) -> np.ndarray:
+        """يوم الأسبوع لكل صف (0 = الإثنين) مثل date.weekday"""
+        return (self.day + 6) % 7
+
+    def hours(self) -> np.ndarray:
+        """ساعة اليوم لكل صف"""
+        return self.slot // 2
+
+    def dates(self) -> List[date]:
+        """تحويل أرقام الأيام الفريدة إلى تواريخ"""
+        return [date.fromordinal(int(d)) for d in np.unique(self.day)]
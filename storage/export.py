@@ -0,0 +1,103 @@
+"""
+تصدير السجلات إلى CSV أو JSONL أو Parquet على دفعات
+Streaming log export (CSV, JSONL, Parquet)
+
+الكاتب يستقبل السجلات دفعة دفعة (شهر أو مؤشر من المحرك) ويكتبها مباشرة في
+ملف، فلا يوجد DataFrame ولا قائمة بكل السجلات في الذاكرة مهما طال التاريخ.
+Parquet اختياري ويتطلب pyarrow (دفعة = مجموعة صفوف row group).
+"""
+
+import codecs
+import csv
+import io
+from datetime import date
+from typing import BinaryIO, Dict, Iterable, List
+
+from storage import serializer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# أعمدة الملف بنفس مفاتيح السجل
+COLUMNS = ("id", "user_id", "log_date", "time_slot", "score", "category", "notes", "updated_at")
+
+# {الصيغة: (نوع MIME، امتداد الملف)}
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available() -> List[str]:
+    """الصيغ المتاحة في هذه البيئة"""
+    return [fmt for fmt in FORMATS if fmt != "parquet" or pa is not None]
+
+
+def _write_csv(chunks: Iterable[List[Dict]], sink: BinaryIO) -> int:
+    # BOM حتى يفتح Excel النص العربي بشكل صحيح (مثل utf-8-sig سابقاً)
+    sink.write(codecs.BOM_UTF8)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows([log.get(c) for c in COLUMNS] for log in chunk)
+        rows += len(chunk)
+        sink.write(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+    sink.write(buffer.getvalue().encode("utf-8"))
+    return rows
+
+
+def _write_jsonl(chunks: Iterable[List[Dict]], sink: BinaryIO) -> int:
+    rows = 0
+    for chunk in chunks:
+        sink.write(b"".join(
+            serializer.dumps({c: log.get(c) for c in COLUMNS}, "auto") + b"\n" for log in chunk
+        ))
+        rows += len(chunk)
+    return rows
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("log_date", pa.date32()),
+        ("time_slot", pa.int8()),
+        ("score", pa.int8()),
+        ("category", pa.string()),
+        ("notes", pa.string()),
+        ("updated_at", pa.string()),
+    ])
+
+
+def _write_parquet(chunks: Iterable[List[Dict]], sink: BinaryIO) -> int:
+    schema = _parquet_schema()
+    rows = 0
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            columns = {c: [log.get(c) for log in chunk] for c in COLUMNS}
+            columns["log_date"] = [date.fromisoformat(str(d)) for d in columns["log_date"]]
+            for c in ("id", "user_id", "updated_at"):
+                columns[c] = [None if v is None else str(v) for v in columns[c]]
+            writer.write_table(pa.table(columns, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+def write(fmt: str, chunks: Iterable[List[Dict]], sink: BinaryIO) -> int:
+    """كتابة الدفعات في sink بالصيغة المطلوبة وإرجاع عدد السجلات"""
+    if fmt not in available():
+        raise ValueError(f"صيغة تصدير غير متاحة: {fmt}")
+    if fmt == "csv":
+        return _write_csv(chunks, sink)
+    if fmt == "jsonl":
+        return _write_jsonl(chunks, sink)
+    return _write_parquet(chunks, sink)
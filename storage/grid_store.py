@@ -0,0 +1,470 @@
+"""
+مخزن السجلات كشبكة ثابتة العرض (366 يوم × 48 فترة) لكل مستخدم وسنة عبر mmap
+Memory-mapped fixed-width slot grid per user-year
+
+اليوم 48 فترة بالضبط والتقييم 0-4، فكل سجل خلية uint16 في موضع ثابت:
+
+    bit 15      مسجل (logged)
+    bits 12-14  التقييم 0-4
+    bits 0-11   رمز الفئة في grid/categories.json (حتى 4096 فئة)
+
+ملف السنة <year>.grid:
+    ترويسة 16 بايت: MAGIC + رقم الجيل (uint64 يزيد مع كل كتابة = نسخة البيانات)
+    الخلايا  uint16[366][48]
+    updated_at بالثواني uint32[366][48]
+
+تسجيل فترة = كتابة خليتين في الموضع day_of_year*48+slot (دون قراءة أو
+إعادة كتابة الملف)، وقراءة يوم أو فترة = شريحة من المصفوفة المعينة في الذاكرة.
+columns() تبني LogColumns للتحليلات مباشرة من الشبكة دون قواميس.
+
+الملاحظات (نادرة) في ملف جانبي <year>.notes.json. معرف السجل ثابت لكل فترة:
+"<log_date>_<time_slot>_<user_id>".
+"""
+
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from storage.atomic import StripedLocks, write_atomic
+from storage.columnar import LogColumns
+
+MAGIC = b"PTG1"
+HEADER = struct.Struct("<4s4xQ")  # MAGIC + حشو + رقم الجيل
+DAYS = 366
+SLOTS = 48
+CELLS_OFFSET = HEADER.size
+STAMPS_OFFSET = CELLS_OFFSET + DAYS * SLOTS * 2
+FILE_SIZE = STAMPS_OFFSET + DAYS * SLOTS * 4
+
+LOGGED = 0x8000
+SCORE_SHIFT = 12
+CATEGORY_MASK = 0x0FFF
+
+# أقصى عدد ملفات سنوات معينة في الذاكرة (كل ملف يحجز واصف ملف)
+MAX_OPEN = 256
+
+PAGE = mmap.ALLOCATIONGRANULARITY
+
+
+def pack(score: int, category_code: int) -> int:
+    """خلية مسجلة بتقييم ورمز فئة"""
+    if not 0 <= score <= 4:
+        raise ValueError(f"تقييم خارج النطاق: {score}")
+    if not 0 <= category_code <= CATEGORY_MASK:
+        raise ValueError("تجاوز عدد الفئات حد الشبكة")
+    return LOGGED | (score << SCORE_SHIFT) | category_code
+
+
+def _position(log_date: str) -> Tuple[int, int]:
+    """(السنة، رقم اليوم في السنة من 0)"""
+    d = date.fromisoformat(str(log_date))
+    return d.year, d.timetuple().tm_yday - 1
+
+
+def _stat(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _stamp(updated_at) -> int:
+    if not updated_at:
+        return int(datetime.now().timestamp())
+    return int(datetime.fromisoformat(str(updated_at)).timestamp())
+
+
+class YearGrid:
+    """ملف سنة واحدة معين في الذاكرة مع عروض NumPy على خلاياه (بلا نسخ)"""
+
+    __slots__ = ("mm", "users", "evicted")
+
+    def __init__(self, path: Path):
+        # users: عدد من يستخدم الملف الآن، evicted: أُخرج من الذاكرة ويُغلق عند آخر تحرير
+        self.users = 0
+        self.evicted = False
+        with open(path, "r+b") as f:
+            self.mm = mmap.mmap(f.fileno(), FILE_SIZE)
+        if self.mm[:4] != MAGIC:
+            self.mm.close()
+            raise ValueError(f"ملف شبكة غير صالح: {path}")
+
+    # العروض تُنشأ عند الطلب ولا تُحفظ، فلا يبقى مرجع للملف إلا عند من يستخدمها
+    @property
+    def cells(self) -> np.ndarray:
+        return np.ndarray((DAYS, SLOTS), dtype="<u2", buffer=self.mm, offset=CELLS_OFFSET)
+
+    @property
+    def stamps(self) -> np.ndarray:
+        return np.ndarray((DAYS, SLOTS), dtype="<u4", buffer=self.mm, offset=STAMPS_OFFSET)
+
+    @property
+    def generation(self) -> int:
+        return HEADER.unpack_from(self.mm)[1]
+
+    def bump(self):
+        """زيادة رقم الجيل بعد كل كتابة"""
+        HEADER.pack_into(self.mm, 0, MAGIC, self.generation + 1)
+
+    def sync(self, day: int, slot: int):
+        """تثبيت الصفحات التي تغيرت فقط (الترويسة والخليتان)"""
+        self.mm.flush(0, PAGE)
+        for offset, width in ((CELLS_OFFSET, 2), (STAMPS_OFFSET, 4)):
+            start = (offset + (day * SLOTS + slot) * width) // PAGE * PAGE
+            self.mm.flush(start, min(PAGE, FILE_SIZE - start))
+
+    def sync_all(self):
+        self.mm.flush()
+
+    def close(self):
+        """إغلاق الملف المعين (إن كان عرض ما زال مستخدماً يُغلق عند تحرير آخر مرجع)"""
+        try:
+            self.mm.close()
+        except BufferError:
+            pass
+
+
+class GridLogStore:
+    """مخزن الشبكة: ملف لكل (مستخدم، سنة) تحت dir_for(user_id)"""
+
+    def __init__(self, dir_for: Callable[[str], Path], load: Callable, save: Callable,
+                 lock_dir: Optional[Callable[[], Path]] = None):
+        # دوال المسار والقراءة والكتابة تأتي من database.py
+        self._dir_for = dir_for
+        self._load = load
+        self._save = save
+        # {(user_id, السنة): YearGrid} بترتيب آخر استخدام
+        self._grids: "OrderedDict[Tuple[str, int], YearGrid]" = OrderedDict()
+        # {(user_id, اسم الملف): (بصمة، محتوى)} لملفات الفئات والملاحظات
+        self._side: Dict[Tuple[str, str], tuple] = {}
+        self._open_lock = threading.Lock()
+        # lock_dir: flock بين العمليات (التطبيق و import_logs.py) على جدول الفئات ورقم الجيل
+        self._locks = StripedLocks(lock_dir, name="grid")
+
+    # ---------- الملفات ----------
+
+    def _grid_path(self, user_id: str, year: int) -> Path:
+        return self._dir_for(user_id) / f"{year}.grid"
+
+    def _years(self, user_id: str) -> List[int]:
+        """السنوات التي لها ملف شبكة"""
+        directory = self._dir_for(user_id)
+        if not directory.is_dir():
+            return []
+        return sorted(int(p.name[:-5]) for p in os.scandir(directory)
+                      if p.name.endswith(".grid") and p.name[:-5].isdigit())
+
+    @contextmanager
+    def _using(self, user_id: str, year: int, create: bool = False) -> Iterator[Optional[YearGrid]]:
+        """
+        شبكة سنة محجوزة طوال الكتلة (None إن لم توجد ولم يُطلب إنشاؤها)
+        إخراجها من الذاكرة أثناء الاستخدام يؤجل إغلاقها إلى آخر تحرير
+        """
+        grid = self._acquire(user_id, year, create)
+        try:
+            yield grid
+        finally:
+            if grid is not None:
+                self._release(grid)
+
+    def _acquire(self, user_id: str, year: int, create: bool) -> Optional[YearGrid]:
+        """البحث وتحديث ترتيب الاستخدام والحجز تحت قفل واحد مع الإخراج"""
+        key = (user_id, year)
+        with self._open_lock:
+            grid = self._grids.get(key)
+            if grid is not None:
+                self._grids.move_to_end(key)
+            else:
+                path = self._grid_path(user_id, year)
+                if not path.exists():
+                    if not create:
+                        return None
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    # ملف كامل الحجم دفعة واحدة: القارئ لا يرى ملفاً ناقصاً
+                    write_atomic(path, HEADER.pack(MAGIC, 0) + bytes(FILE_SIZE - HEADER.size))
+                grid = YearGrid(path)
+                if len(self._grids) >= MAX_OPEN:
+                    # إخراج الأقدم استخداماً لتحرير واصف الملف (فوراً إن لم يكن مستخدماً)
+                    evicted = self._grids.popitem(last=False)[1]
+                    evicted.evicted = True
+                    if not evicted.users:
+                        evicted.close()
+                self._grids[key] = grid
+            grid.users += 1
+            return grid
+
+    def _release(self, grid: YearGrid):
+        with self._open_lock:
+            grid.users -= 1
+            if grid.evicted and not grid.users:
+                grid.close()
+
+    def _side_file(self, user_id: str, name: str, default):
+        """ملف جانبي (الفئات أو الملاحظات) من الذاكرة، ويعاد تحميله إذا تغير"""
+        path = self._dir_for(user_id) / name
+        signature = _stat(path)
+        cached = self._side.get((user_id, name))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        data = self._load(path, default) if signature is not None else default
+        self._side[(user_id, name)] = (signature, data)
+        return data
+
+    def _save_side(self, user_id: str, name: str, data):
+        path = self._dir_for(user_id) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._save(path, data)
+        self._side[(user_id, name)] = (_stat(path), data)
+
+    def _categories(self, user_id: str) -> List[str]:
+        return self._side_file(user_id, "categories.json", [])
+
+    def _notes(self, user_id: str, year: int) -> Dict[str, str]:
+        return self._side_file(user_id, f"{year}.notes.json", {})
+
+    def _category_code(self, user_id: str, name: str) -> int:
+        """رمز الفئة (تُضاف للجدول عند أول ظهور)"""
+        categories = self._categories(user_id)
+        try:
+            return categories.index(name)
+        except ValueError:
+            categories = categories + [name]
+            self._save_side(user_id, "categories.json", categories)
+            return len(categories) - 1
+
+    # ---------- تحويل الخلايا ----------
+
+    @staticmethod
+    def log_id(user_id: str, log_date: str, time_slot: int) -> str:
+        return f"{log_date}_{time_slot}_{user_id}"
+
+    def _record(self, user_id: str, year: int, day: int, slot: int, cell: int, stamp: int,
+                categories: List[str], notes: Dict[str, str]) -> Dict:
+        log_date = str(date.fromordinal(date(year, 1, 1).toordinal() + day))
+        code = cell & CATEGORY_MASK
+        return {
+            "id": self.log_id(user_id, log_date, slot),
+            "user_id": user_id,
+            "log_date": log_date,
+            "time_slot": slot,
+            "score": (cell >> SCORE_SHIFT) & 0x7,
+            "category": categories[code] if code < len(categories) else None,
+            "notes": notes.get(str(day * SLOTS + slot)),
+            "updated_at": datetime.fromtimestamp(stamp).isoformat() if stamp else None,
+        }
+
+    def _year_records(self, user_id: str, year: int, first_day: int, last_day: int) -> List[Dict]:
+        """سجلات أيام [first_day, last_day] من سنة مرتبة حسب (اليوم، الفترة)"""
+        with self._using(user_id, year) as grid:
+            if grid is None:
+                return []
+            cells = grid.cells[first_day:last_day + 1]
+            days, slots = np.nonzero(cells & LOGGED)
+            if not len(days):
+                return []
+            values = cells[days, slots].tolist()
+            stamps = grid.stamps[first_day:last_day + 1][days, slots].tolist()
+            # تحرير العرض قبل تحرير الشبكة حتى يمكن إغلاقها إن أُخرجت
+            del cells
+        categories = self._categories(user_id)
+        notes = self._notes(user_id, year)
+        return [
+            self._record(user_id, year, first_day + d, s, cell, stamp, categories, notes)
+            for d, s, cell, stamp in zip(days.tolist(), slots.tolist(), values, stamps)
+        ]
+
+    def _day_bounds(self, start_date: str, end_date: str) -> Iterator[Tuple[int, int, int]]:
+        """(السنة، أول يوم، آخر يوم) لكل سنة في الفترة مع قصها على السنوات الموجودة"""
+        start = date.fromisoformat(max(str(start_date), "0001-01-01"))
+        end = date.fromisoformat(str(end_date))
+        for year in range(start.year, end.year + 1):
+            first = start.timetuple().tm_yday - 1 if year == start.year else 0
+            last = end.timetuple().tm_yday - 1 if year == end.year else DAYS - 1
+            yield year, first, last
+
+    # ---------- واجهة المحرك ----------
+
+    def _write(self, user_id: str, record: Dict, notes_by_year: Dict[int, Dict[str, str]],
+               grids: Dict[int, YearGrid], using: ExitStack) -> Tuple[Dict, YearGrid, int, int]:
+        year, day = _position(record["log_date"])
+        slot = int(record["time_slot"])
+        if not 0 <= slot < SLOTS:
+            raise ValueError(f"فترة خارج النطاق: {slot}")
+        grid = grids.get(year)
+        if grid is None:
+            # كل سنة تُحجز مرة واحدة حتى نهاية الكتابة وتثبيتها
+            grid = grids[year] = using.enter_context(self._using(user_id, year, create=True))
+        stamp = _stamp(record.get("updated_at"))
+        grid.cells[day, slot] = pack(int(record["score"]), self._category_code(user_id, record["category"]))
+        grid.stamps[day, slot] = stamp
+
+        key = str(day * SLOTS + slot)
+        notes = notes_by_year.get(year)
+        if notes is None:
+            notes = notes_by_year[year] = dict(self._notes(user_id, year))
+        if record.get("notes"):
+            notes[key] = record["notes"]
+        else:
+            notes.pop(key, None)
+
+        log_date = str(record["log_date"])
+        saved = {
+            "id": self.log_id(user_id, log_date, slot),
+            "user_id": user_id,
+            "log_date": log_date,
+            "time_slot": slot,
+            "score": int(record["score"]),
+            "category": record["category"],
+            "notes": record.get("notes") or None,
+            "updated_at": datetime.fromtimestamp(stamp).isoformat(),
+        }
+        return saved, grid, day, slot
+
+    def _save_notes(self, user_id: str, notes_by_year: Dict[int, Dict[str, str]]):
+        """حفظ ملفات الملاحظات التي تغيرت فقط"""
+        for year, notes in notes_by_year.items():
+            if notes != self._notes(user_id, year):
+                self._save_side(user_id, f"{year}.notes.json", notes)
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """كتابة خلية الفترة في موضعها مباشرة"""
+        with self._locks.hold(user_id), ExitStack() as using:
+            notes_by_year = {}
+            saved, grid, day, slot = self._write(user_id, record, notes_by_year, {}, using)
+            self._save_notes(user_id, notes_by_year)
+            grid.bump()
+            grid.sync(day, slot)
+        return saved
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """كتابة عدة خلايا وتثبيت كل ملف سنة متأثر مرة واحدة"""
+        with self._locks.hold(user_id), ExitStack() as using:
+            notes_by_year = {}
+            saved, grids = [], {}
+            for record in records:
+                result, _, _, _ = self._write(user_id, record, notes_by_year, grids, using)
+                saved.append(result)
+            self._save_notes(user_id, notes_by_year)
+            for grid in grids.values():
+                grid.bump()
+                grid.sync_all()
+        return saved
+
+    def version(self, user_id: str) -> str:
+        """نسخة بيانات المستخدم: أرقام أجيال ملفات السنوات"""
+        with self._locks.hold(user_id):
+            return ";".join(
+                f"{year}:{self._generation(user_id, year)}" for year in self._years(user_id)
+            )
+
+    def _generation(self, user_id: str, year: int) -> int:
+        with self._using(user_id, year) as grid:
+            return grid.generation
+
+    def get_by_date(self, user_id: str, log_date: str) -> List[Dict]:
+        """سجلات يوم معين من صف واحد في الشبكة"""
+        year, day = _position(log_date)
+        return self._year_records(user_id, year, day, day)
+
+    def get_by_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية من شرائح سنواتها"""
+        years = set(self._years(user_id))
+        return [
+            log
+            for year, first, last in self._day_bounds(start_date, end_date) if year in years
+            for log in self._year_records(user_id, year, first, last)
+        ]
+
+    def iter_range(self, user_id: str, start_date: str, end_date: str) -> Iterator[List[Dict]]:
+        """سجلات فترة سنة بسنة (للتصدير الطويل)"""
+        years = set(self._years(user_id))
+        for year, first, last in self._day_bounds(start_date, end_date):
+            if year in years:
+                logs = self._year_records(user_id, year, first, last)
+                if logs:
+                    yield logs
+
+    def get_by_slot(self, user_id: str, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة من خلية واحدة"""
+        year, day = _position(log_date)
+        with self._using(user_id, year) as grid:
+            if grid is None:
+                return None
+            cell = int(grid.cells[day, time_slot])
+            stamp = int(grid.stamps[day, time_slot])
+        if not cell & LOGGED:
+            return None
+        return self._record(user_id, year, day, int(time_slot), cell, stamp,
+                            self._categories(user_id), self._notes(user_id, year))
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل بمعرفه (التاريخ والفترة والمستخدم مضمنة فيه)"""
+        try:
+            log_date, rest = log_id[:10], log_id[11:]
+            slot, owner = rest.split("_", 1)
+            slot = int(slot)
+            year, day = _position(log_date)
+        except ValueError:
+            return None
+        if owner != user_id or not 0 <= slot < SLOTS:
+            return None
+        with self._locks.hold(user_id):
+            removed = self.get_by_slot(user_id, log_date, slot)
+            if removed is None:
+                return None
+            with self._using(user_id, year) as grid:
+                grid.cells[day, slot] = 0
+                grid.stamps[day, slot] = 0
+                if removed["notes"] is not None:
+                    notes = dict(self._notes(user_id, year))
+                    notes.pop(str(day * SLOTS + slot), None)
+                    self._save_side(user_id, f"{year}.notes.json", notes)
+                grid.bump()
+                grid.sync(day, slot)
+        return removed
+
+    def columns(self, user_id: str, start_date: str, end_date: str) -> LogColumns:
+        """أعمدة التحليلات مباشرة من الشبكة (nonzero على الخلايا دون قواميس)"""
+        years = set(self._years(user_id))
+        parts = []
+        for year, first, last in self._day_bounds(start_date, end_date):
+            if year not in years:
+                continue
+            with self._using(user_id, year) as grid:
+                if grid is None:
+                    continue
+                cells = grid.cells[first:last + 1]
+                days, slots = np.nonzero(cells & LOGGED)
+                values = cells[days, slots]
+                del cells
+            parts.append((
+                (date(year, 1, 1).toordinal() + first + days).astype(np.int32),
+                slots.astype(np.uint8),
+                ((values >> SCORE_SHIFT) & 0x7).astype(np.uint8),
+                (values & CATEGORY_MASK).astype(np.uint16),
+            ))
+        if not parts:
+            return LogColumns.empty()
+        day, slot, score, category = (np.concatenate(c) for c in zip(*parts))
+        categories = list(self._categories(user_id))
+        if len(categories) <= 256:
+            category = category.astype(np.uint8)
+        return LogColumns(day, slot, score, category, categories)
+
+    def day_cells(self, user_id: str, log_date: str) -> np.ndarray:
+        """صف اليوم في الشبكة (48 خلية، عرض بلا نسخ أو أصفار إذا لم توجد السنة)"""
+        year, day = _position(log_date)
+        with self._using(user_id, year) as grid:
+            if grid is None:
+                return np.zeros(SLOTS, dtype="<u2")
+            # العرض يبقي الملف معيناً حتى تحريره حتى لو أُغلقت الشبكة (YearGrid.close)
+            return grid.cells[day]
@@ -0,0 +1,205 @@
+"""
+استيراد تاريخ إنتاجية كبير من CSV أو JSONL بعمليات متجهة (pandas)
+Bulk importer: vectorized validation, de-duplication and conflict resolution
+
+الملف يُقرأ إلى DataFrame ثم يُتحقق من التاريخ والفترة (0-47) والتقييم (0-4)
+والفئة عمودياً دون حلقة لكل صف، وتُحل التكرارات على (اليوم، الفترة) داخل
+الملف ومع السجلات المحفوظة حسب السياسة:
+
+    overwrite: آخر صف في الملف يفوز ويستبدل السجل المحفوظ
+    keep:      أول صف في الملف يفوز والفترات المسجلة مسبقاً لا تُمس
+    max:       التقييم الأعلى يفوز (عند التساوي يبقى المحفوظ)
+
+الصفوف المطابقة للسجل المحفوظ تماماً لا تُكتب، فإعادة استيراد نفس الملف لا
+تغير شيئاً. الكتابة نفسها دفعة واحدة عبر DailyRollup.upsert_many في database.py.
+"""
+
+import gc
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ("csv", "jsonl")
+POLICIES = ("overwrite", "keep", "max")
+
+# الأعمدة المطلوبة (notes اختياري وباقي الأعمدة مثل id و updated_at تُتجاهل)
+REQUIRED = ("log_date", "time_slot", "score", "category")
+COLUMNS = REQUIRED + ("notes",)
+
+SLOTS = 48
+MAX_SCORE = 4
+
+SlotKey = Tuple[str, int]
+
+
+@contextmanager
+def paused_gc():
+    """
+    إيقاف جامع الدورات أثناء الاستيراد: ملايين القواميس الجديدة (بلا دورات)
+    تجعله يمر على نفس الكائنات مراراً ويضاعف زمن الكتابة تقريباً
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read(source: BinaryIO, fmt: str) -> pd.DataFrame:
+    """قراءة الملف إلى DataFrame بالأعمدة المعروفة فقط"""
+    if fmt == "csv":
+        # utf-8-sig يتجاوز BOM الذي يكتبه التصدير و Excel
+        return pd.read_csv(
+            source, encoding="utf-8-sig", usecols=lambda c: c in COLUMNS,
+            dtype={"log_date": str, "category": str, "notes": str},
+        )
+    if fmt == "jsonl":
+        frame = pd.read_json(source, lines=True, dtype=False, convert_dates=False)
+        return frame[[c for c in COLUMNS if c in frame.columns]]
+    raise ValueError(f"صيغة استيراد غير مدعومة: {fmt}")
+
+
+def category_aliases(categories: List[Dict]) -> Dict[str, str]:
+    """{اسم الفئة أو اسمها العربي بحروف صغيرة: الاسم المحفوظ في السجلات}"""
+    aliases = {}
+    for cat in categories:
+        name = cat.get("name")
+        if not name:
+            continue
+        for alias in (name, cat.get("name_ar")):
+            if alias:
+                aliases[str(alias).strip().casefold()] = name
+    return aliases
+
+
+def _integers(column: pd.Series, upper: int) -> Tuple[pd.Series, pd.Series]:
+    """(القيم الرقمية، قناع الصحيح منها ضمن 0..upper)"""
+    values = pd.to_numeric(column, errors="coerce")
+    valid = values.notna() & (values % 1 == 0) & (values >= 0) & (values <= upper)
+    return values, valid
+
+
+def _per_unique(column: pd.Series, convert: Callable[[object], Optional[str]]) -> np.ndarray:
+    """تطبيق convert على القيم المختلفة فقط (آلاف الأيام والفئات مقابل ملايين الصفوف)"""
+    codes, uniques = pd.factorize(column)
+    # الرمز -1 (قيمة فارغة) يشير إلى None الأخير
+    values = np.array([convert(v) for v in uniques] + [None], dtype=object)
+    return values[codes]
+
+
+def _iso_date(value) -> Optional[str]:
+    """تاريخ ISO (يُقبل معه وقت بعد T أو مسافة) أو None"""
+    text = str(value).strip()
+    if len(text) > 10 and text[10] not in "T ":
+        return None
+    try:
+        return date.fromisoformat(text[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+def validate(frame: pd.DataFrame, aliases: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    الصفوف الصحيحة بأنواع موحدة، وعدد الصفوف المرفوضة بسبب كل عمود
+    (الصف الذي يخالف أكثر من عمود يُحسب في كل منها)
+    """
+    missing = [c for c in REQUIRED if c not in frame.columns]
+    if missing:
+        raise ValueError(f"أعمدة ناقصة في الملف: {', '.join(missing)}")
+
+    dates = _per_unique(frame["log_date"], _iso_date)
+    valid_date = pd.notna(dates)
+    slots, valid_slot = _integers(frame["time_slot"], SLOTS - 1)
+    scores, valid_score = _integers(frame["score"], MAX_SCORE)
+    categories = _per_unique(frame["category"], lambda v: aliases.get(str(v).strip().casefold()))
+    valid_category = pd.notna(categories)
+    valid_slot = valid_slot.to_numpy()
+    valid_score = valid_score.to_numpy()
+
+    rejected = {
+        "log_date": int((~valid_date).sum()),
+        "time_slot": int((~valid_slot).sum()),
+        "score": int((~valid_score).sum()),
+        "category": int((~valid_category).sum()),
+    }
+    valid = valid_date & valid_slot & valid_score & valid_category
+
+    if "notes" in frame.columns:
+        notes = _per_unique(frame["notes"][valid], lambda v: str(v) if str(v).strip() else None)
+    else:
+        notes = np.full(int(valid.sum()), None, dtype=object)
+
+    clean = pd.DataFrame({
+        "log_date": dates[valid],
+        "time_slot": slots[valid].astype(np.int64).to_numpy(),
+        "score": scores[valid].astype(np.int64).to_numpy(),
+        "category": categories[valid],
+        # object حتى تبقى None (نوع النص في pandas يحولها إلى NaN)
+        "notes": pd.Series(notes, dtype=object),
+    })
+    return clean, rejected
+
+
+def dedupe(frame: pd.DataFrame, policy: str) -> pd.DataFrame:
+    """صف واحد لكل (اليوم، الفترة) داخل الملف حسب السياسة"""
+    if policy not in POLICIES:
+        raise ValueError(f"سياسة تعارض غير معروفة: {policy}")
+    keys = ["log_date", "time_slot"]
+    if policy == "max":
+        # ترتيب مستقر: عند تساوي التقييم يفوز الصف الأخير
+        frame = frame.sort_values("score", kind="stable")
+        return frame.drop_duplicates(keys, keep="last").sort_index()
+    return frame.drop_duplicates(keys, keep="last" if policy == "overwrite" else "first")
+
+
+def resolve(frame: pd.DataFrame, existing: Dict[SlotKey, Dict], policy: str) -> Tuple[pd.DataFrame, int]:
+    """الصفوف التي تُكتب بعد المقارنة بالسجلات المحفوظة، وعدد الصفوف المتروكة"""
+    if not existing or frame.empty:
+        return frame, 0
+    saved = pd.DataFrame.from_records(
+        [(d, s, r.get("score"), r.get("category"), r.get("notes") or None)
+         for (d, s), r in existing.items()],
+        columns=["log_date", "time_slot", "saved_score", "saved_category", "saved_notes"],
+    )
+    merged = frame.merge(saved, on=["log_date", "time_slot"], how="left", indicator=True)
+    has_saved = (merged["_merge"] == "both").to_numpy()
+    same = (
+        has_saved
+        & (merged["score"] == merged["saved_score"]).to_numpy()
+        & (merged["category"] == merged["saved_category"]).to_numpy()
+        & (merged["notes"].fillna("") == merged["saved_notes"].fillna("")).to_numpy()
+    )
+    if policy == "keep":
+        write = ~has_saved
+    elif policy == "max":
+        write = ~has_saved | (merged["score"] > merged["saved_score"]).to_numpy()
+    else:
+        write = ~same
+    return frame[write], int((~write).sum())
+
+
+def to_records(frame: pd.DataFrame, user_id: str, now: datetime) -> List[Dict]:
+    """سجلات بنفس شكل log_productivity (معرف الفترة المسجلة مسبقاً يحفظه المحرك)"""
+    suffix = f"_{now.timestamp()}"
+    updated_at = now.isoformat()
+    return [
+        {
+            "id": f"{log_date}_{time_slot}{suffix}",
+            "user_id": user_id,
+            "log_date": log_date,
+            "time_slot": time_slot,
+            "score": score,
+            "category": category,
+            "notes": notes,
+            "updated_at": updated_at,
+        }
+        for log_date, time_slot, score, category, notes in zip(
+            frame["log_date"].tolist(), frame["time_slot"].tolist(), frame["score"].tolist(),
+            frame["category"].tolist(), frame["notes"].tolist(),
+        )
+    ]
@@ -0,0 +1,170 @@
+"""
+مخزن السجلات بسجل كتابة إلحاقي (Journal) مع ضغط دوري
+Append-only Journal Log Store with periodic compaction
+
+كل عملية تحديث أو حذف تُلحق كسطر JSON واحد بملف productivity_logs.journal.jsonl،
+والقراءة تعيد تطبيق السجل فوق آخر لقطة مضغوطة (productivity_logs.json).
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from storage import serializer
+from storage.json_store import JsonLogStore
+
+# حجم ملف السجل (بالبايت) الذي يُدمج بعده في لقطة جديدة (~1000 عملية)
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+
+
+def replay(snapshot: List[Dict], entries: List[Dict]) -> List[Dict]:
+    """تطبيق عمليات السجل بالترتيب فوق اللقطة (العملية idempotent)"""
+    state = {}
+    # {المعرف: (اليوم، الفترة)} حتى يكون الحذف بحثاً بالمفتاح لا مروراً على الكل
+    keys = {}
+
+    def put(record: Dict):
+        key = (record.get("log_date"), record.get("time_slot"))
+        previous = state.get(key)
+        if previous is not None:
+            keys.pop(previous.get("id"), None)
+        state[key] = record
+        keys[record.get("id")] = key
+
+    for record in snapshot:
+        put(record)
+    for entry in entries:
+        if entry.get("op") == "upsert":
+            put(entry["record"])
+        elif entry.get("op") == "delete":
+            key = keys.pop(entry.get("id"), None)
+            if key is not None:
+                del state[key]
+    return list(state.values())
+
+
+class JournalLogStore(JsonLogStore):
+    """مخزن JSON تكون فيه الكتابة O(1) بالنسبة لحجم التاريخ"""
+
+    def __init__(self, path_for: Callable[[str], Path], load: Callable, save: Callable,
+                 compact_threshold: int = COMPACT_THRESHOLD_BYTES):
+        super().__init__(path_for, load, save)
+        self.compact_threshold = compact_threshold
+
+    def _journal_file(self, user_id: str) -> Path:
+        """مسار ملف السجل بجوار اللقطة"""
+        snapshot = self._path_for(user_id)
+        return snapshot.with_name(snapshot.stem + ".journal.jsonl")
+
+    def _files(self, user_id: str) -> List[Path]:
+        """اللقطة والسجل معاً يحددان بصمة الفهرس"""
+        return [self._path_for(user_id), self._journal_file(user_id)]
+
+    def _read_journal(self, user_id: str) -> List[Dict]:
+        """قراءة عمليات السجل مع تجاهل السطر الأخير إذا انقطعت كتابته"""
+        journal_file = self._journal_file(user_id)
+        if not journal_file.exists():
+            return []
+        entries = []
+        with open(journal_file, "rb") as f:
+            for line in f:
+                try:
+                    entries.append(serializer.loads_json(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def _read(self, user_id: str) -> List[Dict]:
+        """اللقطة بعد تطبيق السجل (من القرص)"""
+        return replay(self._load(self._path_for(user_id), []), self._read_journal(user_id))
+
+    def _append(self, user_id: str, *entries: Dict):
+        """إلحاق عمليات بالسجل بكتابة و fsync واحدين ثم الضغط عند تجاوز الحد"""
+        journal_file = self._journal_file(user_id)
+        # سطر JSON لكل عملية (auto لا تختار msgpack أبداً)
+        line = b"".join(serializer.dumps(entry) + b"\n" for entry in entries)
+        with open(journal_file, "a+b") as f:
+            # سطر مقطوع من انهيار سابق لا يجب أن يلتصق بالعملية الجديدة
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+
+        if size > self.compact_threshold:
+            self.compact(user_id)
+
+    def compact(self, user_id: str):
+        """دمج السجل في لقطة جديدة ثم حذفه"""
+        with self._locks.hold(user_id):
+            journal_file = self._journal_file(user_id)
+            if not journal_file.exists():
+                return
+            # اللقطة الجديدة تُكتب في ملف مؤقت ثم تحل محل القديمة دفعة واحدة: انقطاع
+            # التنفيذ أثناء الكتابة يبقي اللقطة القديمة والسجل كاملين
+            snapshot = self._path_for(user_id)
+            pending = snapshot.with_name(snapshot.name + ".compact")
+            try:
+                self._save(pending, self._read(user_id))
+                os.replace(pending, snapshot)
+            except BaseException:
+                pending.unlink(missing_ok=True)
+                raise
+            # إن انقطع التنفيذ قبل الحذف فإعادة تطبيق السجل لا تغير شيئاً
+            journal_file.unlink()
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """
+        إلحاق عملية تحديث مع الحفاظ على معرف السجل الموجود
+        المعرف الموجود يأتي من الفهرس في الذاكرة، فالكتابة سطر واحد دون قراءة الملفات
+        (يُبنى الفهرس من القرص مرة واحدة فقط إذا لم يكن محملاً أو تغيرت الملفات)
+        """
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            existing = index.get(record["log_date"], record["time_slot"])
+            if existing is not None:
+                record["id"] = existing["id"]
+
+            try:
+                self._append(user_id, {"op": "upsert", "record": record})
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            index.put(dict(record))
+            self._remember(user_id, index)
+        return record
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """إلحاق عمليات تحديث عدة سجلات دفعة واحدة"""
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            for record in records:
+                existing = index.get(record["log_date"], record["time_slot"])
+                if existing is not None:
+                    record["id"] = existing["id"]
+                index.put(dict(record))
+            try:
+                self._append(user_id, *({"op": "upsert", "record": r} for r in records))
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            self._remember(user_id, index)
+        return records
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """إلحاق عملية حذف وإرجاع السجل المحذوف"""
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            if log_id not in index.by_id:
+                return None
+            try:
+                self._append(user_id, {"op": "delete", "id": log_id})
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            removed = index.remove_id(log_id)
+            self._remember(user_id, index)
+        return removed
@@ -0,0 +1,133 @@
+"""
+مخزن السجلات بصيغة JSON - ملف واحد لكل مستخدم
+JSON Log Store - one file per user
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from storage.atomic import StripedLocks
+from storage.log_index import LogIndex
+
+
+class JsonLogStore:
+    """مخزن السجلات الافتراضي (productivity_logs.json لكل مستخدم)"""
+
+    def __init__(self, path_for: Callable[[str], Path], load: Callable, save: Callable):
+        # دوال المسار والقراءة والكتابة تأتي من database.py
+        self._path_for = path_for
+        self._load = load
+        self._save = save
+        # فهرس مشترك بين كل الجلسات: {user_id: (بصمة الملفات، LogIndex)}
+        self._cache = {}
+        # قفل لكل شريحة مستخدمين: جلسات المستخدمين المختلفين لا تنتظر بعضها
+        self._locks = StripedLocks()
+
+    def _files(self, user_id: str) -> List[Path]:
+        """الملفات التي يُبنى منها الفهرس"""
+        return [self._path_for(user_id)]
+
+    def _signature(self, user_id: str) -> tuple:
+        """بصمة (mtime, size) للملفات لاكتشاف التعديل من خارج العملية"""
+        signature = []
+        for path in self._files(user_id):
+            try:
+                stat = path.stat()
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def version(self, user_id: str) -> str:
+        """نسخة بيانات المستخدم تتغير مع كل كتابة (لمزامنة الملخصات المشتقة)"""
+        return ";".join(f"{s[0]}:{s[1]}" if s else "-" for s in self._signature(user_id))
+
+    def _read(self, user_id: str) -> List[Dict]:
+        """قراءة جميع سجلات المستخدم من القرص"""
+        return self._load(self._path_for(user_id), [])
+
+    def _index(self, user_id: str) -> LogIndex:
+        """فهرس المستخدم من الذاكرة، ويعاد بناؤه فقط إذا تغيرت الملفات"""
+        signature = self._signature(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        index = LogIndex(self._read(user_id))
+        self._cache[user_id] = (signature, index)
+        return index
+
+    def _remember(self, user_id: str, index: LogIndex):
+        """تثبيت الفهرس بعد الكتابة مع البصمة الجديدة للملفات"""
+        self._cache[user_id] = (self._signature(user_id), index)
+
+    def invalidate(self, user_id: str = None):
+        """إلغاء الفهرس المخزن لمستخدم أو للجميع"""
+        if user_id is None:
+            self._cache.clear()
+            return
+        with self._locks.hold(user_id):
+            self._cache.pop(user_id, None)
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة سجل أو تحديث سجل نفس اليوم والفترة"""
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            existing = index.get(record["log_date"], record["time_slot"])
+            if existing is not None:
+                record["id"] = existing["id"]
+
+            index.put(dict(record))
+            try:
+                self._save(self._path_for(user_id), index.records())
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            self._remember(user_id, index)
+        return record
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """إضافة أو تحديث عدة سجلات بقراءة وكتابة واحدة للملف"""
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            for record in records:
+                existing = index.get(record["log_date"], record["time_slot"])
+                if existing is not None:
+                    record["id"] = existing["id"]
+                index.put(dict(record))
+            try:
+                self._save(self._path_for(user_id), index.records())
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            self._remember(user_id, index)
+        return records
+
+    def get_by_date(self, user_id: str, log_date: str) -> List[Dict]:
+        """سجلات يوم معين مرتبة حسب الفترة"""
+        with self._locks.hold(user_id):
+            return [dict(l) for l in self._index(user_id).day(log_date)]
+
+    def get_by_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية مرتبة حسب التاريخ ثم الفترة"""
+        with self._locks.hold(user_id):
+            return [dict(l) for l in self._index(user_id).range(start_date, end_date)]
+
+    def get_by_slot(self, user_id: str, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة"""
+        with self._locks.hold(user_id):
+            log = self._index(user_id).get(log_date, time_slot)
+        return dict(log) if log else None
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل وإرجاعه (None إذا لم يوجد)"""
+        with self._locks.hold(user_id):
+            index = self._index(user_id)
+            removed = index.remove_id(log_id)
+            try:
+                self._save(self._path_for(user_id), index.records())
+            except Exception:
+                self._cache.pop(user_id, None)
+                raise
+            self._remember(user_id, index)
+        return removed
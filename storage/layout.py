@@ -0,0 +1,95 @@
+"""
+توزيع مجلدات المستخدمين داخل LOCAL_DATA_DIR
+Per-user directory layout: flat or sharded
+
+    flat:     local_data/<user_id>/
+    sharded:  local_data/ab/cd/<user_id>/   (ab و cd أول أربعة أحرف من md5)
+
+مع عشرات آلاف المستخدمين يصبح المجلد الواحد بطيئاً في البحث والسرد على
+ext4 و overlayfs؛ التقسيم يبقي كل مجلد بحدود مئات العناصر.
+
+في وضع sharded يُبحث عن المستخدم في مكانه المقسم أولاً ثم في المكان القديم،
+فيعمل التطبيق أثناء النقل (migrate_user ينقل مجلداً واحداً بـ rename ذري).
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Iterator, Tuple
+
+LAYOUTS = ("flat", "sharded")
+
+_MD5 = re.compile(r"[0-9a-f]{32}")
+_SHARD = re.compile(r"[0-9a-f]{2}")
+
+
+def shard_prefix(user_id: str) -> Tuple[str, str]:
+    """مستويا التقسيم: من المعرف نفسه إن كان md5 (معرفات auth.py) وإلا من md5 له"""
+    digest = user_id if _MD5.fullmatch(user_id) else hashlib.md5(user_id.encode("utf-8")).hexdigest()
+    return digest[:2], digest[2:4]
+
+
+def flat_dir(root: Path, user_id: str) -> Path:
+    return root / user_id
+
+
+def sharded_dir(root: Path, user_id: str) -> Path:
+    first, second = shard_prefix(user_id)
+    return root / first / second / user_id
+
+
+def resolve(root: Path, user_id: str, layout: str) -> Tuple[Path, bool]:
+    """
+    (مجلد المستخدم، هل المكان نهائي) — في sharded قبل نقل مجلد قديم يرجع المكان
+    القديم مع False حتى لا يحفظه المستدعي في الذاكرة
+    """
+    if layout == "flat":
+        return flat_dir(root, user_id), True
+    if layout != "sharded":
+        raise ValueError(f"توزيع مجلدات غير معروف: {layout}")
+    target = sharded_dir(root, user_id)
+    if target.is_dir():
+        return target, True
+    legacy = flat_dir(root, user_id)
+    if legacy.is_dir():
+        return legacy, False
+    return target, True
+
+
+def _is_shard(name: str) -> bool:
+    return _SHARD.fullmatch(name) is not None
+
+
+def iter_users(root: Path) -> Iterator[Tuple[str, Path]]:
+    """(المعرف، المجلد) لكل مستخدم بالتوزيعين معاً دون ترتيب"""
+    if not root.is_dir():
+        return
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                continue
+            if not _is_shard(entry.name):
+                yield entry.name, Path(entry.path)
+                continue
+            with os.scandir(entry.path) as seconds:
+                for second in seconds:
+                    if not (_is_shard(second.name) and second.is_dir(follow_symlinks=False)):
+                        continue
+                    with os.scandir(second.path) as users:
+                        for user in users:
+                            if user.is_dir(follow_symlinks=False):
+                                yield user.name, Path(user.path)
+
+
+def migrate_user(root: Path, user_id: str) -> bool:
+    """نقل مجلد مستخدم من التوزيع المسطح إلى المقسم (False إذا لم يكن هناك ما ينقل)"""
+    legacy = flat_dir(root, user_id)
+    if not legacy.is_dir():
+        return False
+    target = sharded_dir(root, user_id)
+    if target.exists():
+        raise FileExistsError(f"المجلد موجود في المكانين: {user_id}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.rename(legacy, target)
+    return True
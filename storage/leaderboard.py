@@ -0,0 +1,216 @@
+"""
+ترتيب المتصدرين المحفوظ مع عدادات نقاط تزايدية
+Materialized leaderboard ranking with incremental score counters (SQLite)
+
+لكل فترة (أسبوعية، شهرية، كل الأوقات) صف [النقاط، السجلات] لكل مستخدم في
+leaderboard.db مع فهرس (الفترة، النقاط)، فقراءة الأوائل بحث في الفهرس بدل قراءة
+سجلات كل المستخدمين. العدادات تُحدث مع كل كتابة عبر DailyRollup.listeners:
+كتابة مستخدم = تحديث صفوفه فقط في معاملة قصيرة، لا إعادة كتابة عدادات الجميع.
+
+القاعدة تحفظ أيضاً مجموع كل يوم لكل مستخدم، والكتابة تضيف الفرق بين المجموع
+الجديد والمحفوظ، فتطبيق نفس التحديث مرتين (مثلاً بعد إعادة بناء في عملية أخرى
+قرأت السجل نفسه) لا يحسبه مرتين. القراءة من القاعدة مباشرة دون نسخة في الذاكرة،
+فتظهر تحديثات العمليات الأخرى (مثل import_logs.py) فوراً، وقفل الكتابة في SQLite
+يمنع ضياع أي تحديث بينها. عند بداية أسبوع أو شهر جديد يعاد بناء عداد تلك الفترة
+من مجاميع الأيام المحفوظة.
+
+كل فترة تنتهي اليوم (كما في الترتيب الأصلي)، فالسجلات بتاريخ مستقبلي تُحفظ في
+مجاميع الأيام ولا تُحسب حتى يحين يومها: مع كل يوم جديد يُضاف للعدادات ما بين
+نهاية الفترة المحفوظة واليوم فقط.
+"""
+
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PERIODS = ("weekly", "monthly", "all_time")
+# كل الأيام المحفوظة (ومنها المستقبلية) عند ملء مجاميع الأيام
+ALL_DAYS = ("0000-01-01", "9999-12-31")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS periods (
+    period TEXT PRIMARY KEY,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    period TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    logs INTEGER NOT NULL,
+    PRIMARY KEY (period, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS days (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    logs INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_counters_rank ON counters(period, score DESC, user_id);
+"""
+
+ADD_SQL = """
+INSERT INTO counters (period, user_id, score, logs) VALUES (?, ?, ?, ?)
+ON CONFLICT(period, user_id) DO UPDATE SET
+    score = score + excluded.score,
+    logs = logs + excluded.logs
+"""
+
+REBUILD_SQL = """
+INSERT INTO counters (period, user_id, score, logs)
+SELECT ?, user_id, SUM(score), SUM(logs) FROM days
+WHERE day BETWEEN ? AND ? GROUP BY user_id
+"""
+
+# الأيام التي دخلت الفترة منذ آخر تحديث لنهايتها (day > النهاية القديمة)
+EXTEND_SQL = """
+INSERT INTO counters (period, user_id, score, logs)
+SELECT ?, user_id, SUM(score), SUM(logs) FROM days
+WHERE day > ? AND day <= ? GROUP BY user_id
+ON CONFLICT(period, user_id) DO UPDATE SET
+    score = score + excluded.score,
+    logs = logs + excluded.logs
+"""
+
+
+def period_bounds(period: str, today: date) -> Tuple[str, str]:
+    """حدود الفترة (نصوص ISO) من بدايتها حتى اليوم"""
+    if period == "weekly":
+        # الأسبوع يبدأ يوم السبت
+        start = today - timedelta(days=(today.weekday() + 2) % 7)
+    elif period == "monthly":
+        start = today.replace(day=1)
+    else:
+        return ALL_DAYS[0], str(today)
+    return str(start), str(today)
+
+
+class Leaderboard:
+    """ترتيب المتصدرين لكل الفترات في ملف leaderboard.db واحد"""
+
+    def __init__(self, db_path: Callable[[], Path],
+                 users: Callable[[], Iterable[str]],
+                 daily_for: Callable[[str, str, str], Dict[str, Dict]]):
+        # مسار القاعدة وقائمة المستخدمين والملخص اليومي تأتي من database.py
+        self._db_path = db_path
+        self._users = users
+        self._daily_for = daily_for
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال خاص بكل خيط (Streamlit يشغّل كل جلسة في خيط مستقل)"""
+        path = self._db_path()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.path != path:
+            # isolation_level=None: المعاملات صريحة (BEGIN IMMEDIATE) لحجز الكتابة قبل القراءة
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.path = conn, path
+        return conn
+
+    def _fill(self, conn: sqlite3.Connection):
+        """مجاميع أيام كل المستخدمين من الملخصات اليومية (أول تشغيل أو بعد invalidate)"""
+        conn.execute("DELETE FROM days")
+        for user_id in self._users():
+            conn.executemany(
+                "INSERT INTO days (user_id, day, score, logs) VALUES (?, ?, ?, ?)",
+                ((user_id, d, day["score"], day["slots"])
+                 for d, day in self._daily_for(user_id, *ALL_DAYS).items()
+                 if day["slots"]),
+            )
+
+    def _current(self, conn: sqlite3.Connection, today: date) -> Dict[str, Tuple[str, str]]:
+        """
+        حدود الفترات الحالية مع تحديث عداد كل فترة تغيرت حدودها
+        يُستدعى داخل معاملة BEGIN IMMEDIATE. صف all_time لا يتغير بدؤه، فغيابه
+        يعني أن مجاميع الأيام لم تُملأ بعد
+        """
+        stored = {period: (start, end) for period, start, end in conn.execute("SELECT period, start, end FROM periods")}
+        if "all_time" not in stored:
+            self._fill(conn)
+            stored = {}
+        bounds = {}
+        for period in PERIODS:
+            start, end = bounds[period] = period_bounds(period, today)
+            previous = stored.get(period)
+            if previous == (start, end):
+                continue
+            if previous is not None and previous[0] == start and previous[1] < end:
+                # يوم جديد في نفس الفترة: إضافة الأيام التي حان وقتها فقط
+                conn.execute(EXTEND_SQL, (period, previous[1], end))
+            else:
+                conn.execute("DELETE FROM counters WHERE period = ?", (period,))
+                conn.execute(REBUILD_SQL, (period, start, end))
+            conn.execute("INSERT OR REPLACE INTO periods (period, start, end) VALUES (?, ?, ?)",
+                         (period, start, end))
+        return bounds
+
+    def _transaction(self, conn: sqlite3.Connection, work: Callable[[], None]):
+        """تنفيذ work في معاملة تحجز الكتابة قبل أول قراءة"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            work()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(self, user_id: str, changes: List[Tuple[str, int, int]]):
+        """تطبيق مجاميع أيام مستخدم بعد الكتابة [(اليوم، النقاط، السجلات)] في معاملة واحدة"""
+        def work():
+            bounds = self._current(conn, date.today())
+            for day, score, logs in changes:
+                row = conn.execute(
+                    "SELECT score, logs FROM days WHERE user_id = ? AND day = ?", (user_id, day)
+                ).fetchone()
+                old_score, old_logs = row or (0, 0)
+                if logs > 0:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO days (user_id, day, score, logs) VALUES (?, ?, ?, ?)",
+                        (user_id, day, score, logs),
+                    )
+                elif row is not None:
+                    conn.execute("DELETE FROM days WHERE user_id = ? AND day = ?", (user_id, day))
+                if (score, logs) == (old_score, old_logs):
+                    continue
+                for period, (start, end) in bounds.items():
+                    if start <= day <= end:
+                        conn.execute(ADD_SQL, (period, user_id, score - old_score, logs - old_logs))
+            conn.execute("DELETE FROM counters WHERE user_id = ? AND logs <= 0", (user_id,))
+
+        try:
+            conn = self._conn()
+            self._transaction(conn, work)
+        except Exception:
+            # السجل نفسه حُفظ: يعاد بناء الترتيب من الملخصات عند القراءة التالية
+            self.invalidate()
+
+    def top(self, period: str, limit: Optional[int] = None,
+            today: Optional[date] = None) -> List[Tuple[str, int, int]]:
+        """(المستخدم، النقاط، السجلات) للأوائل في فترة مرتبين تنازلياً حسب النقاط"""
+        conn = self._conn()
+        today = today or date.today()
+        row = conn.execute("SELECT start, end FROM periods WHERE period = ?", (period,)).fetchone()
+        if row is None or tuple(row) != period_bounds(period, today):
+            # فترة أو يوم جديد: يُحدث العداد مرة واحدة بقفل الكتابة (ويُعاد الفحص داخله)
+            self._transaction(conn, lambda: self._current(conn, today))
+        return conn.execute(
+            "SELECT user_id, score, logs FROM counters WHERE period = ? AND score > 0 "
+            "ORDER BY score DESC, user_id LIMIT ?",
+            (period, -1 if limit is None else limit),
+        ).fetchall()
+
+    def invalidate(self):
+        """إعادة ملء مجاميع الأيام وبناء كل الفترات من الملخصات عند القراءة التالية"""
+        try:
+            self._conn().execute("DELETE FROM periods")
+        except sqlite3.Error:
+            pass
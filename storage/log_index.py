@@ -0,0 +1,87 @@
+"""
+فهرس سجلات المستخدم في الذاكرة مفهرس بـ (التاريخ، الفترة)
+In-memory per-user log index keyed by (log_date, time_slot)
+
+التواريخ بصيغة ISO تُقارن نصياً، لذا تُحفظ في قائمة مرتبة ويُستعلم عن
+الفترات الزمنية بالبحث الثنائي (bisect) بدل المرور على كل السجلات.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class LogIndex:
+    """سجلات مستخدم واحد على شكل {التاريخ: {الفترة: السجل}}"""
+
+    def __init__(self, logs: Iterable[Dict] = ()):
+        self.by_date: Dict[str, Dict[int, Dict]] = {}
+        self.by_id: Dict[str, Tuple[str, int]] = {}
+        # التواريخ الموجودة مرتبة تصاعدياً
+        self.dates: List[str] = []
+        # سجلات قديمة بلا تاريخ: لا تظهر في الاستعلامات لكنها لا تُفقد عند الحفظ
+        self.unindexed: List[Dict] = []
+        for log in logs:
+            self._put(log)
+        # ترتيب واحد عند البناء بدل insort لكل يوم
+        self.dates = sorted(self.by_date)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة"""
+        return self.by_date.get(log_date, {}).get(time_slot)
+
+    def put(self, record: Dict) -> Optional[Dict]:
+        """إضافة سجل أو استبدال سجل نفس الفترة (يرجع السجل المستبدل)"""
+        log_date = record.get("log_date")
+        if log_date and log_date not in self.by_date:
+            insort(self.dates, log_date)
+        return self._put(record)
+
+    def _put(self, record: Dict) -> Optional[Dict]:
+        """إضافة السجل للقواميس دون تحديث قائمة التواريخ"""
+        log_date = record.get("log_date")
+        if not log_date:
+            self.unindexed.append(record)
+            return None
+
+        slots = self.by_date.setdefault(log_date, {})
+        time_slot = record.get("time_slot", 0)
+        replaced = slots.get(time_slot)
+        if replaced is not None:
+            self.by_id.pop(replaced.get("id"), None)
+
+        slots[time_slot] = record
+        self.by_id[record.get("id")] = (log_date, time_slot)
+        return replaced
+
+    def remove_id(self, log_id: str) -> Optional[Dict]:
+        """حذف سجل بالمعرف (يرجع السجل المحذوف)"""
+        key = self.by_id.pop(log_id, None)
+        if key is None:
+            return None
+        log_date, time_slot = key
+        slots = self.by_date[log_date]
+        removed = slots.pop(time_slot)
+        if not slots:
+            del self.by_date[log_date]
+            del self.dates[bisect_left(self.dates, log_date)]
+        return removed
+
+    def day(self, log_date: str) -> List[Dict]:
+        """سجلات يوم مرتبة حسب الفترة"""
+        slots = self.by_date.get(log_date, {})
+        return [slots[s] for s in sorted(slots)]
+
+    def dates_in_range(self, start_date: str, end_date: str) -> List[str]:
+        """التواريخ المسجلة ضمن الفترة بالبحث الثنائي"""
+        return self.dates[bisect_left(self.dates, start_date):bisect_right(self.dates, end_date)]
+
+    def range(self, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية مرتبة حسب التاريخ ثم الفترة - O(log n + k)"""
+        return [log for d in self.dates_in_range(start_date, end_date) for log in self.day(d)]
+
+    def records(self) -> List[Dict]:
+        """جميع السجلات مرتبة حسب (التاريخ، الفترة) للحفظ"""
+        return [log for d in self.dates for log in self.day(d)] + self.unindexed
@@ -0,0 +1,240 @@
+"""
+مخزن السجلات مقسم حسب الشهر - ملف لكل شهر مع بيان صغير
+Month-partitioned JSON Log Store with a tiny manifest
+
+    local_data/<user>/logs/manifest.json   {"months": ["2026-09", "2026-10"]}
+    local_data/<user>/logs/2026-10.json    سجلات الشهر مرتبة حسب (التاريخ، الفترة)
+
+قراءة يوم تفتح شهراً واحداً، وقراءة فترة تفتح الأشهر المتداخلة معها فقط، والكتابة
+تعيد كتابة شهر السجل فقط. البيان يُحدث قبل إضافة شهر وبعد حذفه، فالشهر المعلن
+بلا ملف يُقرأ فارغاً ولا يختفي شهر له ملف.
+
+المستخدم الذي لديه productivity_logs.json قديم يُنقل تلقائياً عند أول وصول
+(أو دفعة واحدة عبر database.migrate_log_partitions).
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from storage.atomic import StripedLocks
+from storage.journal_store import JournalLogStore
+from storage.log_index import LogIndex
+
+MANIFEST = "manifest.json"
+
+
+def month_of(log_date: str) -> str:
+    """شهر التاريخ ISO بصيغة YYYY-MM"""
+    return str(log_date)[:7]
+
+
+def _stat(path: Path) -> Optional[tuple]:
+    """بصمة (mtime, size) للملف أو None إذا لم يوجد"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class PartitionedLogStore:
+    """مخزن JSON بملف لكل شهر، والفهرس في الذاكرة لكل (مستخدم، شهر)"""
+
+    def __init__(self, dir_for: Callable[[str], Path], legacy_path_for: Callable[[str], Path],
+                 load: Callable, save: Callable):
+        # دوال المسار والقراءة والكتابة تأتي من database.py
+        self._dir_for = dir_for
+        self._legacy_path_for = legacy_path_for
+        self._load = load
+        self._save = save
+        # {(user_id, الشهر): (بصمة الملف، LogIndex)}
+        self._cache = {}
+        # {user_id: (بصمة البيان، الأشهر مرتبة)}
+        self._manifests = {}
+        self._locks = StripedLocks()
+
+    def _manifest_path(self, user_id: str) -> Path:
+        return self._dir_for(user_id) / MANIFEST
+
+    def _partition_path(self, user_id: str, month: str) -> Path:
+        return self._dir_for(user_id) / f"{month}.json"
+
+    def _months(self, user_id: str) -> List[str]:
+        """الأشهر التي لها سجلات (من البيان، مع النقل من الملف القديم عند الحاجة)"""
+        path = self._manifest_path(user_id)
+        signature = _stat(path)
+        if signature is None:
+            if not self.migrate(user_id):
+                return []
+            signature = _stat(path)
+
+        cached = self._manifests.get(user_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        months = sorted(self._load(path, {}).get("months", []))
+        self._manifests[user_id] = (signature, months)
+        return months
+
+    def _save_manifest(self, user_id: str, months: List[str]):
+        path = self._manifest_path(user_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._save(path, {"months": months})
+        self._manifests[user_id] = (_stat(path), months)
+
+    def _index(self, user_id: str, month: str) -> LogIndex:
+        """فهرس شهر من الذاكرة، ويعاد بناؤه فقط إذا تغير ملفه"""
+        path = self._partition_path(user_id, month)
+        signature = _stat(path)
+        cached = self._cache.get((user_id, month))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        index = LogIndex(self._load(path, []))
+        self._cache[(user_id, month)] = (signature, index)
+        return index
+
+    def _store(self, user_id: str, indexes: Dict[str, LogIndex]):
+        """حفظ الأشهر المعدلة فقط مع تحديث البيان إن ظهر شهر أو اختفى"""
+        months = self._months(user_id)
+        present = {month for month, index in indexes.items() if len(index)}
+        listed = sorted(set(months) | present)
+        final = [m for m in listed if m in present or m not in indexes]
+
+        # الشهر الجديد يُعلن قبل كتابة ملفه
+        if listed != months:
+            self._save_manifest(user_id, listed)
+        try:
+            for month, index in indexes.items():
+                path = self._partition_path(user_id, month)
+                if len(index):
+                    self._save(path, index.records())
+                else:
+                    path.unlink(missing_ok=True)
+                self._cache[(user_id, month)] = (_stat(path), index)
+        except Exception:
+            for month in indexes:
+                self._cache.pop((user_id, month), None)
+            raise
+        # والشهر الفارغ يُحذف من البيان بعد حذف ملفه
+        if final != listed:
+            self._save_manifest(user_id, final)
+
+    def migrate(self, user_id: str) -> bool:
+        """نقل productivity_logs.json (مع سجل journal إن وجد) إلى ملفات شهرية - آمن للتكرار"""
+        with self._locks.hold(user_id):
+            if _stat(self._manifest_path(user_id)) is not None:
+                return False
+            legacy = JournalLogStore(self._legacy_path_for, self._load, self._save)
+            files = [p for p in legacy._files(user_id) if p.exists()]
+            if not files:
+                return False
+
+            by_month: Dict[str, List[Dict]] = {}
+            for log in legacy._read(user_id):
+                if log.get("log_date"):
+                    by_month.setdefault(month_of(log["log_date"]), []).append(log)
+
+            self._dir_for(user_id).mkdir(parents=True, exist_ok=True)
+            for month, logs in by_month.items():
+                self._save(self._partition_path(user_id, month), LogIndex(logs).records())
+            # البيان نقطة الالتزام: انقطاع قبله يعيد النقل من البداية
+            self._save_manifest(user_id, sorted(by_month))
+            for path in files:
+                path.rename(path.with_name(path.name + ".migrated"))
+            return True
+
+    def version(self, user_id: str) -> str:
+        """نسخة بيانات المستخدم: بصمات البيان وملفات الأشهر"""
+        with self._locks.hold(user_id):
+            months = self._months(user_id)
+            signatures = [_stat(self._manifest_path(user_id))]
+            signatures += [_stat(self._partition_path(user_id, m)) for m in months]
+            return ";".join(f"{s[0]}:{s[1]}" if s else "-" for s in signatures)
+
+    def invalidate(self, user_id: str = None):
+        """إلغاء الفهارس المخزنة لمستخدم أو للجميع"""
+        if user_id is None:
+            self._cache.clear()
+            self._manifests.clear()
+            return
+        with self._locks.hold(user_id):
+            self._manifests.pop(user_id, None)
+            for key in [k for k in self._cache if k[0] == user_id]:
+                self._cache.pop(key, None)
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة أو تحديث سجل بإعادة كتابة شهره فقط"""
+        return self.upsert_many(user_id, [record])[0]
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """إضافة أو تحديث عدة سجلات بكتابة واحدة لكل شهر متأثر"""
+        with self._locks.hold(user_id):
+            indexes = {}
+            for record in records:
+                month = month_of(record["log_date"])
+                if month not in indexes:
+                    indexes[month] = self._index(user_id, month)
+                index = indexes[month]
+                existing = index.get(record["log_date"], record["time_slot"])
+                if existing is not None:
+                    record["id"] = existing["id"]
+                index.put(dict(record))
+            self._store(user_id, indexes)
+        return records
+
+    def get_by_date(self, user_id: str, log_date: str) -> List[Dict]:
+        """سجلات يوم معين من ملف شهره فقط"""
+        with self._locks.hold(user_id):
+            month = month_of(log_date)
+            if month not in self._months(user_id):
+                return []
+            return [dict(l) for l in self._index(user_id, month).day(log_date)]
+
+    def get_by_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية من الأشهر المتداخلة معها فقط"""
+        with self._locks.hold(user_id):
+            first, last = month_of(start_date), month_of(end_date)
+            return [
+                dict(l)
+                for month in self._months(user_id) if first <= month <= last
+                for l in self._index(user_id, month).range(start_date, end_date)
+            ]
+
+    def iter_range(self, user_id: str, start_date: str, end_date: str) -> Iterator[List[Dict]]:
+        """سجلات فترة شهراً بشهر دون إضافتها للذاكرة المخبأة (للتصدير الطويل)"""
+        with self._locks.hold(user_id):
+            first, last = month_of(start_date), month_of(end_date)
+            months = [m for m in self._months(user_id) if first <= m <= last]
+        for month in months:
+            with self._locks.hold(user_id):
+                path = self._partition_path(user_id, month)
+                cached = self._cache.get((user_id, month))
+                if cached is not None and cached[0] == _stat(path):
+                    logs = [dict(l) for l in cached[1].range(start_date, end_date)]
+                else:
+                    logs = LogIndex(self._load(path, [])).range(start_date, end_date)
+            if logs:
+                yield logs
+
+    def get_by_slot(self, user_id: str, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة"""
+        with self._locks.hold(user_id):
+            month = month_of(log_date)
+            if month not in self._months(user_id):
+                return None
+            log = self._index(user_id, month).get(log_date, time_slot)
+        return dict(log) if log else None
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل وإرجاعه (None إذا لم يوجد)"""
+        with self._locks.hold(user_id):
+            months = self._months(user_id)
+            # المعرف يبدأ عادة بتاريخ السجل: نجرب شهره أولاً
+            guess = month_of(log_id)
+            for month in sorted(months, key=lambda m: m != guess):
+                index = self._index(user_id, month)
+                if log_id in index.by_id:
+                    removed = index.remove_id(log_id)
+                    self._store(user_id, {month: index})
+                    return removed
+        return None
@@ -0,0 +1,346 @@
+"""
+ملخص يومي مجمع لسجلات كل مستخدم يُحدث عند الكتابة
+Per-user daily rollup maintained on write
+
+لكل يوم: مجموع النقاط، عدد الفترات، مجموع وعدد كل فئة، عدد كل درجة 0-4،
+وخريطة بتات الفترات المسجلة (slot_mask.py).
+الأهداف والسلسلة والتقويم والمتصدرين تقرأ O(أيام) من هنا بدل O(أيام × 48) سجل.
+
+الملف daily_rollup.json يحفظ نسخة بيانات المحرك (version) التي يطابقها، فإن
+تغيرت السجلات من خارج هذا الكائن يعاد بناء الملخص منها تلقائياً.
+ويحفظ معه حالة السلسلة (streaks.py) للهدف اليومي الحالي.
+
+ServerRollup بنفس الواجهة للمحرك الذي يجمع في الخادم (Supabase): الكتابة طلب
+واحد للمحرك، والملخص يُقرأ من عرض الخادم عند الطلب دون ملف محلي.
+"""
+
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from storage import slot_mask, streaks
+from storage.atomic import StripedLocks
+
+# أوسع فترة ممكنة لقراءة كل سجلات المستخدم عند إعادة البناء
+ALL_DATES = ("0000-01-01", "9999-12-31")
+
+# بنية ملف الملخص: الملفات الأقدم (بلا mask) يعاد بناؤها
+FORMAT = 2
+
+
+def empty_day() -> Dict:
+    """ملخص يوم بلا سجلات"""
+    return {"score": 0, "slots": 0, "categories": {}, "scores": [0, 0, 0, 0, 0], "mask": 0}
+
+
+def copy_day(day: Dict) -> Dict:
+    """نسخة مستقلة من ملخص يوم"""
+    return {
+        "score": day["score"],
+        "slots": day["slots"],
+        "categories": {cat: list(v) for cat, v in day["categories"].items()},
+        "scores": list(day["scores"]),
+        "mask": day["mask"],
+    }
+
+
+def apply(days: Dict[str, Dict], record: Dict, sign: int = 1):
+    """إضافة سجل (sign=1) إلى ملخص يومه أو طرحه منه (sign=-1)"""
+    log_date = record.get("log_date")
+    if not log_date:
+        return
+    day = days.setdefault(str(log_date), empty_day())
+    score = record.get("score", 0)
+
+    day["score"] += sign * score
+    day["slots"] += sign
+
+    categories = day["categories"]
+    category = record.get("category", "غير محدد")
+    totals = categories.setdefault(category, [0, 0])
+    totals[0] += sign * score
+    totals[1] += sign
+    if totals[1] <= 0:
+        del categories[category]
+
+    if 0 <= score < len(day["scores"]):
+        day["scores"][score] += sign
+
+    slot = record.get("time_slot")
+    if slot is not None:
+        if sign > 0:
+            day["mask"] |= slot_mask.bit(int(slot))
+        else:
+            day["mask"] &= ~slot_mask.bit(int(slot))
+
+    if day["slots"] <= 0:
+        del days[str(log_date)]
+
+
+def _totals(days: Dict[str, Dict], log_date: str) -> tuple:
+    """(مجموع النقاط، عدد الفترات) ليوم"""
+    day = days.get(log_date)
+    return (day["score"], day["slots"]) if day else (0, 0)
+
+
+def build(logs: Iterable[Dict]) -> Dict[str, Dict]:
+    """بناء الملخص كاملاً من السجلات الخام"""
+    days: Dict[str, Dict] = {}
+    for log in logs:
+        apply(days, log)
+    return days
+
+
+class DailyRollup:
+    """يمرر الكتابة لمحرك السجلات ثم يحدث ملخص اليوم المتأثر وحالة السلسلة فقط"""
+
+    def __init__(self, store, path_for: Callable[[str], Path], load: Callable, save: Callable):
+        self.store = store
+        # دوال المسار والقراءة والكتابة تأتي من database.py
+        self._path_for = path_for
+        self._load = load
+        self._save = save
+        # {user_id: (نسخة بيانات المحرك، {"days": ..., "streak": ...})}
+        self._cache = {}
+        # قفل لكل شريحة مستخدمين: جلسات المستخدمين المختلفين لا تنتظر بعضها
+        self._locks = StripedLocks()
+        # دوال تُستدعى بعد كل كتابة: (user_id, [(log_date, النقاط، الفترات)]) لكل يوم تغير
+        self.listeners: List[Callable[[str, List[Tuple[str, int, int]]], None]] = []
+
+    def _state(self, user_id: str) -> Dict:
+        """ملخص المستخدم المطابق للنسخة الحالية من السجلات"""
+        version = self.store.version(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        data = self._load(self._path_for(user_id), {})
+        if data.get("version") == version and data.get("format") == FORMAT:
+            state = {"days": data.get("days", {}), "streak": data.get("streak")}
+        else:
+            days = self._build(user_id)
+            streak = data.get("streak")
+            if streak is not None:
+                streak = streaks.compute(days, streak["goal"])
+            state = {"days": days, "streak": streak}
+            # لا ننشئ ملفاً لمستخدم بلا سجلات (مثل المرور على كل المستخدمين في المتصدرين)
+            if days or data:
+                self._persist(user_id, version, state)
+        self._cache[user_id] = (version, state)
+        return state
+
+    def _build(self, user_id: str) -> Dict[str, Dict]:
+        """الملخص كاملاً: من المحرك إن كان يجمع في الخادم، وإلا من السجلات الخام"""
+        daily_totals = getattr(self.store, "daily_totals", None)
+        if daily_totals is not None:
+            return daily_totals(user_id, *ALL_DATES)
+        return build(self.store.get_by_range(user_id, *ALL_DATES))
+
+    def _persist(self, user_id: str, version: str, state: Dict):
+        """حفظ الملخص مع نسخة السجلات التي يطابقها"""
+        self._save(self._path_for(user_id), {"version": version, "format": FORMAT, **state})
+
+    def _commit(self, user_id: str, state: Dict):
+        """تثبيت الملخص بعد الكتابة في المحرك"""
+        version = self.store.version(user_id)
+        try:
+            self._persist(user_id, version, state)
+        except Exception:
+            # السجل نفسه حُفظ: الملخص يعاد بناؤه عند القراءة التالية
+            self._cache.pop(user_id, None)
+            return
+        self._cache[user_id] = (version, state)
+
+    def _apply(self, state: Dict, record: Dict, sign: int):
+        """تطبيق سجل على ملخص يومه ثم تحديث السلسلة بالفرق"""
+        days = state["days"]
+        log_date = str(record.get("log_date"))
+        before = days[log_date]["score"] if log_date in days else None
+        apply(days, record, sign)
+        after = days[log_date]["score"] if log_date in days else None
+        if state["streak"] is not None:
+            state["streak"] = streaks.advance(state["streak"], days, log_date, before, after)
+
+    def _notify(self, user_id: str, before: Dict[str, tuple], after: Dict[str, tuple]):
+        """
+        إبلاغ المستمعين بمجاميع الأيام التي تغيرت دفعة واحدة (خارج القفل لتجنب تعارض الأقفال)
+        المجاميع بعد الكتابة لا الفروق: تطبيقها مرتين لا يغير النتيجة
+        """
+        changes = [
+            (log_date, *after[log_date])
+            for log_date, totals in before.items() if totals != after[log_date]
+        ]
+        if not changes:
+            return
+        for listener in self.listeners:
+            listener(user_id, changes)
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة أو تحديث سجل مع طرح السجل المستبدل من ملخص يومه"""
+        with self._locks.hold(user_id):
+            state = self._state(user_id)
+            log_date = str(record["log_date"])
+            before = _totals(state["days"], log_date)
+            previous = self.store.get_by_slot(user_id, record["log_date"], record["time_slot"])
+            saved = self.store.upsert(user_id, record)
+            if previous is not None:
+                self._apply(state, previous, -1)
+            self._apply(state, saved, 1)
+            after = _totals(state["days"], log_date)
+            self._commit(user_id, state)
+        self._notify(user_id, {log_date: before}, {log_date: after})
+        return saved
+
+    def upsert_many(self, user_id: str, records: List[Dict],
+                    existing: Optional[Dict[Tuple[str, int], Dict]] = None) -> List[Dict]:
+        """
+        إضافة أو تحديث عدة سجلات بكتابة واحدة في المحرك وحفظ واحد للملخص
+        existing: السجلات المحفوظة {(اليوم، الفترة): سجل} إن قرأها المستدعي مسبقاً
+        (الاستيراد) فلا تُقرأ كل فترة من المحرك على حدة
+        """
+        # آخر سجل لنفس (اليوم، الفترة) هو الذي يبقى
+        records = list({(str(r["log_date"]), r["time_slot"]): r for r in records}.values())
+        with self._locks.hold(user_id):
+            state = self._state(user_id)
+            log_dates = sorted({str(r["log_date"]) for r in records})
+            before = {d: _totals(state["days"], d) for d in log_dates}
+            if existing is None:
+                previous = [
+                    self.store.get_by_slot(user_id, r["log_date"], r["time_slot"]) for r in records
+                ]
+            else:
+                previous = [existing.get((str(r["log_date"]), r["time_slot"])) for r in records]
+            saved = self.store.upsert_many(user_id, records)
+            for old, new in zip(previous, saved):
+                if old is not None:
+                    apply(state["days"], old, -1)
+                apply(state["days"], new, 1)
+            after = {d: _totals(state["days"], d) for d in log_dates}
+            self._advance_streak(state, before, after)
+            self._commit(user_id, state)
+        self._notify(user_id, before, after)
+        return saved
+
+    def _advance_streak(self, state: Dict, before: Dict[str, tuple], after: Dict[str, tuple]):
+        """تحديث السلسلة بعد دفعة: O(1) إذا تغير تحقق الهدف في يوم واحد، وإلا إعادة حساب واحدة"""
+        streak = state["streak"]
+        if streak is None:
+            return
+        goal = streak["goal"]
+        flipped = [
+            d for d in before
+            if (before[d][1] > 0 and before[d][0] >= goal) != (after[d][1] > 0 and after[d][0] >= goal)
+        ]
+        if len(flipped) == 1:
+            d = flipped[0]
+            state["streak"] = streaks.advance(
+                streak, state["days"], d,
+                before[d][0] if before[d][1] else None, after[d][0] if after[d][1] else None
+            )
+        elif flipped:
+            state["streak"] = streaks.compute(state["days"], goal)
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل وطرحه من ملخص يومه"""
+        with self._locks.hold(user_id):
+            state = self._state(user_id)
+            removed = self.store.delete(user_id, log_id)
+            if removed is not None:
+                log_date = str(removed["log_date"])
+                before = _totals(state["days"], log_date)
+                self._apply(state, removed, -1)
+                after = _totals(state["days"], log_date)
+            self._commit(user_id, state)
+        if removed is not None:
+            self._notify(user_id, {log_date: before}, {log_date: after})
+        return removed
+
+    def get_range(self, user_id: str, start_date: str, end_date: str) -> Dict[str, Dict]:
+        """ملخصات أيام فترة زمنية مرتبة حسب التاريخ"""
+        with self._locks.hold(user_id):
+            days = self._state(user_id)["days"]
+            return {
+                d: copy_day(days[d])
+                for d in sorted(days) if start_date <= d <= end_date
+            }
+
+    def slot_masks(self, user_id: str, start_date: str, end_date: str) -> Dict[str, int]:
+        """خرائط بتات الفترات المسجلة لأيام فترة زمنية (الأيام بلا سجلات لا تظهر)"""
+        with self._locks.hold(user_id):
+            days = self._state(user_id)["days"]
+            if start_date == end_date:
+                day = days.get(start_date)
+                return {start_date: day["mask"]} if day else {}
+            return {d: day["mask"] for d, day in days.items() if start_date <= d <= end_date}
+
+    def set_goal(self, user_id: str, goal: int) -> Dict:
+        """إعادة حساب حالة السلسلة عند تغير الهدف اليومي"""
+        with self._locks.hold(user_id):
+            state = self._state(user_id)
+            streak = state["streak"]
+            if streak is None or streak["goal"] != goal:
+                state["streak"] = streaks.compute(state["days"], goal)
+                self._commit(user_id, state)
+            return state["streak"]
+
+    def get_streak(self, user_id: str, goal: int, today: date) -> Dict:
+        """السلسلة الحالية والأطول دون قراءة السجلات"""
+        with self._locks.hold(user_id):
+            streak = self.set_goal(user_id, goal)
+            return {
+                "current": streaks.current(streak, self._state(user_id)["days"], today),
+                "longest": streak["longest"],
+                "run_start": streak["run_start"],
+                "last_day": streak["last_day"],
+            }
+
+    def invalidate(self, user_id: str = None):
+        """إلغاء الملخص المخزن في الذاكرة لمستخدم أو للجميع"""
+        if user_id is None:
+            self._cache.clear()
+            return
+        with self._locks.hold(user_id):
+            self._cache.pop(user_id, None)
+
+
+class ServerRollup:
+    """
+    واجهة DailyRollup فوق محرك يجمع في الخادم (daily_totals)
+    لا نسخة ولا ملف ولا قفل محلي: الكتابة تمر للمحرك مباشرة والقراءة من عرض الخادم
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة أو تحديث سجل بطلب واحد"""
+        return self.store.upsert(user_id, record)
+
+    def upsert_many(self, user_id: str, records: List[Dict],
+                    existing: Optional[Dict[Tuple[str, int], Dict]] = None) -> List[Dict]:
+        """إضافة أو تحديث عدة سجلات بطلب واحد (existing لا يلزم: الخادم يحل التعارض)"""
+        records = list({(str(r["log_date"]), r["time_slot"]): r for r in records}.values())
+        return self.store.upsert_many(user_id, records)
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل"""
+        return self.store.delete(user_id, log_id)
+
+    def get_range(self, user_id: str, start_date: str, end_date: str) -> Dict[str, Dict]:
+        """ملخصات أيام فترة زمنية من عرض الخادم"""
+        return self.store.daily_totals(user_id, start_date, end_date)
+
+    def slot_masks(self, user_id: str, start_date: str, end_date: str) -> Dict[str, int]:
+        """خرائط بتات الفترات المسجلة لأيام فترة زمنية"""
+        return {d: day["mask"] for d, day in self.get_range(user_id, start_date, end_date).items()}
+
+    def get_streak(self, user_id: str, goal: int, today: date) -> Dict:
+        """السلسلة الحالية والأطول بقراءة واحدة لملخص كل الأيام"""
+        days = self.get_range(user_id, *ALL_DATES)
+        streak = streaks.compute(days, goal)
+        return {
+            "current": streaks.current(streak, days, today),
+            "longest": streak["longest"],
+            "run_start": streak["run_start"],
+            "last_day": streak["last_day"],
+        }
@@ -0,0 +1,80 @@
+"""
+ترميز ملفات البيانات المحلية: orjson أو msgpack إن توفرا، وإلا json القياسي
+Pluggable serializer for local data files
+
+الصيغة تُختار عند الكتابة (LOCAL_DATA_FORMAT في config.py):
+    auto     orjson إن كان مثبتاً وإلا json (الملفات تبقى JSON نصياً)
+    orjson   JSON مضغوط بمكتبة orjson
+    msgpack  ثنائي أصغر وأسرع (اختياري لأنه غير مقروء للبشر)
+    json     المكتبة القياسية بلا مسافات
+
+القراءة تكتشف الصيغة من أول بايت، فالملفات القديمة (JSON بمسافات) تبقى مقروءة
+بعد تغيير الصيغة، وتتحول للصيغة الجديدة عند أول كتابة.
+"""
+
+import codecs
+import json
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# أول بايت في ملف JSON (كائن أو قائمة مع مسافات محتملة)
+_JSON_LEADS = b"{[ \t\r\n"
+
+
+def available() -> List[str]:
+    """الصيغ المتاحة في هذه البيئة"""
+    formats = ["json"]
+    if orjson is not None:
+        formats.append("orjson")
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+def resolve(fmt: str = "auto") -> str:
+    """الصيغة الفعلية (الصيغة غير المثبتة ترجع إلى auto)"""
+    fmt = (fmt or "auto").strip().lower()
+    if fmt in available():
+        return fmt
+    return "orjson" if orjson is not None else "json"
+
+
+def dumps(data: Any, fmt: str = "auto") -> bytes:
+    """ترميز البيانات بالصيغة المطلوبة (القيم غير المدعومة مثل date تُحول نصاً)"""
+    fmt = resolve(fmt)
+    if fmt == "orjson":
+        # date/datetime عبر str مثل json القياسي تماماً
+        return orjson.dumps(
+            data, default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    if fmt == "msgpack":
+        return msgpack.packb(data, default=str, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads_json(raw: bytes) -> Any:
+    """قراءة JSON بأسرع مكتبة متاحة"""
+    if raw.startswith(codecs.BOM_UTF8):
+        raw = raw[len(codecs.BOM_UTF8):]
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def loads(raw: bytes) -> Any:
+    """قراءة ملف بأي صيغة مع اكتشافها تلقائياً"""
+    if raw[:1] in _JSON_LEADS or raw.startswith(codecs.BOM_UTF8):
+        return loads_json(raw)
+    if msgpack is None:
+        raise ValueError("الملف بصيغة msgpack والحزمة غير مثبتة")
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
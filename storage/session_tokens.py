@@ -0,0 +1,113 @@
+"""
+رموز جلسات موقعة تنتهي صلاحيتها (استعادة الدخول بعد تحديث الصفحة)
+Signed, expiring session tokens with a small TTL store
+
+الرمز: <token_id>.<expires>.<sig> حيث sig = HMAC-SHA256(السر، token_id.expires).
+التوقيع يرفض الرموز المزورة أو المعدلة دون لمس المخزن، والمخزن (جدول sessions
+في users.db) يربط token_id بالمستخدم ويسمح بإلغاء الرمز عند الخروج. التحقق
+مقارنة HMAC وبحث بالمفتاح الأساسي، بدل كلمة المرور وقراءة الحسابات.
+
+الرموز المنتهية تُحذف عند إصدار رمز جديد (فهرس على expires_at).
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    token_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+"""
+
+
+def _sign(secret: bytes, payload: str) -> str:
+    digest = hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+class SessionTokens:
+    """إصدار رموز الجلسات والتحقق منها وإلغاؤها"""
+
+    def __init__(self, db_path: Path, secret: bytes, ttl: int, clock: Callable[[], float] = time.time):
+        self.db_path = Path(db_path)
+        self._secret = secret
+        # مدة صلاحية الرمز بالثواني
+        self.ttl = ttl
+        self._clock = clock
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال خاص بكل خيط (Streamlit يشغّل كل جلسة في خيط مستقل)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _parse(self, token: str) -> Optional[tuple]:
+        """(token_id، وقت الانتهاء) لرمز سليم التوقيع، وإلا None"""
+        try:
+            token_id, expires, signature = token.split(".")
+            expires = int(expires)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, _sign(self._secret, f"{token_id}.{expires}")):
+            return None
+        return token_id, expires
+
+    def issue(self, user_id: str) -> str:
+        """رمز جديد للمستخدم صالح لمدة ttl"""
+        now = int(self._clock())
+        token_id = secrets.token_urlsafe(18)
+        expires = now + self.ttl
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT INTO sessions (token_id, user_id, expires_at) VALUES (?, ?, ?)",
+                (token_id, user_id, expires),
+            )
+        return f"{token_id}.{expires}.{_sign(self._secret, f'{token_id}.{expires}')}"
+
+    def verify(self, token: str) -> Optional[str]:
+        """معرف صاحب الرمز إن كان موقعاً وغير منتهٍ ولم يُلغَ، وإلا None"""
+        parsed = self._parse(token)
+        if parsed is None:
+            return None
+        token_id, expires = parsed
+        if expires <= self._clock():
+            self.revoke(token)
+            return None
+        row = self._conn().execute(
+            "SELECT user_id FROM sessions WHERE token_id = ? AND expires_at = ?", (token_id, expires)
+        ).fetchone()
+        return row[0] if row else None
+
+    def revoke(self, token: str):
+        """إلغاء رمز (تسجيل الخروج)"""
+        parsed = self._parse(token)
+        if parsed is None:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE token_id = ?", (parsed[0],))
+
+    def evict(self) -> int:
+        """حذف الرموز المنتهية الآن (عددها)"""
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (int(self._clock()),)).rowcount
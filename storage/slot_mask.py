@@ -0,0 +1,47 @@
+"""
+خريطة بتات الفترات المسجلة في يوم (48 بت في عدد صحيح واحد)
+Per-day 48-bit bitmap of logged slots
+
+البت رقم n يساوي 1 إذا كانت الفترة n مسجلة. تُحفظ مع ملخص اليوم في
+rollup.py وتُحدث عند كل كتابة، فسؤال "هل الفترة السابقة مسجلة؟" أو "كم فترة
+سُجلت اليوم؟" عملية بتات بدل قراءة سجلات اليوم وبناء مجموعة منها، وعد
+الفترات الفائتة في شهر مجموع popcount لثلاثين عدداً.
+"""
+
+from typing import Iterable, Optional
+
+SLOTS = 48
+FULL_DAY = (1 << SLOTS) - 1
+
+
+def bit(slot: int) -> int:
+    """بت الفترة"""
+    return 1 << slot
+
+
+def is_logged(mask: int, slot: int) -> bool:
+    """هل الفترة مسجلة"""
+    return 0 <= slot < SLOTS and bool(mask >> slot & 1)
+
+
+def count(mask: int) -> int:
+    """عدد الفترات المسجلة"""
+    return mask.bit_count()
+
+
+def first_unlogged(mask: int, until: int = SLOTS) -> Optional[int]:
+    """أول فترة غير مسجلة قبل until أو None إذا سُجلت كلها"""
+    free = ~mask & ((1 << min(until, SLOTS)) - 1)
+    if not free:
+        return None
+    # أدنى بت مرفوع في free
+    return (free & -free).bit_length() - 1
+
+
+def missed(masks: Iterable[int], days: int, until: int = SLOTS) -> int:
+    """
+    عدد الفترات غير المسجلة في days يوماً لها masks (الأيام بلا سجلات لا تظهر
+    في masks) مع احتساب أول until فترة فقط من كل يوم
+    """
+    window = (1 << min(until, SLOTS)) - 1
+    return days * min(until, SLOTS) - sum((mask & window).bit_count() for mask in masks)
@@ -0,0 +1,189 @@
+"""
+مخزن السجلات في SQLite مدمج - يطابق جدول productivity_logs في supabase_schema.sql
+Embedded SQLite Log Store - mirrors productivity_logs in supabase_schema.sql
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS productivity_logs (
+    user_id TEXT NOT NULL,
+    log_date TEXT NOT NULL,
+    time_slot INTEGER NOT NULL CHECK (time_slot >= 0 AND time_slot <= 47),
+    id TEXT NOT NULL UNIQUE,
+    score INTEGER NOT NULL CHECK (score >= 0 AND score <= 4),
+    category TEXT NOT NULL,
+    notes TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, log_date, time_slot)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_productivity_logs_user_date
+    ON productivity_logs(user_id, log_date);
+
+CREATE TABLE IF NOT EXISTS log_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# رقم نسخة المستخدم يزيد في نفس معاملة كل كتابة، فقراءة النسخة بحث بالمفتاح الأساسي
+BUMP_SQL = """
+INSERT INTO log_versions (user_id, version) VALUES (?, 1)
+ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+"""
+
+# نفس مفاتيح السجل في الوضع المحلي (JSON)
+COLUMNS = "id, user_id, log_date, time_slot, score, category, notes, updated_at"
+COLUMN_NAMES = tuple(COLUMNS.split(", "))
+
+UPSERT_SQL = f"""
+INSERT INTO productivity_logs ({COLUMNS})
+VALUES (:id, :user_id, :log_date, :time_slot, :score, :category, :notes, :updated_at)
+ON CONFLICT(user_id, log_date, time_slot) DO UPDATE SET
+    score = excluded.score,
+    category = excluded.category,
+    notes = excluded.notes,
+    updated_at = excluded.updated_at
+RETURNING {COLUMNS}
+"""
+
+# نفس العبارة بمعاملات موضعية ودون RETURNING لـ executemany (الكتابة الجماعية)
+UPSERT_MANY_SQL = f"""
+INSERT INTO productivity_logs ({COLUMNS})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_id, log_date, time_slot) DO UPDATE SET
+    score = excluded.score,
+    category = excluded.category,
+    notes = excluded.notes,
+    updated_at = excluded.updated_at
+"""
+
+
+class SQLiteLogStore:
+    """مخزن السجلات في ملف SQLite واحد لكل المستخدمين"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال خاص بكل خيط (Streamlit يشغّل كل جلسة في خيط مستقل)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة أو تحديث سجل بعبارة INSERT ... ON CONFLICT واحدة"""
+        conn = self._conn()
+        with conn:
+            row = conn.execute(UPSERT_SQL, {**record, "user_id": user_id}).fetchone()
+            conn.execute(BUMP_SQL, (user_id,))
+        return dict(row)
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """
+        إضافة أو تحديث عدة سجلات في معاملة واحدة بعبارة executemany واحدة
+        معرفات الفترات المسجلة مسبقاً تُقرأ باستعلام واحد للفترة بدل RETURNING لكل صف
+        """
+        if not records:
+            return []
+        # صفوف موضعية: ربط tuple أسرع بكثير من ربط القواميس بالأسماء
+        rows = [
+            (r["id"], user_id, str(r["log_date"]), r["time_slot"], r["score"],
+             r["category"], r.get("notes"), r.get("updated_at"))
+            for r in records
+        ]
+        dates = [r[2] for r in rows]
+        conn = self._conn()
+        with conn:
+            # قفل الكتابة قبل القراءة حتى لا تتغير المعرفات بين الاستعلام والكتابة
+            conn.execute("BEGIN IMMEDIATE")
+            ids = {
+                (log_date, time_slot): log_id
+                for log_id, log_date, time_slot in conn.execute(
+                    "SELECT id, log_date, time_slot FROM productivity_logs "
+                    "WHERE user_id = ? AND log_date BETWEEN ? AND ?",
+                    (user_id, min(dates), max(dates)),
+                )
+            }
+            conn.executemany(UPSERT_MANY_SQL, rows)
+            conn.execute(BUMP_SQL, (user_id,))
+        saved = []
+        for row in rows:
+            saved.append(dict(zip(COLUMN_NAMES, row)))
+            # أول سجل لفترة جديدة يحدد معرفها، والتكرار اللاحق يحدّث نفس الصف
+            saved[-1]["id"] = ids.setdefault((row[2], row[3]), row[0])
+        return saved
+
+    def version(self, user_id: str) -> str:
+        """نسخة بيانات المستخدم: عداد يزيد مع كل كتابة (O(1) مهما طال التاريخ)"""
+        row = self._conn().execute(
+            "SELECT version FROM log_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return f"v{row[0] if row else 0}"
+
+    def get_by_date(self, user_id: str, log_date: str) -> List[Dict]:
+        """سجلات يوم معين مرتبة حسب الفترة"""
+        rows = self._conn().execute(
+            f"SELECT {COLUMNS} FROM productivity_logs "
+            "WHERE user_id = ? AND log_date = ? ORDER BY time_slot",
+            (user_id, log_date),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_by_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية عبر الفهرس (user_id, log_date)"""
+        rows = self._conn().execute(
+            f"SELECT {COLUMNS} FROM productivity_logs "
+            "WHERE user_id = ? AND log_date BETWEEN ? AND ? "
+            "ORDER BY log_date, time_slot",
+            (user_id, start_date, end_date),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def iter_range(self, user_id: str, start_date: str, end_date: str,
+                   chunk_size: int = 2000) -> Iterator[List[Dict]]:
+        """سجلات فترة على دفعات من مؤشر واحد (للتصدير الطويل)"""
+        cursor = self._conn().execute(
+            f"SELECT {COLUMNS} FROM productivity_logs "
+            "WHERE user_id = ? AND log_date BETWEEN ? AND ? "
+            "ORDER BY log_date, time_slot",
+            (user_id, start_date, end_date),
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [dict(r) for r in rows]
+
+    def get_by_slot(self, user_id: str, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة عبر المفتاح الأساسي"""
+        row = self._conn().execute(
+            f"SELECT {COLUMNS} FROM productivity_logs "
+            "WHERE user_id = ? AND log_date = ? AND time_slot = ?",
+            (user_id, log_date, time_slot),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل وإرجاعه (None إذا لم يوجد)"""
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                f"DELETE FROM productivity_logs WHERE user_id = ? AND id = ? RETURNING {COLUMNS}",
+                (user_id, log_id),
+            ).fetchone()
+            if row is not None:
+                conn.execute(BUMP_SQL, (user_id,))
+        return dict(row) if row else None
@@ -0,0 +1,86 @@
+"""
+حالة سلسلة الإنتاجية المحفوظة لكل مستخدم وتحديثها التزايدي
+Persisted per-user streak state with incremental updates
+
+الحالة: {"goal", "run", "run_start", "longest", "last_day"}
+    run/run_start  آخر سلسلة أيام متتالية تحقق فيها الهدف وتنتهي في last_day
+    longest        أطول سلسلة على الإطلاق
+التواريخ نصوص ISO، واليوم يحقق الهدف إذا كان له ملخص ومجموعه >= goal.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+
+def _next_day(day: str) -> str:
+    """اليوم التالي لتاريخ ISO"""
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def compute(days: Dict[str, Dict], goal: int) -> Dict:
+    """بناء الحالة من الملخص اليومي كاملاً - O(أيام)"""
+    state = {"goal": goal, "run": 0, "run_start": None, "longest": 0, "last_day": None}
+    for day in sorted(days):
+        if days[day]["score"] < goal:
+            continue
+        if state["last_day"] is not None and day == _next_day(state["last_day"]):
+            state["run"] += 1
+        else:
+            state["run"] = 1
+            state["run_start"] = day
+        state["last_day"] = day
+        state["longest"] = max(state["longest"], state["run"])
+    return state
+
+
+def advance(state: Dict, days: Dict[str, Dict], log_date: str,
+            before: Optional[int], after: Optional[int]) -> Dict:
+    """
+    تحديث الحالة بعد تغير مجموع يوم واحد (None = اليوم بلا سجلات)
+
+    الحالة الشائعة (تسجيل اليوم الحالي أو يوم بعد آخر يوم محقق) O(1)،
+    وتغيير يوم قديم يغير تحقق الهدف يعيد البناء من الملخص O(أيام).
+    """
+    goal = state["goal"]
+    was = before is not None and before >= goal
+    now = after is not None and after >= goal
+    if was == now:
+        return state
+
+    last_day = state["last_day"]
+    if now and (last_day is None or log_date > last_day):
+        if last_day is not None and log_date == _next_day(last_day):
+            state["run"] += 1
+        else:
+            state["run"] = 1
+            state["run_start"] = log_date
+        state["last_day"] = log_date
+        state["longest"] = max(state["longest"], state["run"])
+        return state
+
+    return compute(days, goal)
+
+
+def current(state: Dict, days: Dict[str, Dict], today: date) -> int:
+    """السلسلة الحالية بنفس قاعدة calculate_streak: تنتهي اليوم أو الأمس"""
+    last_day = state["last_day"]
+    if last_day is None:
+        return 0
+
+    yesterday = today - timedelta(days=1)
+    if last_day in (today.isoformat(), yesterday.isoformat()):
+        return state["run"]
+    if last_day < yesterday.isoformat():
+        return 0
+
+    # سجلات بتاريخ مستقبلي: العد رجوعاً من اليوم أو الأمس كما في calculate_streak
+    def qualifies(d: date) -> bool:
+        day = days.get(d.isoformat())
+        return day is not None and day["score"] >= state["goal"]
+
+    cursor = today if qualifies(today) else yesterday
+    streak = 0
+    while qualifies(cursor):
+        streak += 1
+        cursor -= timedelta(days=1)
+    return streak
@@ -0,0 +1,112 @@
+"""
+الدخول عبر Supabase Auth مع حفظ جلسة كل مستخدم وتجديدها
+Supabase Auth sign-up / sign-in with per-user sessions and token refresh
+
+في وضع Supabase يُنشأ الحساب في auth.users (معرفه UUID يولده الخادم)، فتطابق
+صفوف productivity_logs و user_profiles و categories مفاتيحها الخارجية، ويُنشئ
+مشغل handle_new_user الملف الشخصي. رمز الدخول (JWT) يُرسل مع كل طلب بيانات
+فتطبق سياسات RLS بالمفتاح العام (anon) دون مفتاح service_role.
+
+الجلسة (رمز الدخول، رمز التجديد، وقت الانتهاء) تُحفظ في جدول supabase_sessions
+في users.db، فيجدها كل خيط وكل عملية (والكتابة المؤجلة في الخلفية) بمعرف
+المستخدم، وتُجدد قبل انتهائها بـ REFRESH_MARGIN ثانية.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from storage.supabase_store import PostgrestClient, PostgrestError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS supabase_sessions (
+    user_id TEXT PRIMARY KEY,
+    access_token TEXT NOT NULL,
+    refresh_token TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# تجديد رمز الدخول قبل انتهائه بهذه المدة (ثوانٍ)
+REFRESH_MARGIN = 60
+
+
+class SupabaseAuth:
+    """إنشاء الحسابات والدخول ورموز الدخول الصالحة لكل مستخدم"""
+
+    def __init__(self, client: PostgrestClient, db_path: Path, clock: Callable[[], float] = time.time):
+        self.client = client
+        self.db_path = Path(db_path)
+        self._clock = clock
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال خاص بكل خيط (Streamlit يشغّل كل جلسة في خيط مستقل)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _save(self, session: Dict) -> Dict:
+        """حفظ جلسة رد الخادم وإرجاع المستخدم {id, email, user_metadata}"""
+        user = session["user"]
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO supabase_sessions (user_id, access_token, refresh_token, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (user["id"], session["access_token"], session["refresh_token"],
+                 int(self._clock()) + int(session.get("expires_in", 3600))),
+            )
+        return user
+
+    def sign_up(self, email: str, password: str, display_name: str) -> Dict:
+        """إنشاء حساب (الجلسة تُحفظ إن لم يتطلب المشروع تأكيد البريد)"""
+        data = self.client.auth("signup", {
+            "email": email, "password": password, "data": {"display_name": display_name},
+        })
+        if "access_token" in data:
+            return self._save(data)
+        return data.get("user", data)
+
+    def sign_in(self, email: str, password: str) -> Dict:
+        """الدخول بالبريد وكلمة المرور (PostgrestError لبيانات غير صحيحة)"""
+        return self._save(self.client.auth(
+            "token", {"email": email, "password": password}, params={"grant_type": "password"}
+        ))
+
+    def recover(self, email: str):
+        """إرسال رابط إعادة تعيين كلمة المرور"""
+        self.client.auth("recover", {"email": email})
+
+    def token(self, user_id: str) -> Optional[str]:
+        """رمز دخول صالح للمستخدم (يُجدد عند اقتراب انتهائه) أو None بلا جلسة"""
+        row = self._conn().execute(
+            "SELECT access_token, refresh_token, expires_at FROM supabase_sessions WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        access_token, refresh_token, expires_at = row
+        if expires_at - REFRESH_MARGIN > self._clock():
+            return access_token
+        try:
+            session = self.client.auth(
+                "token", {"refresh_token": refresh_token}, params={"grant_type": "refresh_token"}
+            )
+        except PostgrestError as e:
+            if e.status >= 500:
+                raise
+            # رمز التجديد ملغى أو منتهٍ: يلزم الدخول مجدداً
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM supabase_sessions WHERE user_id = ?", (user_id,))
+            return None
+        self._save(session)
+        return session["access_token"]
@@ -0,0 +1,359 @@
+"""
+مخزن البيانات في Supabase عبر PostgREST - نفس جداول supabase_schema.sql
+Supabase Store over PostgREST with a shared keep-alive client
+
+عميل HTTP واحد لكل (رابط، مفتاح) طوال عمر العملية: جلسة requests بمجمع
+اتصالات keep-alive، فكل الجلسات والخيوط تعيد استخدام اتصالات TLS نفسها بدل
+فتح اتصال جديد لكل طلب.
+
+يتحدث مباشرة مع واجهة REST التي تغلفها مكتبة supabase (‎/rest/v1/<الجدول>)،
+فيمكن اختباره دون إنترنت أمام خادم PostgREST بديل (tests/fake_postgrest.py).
+
+المفتاح العام (anon) يُرسل في apikey، وطلبات بيانات المستخدم تحمل رمز دخوله من
+Supabase Auth (token_for) في Authorization، فتطبق سياسات RLS في المخطط auth.uid()
+على كل طلب. عروض المتصدرين وحدها تُقرأ بالمفتاح العام.
+"""
+
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from storage.rollup import empty_day
+
+# أقصى عدد اتصالات مفتوحة لكل مضيف (جلسات Streamlit المتزامنة)
+POOL_SIZE = 16
+TIMEOUT = 10
+# أقصى عدد صفوف في طلب upsert واحد (الاستيراد الكبير يُرسل على دفعات)
+UPSERT_BATCH = 5000
+# صفوف كل صفحة قراءة: لا تتجاوز max_rows في الخادم (1000 افتراضياً في Supabase)
+# وإلا يقص الخادم الرد دون خطأ ويبدو كآخر صفحة
+PAGE = 1000
+
+# أعمدة السجل كما في الوضع المحلي
+LOG_COLUMNS = "id,user_id,log_date,time_slot,score,category,notes,updated_at"
+PROFILE_COLUMNS = ("id", "display_name", "daily_goal", "weekly_goal",
+                   "monthly_goal", "created_at", "updated_at")
+CATEGORY_COLUMNS = ("name", "name_ar", "color", "icon")
+# أقدم تاريخ يقبله نوع DATE (rollup.ALL_DATES يبدأ بالسنة 0)
+MIN_DATE = "0001-01-01"
+
+
+class PostgrestError(RuntimeError):
+    """رد خطأ من الخادم مع رمز حالة HTTP (4xx: الطلب نفسه مرفوض)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"PostgREST {status}: {message}")
+        self.status = status
+
+
+def _raise_for_status(response: requests.Response):
+    """PostgrestError برسالة الخادم (PostgREST: message، و Auth: error_description أو msg)"""
+    if response.status_code < 400:
+        return
+    try:
+        body = response.json()
+        message = body.get("message") or body.get("error_description") or body.get("msg") or response.text
+    except (ValueError, AttributeError):
+        message = response.text
+    raise PostgrestError(response.status_code, message)
+
+
+class PostgrestClient:
+    """عميل PostgREST صغير فوق جلسة requests واحدة (keep-alive)"""
+
+    def __init__(self, url: str, key: str, pool_size: int = POOL_SIZE):
+        self.url = url.rstrip("/")
+        self.base_url = self.url + "/rest/v1"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        })
+
+    def request(self, method: str, table: str, params: Dict = None, json=None,
+                prefer: str = None, token: str = None) -> Tuple[List[Dict], requests.Response]:
+        """طلب على جدول وإرجاع الصفوف مع الاستجابة (token: رمز دخول المستخدم لسياسات RLS)"""
+        headers = {}
+        if prefer:
+            headers["Prefer"] = prefer
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        response = self.session.request(
+            method, f"{self.base_url}/{table}", params=params, json=json,
+            headers=headers or None, timeout=TIMEOUT
+        )
+        _raise_for_status(response)
+        rows = response.json() if response.content else []
+        return rows, response
+
+    def pages(self, method: str, table: str, params: List[Tuple[str, str]], json=None,
+              token: str = None, limit: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        صفوف طلب قراءة صفحةً صفحة (limit/offset) حتى تعود صفحة ناقصة
+        params يجب أن تتضمن order بترتيب ثابت، و limit: أقصى عدد صفوف إجمالاً
+        """
+        offset = 0
+        while limit is None or offset < limit:
+            size = PAGE if limit is None else min(PAGE, limit - offset)
+            rows, _ = self.request(
+                method, table, params=list(params) + [("limit", size), ("offset", offset)],
+                json=json, token=token,
+            )
+            if rows:
+                yield rows
+            if len(rows) < size:
+                return
+            offset += len(rows)
+
+    def auth(self, path: str, json: Dict, params: Dict = None) -> Dict:
+        """طلب POST على Supabase Auth (‎/auth/v1/<path>) بالمفتاح العام"""
+        response = self.session.post(
+            f"{self.url}/auth/v1/{path}", params=params, json=json, timeout=TIMEOUT
+        )
+        _raise_for_status(response)
+        return response.json() if response.content else {}
+
+    def close(self):
+        self.session.close()
+
+
+# {(الرابط، المفتاح): PostgrestClient}
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str, key: str) -> PostgrestClient:
+    """العميل المشترك لهذه البيانات (يُنشأ مرة واحدة لكل عملية)"""
+    credentials = (url.rstrip("/"), key)
+    with _clients_lock:
+        client = _clients.get(credentials)
+        if client is None:
+            client = PostgrestClient(*credentials)
+            _clients[credentials] = client
+        return client
+
+
+def _first(rows: List[Dict]) -> Optional[Dict]:
+    return rows[0] if rows else None
+
+
+def _since(start_date: str) -> str:
+    return max(str(start_date), MIN_DATE)
+
+
+def _in(values: List[str]) -> str:
+    """مرشح in.(...) مع اقتباس القيم (أسماء الفئات قد تحتوي فواصل أو مسافات)"""
+    quoted = ('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return f"in.({','.join(quoted)})"
+
+
+class SupabaseStore:
+    """السجلات والملفات الشخصية والفئات في Supabase (واجهة محرك السجلات نفسها)"""
+
+    def __init__(self, client: PostgrestClient,
+                 token_for: Callable[[str], Optional[str]] = lambda user_id: None):
+        self.client = client
+        # رمز دخول المستخدم الحالي من Supabase Auth (يأتي من database.py)
+        self._token_for = token_for
+
+    def _request(self, user_id: str, method: str, table: str, **kwargs) -> Tuple[List[Dict], requests.Response]:
+        """طلب باسم المستخدم: سياسات RLS تسمح بصفوفه فقط"""
+        return self.client.request(method, table, token=self._token_for(user_id), **kwargs)
+
+    # -----------------------------------------
+    # سجلات الإنتاجية
+    # -----------------------------------------
+
+    @staticmethod
+    def _log_row(user_id: str, record: Dict) -> Dict:
+        """صف للإرسال: المعرف يولده الخادم (UUID) ويبقى كما هو عند التحديث"""
+        return {
+            "user_id": user_id,
+            "log_date": str(record["log_date"]),
+            "time_slot": record["time_slot"],
+            "score": record["score"],
+            "category": record["category"],
+            "notes": record.get("notes"),
+            "updated_at": record.get("updated_at"),
+        }
+
+    def upsert(self, user_id: str, record: Dict) -> Dict:
+        """إضافة أو تحديث سجل بطلب upsert واحد على (user_id, log_date, time_slot)"""
+        return self.upsert_many(user_id, [record])[0]
+
+    def upsert_many(self, user_id: str, records: List[Dict]) -> List[Dict]:
+        """إضافة أو تحديث عدة سجلات في طلب واحد لكل UPSERT_BATCH سجل (معاملة لكل طلب في الخادم)"""
+        saved = []
+        for i in range(0, len(records), UPSERT_BATCH):
+            batch = records[i:i + UPSERT_BATCH]
+            rows, _ = self._request(
+                user_id, "POST", "productivity_logs",
+                params={"on_conflict": "user_id,log_date,time_slot", "select": LOG_COLUMNS},
+                json=[self._log_row(user_id, r) for r in batch],
+                prefer="resolution=merge-duplicates,return=representation",
+            )
+            # الخادم لا يضمن ترتيب الصفوف المرجعة: نعيدها بترتيب الطلب
+            by_slot = {(str(r["log_date"]), r["time_slot"]): r for r in rows}
+            saved.extend(by_slot[(str(r["log_date"]), r["time_slot"])] for r in batch)
+        return saved
+
+    def version(self, user_id: str) -> str:
+        """نسخة بيانات المستخدم: عداد log_versions الذي تزيده مشغلات الجدول (بحث بالمفتاح)"""
+        rows, _ = self._request(user_id, "GET", "log_versions", params={
+            "user_id": f"eq.{user_id}", "select": "version",
+        })
+        return f"v{rows[0]['version'] if rows else 0}"
+
+    def get_by_date(self, user_id: str, log_date: str) -> List[Dict]:
+        """سجلات يوم معين مرتبة حسب الفترة"""
+        rows, _ = self._request(user_id, "GET", "productivity_logs", params={
+            "user_id": f"eq.{user_id}", "log_date": f"eq.{log_date}",
+            "select": LOG_COLUMNS, "order": "time_slot",
+        })
+        return rows
+
+    def get_by_range(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """سجلات فترة زمنية (شاملة للطرفين) عبر فهرس (user_id, log_date)"""
+        return [log for page in self.iter_range(user_id, start_date, end_date) for log in page]
+
+    def iter_range(self, user_id: str, start_date: str, end_date: str) -> Iterator[List[Dict]]:
+        """سجلات فترة صفحةً صفحة (PAGE سجل لكل طلب) للتصدير والاستيراد الطويلين"""
+        return self.client.pages("GET", "productivity_logs", [
+            ("user_id", f"eq.{user_id}"),
+            ("log_date", f"gte.{_since(start_date)}"),
+            ("log_date", f"lte.{end_date}"),
+            ("select", LOG_COLUMNS),
+            ("order", "log_date,time_slot"),
+        ], token=self._token_for(user_id))
+
+    def get_by_slot(self, user_id: str, log_date: str, time_slot: int) -> Optional[Dict]:
+        """سجل فترة محددة"""
+        rows, _ = self._request(user_id, "GET", "productivity_logs", params={
+            "user_id": f"eq.{user_id}", "log_date": f"eq.{log_date}",
+            "time_slot": f"eq.{time_slot}", "select": LOG_COLUMNS,
+        })
+        return _first(rows)
+
+    def delete(self, user_id: str, log_id: str) -> Optional[Dict]:
+        """حذف سجل وإرجاعه (None إذا لم يوجد)"""
+        rows, _ = self._request(
+            user_id, "DELETE", "productivity_logs",
+            params={"user_id": f"eq.{user_id}", "id": f"eq.{log_id}", "select": LOG_COLUMNS},
+            prefer="return=representation",
+        )
+        return _first(rows)
+
+    # -----------------------------------------
+    # التجميع في الخادم (عروض ودوال supabase_schema.sql)
+    # -----------------------------------------
+
+    def daily_totals(self, user_id: str, start_date: str, end_date: str,
+                     categories: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """ملخص الأيام بشكل DailyRollup من العرض daily_category_totals (صف لكل يوم وفئة)"""
+        params = [
+            ("user_id", f"eq.{user_id}"),
+            ("log_date", f"gte.{_since(start_date)}"),
+            ("log_date", f"lte.{end_date}"),
+            ("order", "log_date,category"),
+        ]
+        if categories is not None:
+            params.append(("category", _in(categories)))
+        # صف لكل (يوم، فئة): التاريخ الطويل يتجاوز max_rows فيُقرأ صفحةً صفحة
+        pages = self.client.pages("GET", "daily_category_totals", params,
+                                  token=self._token_for(user_id))
+
+        days = {}
+        for row in (row for page in pages for row in page):
+            day = days.setdefault(str(row["log_date"]), empty_day())
+            day["score"] += row["score"]
+            day["slots"] += row["slots"]
+            day["categories"][row["category"]] = [row["score"], row["slots"]]
+            for score in range(len(day["scores"])):
+                day["scores"][score] += row[f"s{score}"]
+            day["mask"] |= row["mask"]
+        return days
+
+    def hour_weekday_totals(self, user_id: str, start_date: str, end_date: str,
+                            categories: Optional[List[str]] = None) -> List[Dict]:
+        """مجاميع (الساعة، يوم الأسبوع) لفترة: {hour, weekday, score, slots}"""
+        pages = self.client.pages("POST", "rpc/hour_weekday_totals", [], json={
+            "p_user_id": user_id,
+            "p_start": _since(start_date),
+            "p_end": str(end_date),
+            "p_categories": categories,
+        }, token=self._token_for(user_id))
+        return [row for page in pages for row in page]
+
+    def leaderboard(self, period: str, limit: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """(المستخدم، النقاط، السجلات) للأوائل من عرض leaderboard_<period>"""
+        pages = self.client.pages(
+            "GET", f"leaderboard_{period}", [("order", "score.desc,user_id.asc")], limit=limit
+        )
+        return [(r["user_id"], r["score"], r["logs_count"]) for page in pages for r in page]
+
+    # -----------------------------------------
+    # الملف الشخصي
+    # -----------------------------------------
+
+    def get_profile(self, user_id: str) -> Optional[Dict]:
+        """ملف المستخدم أو None"""
+        rows, _ = self._request(user_id, "GET", "user_profiles", params={"id": f"eq.{user_id}"})
+        return _first(rows)
+
+    def save_profile(self, profile: Dict) -> Dict:
+        """إنشاء أو تحديث ملف المستخدم (الأعمدة المعروفة في المخطط فقط)"""
+        row = {k: v for k, v in profile.items() if k in PROFILE_COLUMNS}
+        rows, _ = self._request(
+            profile["id"], "POST", "user_profiles", params={"on_conflict": "id"}, json=row,
+            prefer="resolution=merge-duplicates,return=representation",
+        )
+        return rows[0]
+
+    # -----------------------------------------
+    # الفئات المخصصة
+    # -----------------------------------------
+
+    def get_categories(self, user_id: str) -> List[Dict]:
+        """فئات المستخدم المخصصة (الافتراضية تأتي من config)"""
+        pages = self.client.pages("GET", "categories", [
+            ("user_id", f"eq.{user_id}"), ("is_default", "eq.false"), ("order", "created_at,id"),
+        ], token=self._token_for(user_id))
+        return [row for page in pages for row in page]
+
+    def add_category(self, user_id: str, category: Dict) -> Dict:
+        """إضافة فئة مخصصة (المعرف يولده الخادم)"""
+        row = {k: category[k] for k in CATEGORY_COLUMNS if k in category}
+        rows, _ = self._request(
+            user_id, "POST", "categories",
+            json={**row, "user_id": user_id, "is_default": False},
+            prefer="return=representation",
+        )
+        return rows[0]
+
+    def update_category(self, user_id: str, category_id: str, updates: Dict) -> Optional[Dict]:
+        """تحديث الحقول المسموح بها في فئة مخصصة (None إذا لم توجد)"""
+        row = {k: updates[k] for k in CATEGORY_COLUMNS if k in updates}
+        rows, _ = self._request(
+            user_id, "PATCH", "categories",
+            params={"id": f"eq.{category_id}", "user_id": f"eq.{user_id}",
+                    "is_default": "eq.false"},
+            json=row, prefer="return=representation",
+        )
+        return _first(rows)
+
+    def delete_category(self, user_id: str, category_id: str) -> Optional[Dict]:
+        """حذف فئة مخصصة"""
+        rows, _ = self._request(
+            user_id, "DELETE", "categories",
+            params={"id": f"eq.{category_id}", "user_id": f"eq.{user_id}",
+                    "is_default": "eq.false"},
+            prefer="return=representation",
+        )
+        return _first(rows)
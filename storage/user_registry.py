@@ -0,0 +1,152 @@
+"""
+سجل المستخدمين في SQLite مع فهرس للبريد والمعرف
+Indexed user registry (replaces the monolithic users.json)
+
+users.json كان يُقرأ كاملاً عند كل دخول وتسجيل وعرض للمتصدرين، ويُعاد كتابته
+كاملاً مع كل حساب جديد. هنا:
+
+    البحث بالبريد أو بالمعرف   O(1) تقريباً (مفتاح أساسي وفهرس فريد)
+    إنشاء حساب                 INSERT واحد (البريد المكرر يرفضه القيد)
+    سرد المستخدمين             دفعات مرتبة بالمعرف دون تحميل الجميع
+
+السجل بنفس شكل قيمة users.json: {id, email, password, metadata, created_at}.
+ملف users.json القديم يُستورد مرة واحدة ثم يُعاد تسميته. في وضع Supabase يحفظ
+السجل نسخة من حساب Supabase Auth (كلمة مرور فارغة) لأسماء المتصدرين واستعادة الجلسة.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT
+) WITHOUT ROWID;
+"""
+
+COLUMNS = "id, email, password, metadata, created_at"
+
+INSERT_SQL = f"INSERT INTO users ({COLUMNS}) VALUES (?, ?, ?, ?, ?)"
+
+# حد معاملات SQLite في عبارة IN واحدة (الافتراضي القديم 999)
+IN_BATCH = 900
+
+# عدد المستخدمين في كل دفعة عند السرد
+PAGE = 1000
+
+
+def _row(record: Dict) -> tuple:
+    return (
+        record["id"], record["email"], record["password"],
+        json.dumps(record.get("metadata") or {}, ensure_ascii=False), record.get("created_at"),
+    )
+
+
+def _record(row: sqlite3.Row) -> Dict:
+    return {
+        "id": row["id"],
+        "email": row["email"],
+        "password": row["password"],
+        "metadata": json.loads(row["metadata"]),
+        "created_at": row["created_at"],
+    }
+
+
+class UserRegistry:
+    """حسابات المستخدمين المحلية في ملف SQLite واحد"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """اتصال خاص بكل خيط (Streamlit يشغّل كل جلسة في خيط مستقل)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, record: Dict) -> bool:
+        """إضافة حساب (False إذا كان البريد أو المعرف مسجلاً)"""
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute(INSERT_SQL, _row(record))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def save(self, record: Dict):
+        """إضافة حساب أو تحديث معرفه وبياناته الوصفية (كلمة المرور المحفوظة لا تتغير)"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                INSERT_SQL + " ON CONFLICT(email) DO UPDATE SET id = excluded.id, metadata = excluded.metadata",
+                _row(record),
+            )
+
+    def import_users(self, users: Dict[str, Dict]) -> int:
+        """استيراد محتوى users.json القديم (الحسابات الموجودة لا تتغير)"""
+        conn = self._conn()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO users ({COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                [_row({**info, "email": info.get("email") or email}) for email, info in users.items()],
+            )
+            return conn.total_changes - before
+
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        row = self._conn().execute(f"SELECT {COLUMNS} FROM users WHERE email = ?", (email,)).fetchone()
+        return _record(row) if row else None
+
+    def get_by_id(self, user_id: str) -> Optional[Dict]:
+        row = self._conn().execute(f"SELECT {COLUMNS} FROM users WHERE id = ?", (user_id,)).fetchone()
+        return _record(row) if row else None
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        """{المعرف: الحساب} لعدة معرفات (المتصدرون) باستعلام لكل 900 معرف"""
+        user_ids = list(dict.fromkeys(user_ids))
+        found = {}
+        for i in range(0, len(user_ids), IN_BATCH):
+            batch = user_ids[i:i + IN_BATCH]
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM users WHERE id IN ({', '.join('?' * len(batch))})", batch
+            )
+            found.update((row["id"], _record(row)) for row in rows)
+        return found
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def _pages(self, columns: str, convert: Callable) -> Iterator:
+        """صفوف مرتبة بالمعرف على دفعات (لا تبقى قراءة مفتوحة بين الدفعات)"""
+        last = ""
+        while True:
+            rows = self._conn().execute(
+                f"SELECT {columns} FROM users WHERE id > ? ORDER BY id LIMIT ?", (last, PAGE)
+            ).fetchall()
+            for row in rows:
+                yield convert(row)
+            if len(rows) < PAGE:
+                return
+            last = rows[-1]["id"]
+
+    def iter_ids(self) -> Iterator[str]:
+        """معرفات كل المستخدمين"""
+        return self._pages("id", lambda row: row["id"])
+
+    def iter_users(self) -> Iterator[Dict]:
+        """حسابات كل المستخدمين"""
+        return self._pages(COLUMNS, _record)
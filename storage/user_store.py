@@ -0,0 +1,109 @@
+"""
+ملفات مستخدم واحد خلال تشغيل واحد للصفحة (unit of work)
+Per-rerun UserStore: each user file is read at most once
+
+تشغيل Streamlit واحد يقرأ profile.json و categories.json و hidden_defaults.json
+من عدة مكونات (الشريط الجانبي، لوحة التحكم، نموذج التقييم...). UserStore يقرأ
+كل ملف عند أول طلب فقط ويخدم باقي القراءات من الذاكرة، ومسارات الملفات تُحسب
+مرة واحدة.
+
+التعديل يظهر فوراً لقراءات نفس التشغيل ويُسجل كدالة (القيمة القديمة ← الجديدة)،
+و flush() في نهاية التشغيل يكتب كل ملف معدل مرة واحدة تحت قفل المستخدم. إذا
+غيرت جلسة أخرى الملف بعد قراءته (بصمة mtime/size مختلفة) تُعاد التعديلات فوق
+أحدث نسخة بدل الكتابة فوقها.
+"""
+
+import copy
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+# أسماء ملفات المستخدم في مجلده
+PROFILE = "profile.json"
+CATEGORIES = "categories.json"
+HIDDEN_DEFAULTS = "hidden_defaults.json"
+THEME = "theme.json"
+TASKS = "tasks.json"
+
+Mutation = Callable[[Any], Any]
+
+
+def _stat(path: Path) -> Optional[tuple]:
+    """بصمة (mtime, size) للملف أو None إذا لم يوجد"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class UserStore:
+    """قراءة كسولة مرة واحدة لكل ملف، وكتابة مؤجلة حتى flush()"""
+
+    def __init__(self, user_id: str, dir_for: Callable[[str], Path], load: Callable, save: Callable,
+                 lock: Callable[[str], ContextManager]):
+        self.user_id = user_id
+        # دوال المسار والقراءة والكتابة والقفل تأتي من database.py
+        self._dir_for = dir_for
+        self._load = load
+        self._save = save
+        self._lock = lock
+        self._paths: Dict[str, Path] = {}
+        # {اسم الملف: القيمة الحالية في هذا التشغيل}
+        self._values: Dict[str, Any] = {}
+        # بصمة الملف عند قراءته (لاكتشاف الكتابة من جلسة أخرى)
+        self._signatures: Dict[str, Optional[tuple]] = {}
+        # {اسم الملف: (القيمة الافتراضية، [التعديلات بالترتيب])}
+        self._pending: Dict[str, Tuple[Any, List[Mutation]]] = {}
+        # عدد الملفات المقروءة من القرص (للقياس والاختبارات)
+        self.reads = 0
+
+    def path(self, name: str) -> Path:
+        """مسار ملف المستخدم (يُحسب مرة واحدة)"""
+        path = self._paths.get(name)
+        if path is None:
+            path = self._paths[name] = self._dir_for(self.user_id) / name
+        return path
+
+    def _value(self, name: str, default: Any) -> Any:
+        if name not in self._values:
+            path = self.path(name)
+            self._signatures[name] = _stat(path)
+            self._values[name] = self._load(path, default)
+            self.reads += 1
+        return self._values[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """نسخة مستقلة من محتوى الملف (يمكن للمستدعي تعديلها دون أثر)"""
+        return copy.deepcopy(self._value(name, default))
+
+    def update(self, name: str, mutate: Mutation, default: Any = None) -> Any:
+        """تطبيق تعديل على محتوى الملف الآن وتأجيل كتابته إلى flush()"""
+        value = mutate(copy.deepcopy(self._value(name, default)))
+        self._values[name] = value
+        self._pending.setdefault(name, (default, []))[1].append(mutate)
+        return copy.deepcopy(value)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self):
+        """كتابة الملفات المعدلة مرة واحدة لكل ملف تحت قفل المستخدم"""
+        if not self._pending:
+            return
+        with self._lock(self.user_id):
+            # المسار يُحسب من جديد تحت القفل (قد يُنقل المجلد أثناء التشغيل، انظر layout.py)
+            self._paths.clear()
+            for name in list(self._pending):
+                default, mutations = self._pending[name]
+                path = self.path(name)
+                value = self._values[name]
+                if _stat(path) != self._signatures.get(name):
+                    # جلسة أخرى كتبت الملف بعد قراءته: نعيد تعديلاتنا فوق نسختها
+                    value = self._load(path, default)
+                    for mutate in mutations:
+                        value = mutate(value)
+                    self._values[name] = value
+                self._save(path, value)
+                self._signatures[name] = _stat(path)
+                del self._pending[name]
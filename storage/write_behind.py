@@ -0,0 +1,174 @@
+"""
+مخزن مؤقت للكتابة المؤجلة مع تفريغ دوري في خيط خلفي
+Write-behind buffer with a debounced background flush
+
+تسجيل فترة يضع السجل في الذاكرة ويعود فوراً، فزمن النقر لا يعتمد على حجم
+تاريخ المستخدم. الخيط الخلفي ينتظر INTERVAL بعد أول كتابة معلقة ثم يفرغ كل
+مستخدم دفعة واحدة (آخر تقييم لنفس الفترة هو الذي يُكتب)، ويُفرغ الباقي عند
+إنهاء العملية عبر atexit.
+
+السجل يُتحقق منه في put() قبل قبوله، فلا يعود نجاح لسجل سيرفضه المحرك. القراءة
+ترى السجلات المعلقة فوراً عبر pending(). إذا فشل التفريغ فشلاً مؤقتاً (قرص، شبكة)
+تعاد السجلات إلى المخزن المؤقت (ما لم يحل محلها تقييم أحدث) وتُعاد المحاولة في
+الدورة التالية. أما الفشل الدائم (is_permanent) فيُعاد فيه تفريغ سجلات الدفعة
+واحداً واحداً، ويُسقط السجل المرفوض فقط ويُحفظ سببه لتقرأه rejected().
+
+المعرف الذي أُعطي للواجهة قبل التفريغ قد يختلف عن معرف المحرك (UUID الخادم في
+Supabase، أو معرف السجل القديم لنفس الفترة)، فيُحفظ الربط بينهما لـ saved_id().
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# مهلة التجميع قبل التفريغ (ثوانٍ)
+INTERVAL = 0.3
+# عدد روابط (المعرف المؤقت -> معرف المحرك) المحفوظة لكل المستخدمين
+SAVED_IDS = 4096
+
+SlotKey = Tuple[str, int]
+
+
+class WriteBehindBuffer:
+    """سجلات معلقة لكل مستخدم تُكتب لاحقاً عبر flush_fn(user_id, records) -> السجلات المحفوظة"""
+
+    def __init__(self, flush_fn: Callable[[str, List[Dict]], List[Dict]], interval: float = INTERVAL,
+                 validate: Callable[[Dict], None] = lambda record: None,
+                 is_permanent: Callable[[Exception], bool] = lambda error: False):
+        self._flush_fn = flush_fn
+        self.interval = interval
+        # validate يرفع ValueError لسجل لن يقبله المحرك، و is_permanent يميز
+        # الأخطاء التي لن تنجح إعادة المحاولة فيها (تأتي من database.py)
+        self._validate = validate
+        self._is_permanent = is_permanent
+        # {user_id: {(log_date, time_slot): record}}
+        self._pending: Dict[str, Dict[SlotKey, Dict]] = {}
+        # دفعات قيد الكتابة: تبقى مرئية للقراءة حتى يثبتها المحرك
+        self._inflight: Dict[str, Dict[SlotKey, Dict]] = {}
+        # {user_id: [(السجل، سبب الرفض)]} للسجلات التي أسقطها فشل دائم
+        self._rejected: Dict[str, List[Tuple[Dict, str]]] = {}
+        # {(user_id, المعرف المؤقت): معرف المحرك} الأحدث في النهاية
+        self._saved_ids: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # تفريغ واحد في كل مرة حتى لا تتجاوز دفعة أقدم دفعة أحدث لنفس الفترة
+        self._flushing = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def put(self, user_id: str, records: List[Dict]):
+        """إضافة سجلات للمخزن المؤقت - O(عدد السجلات) دون لمس القرص (ValueError لسجل غير صالح)"""
+        for record in records:
+            self._validate(record)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("المخزن المؤقت مغلق")
+            pending = self._pending.setdefault(user_id, {})
+            for record in records:
+                pending[(str(record["log_date"]), record["time_slot"])] = dict(record)
+            self._ensure_thread()
+        self._wake.set()
+
+    def pending(self, user_id: str) -> Dict[SlotKey, Dict]:
+        """نسخة من السجلات المعلقة لمستخدم (للقراءة قبل التفريغ)"""
+        with self._lock:
+            merged = {**self._inflight.get(user_id, {}), **self._pending.get(user_id, {})}
+            return {key: dict(r) for key, r in merged.items()}
+
+    def flush(self, user_id: Optional[str] = None):
+        """تفريغ مستخدم أو الجميع الآن (يرفع أول خطأ بعد إعادة السجلات للمخزن)"""
+        with self._flushing:
+            with self._lock:
+                users = [user_id] if user_id is not None else list(self._pending)
+                batches = [(u, self._pending.pop(u)) for u in users if self._pending.get(u)]
+                self._inflight.update(batches)
+
+            error = None
+            for user, batch in batches:
+                try:
+                    self._write(user, list(batch.values()))
+                except Exception as e:
+                    self._requeue(user, batch)
+                    error = error or e
+                finally:
+                    with self._lock:
+                        self._inflight.pop(user, None)
+            if error is not None:
+                raise error
+
+    def _write(self, user_id: str, records: List[Dict]):
+        """كتابة دفعة، وعند فشل دائم كتابة سجلاتها منفردة وإسقاط المرفوض منها فقط"""
+        try:
+            self._remember(user_id, records, self._flush_fn(user_id, records))
+            return
+        except Exception as e:
+            if not self._is_permanent(e):
+                raise
+            if len(records) == 1:
+                with self._lock:
+                    self._rejected.setdefault(user_id, []).append((records[0], str(e)))
+                return
+        for record in records:
+            self._write(user_id, [record])
+
+    def _remember(self, user_id: str, records: List[Dict], saved: List[Dict]):
+        """ربط المعرفات المؤقتة بمعرفات المحرك بعد التفريغ"""
+        with self._lock:
+            for record, row in zip(records, saved or []):
+                if record["id"] != row["id"]:
+                    self._saved_ids[(user_id, record["id"])] = row["id"]
+                    self._saved_ids.move_to_end((user_id, record["id"]))
+            while len(self._saved_ids) > SAVED_IDS:
+                self._saved_ids.popitem(last=False)
+
+    def saved_id(self, user_id: str, log_id: str) -> str:
+        """معرف المحرك لسجل كُتب عبر المخزن المؤقت (أو المعرف نفسه)"""
+        with self._lock:
+            return self._saved_ids.get((user_id, log_id), log_id)
+
+    def rejected(self, user_id: str) -> List[Tuple[Dict, str]]:
+        """السجلات التي رفضها المحرك لمستخدم منذ آخر استدعاء مع سبب كل منها"""
+        with self._lock:
+            return self._rejected.pop(user_id, [])
+
+    def _requeue(self, user_id: str, batch: Dict[SlotKey, Dict]):
+        """إعادة سجلات فشل تفريغها دون تجاوز تقييمات أحدث وصلت أثناءه"""
+        with self._lock:
+            pending = self._pending.setdefault(user_id, {})
+            for key, record in batch.items():
+                pending.setdefault(key, record)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._closed:
+                return
+            # تجميع التقييمات المتتالية في تفريغ واحد
+            time.sleep(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # السجلات أعيدت للمخزن: محاولة جديدة بعد مهلة
+                self._wake.set()
+                time.sleep(self.interval)
+
+    def close(self):
+        """تفريغ أخير وإيقاف الخيط (يُستدعى عند إنهاء العملية)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            pass
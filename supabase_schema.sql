@@ -140,3 +140,118 @@ CREATE INDEX IF NOT EXISTS idx_productivity_logs_user_date_slot
 
 CREATE INDEX IF NOT EXISTS idx_categories_user 
     ON categories(user_id);
+
+-- =============================================
+
+-- التجميع في الخادم: الصفحات تنقل عشرات الصفوف المجمعة بدل آلاف السجلات
+-- Server-side aggregation views and RPC functions
+
+-- ملخص كل (مستخدم، يوم، فئة) مع عدد كل درجة 0-4
+-- Daily totals per category (security_invoker: RLS of productivity_logs applies)
+CREATE OR REPLACE VIEW daily_category_totals WITH (security_invoker = true) AS
+SELECT
+    user_id,
+    log_date,
+    category,
+    SUM(score)::INTEGER AS score,
+    COUNT(*)::INTEGER AS slots,
+    COUNT(*) FILTER (WHERE score = 0)::INTEGER AS s0,
+    COUNT(*) FILTER (WHERE score = 1)::INTEGER AS s1,
+    COUNT(*) FILTER (WHERE score = 2)::INTEGER AS s2,
+    COUNT(*) FILTER (WHERE score = 3)::INTEGER AS s3,
+    COUNT(*) FILTER (WHERE score = 4)::INTEGER AS s4,
+    -- خريطة بتات الفترات المسجلة (الفترة فريدة في اليوم فالمجموع = OR)
+    SUM(1::BIGINT << time_slot)::BIGINT AS mask
+FROM productivity_logs
+GROUP BY user_id, log_date, category;
+
+-- المتصدرون: تعمل بصلاحيات المالك لتجمع كل المستخدمين (نقاط فقط بلا تفاصيل السجلات)
+-- Leaderboards (owner rights: aggregate across users, expose totals only)
+-- الأسبوع يبدأ يوم السبت وكل فترة تنتهي اليوم (لا تُحسب السجلات المستقبلية) كما في storage/leaderboard.py
+CREATE OR REPLACE VIEW leaderboard_weekly AS
+SELECT user_id, SUM(score)::INTEGER AS score, COUNT(*)::INTEGER AS logs_count
+FROM productivity_logs
+WHERE log_date BETWEEN CURRENT_DATE - ((EXTRACT(ISODOW FROM CURRENT_DATE)::INTEGER + 1) % 7)
+                   AND CURRENT_DATE
+GROUP BY user_id
+HAVING SUM(score) > 0;
+
+CREATE OR REPLACE VIEW leaderboard_monthly AS
+SELECT user_id, SUM(score)::INTEGER AS score, COUNT(*)::INTEGER AS logs_count
+FROM productivity_logs
+WHERE log_date BETWEEN DATE_TRUNC('month', CURRENT_DATE)::DATE AND CURRENT_DATE
+GROUP BY user_id
+HAVING SUM(score) > 0;
+
+CREATE OR REPLACE VIEW leaderboard_all_time AS
+SELECT user_id, SUM(score)::INTEGER AS score, COUNT(*)::INTEGER AS logs_count
+FROM productivity_logs
+WHERE log_date <= CURRENT_DATE
+GROUP BY user_id
+HAVING SUM(score) > 0;
+
+-- مجاميع (الساعة × يوم الأسبوع) لفترة زمنية: خلايا خريطة الحرارة، ومجاميع كل
+-- ساعة وكل يوم أسبوع هي مجاميع صفوفها (168 صفاً على الأكثر)
+-- يوم الأسبوع 0 = الإثنين (مثل date.weekday في بايثون)، و p_categories = NULL لكل الفئات
+-- Hour x weekday aggregates for the analytics page
+CREATE OR REPLACE FUNCTION hour_weekday_totals(
+    p_user_id UUID, p_start DATE, p_end DATE, p_categories TEXT[] DEFAULT NULL
+)
+RETURNS TABLE (hour INTEGER, weekday INTEGER, score INTEGER, slots INTEGER)
+LANGUAGE sql STABLE SECURITY INVOKER AS $$
+    SELECT time_slot / 2, EXTRACT(ISODOW FROM log_date)::INTEGER - 1,
+           SUM(score)::INTEGER, COUNT(*)::INTEGER
+    FROM productivity_logs
+    WHERE user_id = p_user_id AND log_date BETWEEN p_start AND p_end
+      AND (p_categories IS NULL OR category = ANY(p_categories))
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+$$;
+
+-- فهرس التاريخ لمتصدري الأسبوع والشهر (كل المستخدمين)
+CREATE INDEX IF NOT EXISTS idx_productivity_logs_date
+    ON productivity_logs(log_date);
+
+-- =============================================
+
+-- رقم نسخة سجلات كل مستخدم: يزيد في نفس معاملة كل إدخال أو تحديث أو حذف،
+-- فيعرف العميل تغير السجلات ببحث بالمفتاح بدل عدها
+-- Per-user log version counter bumped by statement-level triggers
+CREATE TABLE IF NOT EXISTS log_versions (
+    user_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+ALTER TABLE log_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own log version" ON log_versions
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- صف واحد لكل مستخدم في العبارة (changed_logs جدول الانتقال في كل مشغل)
+CREATE OR REPLACE FUNCTION public.bump_log_versions()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.log_versions (user_id, version)
+    SELECT DISTINCT user_id, 1 FROM changed_logs
+    ON CONFLICT (user_id) DO UPDATE SET version = log_versions.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS productivity_logs_version_insert ON productivity_logs;
+CREATE TRIGGER productivity_logs_version_insert
+    AFTER INSERT ON productivity_logs
+    REFERENCING NEW TABLE AS changed_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_log_versions();
+
+DROP TRIGGER IF EXISTS productivity_logs_version_update ON productivity_logs;
+CREATE TRIGGER productivity_logs_version_update
+    AFTER UPDATE ON productivity_logs
+    REFERENCING NEW TABLE AS changed_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_log_versions();
+
+DROP TRIGGER IF EXISTS productivity_logs_version_delete ON productivity_logs;
+CREATE TRIGGER productivity_logs_version_delete
+    AFTER DELETE ON productivity_logs
+    REFERENCING OLD TABLE AS changed_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION public.bump_log_versions();
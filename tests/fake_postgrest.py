@@ -0,0 +1,528 @@
+"""
+خادم PostgREST بديل فوق SQLite لاختبار SupabaseStore دون إنترنت
+Fake PostgREST server backed by SQLite (tests only)
+
+يدعم الجزء الذي يستخدمه storage/supabase_store.py فقط:
+    GET     select / order / limit / offset / مرشحات eq,neq,gt,gte,lt,lte,in
+            كل رد قراءة (و RPC) يُقص عند max_rows صفاً دون خطأ كما في PostgREST
+            Prefer: count=exact  ->  Content-Range
+    POST    إدخال كائن أو قائمة، on_conflict + resolution=merge-duplicates
+    POST    ‎/rpc/<دالة> لدوال التجميع (FUNCTIONS)
+    PATCH   تحديث بالمرشحات
+    DELETE  حذف بالمرشحات
+    return=representation في الكتابة
+
+ومن Supabase Auth: ‎/auth/v1/signup و ‎/auth/v1/token (password و refresh_token)
+و ‎/auth/v1/recover. الحسابات في auth_users والمفاتيح الخارجية مفعلة، ورمز الدخول
+في Authorization يحدد auth.uid() لسياسات RLS (POLICIES)؛ المفتاح العام وحده
+لا يرى صفوف أي مستخدم.
+
+ويحصي اتصالات TCP المفتوحة (connections) للتحقق من إعادة استخدام keep-alive.
+"""
+
+import json
+import re
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# نفس جداول supabase_schema.sql بأنواع SQLite (auth_users بدل auth.users، و RLS في POLICIES)
+SCHEMA = """
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE auth_users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    raw_user_meta_data TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE user_profiles (
+    id TEXT PRIMARY KEY REFERENCES auth_users(id) ON DELETE CASCADE,
+    display_name TEXT,
+    daily_goal INTEGER DEFAULT 100,
+    weekly_goal INTEGER DEFAULT 500,
+    monthly_goal INTEGER DEFAULT 2000,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE productivity_logs (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    user_id TEXT NOT NULL REFERENCES auth_users(id) ON DELETE CASCADE,
+    log_date TEXT NOT NULL,
+    time_slot INTEGER NOT NULL CHECK (time_slot >= 0 AND time_slot <= 47),
+    score INTEGER NOT NULL CHECK (score >= 0 AND score <= 4),
+    category TEXT NOT NULL,
+    notes TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, log_date, time_slot)
+);
+
+CREATE TABLE log_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- نفس مشغلات supabase_schema.sql على مستوى الصف (SQLite لا يدعم جداول الانتقال)
+CREATE TRIGGER productivity_logs_version_insert AFTER INSERT ON productivity_logs BEGIN
+    INSERT INTO log_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER productivity_logs_version_update AFTER UPDATE ON productivity_logs BEGIN
+    INSERT INTO log_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER productivity_logs_version_delete AFTER DELETE ON productivity_logs BEGIN
+    INSERT INTO log_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TABLE categories (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    user_id TEXT REFERENCES auth_users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    name_ar TEXT NOT NULL,
+    color TEXT DEFAULT '#4CAF50',
+    icon TEXT DEFAULT '📌',
+    is_default BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+-- handle_new_user: ملف شخصي لكل حساب جديد
+CREATE TRIGGER on_auth_user_created AFTER INSERT ON auth_users BEGIN
+    INSERT INTO user_profiles (id, display_name)
+    VALUES (NEW.id, json_extract(NEW.raw_user_meta_data, '$.display_name'));
+END;
+
+CREATE VIEW daily_category_totals AS
+SELECT user_id, log_date, category, SUM(score) AS score, COUNT(*) AS slots,
+       COUNT(*) FILTER (WHERE score = 0) AS s0,
+       COUNT(*) FILTER (WHERE score = 1) AS s1,
+       COUNT(*) FILTER (WHERE score = 2) AS s2,
+       COUNT(*) FILTER (WHERE score = 3) AS s3,
+       COUNT(*) FILTER (WHERE score = 4) AS s4,
+       SUM(1 << time_slot) AS mask
+FROM productivity_logs
+GROUP BY user_id, log_date, category;
+
+CREATE VIEW leaderboard_weekly AS
+SELECT user_id, SUM(score) AS score, COUNT(*) AS logs_count
+FROM productivity_logs
+WHERE log_date BETWEEN
+      date('now', 'localtime', '-' || ((strftime('%w', 'now', 'localtime') + 1) % 7) || ' days')
+  AND date('now', 'localtime')
+GROUP BY user_id
+HAVING SUM(score) > 0;
+
+CREATE VIEW leaderboard_monthly AS
+SELECT user_id, SUM(score) AS score, COUNT(*) AS logs_count
+FROM productivity_logs
+WHERE log_date BETWEEN date('now', 'localtime', 'start of month') AND date('now', 'localtime')
+GROUP BY user_id
+HAVING SUM(score) > 0;
+
+CREATE VIEW leaderboard_all_time AS
+SELECT user_id, SUM(score) AS score, COUNT(*) AS logs_count
+FROM productivity_logs
+WHERE log_date <= date('now', 'localtime')
+GROUP BY user_id
+HAVING SUM(score) > 0;
+"""
+
+# دوال RPC في supabase_schema.sql (p_categories تصل JSON، ويوم الأسبوع 0 = الإثنين)
+FUNCTIONS = {
+    "hour_weekday_totals": """
+        SELECT time_slot / 2 AS hour,
+               (CAST(strftime('%w', log_date) AS INTEGER) + 6) % 7 AS weekday,
+               SUM(score) AS score, COUNT(*) AS slots
+        FROM productivity_logs
+        WHERE user_id = :p_user_id AND log_date BETWEEN :p_start AND :p_end
+          AND (:p_categories IS NULL OR category IN (SELECT value FROM json_each(:p_categories)))
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """,
+}
+
+# سياسات RLS في supabase_schema.sql: {الجدول: (شرط القراءة، شرط التعديل والحذف، عمود المالك)}
+# حيث ? = auth.uid()، وعمود المالك يجب أن يساويه في كل صف يُدخل (None = قراءة فقط).
+# العروض الأخرى (المتصدرون) تعمل بصلاحيات المالك فلا تُصفى
+POLICIES = {
+    "user_profiles": ("id = ?", "id = ?", "id"),
+    "productivity_logs": ("user_id = ?", "user_id = ?", "user_id"),
+    "categories": ("(is_default = 1 OR user_id = ?)", "(user_id = ? AND is_default = 0)", "user_id"),
+    "log_versions": ("user_id = ?", None, None),
+    # security_invoker: سياسة productivity_logs
+    "daily_category_totals": ("user_id = ?", None, None),
+}
+
+# مدة صلاحية رمز الدخول (ثوانٍ) كما في expires_in
+TOKEN_TTL = 3600
+
+# db-max-rows: صغير عمداً ليظهر أي قراءة تعتمد على رد غير مقصوص
+MAX_ROWS = 100
+
+BOOLEAN_COLUMNS = {"is_default"}
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class QueryError(Exception):
+    pass
+
+
+class AuthError(Exception):
+    """رد خطأ من Supabase Auth أو رفض سياسة RLS (الحالة، الجسم)"""
+
+    def __init__(self, status: int, body: dict):
+        super().__init__(body)
+        self.status = status
+        self.body = body
+
+
+def _ident(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise QueryError(f"invalid identifier: {name}")
+    return name
+
+
+def _value(raw: str):
+    return {"true": 1, "false": 0, "null": None}.get(raw, raw)
+
+
+def _in_list(raw: str) -> list:
+    """قيم in.(a,"b,c") مع دعم الاقتباس والهروب كما في PostgREST"""
+    inner = raw[1:-1] if raw.startswith("(") and raw.endswith(")") else raw
+    items, current, quoted, escaped, was_quoted = [], [], False, False, False
+    for ch in inner:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\" and quoted:
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+            was_quoted = True
+        elif ch == "," and not quoted:
+            value = "".join(current)
+            items.append(value if was_quoted else _value(value))
+            current, was_quoted = [], False
+        else:
+            current.append(ch)
+    if inner:
+        value = "".join(current)
+        items.append(value if was_quoted else _value(value))
+    return items
+
+
+class FakePostgrest:
+    """الخادم مع قاعدة SQLite في الذاكرة (reset يفرغها بين الاختبارات)"""
+
+    def __init__(self, key: str = "test-key"):
+        self.key = key
+        self.connections = 0
+        self.requests = 0
+        self.token_ttl = TOKEN_TTL
+        self.max_rows = MAX_ROWS
+        self._lock = threading.Lock()
+        self.reset()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self) -> "FakePostgrest":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.db = sqlite3.connect(":memory:", check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.executescript(SCHEMA)
+            # {رمز الدخول: (المستخدم، وقت الانتهاء)} و {رمز التجديد: المستخدم}
+            self.access_tokens = {}
+            self.refresh_tokens = {}
+
+    # -----------------------------------------
+    # Supabase Auth
+    # -----------------------------------------
+
+    def _session(self, user_id: str) -> dict:
+        """جلسة جديدة للمستخدم بشكل رد ‎/auth/v1/token"""
+        row = self.db.execute("SELECT * FROM auth_users WHERE id = ?", (user_id,)).fetchone()
+        access_token, refresh_token = secrets.token_hex(16), secrets.token_hex(16)
+        self.access_tokens[access_token] = (user_id, time.time() + self.token_ttl)
+        self.refresh_tokens[refresh_token] = user_id
+        return {
+            "access_token": access_token, "refresh_token": refresh_token,
+            "token_type": "bearer", "expires_in": self.token_ttl,
+            "user": {"id": row["id"], "email": row["email"], "created_at": row["created_at"],
+                     "user_metadata": json.loads(row["raw_user_meta_data"])},
+        }
+
+    def auth(self, path: str, query, body: dict) -> dict:
+        """طلبات ‎/auth/v1 (AuthError لحساب مكرر أو بيانات دخول خاطئة)"""
+        params = dict(query)
+        with self._lock, self.db:
+            if path == "signup":
+                if len(body.get("password", "")) < 6:
+                    raise AuthError(422, {"msg": "Password should be at least 6 characters"})
+                user_id = str(uuid.uuid4())
+                try:
+                    self.db.execute(
+                        "INSERT INTO auth_users (id, email, password, raw_user_meta_data) VALUES (?, ?, ?, ?)",
+                        (user_id, body["email"], body["password"], json.dumps(body.get("data") or {})),
+                    )
+                except sqlite3.IntegrityError:
+                    raise AuthError(422, {"msg": "User already registered"})
+                return self._session(user_id)
+            if path == "token" and params.get("grant_type") == "password":
+                row = self.db.execute(
+                    "SELECT id FROM auth_users WHERE email = ? AND password = ?",
+                    (body.get("email"), body.get("password")),
+                ).fetchone()
+                if row is None:
+                    raise AuthError(400, {"error": "invalid_grant", "error_description": "Invalid login credentials"})
+                return self._session(row["id"])
+            if path == "token" and params.get("grant_type") == "refresh_token":
+                user_id = self.refresh_tokens.pop(body.get("refresh_token"), None)
+                if user_id is None:
+                    raise AuthError(400, {"error": "invalid_grant", "error_description": "Invalid Refresh Token"})
+                return self._session(user_id)
+            if path == "recover":
+                return {}
+        raise AuthError(404, {"msg": "not found"})
+
+    def session_for(self, user_id: str) -> str:
+        """رمز دخول لمستخدم بمعرف محدد (يُنشأ حسابه إن لم يوجد) لاختبارات المحركات"""
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO auth_users (id, email, password) VALUES (?, ?, '')",
+                (user_id, f"{user_id}@fake.test"),
+            )
+            for token, (owner, expires) in self.access_tokens.items():
+                if owner == user_id and expires > time.time():
+                    return token
+            return self._session(user_id)["access_token"]
+
+    def uid(self, authorization: str):
+        """auth.uid() لترويسة Authorization (None للمفتاح العام)"""
+        token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else ""
+        if token == self.key:
+            return None
+        with self._lock:
+            user_id, expires = self.access_tokens.get(token, (None, 0))
+        if user_id is None:
+            raise AuthError(401, {"message": "invalid JWT"})
+        if expires <= time.time():
+            raise AuthError(401, {"message": "JWT expired"})
+        return user_id
+
+    def _columns(self, table: str):
+        rows = self.db.execute(f"PRAGMA table_info({_ident(table)})").fetchall()
+        if not rows:
+            raise LookupError(table)
+        return {r["name"] for r in rows}
+
+    @staticmethod
+    def _row(row: sqlite3.Row, select: str) -> dict:
+        data = dict(row)
+        for col in BOOLEAN_COLUMNS & data.keys():
+            data[col] = bool(data[col])
+        if select and select != "*":
+            data = {c: data[c] for c in select.split(",")}
+        return data
+
+    def _where(self, filters, policy=None):
+        # policy: (شرط سياسة RLS، auth.uid()) يُضاف لكل استعلام
+        clauses, args = ([policy[0]], [policy[1]]) if policy else ([], [])
+        for column, expr in filters:
+            op, _, raw = expr.partition(".")
+            if op == "in":
+                items = _in_list(raw)
+                clauses.append(f"{_ident(column)} IN ({','.join('?' * len(items))})")
+                args.extend(items)
+            elif op in OPERATORS:
+                if raw == "null":
+                    clauses.append(f"{_ident(column)} IS {'NOT ' if op == 'neq' else ''}NULL")
+                else:
+                    clauses.append(f"{_ident(column)} {OPERATORS[op]} ?")
+                    args.append(_value(raw))
+            else:
+                raise QueryError(f"unsupported operator: {op}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    @staticmethod
+    def _order(spec: str) -> str:
+        terms = []
+        for term in spec.split(","):
+            parts = term.split(".")
+            sql = _ident(parts[0])
+            if "desc" in parts[1:]:
+                sql += " DESC"
+            if "nullslast" in parts[1:]:
+                sql += " NULLS LAST"
+            elif "nullsfirst" in parts[1:]:
+                sql += " NULLS FIRST"
+            terms.append(sql)
+        return " ORDER BY " + ", ".join(terms)
+
+    def _window(self, params: dict) -> tuple:
+        """(limit، offset) بعد القص عند max_rows"""
+        return min(int(params.get("limit", self.max_rows)), self.max_rows), int(params.get("offset", 0))
+
+    def call(self, name: str, args: dict, uid=None, params: dict = None):
+        """تنفيذ دالة RPC بمعاملاتها المسماة (SECURITY INVOKER: صفوف المستخدم فقط)"""
+        if name not in FUNCTIONS:
+            raise LookupError(name)
+        args = dict(args or {})
+        if args.get("p_user_id") != uid:
+            return 200, [], {}
+        if args.get("p_categories") is not None:
+            args["p_categories"] = json.dumps(args["p_categories"], ensure_ascii=False)
+        limit, offset = self._window(params or {})
+        with self._lock:
+            rows = [dict(r) for r in self.db.execute(FUNCTIONS[name], args)]
+            return 200, rows[offset:offset + limit], {}
+
+    def handle(self, method: str, table: str, query, body, prefer: str, uid=None):
+        """تنفيذ طلب باسم auth.uid() = uid وإرجاع (الحالة، الصفوف، ترويسات إضافية)"""
+        if table.startswith("rpc/") and method == "POST":
+            return self.call(table[len("rpc/"):], body, uid, dict(query))
+        params = dict(query)
+        filters = [(k, v) for k, v in query if k not in RESERVED]
+        select = params.get("select", "*")
+        returning = "return=representation" in prefer
+        with self._lock, self.db:
+            columns = self._columns(table)
+            read, write, owner = POLICIES.get(table, (None, None, None))
+            policy = None
+            if read is not None:
+                if method != "GET" and write is None:
+                    raise AuthError(403, {"message": f"permission denied for table {table}"})
+                policy = (read if method == "GET" else write, uid)
+            where, args = self._where(filters, policy)
+
+            if method == "GET":
+                sql = f"SELECT * FROM {table}{where}"
+                if "order" in params:
+                    sql += self._order(params["order"])
+                total = self.db.execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+                sql += " LIMIT %d OFFSET %d" % self._window(params)
+                rows = [self._row(r, select) for r in self.db.execute(sql, args)]
+                headers = {}
+                if "count=exact" in prefer:
+                    span = f"0-{len(rows) - 1}" if rows else "*"
+                    headers["Content-Range"] = f"{span}/{total}"
+                return 200, rows, headers
+
+            if method == "POST":
+                records = body if isinstance(body, list) else [body]
+                if owner is not None and any(r.get(owner) != uid for r in records):
+                    raise AuthError(403, {"message": f'new row violates row-level security policy for table "{table}"'})
+                out = []
+                for record in records:
+                    keys = [_ident(k) for k in record if k in columns]
+                    sql = (f"INSERT INTO {table} ({', '.join(keys)}) "
+                           f"VALUES ({', '.join('?' * len(keys))})")
+                    conflict = params.get("on_conflict")
+                    if conflict and "resolution=merge-duplicates" in prefer:
+                        target = [_ident(c) for c in conflict.split(",")]
+                        updates = [k for k in keys if k not in target]
+                        sql += f" ON CONFLICT ({', '.join(target)}) DO UPDATE SET "
+                        sql += ", ".join(f"{k} = excluded.{k}" for k in updates) or f"{target[0]} = excluded.{target[0]}"
+                    values = [int(v) if isinstance(v, bool) else v for v in (record[k] for k in keys)]
+                    out.append(self._row(self.db.execute(sql + " RETURNING *", values).fetchone(), select))
+                return 201, out if returning else [], {}
+
+            if method == "PATCH":
+                keys = [_ident(k) for k in body if k in columns]
+                if not keys:
+                    return 200, [], {}
+                values = [int(v) if isinstance(v, bool) else v for v in (body[k] for k in keys)]
+                sql = f"UPDATE {table} SET {', '.join(f'{k} = ?' for k in keys)}{where} RETURNING *"
+                rows = [self._row(r, select) for r in self.db.execute(sql, values + args).fetchall()]
+                return 200, rows if returning else [], {}
+
+            if method == "DELETE":
+                sql = f"DELETE FROM {table}{where} RETURNING *"
+                rows = [self._row(r, select) for r in self.db.execute(sql, args).fetchall()]
+                return 200, rows if returning else [], {}
+
+        raise QueryError(f"unsupported method: {method}")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # الترويسات والجسم في كتابتين: بدون NODELAY ينتظر Nagle تأكيداً مؤجلاً
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload, headers=None):
+                raw = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _dispatch(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if self.headers.get("apikey") != server.key:
+                    return self._send(401, {"message": "Invalid API key"})
+
+                parts = urlsplit(self.path)
+                query = parse_qsl(parts.query, keep_blank_values=True)
+                body = json.loads(raw) if raw else None
+                if parts.path.startswith("/auth/v1/") and self.command == "POST":
+                    try:
+                        return self._send(200, server.auth(parts.path[len("/auth/v1/"):], query, body or {}))
+                    except AuthError as e:
+                        return self._send(e.status, e.body)
+                if not parts.path.startswith("/rest/v1/"):
+                    return self._send(404, {"message": "not found"})
+                table = parts.path[len("/rest/v1/"):]
+                try:
+                    status, rows, headers = server.handle(
+                        self.command, table, query, body, self.headers.get("Prefer", ""),
+                        server.uid(self.headers.get("Authorization", ""))
+                    )
+                except AuthError as e:
+                    return self._send(e.status, e.body)
+                except LookupError:
+                    return self._send(404, {"message": f"relation {table} does not exist"})
+                except (QueryError, sqlite3.Error) as e:
+                    return self._send(400, {"message": str(e)})
+                self._send(status, rows, headers)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+        return Handler
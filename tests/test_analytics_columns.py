@@ -0,0 +1,108 @@
+"""
+اختبارات تطابق التحليلات من الأعمدة المضغوطة مع التحليلات من السجلات
+Columnar Analytics Equivalence Tests
+
+تشغيل الاختبارات:
+    pytest tests/test_analytics_columns.py -v
+"""
+
+import pytest
+import sys
+import os
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from analytics import AnalyticsSnapshot
+from storage.columnar import LogColumns
+
+
+def make_logs(seed: int, days: int = 90, density: float = 0.4):
+    """سجلات عشوائية مرتبة حسب (التاريخ، الفترة) كما ترجعها database.py"""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    categories = ["Work", "Study", "Sport", "Reading", "Other"]
+    logs = []
+    for offset in range(days):
+        log_date = (start + timedelta(days=offset)).isoformat()
+        for slot in range(48):
+            if rng.random() < density:
+                logs.append({
+                    "id": f"{log_date}_{slot}",
+                    "log_date": log_date,
+                    "time_slot": slot,
+                    "score": rng.randint(0, 4),
+                    "category": rng.choice(categories),
+                })
+    return logs
+
+
+@pytest.fixture(params=[1, 2, 3])
+def logs(request):
+    """عدة مجموعات بيانات مختلفة"""
+    return make_logs(request.param)
+
+
+def from_columns(logs):
+    """لقطة من الأعمدة المضغوطة كما تبنيها صفحة التحليلات (get_analytics_snapshot)"""
+    return AnalyticsSnapshot.from_columns(LogColumns.from_logs(logs))
+
+
+class TestColumnsEquivalence:
+    """
+    اللقطة المبنية من الأعمدة (bincount) تعطي نفس مخرجات السجلات في كل دالة
+    """
+
+    def test_heatmap(self, logs):
+        expected = analytics.generate_heatmap_data(logs)
+        actual = analytics.generate_heatmap_data(from_columns(logs))
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    def test_trends(self, logs):
+        expected = analytics.calculate_trends(logs)
+        actual = analytics.calculate_trends(from_columns(logs))
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    def test_category_breakdown(self, logs):
+        expected = analytics.get_category_breakdown(logs)
+        actual = analytics.get_category_breakdown(from_columns(logs))
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    def test_best_hour_and_day(self, logs):
+        snapshot = from_columns(logs)
+        assert analytics.get_best_hour(snapshot) == pytest.approx(analytics.get_best_hour(logs))
+        assert analytics.get_best_day(snapshot) == analytics.get_best_day(logs)
+
+    def test_score_distribution(self, logs):
+        expected = analytics.get_score_distribution(logs)
+        assert analytics.get_score_distribution(from_columns(logs)) == expected
+        assert analytics.get_score_distribution(LogColumns.from_logs(logs)) == expected
+
+    def test_time_patterns(self, logs):
+        expected = analytics.get_time_patterns(logs)
+        assert analytics.get_time_patterns(from_columns(logs)) == expected
+
+    @pytest.mark.parametrize("goal", [0, 40, 60, 200])
+    def test_longest_streak(self, logs, goal):
+        expected = analytics.calculate_longest_streak(logs, goal)
+        assert analytics.calculate_longest_streak(from_columns(logs), goal) == expected
+        assert analytics.calculate_longest_streak(LogColumns.from_logs(logs), goal) == expected
+
+    def test_period_report(self, logs):
+        expected = analytics.generate_period_report(logs, 50, "الربع")
+        assert analytics.generate_period_report(from_columns(logs), 50, "الربع") == expected
+
+    def test_empty(self):
+        empty = AnalyticsSnapshot.from_columns(LogColumns.empty())
+        assert analytics.calculate_trends(empty).empty
+        assert analytics.get_category_breakdown(empty).empty
+        assert analytics.get_best_hour(empty) == analytics.get_best_hour([])
+        assert analytics.get_best_day(empty) == analytics.get_best_day([])
+        assert analytics.get_time_patterns(empty) == analytics.get_time_patterns([])
+        assert analytics.generate_period_report(empty, 50, "x") == {"has_data": False}
+        assert analytics.calculate_longest_streak(empty, 50) == 0
+        assert analytics.generate_heatmap_data(empty).to_numpy().sum() == 0
@@ -125,14 +125,15 @@ class TestAuthentication:
         - المستخدم ينشئ حساباً جديداً
         
         النتيجة المتوقعة:
-        - إنشاء ملف users.json في LOCAL_DATA_DIR
+        - إنشاء سجل المستخدمين users.db في LOCAL_DATA_DIR
         - تخزين بيانات المستخدم بشكل صحيح
         
         لماذا هذا مهم؟
         - يضمن استمرارية البيانات بين الجلسات
         - يتحقق من صحة آلية التخزين
         """
-        from auth import sign_up, _get_users_file
+        from auth import sign_up
+        from storage.user_registry import UserRegistry
         
         result = sign_up(
             email="newuser@test.com",
@@ -143,15 +144,14 @@ class TestAuthentication:
         assert result["status"] == "success"
         
         # التحقق من إنشاء الملف
-        users_file = _get_users_file()
+        users_file = mock_local_data_dir / "users.db"
         assert users_file.exists()
         
-        # التحقق من محتوى الملف
-        with open(users_file, "r", encoding="utf-8") as f:
-            users = json.load(f)
+        # التحقق من المحتوى بفتح الملف من جديد
+        user = UserRegistry(users_file).get_by_email("newuser@test.com")
         
-        assert "newuser@test.com" in users
-        assert users["newuser@test.com"]["metadata"]["display_name"] == "New User"
+        assert user is not None
+        assert user["metadata"]["display_name"] == "New User"
     
     
     def test_signin_unregistered_email_returns_error(self, mock_local_data_dir):
@@ -369,6 +369,48 @@ class TestAnalytics:
         assert avg_score == 0
 
 
+    def test_snapshot_matches_list_results(self, sample_logs):
+        """
+        اختبار: اللقطة تعطي نفس نتائج قائمة السجلات
+
+        لماذا هذا مهم؟
+        - صفحة التحليلات تمرر لقطة واحدة لكل الدوال بدل القائمة
+        """
+        from analytics import (
+            AnalyticsSnapshot, get_statistics_summary, get_time_patterns,
+            generate_period_report, get_category_breakdown
+        )
+
+        snapshot = AnalyticsSnapshot(sample_logs)
+
+        assert len(snapshot) == 4
+        assert snapshot.total_score == 13
+        assert snapshot.scores == {0: 0, 1: 0, 2: 1, 3: 1, 4: 2}
+        assert snapshot.categories["Work"] == [8, 2]
+        assert get_statistics_summary(snapshot, 10) == get_statistics_summary(sample_logs, 10)
+        assert get_time_patterns(snapshot) == get_time_patterns(sample_logs)
+        assert generate_period_report(snapshot, 10, "اليوم") == generate_period_report(sample_logs, 10, "اليوم")
+        assert get_category_breakdown(snapshot).equals(get_category_breakdown(sample_logs))
+
+
+    def test_snapshot_parses_each_date_once(self, sample_logs):
+        """
+        اختبار: تحليل التاريخ مرة واحدة لكل يوم مهما تعدد استخدام اللقطة
+
+        لماذا هذا مهم؟
+        - تحليل النصوص كان يتكرر في كل دالة ولكل سجل
+        """
+        import analytics
+        from analytics import AnalyticsSnapshot, get_statistics_summary, generate_heatmap_data
+
+        with patch.object(analytics, "datetime", wraps=analytics.datetime) as mock_datetime:
+            snapshot = AnalyticsSnapshot(sample_logs)
+            get_statistics_summary(snapshot, 10)
+            generate_heatmap_data(snapshot)
+
+        assert mock_datetime.strptime.call_count == 1
+
+
 # =============================================
 # 3. اختبارات عمليات قاعدة البيانات (database.py)
 # =============================================
@@ -445,6 +487,7 @@ class TestDatabase:
         assert len(logs) == 3, "يجب أن يكون هناك 3 سجلات"
     
     
+    @patch('database.LOG_STORAGE_BACKEND', "json")
     def test_user_data_path_isolation(self, mock_local_data_dir):
         """
         اختبار: التحقق من عزل مسارات ملفات المستخدمين
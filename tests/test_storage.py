@@ -0,0 +1,2246 @@
+"""
+اختبارات محركات تخزين السجلات
+Storage Engine Tests
+
+تشغيل الاختبارات:
+    pytest tests/test_storage.py -v
+"""
+
+import pytest
+import sys
+import os
+import shutil
+import tempfile
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def temp_data_dir():
+    """مجلد مؤقت معزول عن بيانات التطبيق الحقيقية"""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def mock_local_data_dir(temp_data_dir):
+    """محاكاة LOCAL_DATA_DIR باستخدام مجلد مؤقت"""
+    with patch('config.LOCAL_DATA_DIR', temp_data_dir):
+        with patch('database.LOCAL_DATA_DIR', temp_data_dir):
+            with patch('auth.LOCAL_DATA_DIR', temp_data_dir):
+                yield temp_data_dir
+
+
+@pytest.fixture(scope="session")
+def fake_postgrest():
+    """خادم PostgREST بديل فوق SQLite (بدل Supabase الحقيقي)"""
+    from tests.fake_postgrest import FakePostgrest
+    server = FakePostgrest().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def supabase_auth(fake_postgrest, mock_local_data_dir):
+    """وضع Supabase كامل أمام الخادم البديل: الحسابات عبر Supabase Auth ورموزها لكل طلب"""
+    fake_postgrest.reset()
+    with patch('database.USE_LOCAL_STORAGE', False), \
+         patch('database.SUPABASE_URL', fake_postgrest.url), \
+         patch('database.SUPABASE_KEY', fake_postgrest.key), \
+         patch('auth.USE_LOCAL_STORAGE', False), \
+         patch('auth.SUPABASE_URL', fake_postgrest.url), \
+         patch('auth.SUPABASE_KEY', fake_postgrest.key), \
+         patch('storage.supabase_store.PAGE', fake_postgrest.max_rows):
+        yield fake_postgrest
+
+
+@pytest.fixture
+def supabase(supabase_auth):
+    """وضع Supabase مع رمز دخول لأي معرف مستخدم (اختبارات المحركات لا تمر بالتسجيل)"""
+    with patch('database._supabase_token', supabase_auth.session_for):
+        yield supabase_auth
+
+
+@pytest.fixture(params=["partitioned", "json", "journal", "sqlite", "grid", "supabase"])
+def backend(request, mock_local_data_dir):
+    """تشغيل نفس الاختبار على كل محرك تخزين"""
+    if request.param == "supabase":
+        request.getfixturevalue("supabase")
+    with patch('database.LOG_STORAGE_BACKEND', request.param):
+        yield request.param
+
+
+class TestLogStoreContract:
+    """
+    كل المحركات يجب أن ترجع نفس القواميس لنفس العمليات
+    """
+
+    def test_upsert_keeps_single_row_and_id(self, backend):
+        from database import log_productivity, get_logs_by_date, get_log_by_slot
+
+        user_id = "contract_user"
+        today = date.today()
+
+        first = log_productivity(user_id, today, 10, 2, "Work")
+        second = log_productivity(user_id, today, 10, 4, "Study", notes="تحديث")
+
+        assert first["status"] == "success"
+        assert second["data"]["id"] == first["data"]["id"]
+
+        logs = get_logs_by_date(user_id, today)
+        assert len(logs) == 1
+        assert logs[0]["score"] == 4
+        assert logs[0]["category"] == "Study"
+        assert logs[0]["notes"] == "تحديث"
+        assert get_log_by_slot(user_id, today, 10)["id"] == first["data"]["id"]
+        assert get_log_by_slot(user_id, today, 11) is None
+
+    def test_range_is_inclusive_and_ordered(self, backend):
+        from database import log_productivity, get_logs_by_range
+
+        user_id = "range_user"
+        today = date.today()
+        for days_ago in (0, 3, 10):
+            d = today - timedelta(days=days_ago)
+            log_productivity(user_id, d, 5, 3, "Work")
+            log_productivity(user_id, d, 1, 1, "Work")
+
+        logs = get_logs_by_range(user_id, today - timedelta(days=3), today)
+
+        assert [(l["log_date"], l["time_slot"]) for l in logs] == [
+            (str(today - timedelta(days=3)), 1),
+            (str(today - timedelta(days=3)), 5),
+            (str(today), 1),
+            (str(today), 5),
+        ]
+
+    def test_delete_removes_only_own_log(self, backend):
+        from database import log_productivity, delete_log, get_logs_by_date
+
+        today = date.today()
+        mine = log_productivity("owner", today, 3, 3, "Work")["data"]
+        log_productivity("other", today, 3, 3, "Work")
+
+        assert delete_log(mine["id"], user_id="other")["status"] == "success"
+        assert len(get_logs_by_date("owner", today)) == 1
+
+        delete_log(mine["id"], user_id="owner")
+        assert get_logs_by_date("owner", today) == []
+        assert len(get_logs_by_date("other", today)) == 1
+
+    def test_version_changes_with_every_write_only(self, backend):
+        import database
+        from database import log_productivity, log_productivity_bulk, delete_log, get_logs_by_date
+
+        store = database._get_log_store()
+        today = date.today()
+        seen = [store.version("version_user")]
+
+        log = log_productivity("version_user", today, 1, 2, "Work")["data"]
+        seen.append(store.version("version_user"))
+        log_productivity("version_user", today, 1, 3, "Work")
+        seen.append(store.version("version_user"))
+        log_productivity_bulk("version_user", [
+            {"log_date": today, "time_slot": s, "score": 1, "category": "Work"} for s in (2, 3)
+        ])
+        seen.append(store.version("version_user"))
+        delete_log(log["id"], user_id="version_user")
+        seen.append(store.version("version_user"))
+
+        assert len(set(seen)) == len(seen)
+        get_logs_by_date("version_user", today)
+        log_productivity("version_other", today, 1, 2, "Work")
+        assert store.version("version_user") == seen[-1]
+
+
+class TestSQLiteLogStore:
+    """
+    خصائص خاصة بمحرك SQLite
+    """
+
+    def test_range_query_uses_user_date_index(self, temp_data_dir):
+        from storage.sqlite_store import SQLiteLogStore
+
+        store = SQLiteLogStore(temp_data_dir / "productivity.db")
+        plan = store._conn().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM productivity_logs "
+            "WHERE user_id = ? AND log_date BETWEEN ? AND ?",
+            ("u", "2026-01-01", "2026-01-31"),
+        ).fetchall()
+
+        detail = " ".join(row["detail"] for row in plan)
+        assert "SCAN" not in detail.replace("USING INDEX", "")
+        assert "USING" in detail
+
+    def test_version_reads_counter_row_only(self, temp_data_dir):
+        from storage.sqlite_store import SQLiteLogStore
+
+        store = SQLiteLogStore(temp_data_dir / "productivity.db")
+        store.upsert_many("u", [
+            {"id": f"id{s}", "log_date": "2026-01-01", "time_slot": s, "score": 2,
+             "category": "Work", "notes": None, "updated_at": None}
+            for s in range(48)
+        ])
+        statements = []
+        store._conn().set_trace_callback(statements.append)
+        assert store.version("u") == "v1"
+        store._conn().set_trace_callback(None)
+
+        assert len(statements) == 1 and "productivity_logs" not in statements[0]
+        plan = store._conn().execute(
+            "EXPLAIN QUERY PLAN SELECT version FROM log_versions WHERE user_id = ?", ("u",)
+        ).fetchall()
+        assert "PRIMARY KEY" in " ".join(row["detail"] for row in plan)
+
+    def test_schema_rejects_out_of_range_values(self, temp_data_dir):
+        import sqlite3
+        from storage.sqlite_store import SQLiteLogStore
+
+        store = SQLiteLogStore(temp_data_dir / "productivity.db")
+        with pytest.raises(sqlite3.IntegrityError):
+            store.upsert("u", {
+                "id": "x", "log_date": "2026-01-01", "time_slot": 48,
+                "score": 2, "category": "Work", "notes": None, "updated_at": None,
+            })
+
+
+class TestJournalLogStore:
+    """
+    الكتابة الإلحاقية والضغط والتعافي من انقطاع الكتابة
+    """
+
+    def _store(self, temp_data_dir, **kwargs):
+        from database import _load_json, _save_json
+        from storage.journal_store import JournalLogStore
+
+        def path_for(user_id):
+            (temp_data_dir / user_id).mkdir(parents=True, exist_ok=True)
+            return temp_data_dir / user_id / "productivity_logs.json"
+
+        return JournalLogStore(path_for, _load_json, _save_json, **kwargs)
+
+    def _record(self, slot, score):
+        return {"id": f"id_{slot}_{score}", "user_id": "u", "log_date": "2026-01-01",
+                "time_slot": slot, "score": score, "category": "Work",
+                "notes": None, "updated_at": None}
+
+    def test_writes_append_without_touching_snapshot(self, temp_data_dir):
+        store = self._store(temp_data_dir)
+        store.upsert("u", self._record(1, 2))
+        store.upsert("u", self._record(1, 4))
+
+        assert not (temp_data_dir / "u" / "productivity_logs.json").exists()
+        lines = store._journal_file("u").read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 2
+        assert store.get_by_slot("u", "2026-01-01", 1)["score"] == 4
+
+    def test_torn_last_line_is_ignored(self, temp_data_dir):
+        store = self._store(temp_data_dir)
+        store.upsert("u", self._record(1, 2))
+        with open(store._journal_file("u"), "a", encoding="utf-8") as f:
+            f.write('{"op": "upsert", "record": {"log_da')
+
+        store.upsert("u", self._record(2, 3))
+
+        assert [l["time_slot"] for l in store.get_by_date("u", "2026-01-01")] == [1, 2]
+
+    def test_threshold_compacts_into_snapshot(self, temp_data_dir):
+        store = self._store(temp_data_dir, compact_threshold=1000)
+        for slot in range(20):
+            store.upsert("u", self._record(slot, slot % 5))
+
+        # تجاوز الحد يدمج السجل تلقائياً في اللقطة
+        assert (temp_data_dir / "u" / "productivity_logs.json").exists()
+
+        store.delete("u", "id_0_0")
+
+        store.compact("u")
+
+        assert not store._journal_file("u").exists()
+        assert len(store.get_by_date("u", "2026-01-01")) == 19
+
+    def test_writes_do_not_read_history(self, temp_data_dir):
+        store = self._store(temp_data_dir)
+        store.upsert("u", self._record(1, 2))
+
+        with patch.object(store, "_read", side_effect=AssertionError("read")):
+            store.upsert("u", self._record(1, 4))
+            store.upsert("u", self._record(2, 3))
+            store.delete("u", "id_2_3")
+        assert store.get_by_slot("u", "2026-01-01", 1) == {**self._record(1, 4), "id": "id_1_2"}
+
+    def test_interrupted_compaction_keeps_history(self, temp_data_dir):
+        store = self._store(temp_data_dir)
+        for slot in range(3):
+            store.upsert("u", self._record(slot, 1))
+        store.compact("u")
+        store.upsert("u", self._record(3, 1))
+
+        def torn_save(path, data):
+            path.write_text("[", encoding="utf-8")
+            raise OSError("انقطاع")
+
+        with patch.object(store, "_save", side_effect=torn_save):
+            with pytest.raises(OSError):
+                store.compact("u")
+
+        store.invalidate("u")
+        assert [l["time_slot"] for l in store.get_by_date("u", "2026-01-01")] == [0, 1, 2, 3]
+        assert sorted(p.name for p in (temp_data_dir / "u").iterdir()) == [
+            "productivity_logs.journal.jsonl", "productivity_logs.json"
+        ]
+
+    def test_replay_deletes_by_id(self):
+        from storage.journal_store import replay
+
+        snapshot = [self._record(slot, 1) for slot in range(3)]
+        entries = [
+            {"op": "upsert", "record": self._record(1, 4)},
+            {"op": "delete", "id": "id_1_1"},
+            {"op": "delete", "id": "id_2_1"},
+            {"op": "delete", "id": "missing"},
+        ]
+        assert replay(snapshot, entries) == [self._record(0, 1), self._record(1, 4)]
+
+
+class TestLogIndexCache:
+    """
+    الفهرس في الذاكرة: القراءة المتكررة لا تعيد تحليل الملف
+    """
+
+    def _counting_store(self, temp_data_dir):
+        from database import _load_json, _save_json
+        from storage.json_store import JsonLogStore
+
+        calls = {"load": 0}
+
+        def load(path, default=None):
+            calls["load"] += 1
+            return _load_json(path, default)
+
+        store = JsonLogStore(lambda user_id: temp_data_dir / f"{user_id}.json", load, _save_json)
+        return store, calls
+
+    def _record(self, log_date, slot, score=3):
+        return {"id": f"{log_date}_{slot}", "user_id": "u", "log_date": log_date,
+                "time_slot": slot, "score": score, "category": "Work",
+                "notes": None, "updated_at": None}
+
+    def test_warm_reads_do_not_reload_file(self, temp_data_dir):
+        store, calls = self._counting_store(temp_data_dir)
+        store.upsert("u", self._record("2026-01-01", 1))
+        store.upsert("u", self._record("2026-01-02", 2))
+        loads_after_writes = calls["load"]
+
+        for _ in range(5):
+            store.get_by_date("u", "2026-01-01")
+            store.get_by_slot("u", "2026-01-02", 2)
+            store.get_by_range("u", "2026-01-01", "2026-01-31")
+
+        assert calls["load"] == loads_after_writes
+
+    def test_external_change_invalidates_index(self, temp_data_dir):
+        import json
+
+        store, calls = self._counting_store(temp_data_dir)
+        store.upsert("u", self._record("2026-01-01", 1))
+        assert len(store.get_by_date("u", "2026-01-01")) == 1
+
+        # تعديل الملف من عملية أخرى (حجم مختلف)
+        with open(temp_data_dir / "u.json", "w", encoding="utf-8") as f:
+            json.dump([self._record("2026-01-01", 1), self._record("2026-01-01", 7)], f)
+
+        assert [l["time_slot"] for l in store.get_by_date("u", "2026-01-01")] == [1, 7]
+
+    def test_returned_records_are_copies(self, temp_data_dir):
+        store, _ = self._counting_store(temp_data_dir)
+        store.upsert("u", self._record("2026-01-01", 1, score=2))
+
+        store.get_by_date("u", "2026-01-01")[0]["score"] = 4
+
+        assert store.get_by_slot("u", "2026-01-01", 1)["score"] == 2
+
+
+class TestLogIndexRange:
+    """
+    الاستعلام عن الفترات بالبحث الثنائي على تواريخ مرتبة
+    """
+
+    def test_range_matches_full_scan(self):
+        import random
+        from storage.log_index import LogIndex
+
+        start = date(2023, 1, 1)
+        logs = []
+        for i in range(600):
+            d = str(start + timedelta(days=random.randrange(900)))
+            logs.append({"id": f"{d}_{i % 48}", "log_date": d, "time_slot": i % 48, "score": i % 5})
+        random.shuffle(logs)
+        index = LogIndex(logs)
+
+        lo, hi = str(start + timedelta(days=100)), str(start + timedelta(days=130))
+        expected = sorted(
+            {(l["log_date"], l["time_slot"]) for l in logs if lo <= l["log_date"] <= hi}
+        )
+        assert [(l["log_date"], l["time_slot"]) for l in index.range(lo, hi)] == expected
+        assert index.dates == sorted(index.by_date)
+
+    def test_dates_stay_sorted_on_put_and_remove(self):
+        from storage.log_index import LogIndex
+
+        index = LogIndex()
+        for d in ("2026-03-01", "2026-01-01", "2026-02-01"):
+            index.put({"id": d, "log_date": d, "time_slot": 0})
+        index.remove_id("2026-02-01")
+
+        assert index.dates == ["2026-01-01", "2026-03-01"]
+        assert [l["log_date"] for l in index.records()] == ["2026-01-01", "2026-03-01"]
+
+
+class TestLogColumns:
+    """
+    التمثيل العمودي يعطي نفس نتائج قوائم القواميس
+    """
+
+    def _logs(self):
+        start = date(2026, 1, 1)
+        return [
+            {"log_date": str(start + timedelta(days=i % 40)), "time_slot": (i * 7) % 48,
+             "score": i % 5, "category": ["Work", "Study", "Health"][i % 3]}
+            for i in range(500)
+        ]
+
+    def test_columns_are_compact_and_sorted(self):
+        from storage.columnar import LogColumns
+
+        columns = LogColumns.from_logs(self._logs())
+
+        assert len(columns) == 500
+        assert columns.nbytes == 500 * 7
+        assert columns.categories == ["Work", "Study", "Health"]
+        keys = list(zip(columns.day.tolist(), columns.slot.tolist()))
+        assert keys == sorted(keys)
+
+    def test_simple_aggregates_match_dict_logs(self):
+        from analytics import calculate_daily_score, get_logs_summary_by_date, get_score_distribution
+        from storage.columnar import LogColumns
+
+        logs = self._logs()
+        columns = LogColumns.from_logs(logs)
+
+        assert calculate_daily_score(columns) == calculate_daily_score(logs)
+        assert get_logs_summary_by_date(columns) == get_logs_summary_by_date(logs)
+        assert get_score_distribution(columns) == get_score_distribution(logs)
+
+    def test_between_and_category_filter(self):
+        from storage.columnar import LogColumns
+
+        logs = self._logs()
+        columns = LogColumns.from_logs(logs)
+        start, end = date(2026, 1, 5), date(2026, 1, 9)
+
+        window = columns.between(start, end).select_categories(["Work"])
+
+        expected = [l for l in logs
+                    if str(start) <= l["log_date"] <= str(end) and l["category"] == "Work"]
+        assert len(window) == len(expected)
+        assert int(window.score.sum()) == sum(l["score"] for l in expected)
+
+    def test_snapshot_from_columns_matches_dict_snapshot(self):
+        from analytics import AnalyticsSnapshot
+        from storage.columnar import LogColumns
+
+        logs = sorted(self._logs(), key=lambda l: (l["log_date"], l["time_slot"]))
+        expected = AnalyticsSnapshot(logs)
+        snapshot = AnalyticsSnapshot.from_columns(LogColumns.from_logs(logs))
+
+        assert snapshot.total_score == expected.total_score
+        assert len(snapshot) == len(expected)
+        for bucket in ("daily", "hourly", "weekdays", "categories", "scores", "cells"):
+            assert getattr(snapshot, bucket) == getattr(expected, bucket), bucket
+            assert list(getattr(snapshot, bucket)) == list(getattr(expected, bucket)), bucket
+        assert len(AnalyticsSnapshot.from_columns(LogColumns.empty())) == 0
+
+    def test_analytics_snapshot_built_from_columns(self, backend):
+        import database
+        from analytics import AnalyticsSnapshot
+        from database import log_productivity, get_analytics_snapshot, get_logs_by_range
+
+        if backend == "supabase":
+            pytest.skip("وضع Supabase يجمع في الخادم")
+        for i in range(12):
+            log_productivity("columns_user", date(2026, 2, 1 + i % 4), i, i % 5, ["Work", "Study"][i % 2])
+        start, end = date(2026, 2, 1), date(2026, 2, 28)
+
+        with patch("database.get_log_columns", wraps=database.get_log_columns) as columns:
+            snapshot = get_analytics_snapshot("columns_user", start, end, ["Study"])
+        columns.assert_called_once()
+
+        expected = AnalyticsSnapshot([l for l in get_logs_by_range("columns_user", start, end)
+                                      if l["category"] == "Study"])
+        assert snapshot.categories == expected.categories
+        assert snapshot.daily == expected.daily
+        assert snapshot.cells == expected.cells
+
+
+class TestDailyRollup:
+    """
+    الملخص اليومي يُحدث مع كل كتابة ويطابق السجلات الخام
+    """
+
+    def test_rollup_tracks_upsert_update_and_delete(self, backend):
+        from database import log_productivity, delete_log, get_daily_rollup, get_daily_scores
+
+        user_id = "rollup_user"
+        today = date.today()
+        first = log_productivity(user_id, today, 1, 4, "Work")["data"]
+        log_productivity(user_id, today, 2, 2, "Study")
+        # تحديث نفس الفترة يطرح السجل القديم من الملخص
+        log_productivity(user_id, today, 1, 3, "Study")
+
+        day = get_daily_rollup(user_id, today, today)[today]
+        assert day["score"] == 5
+        assert day["slots"] == 2
+        assert day["categories"] == {"Study": [5, 2]}
+        assert day["scores"] == [0, 0, 1, 1, 0]
+
+        delete_log(first["id"], user_id=user_id)
+        assert get_daily_scores(user_id, today, today) == {today: 2}
+
+    def test_category_filter_and_range(self, backend):
+        from database import log_productivity, get_daily_scores
+
+        user_id = "rollup_filter"
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        log_productivity(user_id, yesterday, 1, 4, "Work")
+        log_productivity(user_id, today, 1, 3, "Work")
+        log_productivity(user_id, today, 2, 2, "Study")
+
+        assert get_daily_scores(user_id, yesterday, today) == {yesterday: 4, today: 5}
+        assert get_daily_scores(user_id, today, today, ["Study"]) == {today: 2}
+
+    @patch('database.LOG_STORAGE_BACKEND', "json")
+    def test_external_change_rebuilds_rollup(self, mock_local_data_dir):
+        import json
+        from database import log_productivity, get_daily_scores, _get_logs_file
+
+        user_id = "rollup_external"
+        today = date.today()
+        log_productivity(user_id, today, 1, 4, "Work")
+        assert get_daily_scores(user_id, today, today) == {today: 4}
+
+        # كتابة ملف السجلات مباشرة (مثل استيراد نسخة احتياطية)
+        logs_file = _get_logs_file(user_id)
+        logs = json.loads(logs_file.read_text(encoding="utf-8"))
+        logs.append(dict(logs[0], id="external", time_slot=9, score=1))
+        logs_file.write_text(json.dumps(logs), encoding="utf-8")
+
+        assert get_daily_scores(user_id, today, today) == {today: 5}
+
+    def test_warm_reads_do_not_scan_logs(self, mock_local_data_dir):
+        from database import log_productivity, get_daily_scores, _get_log_store
+
+        user_id = "rollup_warm"
+        today = date.today()
+        log_productivity(user_id, today, 1, 4, "Work")
+
+        with patch.object(_get_log_store(), "get_by_range", side_effect=AssertionError("scan")):
+            for _ in range(3):
+                assert get_daily_scores(user_id, today - timedelta(days=30), today) == {today: 4}
+
+
+    def test_slot_bitmap_tracks_writes(self, backend):
+        from database import (
+            log_productivity, delete_log, get_slot_mask, is_slot_logged, logged_slot_count,
+            first_unlogged_slot, count_missed_slots, _get_log_store
+        )
+
+        user_id = "bitmap_user"
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        first = log_productivity(user_id, today, 0, 4, "Work")["data"]
+        log_productivity(user_id, today, 1, 2, "Work")
+        log_productivity(user_id, today, 47, 0, "Study")
+        log_productivity(user_id, today, 1, 3, "Study")
+        log_productivity(user_id, yesterday, 5, 1, "Work")
+
+        with patch.object(_get_log_store(), "get_by_date", side_effect=AssertionError("records")), \
+             patch.object(_get_log_store(), "get_by_range", side_effect=AssertionError("records")):
+            assert get_slot_mask(user_id, today) == 0b11 | (1 << 47)
+            assert is_slot_logged(user_id, today, 47)
+            assert not is_slot_logged(user_id, today, 2)
+            assert logged_slot_count(user_id, today) == 3
+            assert first_unlogged_slot(user_id, today) == 2
+            assert count_missed_slots(user_id, yesterday - timedelta(days=1), today) == 3 * 48 - 4
+
+        delete_log(first["id"], user_id=user_id)
+        assert first_unlogged_slot(user_id, today) == 0
+        assert first_unlogged_slot(user_id, yesterday, until=5) == 0
+        assert logged_slot_count(user_id, today) == 2
+
+    @patch('database.LOG_STORAGE_BACKEND', "json")
+    def test_rollup_file_without_bitmap_is_rebuilt(self, mock_local_data_dir):
+        import json
+        from database import log_productivity, get_slot_mask, _get_rollup_file, _daily_rollups
+
+        user_id = "bitmap_legacy"
+        today = date.today()
+        log_productivity(user_id, today, 3, 4, "Work")
+
+        # ملف ملخص بالبنية السابقة (نفس النسخة بلا mask)
+        path = _get_rollup_file(user_id)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        del data["format"]
+        for day in data["days"].values():
+            del day["mask"]
+        path.write_text(json.dumps(data), encoding="utf-8")
+        _daily_rollups.clear()
+
+        assert get_slot_mask(user_id, today) == 1 << 3
+
+    def test_slot_mask_helpers(self):
+        from storage import slot_mask
+
+        mask = slot_mask.FULL_DAY & ~slot_mask.bit(10)
+        assert slot_mask.count(mask) == 47
+        assert slot_mask.first_unlogged(mask) == 10
+        assert slot_mask.first_unlogged(mask, until=10) is None
+        assert slot_mask.first_unlogged(slot_mask.FULL_DAY) is None
+        assert not slot_mask.is_logged(mask, 48)
+        assert slot_mask.missed([mask, 0], days=3) == 1 + 48 + 48
+        assert slot_mask.missed([mask], days=1, until=10) == 0
+
+
+class TestStreakState:
+    """
+    حالة السلسلة المحفوظة تطابق calculate_streak و calculate_longest_streak
+    """
+
+    def test_incremental_matches_full_computation(self):
+        import random
+        from storage import rollup, streaks
+
+        rng = random.Random(5)
+        days = {}
+        state = streaks.compute(days, 10)
+        start = date(2025, 1, 1)
+        for _ in range(400):
+            d = str(start + timedelta(days=rng.randint(0, 60)))
+            record = {"log_date": d, "score": rng.randint(0, 4), "category": "Work"}
+            sign = 1 if d not in days or rng.random() < 0.6 else -1
+            before = days[d]["score"] if d in days else None
+            rollup.apply(days, record, sign)
+            after = days[d]["score"] if d in days else None
+            state = streaks.advance(state, days, d, before, after)
+            assert state == streaks.compute(days, 10)
+
+    def test_current_matches_calculate_streak(self):
+        from analytics import calculate_streak, calculate_longest_streak
+        from storage import streaks
+
+        today = date.today()
+        scores = {today - timedelta(days=i): s for i, s in enumerate([5, 0, 12, 12, 12, 3, 12, 12])}
+        scores[today + timedelta(days=2)] = 20
+        days = {str(d): {"score": s} for d, s in scores.items()}
+        logs = [{"log_date": str(d), "score": s} for d, s in scores.items()]
+
+        for goal in (0, 4, 10, 12, 30):
+            state = streaks.compute(days, goal)
+            assert streaks.current(state, days, today) == calculate_streak(scores, goal)
+            assert state["longest"] == calculate_longest_streak(logs, goal)
+
+    def test_streak_longer_than_thirty_days(self, backend):
+        from database import log_productivity, get_streak, update_user_goals
+
+        user_id = "streak_user"
+        today = date.today()
+        for i in range(45):
+            log_productivity(user_id, today - timedelta(days=i), 1, 4, "Work")
+
+        streak = get_streak(user_id, 4)
+        assert streak["current"] == 45
+        assert streak["longest"] == 45
+        assert streak["last_day"] == today
+
+        # رفع الهدف يعيد حساب الحالة المحفوظة
+        update_user_goals(user_id, 5, 500, 2000)
+        assert get_streak(user_id, 5)["current"] == 0
+
+        log_productivity(user_id, today - timedelta(days=10), 2, 4, "Work")
+        assert get_streak(user_id, 5)["longest"] == 1
+
+
+class TestLeaderboard:
+    """
+    ترتيب المتصدرين المحفوظ يطابق إعادة الحساب الكاملة
+    """
+
+    def _signup(self, email, name):
+        from auth import sign_up
+        return sign_up(email, "secure123", name)["user"].id
+
+    def test_counters_follow_writes(self, backend):
+        from database import log_productivity, delete_log, get_leaderboard
+
+        today = date.today()
+        alice = self._signup("alice@test.com", "Alice")
+        bob = self._signup("bob@test.com", "Bob")
+
+        log_productivity(alice, today, 1, 3, "Work")
+        bob_log = log_productivity(bob, today, 1, 4, "Work")["data"]
+        log_productivity(bob, today, 2, 1, "Work")
+        assert [(e["id"], e["score"], e["logs_count"]) for e in get_leaderboard("weekly")] == [
+            (bob, 5, 2), (alice, 3, 1)
+        ]
+
+        # تحديث فترة موجودة ثم حذف سجل يعيدان ترتيب المستخدمين
+        log_productivity(alice, today, 1, 4, "Work")
+        delete_log(bob_log["id"], user_id=bob)
+        assert [(e["id"], e["score"]) for e in get_leaderboard("all_time")] == [(alice, 4), (bob, 1)]
+        assert [e["id"] for e in get_leaderboard("monthly", limit=1)] == [alice]
+
+        # سجل بتاريخ مستقبلي لا يُحسب في أي فترة قبل يومه
+        log_productivity(bob, today + timedelta(days=1), 1, 4, "Work")
+        for period in ("weekly", "monthly", "all_time"):
+            assert [(e["id"], e["score"]) for e in get_leaderboard(period)] == [(alice, 4), (bob, 1)], period
+
+    def test_matches_rebuild_and_rolls_over(self, mock_local_data_dir):
+        from database import log_productivity, _get_leaderboard
+        from storage.leaderboard import period_bounds
+
+        today = date.today()
+        carol = self._signup("carol@test.com", "Carol")
+        dave = self._signup("dave@test.com", "Dave")
+        for i in range(20):
+            log_productivity(carol, today - timedelta(days=i), 3, i % 5, "Work")
+            log_productivity(dave, today - timedelta(days=i * 2), 4, 2, "Work")
+
+        leaderboard = _get_leaderboard()
+        for period in ("weekly", "monthly", "all_time"):
+            start, end = period_bounds(period, today)
+            expected = _rollup_totals(start, end)
+            assert {u: [s, c] for u, s, c in leaderboard.top(period)} == {
+                u: c for u, c in expected.items() if c[0] > 0
+            }
+
+        # أسبوع جديد: العداد يعاد بناؤه من الملخصات دون سجلات الأسبوع السابق
+        next_week = date.fromisoformat(period_bounds("weekly", today)[0]) + timedelta(days=7)
+        assert leaderboard.top("weekly", today=next_week) == []
+
+    def test_future_logs_count_from_their_day(self, mock_local_data_dir):
+        from database import log_productivity, _get_leaderboard
+        from storage.leaderboard import PERIODS, period_bounds
+
+        today = date.today()
+        frank = self._signup("frank@test.com", "Frank")
+        log_productivity(frank, today, 0, 2, "Work")
+        log_productivity(frank, today + timedelta(days=3), 0, 4, "Work")
+
+        # كل فترة تنتهي اليوم: السجل المستقبلي لا يُحسب بعد
+        leaderboard = _get_leaderboard()
+        for period in PERIODS:
+            assert leaderboard.top(period) == [(frank, 2, 1)], period
+
+        # عند حلول يومه يدخل العدادات (إضافة الأيام الجديدة أو إعادة بناء الفترة)
+        later = today + timedelta(days=3)
+        for period in PERIODS:
+            expected = _rollup_totals(*period_bounds(period, later))
+            assert [(u, [s, c]) for u, s, c in leaderboard.top(period, today=later)] == list(expected.items())
+        assert leaderboard.top("all_time", today=later) == [(frank, 6, 2)]
+
+    def test_page_does_not_read_logs(self, mock_local_data_dir):
+        from database import log_productivity, _get_log_store
+        from components.leaderboard_page import get_leaderboard_data
+
+        erin = self._signup("erin@test.com", "Erin")
+        log_productivity(erin, date.today(), 1, 4, "Work")
+
+        with patch.object(_get_log_store(), "get_by_range", side_effect=AssertionError("scan")):
+            data = get_leaderboard_data("weekly")
+
+        assert data == [{"name": "Erin", "score": 4, "logs_count": 1, "id": erin}]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="fork غير متوفر")
+    def test_processes_lose_no_counter_updates(self, mock_local_data_dir):
+        import multiprocessing
+        from database import get_leaderboard
+        from storage.leaderboard import ALL_DAYS
+
+        users = [self._signup(f"proc{i}@test.com", f"P{i}") for i in range(4)]
+        # العدادات محملة في هذه العملية قبل أن تكتب العمليات الأخرى
+        assert get_leaderboard("weekly") == []
+
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_log_in_child, args=([u], 6)) for u in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0
+
+        expected = _rollup_totals(*ALL_DAYS)
+        assert len(expected) == 4
+        assert {e["id"]: [e["score"], e["logs_count"]] for e in get_leaderboard("all_time")} == expected
+
+    def test_write_touches_only_own_counters(self, mock_local_data_dir):
+        from database import log_productivity, _get_leaderboard
+
+        users = [self._signup(f"rows{i}@test.com", f"R{i}") for i in range(3)]
+        for user_id in users:
+            log_productivity(user_id, date.today(), 0, 2, "Work")
+
+        conn = _get_leaderboard()._conn()
+        before = conn.total_changes
+        log_productivity(users[0], date.today(), 1, 3, "Work")
+        # مجموع اليوم وصف لكل فترة للمستخدم الكاتب فقط
+        assert conn.total_changes - before == 4
+
+
+def _rollup_totals(start, end):
+    """[النقاط، السجلات] لكل مستخدم في فترة محسوبة من الملخصات اليومية مباشرة"""
+    from database import _all_user_ids, _get_daily_rollup
+    totals = {}
+    for user_id in _all_user_ids():
+        days = _get_daily_rollup().get_range(user_id, start, end)
+        if days:
+            totals[user_id] = [sum(d["score"] for d in days.values()), sum(d["slots"] for d in days.values())]
+    return totals
+
+
+def storage_leaderboard_record(calls):
+    """تغليف Leaderboard.record لعدّ المعاملات مع تنفيذها فعلاً"""
+    from storage.leaderboard import Leaderboard
+    record = Leaderboard.record
+
+    def wrapper(self, *args):
+        calls.append(args)
+        return record(self, *args)
+    return wrapper
+
+
+def _log_in_child(user_ids, count):
+    """تسجيل فترات من عملية منفصلة (مثل import_logs.py بجانب التطبيق)"""
+    from database import log_productivity
+    for user_id in user_ids:
+        for slot in range(count):
+            log_productivity(user_id, date.today(), slot, 1 + slot % 4, "Work")
+
+
+def _add_tasks_in_child(user_id, prefix, count):
+    """إضافة مهام من عملية منفصلة (لاختبار أقفال fcntl)"""
+    from database import add_task
+    for i in range(count):
+        add_task(user_id, f"{prefix}-{i}")
+
+
+class TestAtomicWrites:
+    """
+    الكتابة الذرية والأقفال المقسمة تمنع الملفات المقطوعة والتحديثات الضائعة
+    """
+
+    def test_write_replaces_without_leftovers(self, temp_data_dir):
+        from storage.atomic import write_atomic
+
+        target = temp_data_dir / "data.json"
+        write_atomic(target, '{"v": 1}')
+        write_atomic(target, '{"v": 2}')
+        assert target.read_text(encoding="utf-8") == '{"v": 2}'
+
+        # فشل الاستبدال يبقي الملف القديم كاملاً ويحذف الملف المؤقت
+        with patch("storage.atomic.os.replace", side_effect=OSError("disk")):
+            with pytest.raises(OSError):
+                write_atomic(target, '{"v": 3}')
+        assert target.read_text(encoding="utf-8") == '{"v": 2}'
+        assert [p.name for p in temp_data_dir.iterdir()] == ["data.json"]
+
+    def test_stripes_are_reentrant_and_independent(self, temp_data_dir):
+        import threading
+        from storage.atomic import StripedLocks
+
+        locks = StripedLocks(lambda: temp_data_dir / ".locks")
+        first = "user_a"
+        other = next(f"user_{i}" for i in range(100) if locks.stripe(f"user_{i}") != locks.stripe(first))
+
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold_other():
+            with locks.hold(other):
+                acquired.set()
+                release.wait(5)
+
+        with locks.hold(first):
+            with locks.hold(first):
+                # مستخدم في شريحة أخرى لا ينتظر قفل هذا المستخدم
+                worker = threading.Thread(target=hold_other)
+                worker.start()
+                assert acquired.wait(5)
+                release.set()
+                worker.join()
+
+    def test_parallel_sessions_lose_no_updates(self, backend):
+        from concurrent.futures import ThreadPoolExecutor
+        from database import add_task, get_tasks, log_productivity, get_logs_by_date, get_daily_rollup
+
+        today = date.today()
+        users = [f"parallel_{i}" for i in range(4)]
+
+        def session(args):
+            user_id, worker = args
+            for slot in range(worker * 6, worker * 6 + 6):
+                add_task(user_id, f"task-{slot}")
+                log_productivity(user_id, today, slot, 1, "Work")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(session, [(u, w) for u in users for w in range(4)]))
+
+        for user_id in users:
+            assert sorted(t["title"] for t in get_tasks(user_id)) == sorted(f"task-{s}" for s in range(24))
+            assert len(get_logs_by_date(user_id, today)) == 24
+            assert get_daily_rollup(user_id, today, today)[today]["score"] == 24
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="fcntl غير متوفر")
+    def test_processes_lose_no_updates(self, mock_local_data_dir):
+        import multiprocessing
+        from database import get_tasks
+
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_add_tasks_in_child, args=("shared_user", f"p{n}", 10))
+            for n in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0
+
+        assert len(get_tasks("shared_user")) == 40
+
+
+class TestBulkLogging:
+    """
+    التسجيل الجماعي يطابق التسجيل فترة بفترة بكتابة واحدة
+    """
+
+    def _entries(self, start, days, slots, score=3):
+        return [
+            {"log_date": start + timedelta(days=d), "time_slot": s, "score": score, "category": "Work"}
+            for d in range(days) for s in slots
+        ]
+
+    def test_bulk_matches_single_writes(self, backend):
+        from database import (
+            log_productivity, log_productivity_bulk, get_logs_by_range,
+            get_daily_rollup, update_user_goals, get_streak
+        )
+
+        start = date.today() - timedelta(days=6)
+        entries = self._entries(start, 7, range(18, 26))
+        for user_id in ("single_user", "bulk_user"):
+            update_user_goals(user_id, 24, 500, 2000)
+            # سجل موجود مسبقاً يُحدث بدل أن يتكرر
+            log_productivity(user_id, start, 18, 1, "Study")
+
+        for e in entries:
+            log_productivity("single_user", e["log_date"], e["time_slot"], e["score"], e["category"])
+        result = log_productivity_bulk("bulk_user", entries)
+        assert result["status"] == "success"
+        assert len(result["data"]) == 56
+
+        def strip(logs):
+            return [(l["log_date"], l["time_slot"], l["score"], l["category"]) for l in logs]
+
+        end = date.today()
+        assert strip(get_logs_by_range("bulk_user", start, end)) == strip(get_logs_by_range("single_user", start, end))
+        assert get_daily_rollup("bulk_user", start, end) == get_daily_rollup("single_user", start, end)
+        assert get_streak("bulk_user", 24) == get_streak("single_user", 24)
+
+    def test_bulk_keeps_ids_and_last_duplicate(self, backend):
+        from database import log_productivity, log_productivity_bulk, get_logs_by_date
+
+        today = date.today()
+        first = log_productivity("dup_user", today, 5, 1, "Work")["data"]
+        result = log_productivity_bulk("dup_user", [
+            {"log_date": today, "time_slot": 5, "score": 2, "category": "Work"},
+            {"log_date": today, "time_slot": 5, "score": 4, "category": "Study"},
+        ])
+
+        logs = get_logs_by_date("dup_user", today)
+        assert [(l["id"], l["score"], l["category"]) for l in logs] == [(first["id"], 4, "Study")]
+        assert len(result["data"]) == 1
+
+    def test_week_backfill_is_one_write(self, mock_local_data_dir):
+        from database import log_productivity_bulk, _get_log_store, get_leaderboard
+        from auth import sign_up
+
+        with patch('database.LOG_STORAGE_BACKEND', "json"):
+            user_id = sign_up("bulk@test.com", "secure123", "Bulk")["user"].id
+            store = _get_log_store()
+            leaderboard_saves = []
+            with patch.object(store, "_save", wraps=store._save) as save, \
+                 patch("storage.leaderboard.Leaderboard.record", autospec=True,
+                       side_effect=storage_leaderboard_record(leaderboard_saves)):
+                log_productivity_bulk(user_id, self._entries(date.today() - timedelta(days=6), 7, range(48), score=1))
+            assert save.call_count == 1
+            # ترتيب المتصدرين يُحدث في معاملة واحدة للدفعة كلها
+            assert len(leaderboard_saves) == 1
+            assert get_leaderboard("all_time")[0]["score"] == 7 * 48
+
+
+class TestPartitionedLogStore:
+    """
+    ملف لكل شهر: القراءة والكتابة تلمسان الأشهر المعنية فقط
+    """
+
+    @pytest.fixture
+    def partitioned(self, mock_local_data_dir):
+        with patch('database.LOG_STORAGE_BACKEND', "partitioned"):
+            yield mock_local_data_dir
+
+    def test_reads_and_writes_touch_only_their_months(self, partitioned):
+        import json
+        from database import log_productivity, get_logs_by_date, get_logs_by_range, _get_log_store
+
+        user_id = "months_user"
+        for log_date in (date(2026, 8, 31), date(2026, 9, 15), date(2026, 10, 1)):
+            log_productivity(user_id, log_date, 1, 2, "Work")
+
+        logs_dir = partitioned / user_id / "logs"
+        assert json.loads((logs_dir / "manifest.json").read_text()) == {"months": ["2026-08", "2026-09", "2026-10"]}
+
+        store = _get_log_store()
+        store.invalidate()
+        loaded = []
+        original = store._load
+        with patch.object(store, "_load", side_effect=lambda path, default: loaded.append(path.name) or original(path, default)):
+            assert len(get_logs_by_date(user_id, date(2026, 9, 15))) == 1
+            assert [l["log_date"] for l in get_logs_by_range(user_id, date(2026, 9, 1), date(2026, 10, 31))] == [
+                "2026-09-15", "2026-10-01"
+            ]
+        assert "2026-08.json" not in loaded
+
+        saved = []
+        with patch.object(store, "_save", side_effect=lambda path, data: saved.append(path.name)):
+            store.upsert(user_id, {"id": "new", "log_date": "2026-10-02", "time_slot": 3,
+                                   "score": 1, "category": "Work", "notes": None, "updated_at": None})
+        assert saved == ["2026-10.json"]
+
+    def test_deleting_last_log_drops_month(self, partitioned):
+        import json
+        from database import log_productivity, delete_log, get_logs_by_range
+
+        user_id = "drop_user"
+        log = log_productivity(user_id, date(2026, 7, 4), 1, 2, "Work")["data"]
+        log_productivity(user_id, date(2026, 8, 4), 1, 3, "Work")
+        delete_log(log["id"], user_id=user_id)
+
+        logs_dir = partitioned / user_id / "logs"
+        assert not (logs_dir / "2026-07.json").exists()
+        assert json.loads((logs_dir / "manifest.json").read_text()) == {"months": ["2026-08"]}
+        assert [l["score"] for l in get_logs_by_range(user_id, date(2026, 1, 1), date(2026, 12, 31))] == [3]
+
+    def test_migrates_single_file_and_journal(self, mock_local_data_dir):
+        from database import (
+            log_productivity, delete_log, get_logs_by_range, migrate_log_partitions, _get_logs_file
+        )
+
+        user_id = "legacy_user"
+        start = date(2026, 9, 28)
+        with patch('database.LOG_STORAGE_BACKEND', "journal"):
+            for i in range(6):
+                log_productivity(user_id, start + timedelta(days=i), i, i % 5, "Work")
+            first = get_logs_by_range(user_id, start, start)[0]
+            delete_log(first["id"], user_id=user_id)
+            expected = get_logs_by_range(user_id, date(2026, 1, 1), date(2026, 12, 31))
+
+        with patch('database.LOG_STORAGE_BACKEND', "partitioned"):
+            result = migrate_log_partitions()
+            assert result["data"] == [user_id]
+            assert get_logs_by_range(user_id, date(2026, 1, 1), date(2026, 12, 31)) == expected
+            assert migrate_log_partitions()["data"] == []
+
+        logs_dir = mock_local_data_dir / user_id / "logs"
+        assert sorted(p.name for p in logs_dir.iterdir()) == ["2026-09.json", "2026-10.json", "manifest.json"]
+        # الملفات القديمة تبقى كنسخة احتياطية
+        assert sorted(p.name for p in _get_logs_file(user_id).parent.glob("productivity_logs.*")) == [
+            "productivity_logs.journal.jsonl.migrated"
+        ]
+
+
+def _grid_writes_in_child(user_id, worker, count):
+    """كتابة خلايا بفئات جديدة في الشبكة مباشرة من عملية منفصلة (دون قفل المستخدم)"""
+    import database
+    from storage.grid_store import GridLogStore
+
+    store = GridLogStore(database._get_grid_dir, database._load_json, database._save_json,
+                         lambda: database.LOCAL_DATA_DIR / ".locks")
+    for i in range(count):
+        store.upsert(user_id, {"log_date": "2026-06-01", "time_slot": worker * count + i,
+                               "score": 1, "category": f"w{worker}-{i}"})
+
+
+class TestGridLogStore:
+    """
+    شبكة سنوية ثابتة العرض: كل فترة خلية في موضع معروف
+    """
+
+    @pytest.fixture
+    def grid(self, mock_local_data_dir):
+        with patch('database.LOG_STORAGE_BACKEND', "grid"):
+            yield mock_local_data_dir
+
+    def test_cell_layout_and_side_files(self, grid):
+        import json
+        import numpy as np
+        from database import log_productivity
+        from storage import grid_store
+
+        user_id = "grid_user"
+        log_productivity(user_id, date(2026, 2, 1), 5, 3, "Study", notes="مراجعة")
+        log_productivity(user_id, date(2026, 2, 1), 6, 4, "Work")
+
+        grid_dir = grid / user_id / "grid"
+        raw = (grid_dir / "2026.grid").read_bytes()
+        assert len(raw) == grid_store.FILE_SIZE
+        cells = np.frombuffer(raw, dtype="<u2", count=366 * 48, offset=grid_store.CELLS_OFFSET)
+        index = 31 * 48 + 5
+        assert cells[index] == grid_store.LOGGED | (3 << 12) | 0
+        assert cells[index + 1] == grid_store.LOGGED | (4 << 12) | 1
+        assert np.count_nonzero(cells) == 2
+        assert json.loads((grid_dir / "categories.json").read_text()) == ["Study", "Work"]
+        assert json.loads((grid_dir / "2026.notes.json").read_text()) == {str(index): "مراجعة"}
+
+    def test_columns_match_dict_path(self, grid):
+        from database import log_productivity, get_log_columns, get_logs_by_range
+        from storage.columnar import LogColumns
+
+        user_id = "grid_columns_user"
+        for i, log_date in enumerate((date(2025, 12, 31), date(2026, 1, 1), date(2026, 3, 2))):
+            log_productivity(user_id, log_date, 47 - i, i % 5, ["Work", "Study"][i % 2])
+
+        start, end = date(2025, 12, 1), date(2026, 12, 31)
+        columns = get_log_columns(user_id, start, end)
+        expected = LogColumns.from_logs(get_logs_by_range(user_id, start, end))
+        assert columns.day.tolist() == expected.day.tolist()
+        assert columns.slot.tolist() == expected.slot.tolist()
+        assert columns.score.tolist() == expected.score.tolist()
+        assert [columns.categories[c] for c in columns.category] == [
+            expected.categories[c] for c in expected.category
+        ]
+
+    def test_writes_visible_to_other_instances(self, grid):
+        from database import log_productivity, delete_log, _get_grid_dir, _load_json, _save_json
+        from storage.grid_store import GridLogStore
+
+        user_id = "grid_shared_user"
+        other = GridLogStore(_get_grid_dir, _load_json, _save_json)
+        assert other.get_by_slot(user_id, "2026-05-05", 9) is None
+
+        log = log_productivity(user_id, date(2026, 5, 5), 9, 2, "Work")["data"]
+        before = other.version(user_id)
+        assert other.get_by_slot(user_id, "2026-05-05", 9)["score"] == 2
+
+        log_productivity(user_id, date(2026, 5, 5), 9, 4, "Work")
+        assert other.version(user_id) != before
+        assert other.get_by_slot(user_id, "2026-05-05", 9)["id"] == log["id"]
+        assert other.get_by_slot(user_id, "2026-05-05", 9)["score"] == 4
+
+        delete_log(log["id"], user_id=user_id)
+        assert other.get_by_date(user_id, "2026-05-05") == []
+
+    def test_rejects_out_of_range_cells(self, grid):
+        from database import _get_log_store
+
+        store = _get_log_store()
+        record = {"log_date": "2026-01-01", "time_slot": 48, "score": 1, "category": "Work"}
+        with pytest.raises(ValueError):
+            store.upsert("grid_bad_user", record)
+        with pytest.raises(ValueError):
+            store.upsert("grid_bad_user", {**record, "time_slot": 0, "score": 5})
+        assert store.delete("grid_bad_user", "not-an-id") is None
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="fcntl غير متوفر")
+    def test_processes_share_categories_and_generation(self, grid):
+        import multiprocessing
+        from database import _get_log_store
+
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_grid_writes_in_child, args=("grid_procs_user", n, 6))
+            for n in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0
+
+        store = _get_log_store()
+        logs = store.get_by_date("grid_procs_user", "2026-06-01")
+        assert sorted((l["time_slot"], l["category"]) for l in logs) == sorted(
+            (n * 6 + i, f"w{n}-{i}") for n in range(4) for i in range(6)
+        )
+        assert store.version("grid_procs_user") == "2026:24"
+
+    def test_evicted_grids_are_closed(self, grid):
+        from database import log_productivity, _get_grid_dir, _load_json, _save_json
+        from storage.grid_store import GridLogStore
+
+        user_id = "grid_evict_user"
+        for year in (2024, 2025, 2026):
+            log_productivity(user_id, date(year, 1, 1), 0, 1, "Work")
+
+        store = GridLogStore(_get_grid_dir, _load_json, _save_json)
+        with patch("storage.grid_store.MAX_OPEN", 2):
+            with store._using(user_id, 2024) as first, store._using(user_id, 2025) as second:
+                pass
+            # 2024 الأحدث استخداماً، فيُخرج 2025 عند فتح 2026
+            with store._using(user_id, 2024), store._using(user_id, 2026):
+                pass
+            assert second.mm.closed
+            assert not first.mm.closed
+
+            # شبكة مستخدمة لا تُغلق عند إخراجها بل عند تحريرها
+            with store._using(user_id, 2026) as held:
+                with store._using(user_id, 2025), store._using(user_id, 2024):
+                    pass
+                assert held.evicted and not held.mm.closed
+                assert held.cells[0, 0]
+            assert held.mm.closed
+
+            logs = store.get_by_range(user_id, "2024-01-01", "2026-12-31")
+        assert [log["log_date"] for log in logs] == ["2024-01-01", "2025-01-01", "2026-01-01"]
+
+    def test_eviction_does_not_close_grids_in_use(self, grid):
+        import threading
+        from database import log_productivity, _get_grid_dir, _load_json, _save_json
+        from storage.grid_store import GridLogStore
+
+        user_id = "grid_race_user"
+        years = (2024, 2025, 2026)
+        for year in years:
+            log_productivity(user_id, date(year, 1, 1), 0, 1, "Work")
+
+        # شبكة واحدة مفتوحة: كل قراءة لسنة أخرى تُخرج ما يقرؤه خيط آخر
+        store = GridLogStore(_get_grid_dir, _load_json, _save_json)
+        errors = []
+
+        def read(year):
+            try:
+                for _ in range(300):
+                    assert store.get_by_date(user_id, f"{year}-01-01")[0]["score"] == 1
+                    assert store.get_by_slot(user_id, f"{year}-01-01", 0)["score"] == 1
+            except Exception as e:
+                errors.append(e)
+
+        with patch("storage.grid_store.MAX_OPEN", 1):
+            threads = [threading.Thread(target=read, args=(year,)) for year in years * 2]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert errors == []
+        assert len(store._grids) == 1
+
+
+class TestSerializer:
+    """
+    كل الصيغ تعطي نفس البيانات، والقراءة تكتشف صيغة الملفات القديمة
+    """
+
+    SAMPLE = {
+        "days": {"2026-10-01": {"score": 7, "categories": {"عمل": [7, 2]}}},
+        "logs": [{"log_date": date(2026, 10, 1), "time_slot": 47, "notes": None}],
+    }
+    EXPECTED = {
+        "days": {"2026-10-01": {"score": 7, "categories": {"عمل": [7, 2]}}},
+        "logs": [{"log_date": "2026-10-01", "time_slot": 47, "notes": None}],
+    }
+
+    def test_formats_round_trip(self):
+        from storage import serializer
+
+        for fmt in serializer.available():
+            raw = serializer.dumps(self.SAMPLE, fmt)
+            assert serializer.loads(raw) == self.EXPECTED, fmt
+
+    def test_missing_library_falls_back(self):
+        from storage import serializer
+
+        with patch.object(serializer, "orjson", None), patch.object(serializer, "msgpack", None):
+            assert serializer.resolve("auto") == "json"
+            assert serializer.resolve("msgpack") == "json"
+            assert serializer.loads(serializer.dumps(self.SAMPLE, "orjson")) == self.EXPECTED
+            with pytest.raises(ValueError):
+                serializer.loads(b"\x81\xa1a\x01")
+
+    @pytest.mark.skipif("msgpack" not in __import__("storage.serializer").serializer.available(),
+                        reason="msgpack غير مثبت")
+    def test_switching_to_msgpack_keeps_old_files(self, mock_local_data_dir):
+        from database import log_productivity, get_logs_by_date
+
+        today = date.today()
+        log_productivity("format_user", today, 1, 3, "Work")
+        with patch("database.LOCAL_DATA_FORMAT", "msgpack"):
+            log_productivity("format_user", today, 2, 4, "Work")
+            assert [l["score"] for l in get_logs_by_date("format_user", today)] == [3, 4]
+
+    def test_reads_legacy_pretty_files_and_rewrites_compact(self, mock_local_data_dir):
+        import json
+        from database import _load_json, _save_json
+        from auth import _load_users, _get_users_file
+
+        users = {"a@test.com": {"id": "a", "email": "a@test.com", "password": "x",
+                                "metadata": {"display_name": "أحمد"}, "created_at": None}}
+        users_file = _get_users_file()
+        users_file.write_text(json.dumps(users, ensure_ascii=False, indent=2), encoding="utf-8")
+        assert _load_users() == users
+
+        legacy = mock_local_data_dir / "legacy.json"
+        legacy.write_bytes(b"\xef\xbb\xbf" + json.dumps([1, 2], indent=2).encode("utf-8"))
+        assert _load_json(legacy) == [1, 2]
+        _save_json(legacy, users)
+        assert b"\n" not in legacy.read_bytes()
+        assert _load_json(legacy) == users
+
+
+class TestSupabaseStore:
+    """
+    وضع Supabase: عميل مشترك بـ keep-alive والملف الشخصي والفئات عبر PostgREST
+    """
+
+    def test_client_is_shared_per_credentials(self, fake_postgrest):
+        from storage.supabase_store import get_client
+
+        client = get_client(fake_postgrest.url, fake_postgrest.key)
+        assert get_client(fake_postgrest.url + "/", fake_postgrest.key) is client
+        assert get_client(fake_postgrest.url, "other-key") is not client
+
+    def test_requests_reuse_one_connection(self, supabase):
+        from database import log_productivity, get_logs_by_date
+
+        today = date.today()
+        log_productivity("keepalive_user", today, 0, 1, "Work")
+        before = supabase.connections
+        for slot in range(1, 11):
+            log_productivity("keepalive_user", today, slot, 2, "Work")
+            get_logs_by_date("keepalive_user", today)
+
+        assert supabase.connections == before
+        assert len(get_logs_by_date("keepalive_user", today)) == 11
+
+    def test_selected_when_credentials_present(self, supabase):
+        import database
+        from storage.supabase_store import SupabaseStore
+
+        assert isinstance(database._get_log_store(), SupabaseStore)
+        with patch('database.USE_LOCAL_STORAGE', True):
+            assert not isinstance(database._get_log_store(), SupabaseStore)
+
+    def test_profile_round_trip(self, supabase, mock_local_data_dir):
+        from database import get_user_profile, update_user_goals
+
+        profile = get_user_profile("remote_user")
+        assert profile["daily_goal"] == 100
+
+        result = update_user_goals("remote_user", 40, 200, 800)
+        assert result["status"] == "success"
+        assert get_user_profile("remote_user")["daily_goal"] == 40
+        # لا ملفات محلية للملف الشخصي في وضع Supabase
+        assert not (mock_local_data_dir / "remote_user" / "profile.json").exists()
+
+    def test_custom_categories(self, supabase):
+        from database import add_category, update_category, delete_category, get_categories
+
+        added = add_category("remote_user", "قراءة", "قراءة", "#123456", "📖")
+        assert added["status"] == "success"
+        cat_id = added["data"]["id"]
+
+        custom = [c for c in get_categories("remote_user") if not c["is_default"]]
+        assert [c["name"] for c in custom] == ["قراءة"]
+        assert get_categories("other_user") == get_categories()
+
+        assert update_category("remote_user", cat_id, {"color": "#000000"})["status"] == "success"
+        assert update_category("other_user", cat_id, {"color": "#ffffff"})["status"] == "error"
+        assert delete_category(cat_id, user_id="remote_user")["status"] == "success"
+        assert all(c["is_default"] for c in get_categories("remote_user"))
+
+    def test_server_errors_become_error_results(self, supabase):
+        from database import log_productivity
+
+        result = log_productivity("remote_user", date.today(), 48, 2, "Work")
+        assert result["status"] == "error"
+        assert "400" in result["message"]
+
+    def _seed(self):
+        from database import log_productivity_bulk
+
+        today = date.today()
+        log_productivity_bulk("agg_user", [
+            {"log_date": today - timedelta(days=d), "time_slot": slot,
+             "score": (d + slot) % 5, "category": ("Work", "Study", "عمل, منزل")[slot % 3]}
+            for d in range(10) for slot in range(0, 48, 5)
+        ])
+        return today - timedelta(days=9), today
+
+    def test_analytics_aggregated_on_server(self, supabase):
+        import database
+        from analytics import AnalyticsSnapshot
+        from database import get_analytics_snapshot, get_logs_by_range
+
+        start, end = self._seed()
+        for categories in (None, ["Study", "عمل, منزل"]):
+            logs = get_logs_by_range("agg_user", start, end)
+            if categories:
+                logs = [l for l in logs if l["category"] in categories]
+            expected = AnalyticsSnapshot(logs)
+
+            # لا جلب للسجلات الخام: المجاميع فقط
+            with patch.object(database._get_log_store(), "get_by_range", side_effect=AssertionError("raw")):
+                snapshot = get_analytics_snapshot("agg_user", start, end, categories)
+
+            assert snapshot.total_score == expected.total_score
+            assert len(snapshot) == len(expected)
+            for bucket in ("daily", "hourly", "weekdays", "categories", "scores", "cells"):
+                assert getattr(snapshot, bucket) == getattr(expected, bucket), bucket
+
+    def test_rollup_read_from_server(self, supabase):
+        import database
+        from storage.rollup import build
+        from database import get_daily_rollup, get_logs_by_range
+
+        start, end = self._seed()
+        expected = build(get_logs_by_range("agg_user", start, end))
+        with patch.object(database._get_log_store(), "get_by_range", side_effect=AssertionError("raw")):
+            days = get_daily_rollup("agg_user", start, end)
+        assert {str(d): v for d, v in days.items()} == expected
+        # لا ملخص ولا أقفال محلية في وضع Supabase
+        assert not (database.LOCAL_DATA_DIR / "agg_user").exists()
+        assert not (database.LOCAL_DATA_DIR / ".locks").exists()
+
+    def test_click_is_one_request(self, supabase):
+        from database import log_productivity, delete_log, get_streak
+
+        today = date.today()
+        requests = supabase.requests
+        saved = log_productivity("click_user", today, 3, 4, "Work")["data"]
+        log_productivity("click_user", today, 3, 2, "Study")
+        assert supabase.requests - requests == 2
+
+        requests = supabase.requests
+        assert get_streak("click_user", 2)["current"] == 1
+        assert supabase.requests - requests == 1
+
+        requests = supabase.requests
+        assert delete_log(saved["id"], user_id="click_user")["status"] == "success"
+        assert supabase.requests - requests == 1
+        assert get_streak("click_user", 2)["current"] == 0
+
+    def test_reads_past_max_rows(self, supabase):
+        import io
+        from database import (
+            log_productivity_bulk, get_logs_by_range, export_logs, import_logs, add_category, get_categories
+        )
+
+        # الخادم يقص كل رد عند max_rows: القراءة الطويلة يجب أن تكمل الصفحات
+        rows = 3 * 60
+        assert rows > supabase.max_rows
+        start = date(2023, 1, 1)
+        log_productivity_bulk("paged_user", [
+            {"log_date": start + timedelta(days=d), "time_slot": slot, "score": (d + slot) % 5, "category": "Work"}
+            for d in range(60) for slot in (0, 1, 30)
+        ])
+        assert len(get_logs_by_range("paged_user", start, start + timedelta(days=59))) == rows
+
+        sink = io.BytesIO()
+        assert export_logs("paged_user", "csv", sink)["data"] == rows
+        sink.seek(0)
+        # كل الصفوف الموجودة تُرى عند الاستيراد فلا يُعاد إدخال أي منها
+        result = import_logs("paged_user", sink, "csv")
+        assert (result["data"]["unchanged"], result["data"]["imported"]) == (rows, 0)
+
+        with patch.object(supabase, "max_rows", 3), patch("storage.supabase_store.PAGE", 3):
+            for i in range(5):
+                add_category("paged_user", f"c{i}", f"c{i}", "#123456", "📌")
+            assert [c["name"] for c in get_categories("paged_user") if not c["is_default"]] == [
+                f"c{i}" for i in range(5)
+            ]
+
+    def test_server_totals_past_max_rows(self, supabase):
+        from database import log_productivity_bulk, get_daily_rollup, get_analytics_snapshot
+
+        # صفان (يوم، فئة) لكل يوم: ملخص التاريخ كله يتجاوز max_rows
+        start = date(2023, 1, 1)
+        days = supabase.max_rows
+        log_productivity_bulk("totals_user", [
+            {"log_date": start + timedelta(days=d), "time_slot": slot, "score": 2, "category": category}
+            for d in range(days) for slot, category in ((d % 48, "Work"), ((d + 1) % 48, "Study"))
+        ])
+        end = start + timedelta(days=days - 1)
+
+        rollup = get_daily_rollup("totals_user", start, end)
+        assert len(rollup) == days
+        assert all(day["categories"] == {"Work": [2, 1], "Study": [2, 1]} for day in rollup.values())
+
+        with patch.object(supabase, "max_rows", 10), patch("storage.supabase_store.PAGE", 10):
+            snapshot = get_analytics_snapshot("totals_user", start, end)
+        assert len(snapshot.daily) == days
+        assert sum(score for score, _ in snapshot.hourly.values()) == 4 * days
+
+    def test_accounts_use_supabase_auth(self, supabase_auth):
+        import auth
+        from database import log_productivity, get_logs_by_date, get_user_profile
+
+        result = auth.sign_up("cloud@test.com", "secret1", "سحابة")
+        assert result["status"] == "success"
+        user_id = result["user"].id
+        # المعرف من auth_users فتقبله المفاتيح الخارجية، والمشغل أنشأ الملف الشخصي
+        row = supabase_auth.db.execute("SELECT email FROM auth_users WHERE id = ?", (user_id,)).fetchone()
+        assert row["email"] == "cloud@test.com"
+        assert get_user_profile(user_id)["display_name"] == "سحابة"
+        assert auth.sign_up("cloud@test.com", "secret1")["status"] == "error"
+
+        with patch("auth.st", TestSessionTokens()._browser()) as browser:
+            assert auth.sign_in("cloud@test.com", "wrong1")["status"] == "error"
+            assert auth.sign_in("cloud@test.com", "secret1")["status"] == "success"
+            assert browser.session_state.user.id == user_id
+
+        assert log_productivity(user_id, date.today(), 5, 3, "Work")["status"] == "success"
+        assert [l["score"] for l in get_logs_by_date(user_id, date.today())] == [3]
+        # أسماء المتصدرين واستعادة الجلسة من نسخة الحساب المحلية
+        assert auth._get_registry().get_by_id(user_id)["metadata"]["display_name"] == "سحابة"
+
+    def test_rls_limits_requests_to_token_owner(self, supabase_auth):
+        import auth
+        import database
+        from storage.supabase_store import SupabaseStore, PostgrestError
+
+        today = date.today()
+        alice = auth.sign_up("alice@cloud.test", "secret1")["user"].id
+        bob = auth.sign_up("bob@cloud.test", "secret1")["user"].id
+        assert database.log_productivity(alice, today, 1, 4, "Work")["status"] == "success"
+
+        client = database._get_log_store().client
+        as_bob = SupabaseStore(client, lambda user_id: auth.supabase_access_token(bob))
+        assert as_bob.get_by_date(alice, str(today)) == []
+        with pytest.raises(PostgrestError) as error:
+            as_bob.upsert(alice, {"log_date": str(today), "time_slot": 2, "score": 1, "category": "Work"})
+        assert error.value.status == 403
+        # المفتاح العام وحده لا يرى سجلات أحد، والمتصدرون من عرض يجمع الجميع
+        assert SupabaseStore(client).get_by_date(alice, str(today)) == []
+        assert [e["id"] for e in database.get_leaderboard("weekly")] == [alice]
+
+    def test_expired_token_is_refreshed(self, supabase_auth):
+        import auth
+        from database import log_productivity
+
+        # أقل من REFRESH_MARGIN: كل طلب رمز يجدد الجلسة
+        with patch.object(supabase_auth, "token_ttl", 30):
+            user_id = auth.sign_up("refresh@test.com", "secret1")["user"].id
+            first = auth.supabase_access_token(user_id)
+            assert auth.supabase_access_token(user_id) != first
+            assert log_productivity(user_id, date.today(), 0, 2, "Work")["status"] == "success"
+
+            # رمز التجديد ملغى: لا جلسة ولا كتابة حتى الدخول مجدداً
+            supabase_auth.refresh_tokens.clear()
+            assert auth.supabase_access_token(user_id) is None
+            assert log_productivity(user_id, date.today(), 1, 2, "Work")["status"] == "error"
+
+    def test_foreign_keys_reference_auth_users(self, supabase_auth):
+        import auth
+        from database import log_productivity
+
+        with pytest.raises(sqlite3.IntegrityError):
+            supabase_auth.db.execute(
+                "INSERT INTO productivity_logs (user_id, log_date, time_slot, score, category) "
+                "VALUES ('md5-style-id', '2026-01-01', 0, 1, 'Work')"
+            )
+
+        user_id = auth.sign_up("cascade@test.com", "secret1")["user"].id
+        log_productivity(user_id, date.today(), 0, 2, "Work")
+        with supabase_auth.db:
+            supabase_auth.db.execute("DELETE FROM auth_users WHERE id = ?", (user_id,))
+        assert supabase_auth.db.execute("SELECT COUNT(*) FROM productivity_logs").fetchone()[0] == 0
+        assert supabase_auth.db.execute("SELECT COUNT(*) FROM user_profiles").fetchone()[0] == 0
+
+
+@pytest.fixture
+def write_behind(backend):
+    """الكتابة المؤجلة مفعلة مع تفريغ كل ما تبقى قبل إعادة المجلد المؤقت"""
+    import database
+    with patch('database.WRITE_BEHIND', True), patch('database.WRITE_BEHIND_INTERVAL_MS', 50):
+        yield database
+        buffer = database._write_buffers.pop(database._backend_key(), None)
+        if buffer is not None:
+            buffer.close()
+
+
+class TestWriteBehind:
+    """
+    التقييم يعود دون لمس المحرك، ويظهر للقراءة فوراً، ويُكتب مجمعاً في الخلفية
+    """
+
+    def test_reads_see_pending_before_flush(self, write_behind):
+        database = write_behind
+        from database import log_productivity, get_logs_by_date, get_log_by_slot, get_logs_by_range
+
+        today = date.today()
+        store = database._get_log_store()
+        with patch.object(store, "upsert_many", side_effect=AssertionError("sync write")), \
+             patch.object(store, "upsert", side_effect=AssertionError("sync write")):
+            database._get_write_buffer().interval = 60
+            assert log_productivity("wb_user", today, 3, 2, "Work")["status"] == "success"
+            assert log_productivity("wb_user", today, 3, 4, "Study")["status"] == "success"
+
+            assert [(l["time_slot"], l["score"]) for l in get_logs_by_date("wb_user", today)] == [(3, 4)]
+            assert get_log_by_slot("wb_user", today, 3)["category"] == "Study"
+            assert get_logs_by_range("wb_user", today - timedelta(days=1), today - timedelta(days=1)) == []
+            assert database.is_slot_logged("wb_user", today, 3)
+            assert store.get_by_date("wb_user", str(today)) == []
+
+        database._get_write_buffer().flush("wb_user")
+        saved = store.get_by_date("wb_user", str(today))
+        assert [(l["time_slot"], l["score"]) for l in saved] == [(3, 4)]
+        assert get_logs_by_date("wb_user", today) == saved
+
+    def test_background_flush_coalesces(self, write_behind):
+        import time
+        database = write_behind
+        from database import log_productivity, get_daily_scores
+
+        today = date.today()
+        rollup = database._get_daily_rollup()
+        calls = []
+        original = rollup.upsert_many
+        with patch.object(rollup, "upsert_many", side_effect=lambda u, r: calls.append(len(r)) or original(u, r)):
+            for score in range(5):
+                log_productivity("wb_user", today, 10, score, "Work")
+            log_productivity("wb_user", today, 11, 1, "Work")
+
+            deadline = time.time() + 5
+            while not database._get_log_store().get_by_date("wb_user", str(today)) and time.time() < deadline:
+                time.sleep(0.02)
+
+        assert calls == [2]
+        assert get_daily_scores("wb_user", today, today) == {today: 5}
+
+    def test_failed_flush_keeps_records(self, write_behind):
+        database = write_behind
+        from database import log_productivity, get_logs_by_date
+
+        today = date.today()
+        buffer = database._get_write_buffer()
+        buffer.interval = 60
+        log_productivity("wb_user", today, 7, 3, "Work")
+
+        with patch.object(database._get_daily_rollup(), "upsert_many", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                buffer.flush("wb_user")
+
+        assert [l["score"] for l in get_logs_by_date("wb_user", today)] == [3]
+        buffer.close()
+        assert [l["score"] for l in database._get_log_store().get_by_date("wb_user", str(today))] == [3]
+
+    def test_direct_writes_flush_pending_first(self, write_behind):
+        database = write_behind
+        from database import log_productivity, log_productivity_bulk, get_logs_by_date
+
+        today = date.today()
+        database._get_write_buffer().interval = 60
+        log_productivity("wb_user", today, 20, 1, "Work")
+        log_productivity_bulk("wb_user", [
+            {"log_date": today, "time_slot": 20, "score": 4, "category": "Work"},
+        ])
+        database._get_write_buffer().flush()
+
+        assert [l["score"] for l in get_logs_by_date("wb_user", today)] == [4]
+
+    def test_invalid_record_is_refused_before_buffering(self, write_behind):
+        database = write_behind
+        from database import log_productivity, get_logs_by_date
+
+        today = date.today()
+        assert log_productivity("wb_user", today, 3, 9, "Work")["status"] == "error"
+        assert log_productivity("wb_user", today, 48, 2, "Work")["status"] == "error"
+        assert log_productivity("wb_user", "2026-02-30", 3, 2, "Work")["status"] == "error"
+        assert database._get_write_buffer().pending("wb_user") == {}
+        assert get_logs_by_date("wb_user", today) == []
+
+    def test_permanent_failure_drops_only_rejected_record(self, write_behind):
+        database = write_behind
+        from database import log_productivity, get_logs_by_date
+
+        today = date.today()
+        buffer = database._get_write_buffer()
+        buffer.interval = 60
+        log_productivity("wb_user", today, 8, 2, "Work")
+        log_productivity("wb_user", today, 9, 3, "Work")
+
+        rollup = database._get_daily_rollup()
+        original = rollup.upsert_many
+
+        def upsert_many(user_id, records):
+            if any(r["time_slot"] == 8 for r in records):
+                raise sqlite3.IntegrityError("CHECK constraint failed")
+            return original(user_id, records)
+
+        with patch.object(rollup, "upsert_many", side_effect=upsert_many) as write:
+            buffer.flush("wb_user")
+            # لا إعادة محاولة لا نهائية: الدفعة ثم كل سجل منفرداً مرة واحدة
+            assert write.call_count == 3
+
+        assert buffer.pending("wb_user") == {}
+        assert [l["time_slot"] for l in get_logs_by_date("wb_user", today)] == [9]
+        result = log_productivity("wb_user", today, 10, 1, "Work")
+        assert result["status"] == "success"
+        assert [r["time_slot"] for r in result["rejected"]] == [8]
+        assert buffer.rejected("wb_user") == []
+
+    def test_delete_with_id_shown_before_flush(self, write_behind):
+        database = write_behind
+        from database import log_productivity, get_logs_by_date, delete_log
+
+        today = date.today()
+        database._get_write_buffer().interval = 60
+        shown = log_productivity("wb_user", today, 12, 3, "Work")["data"]
+        assert get_logs_by_date("wb_user", today)[0]["id"] == shown["id"]
+
+        assert delete_log(shown["id"], user_id="wb_user")["status"] == "success"
+        assert get_logs_by_date("wb_user", today) == []
+        assert database._get_log_store().get_by_date("wb_user", str(today)) == []
+
+
+class TestExport:
+    """
+    التصدير يُكتب على دفعات ويطابق السجلات المحفوظة في كل صيغة
+    """
+
+    def _seed(self, user_id):
+        from database import log_productivity_bulk
+
+        # ثلاث سنوات متفرقة: يوم كل أسبوعين بثلاث فترات
+        start = date(2023, 1, 2)
+        log_productivity_bulk(user_id, [
+            {"log_date": start + timedelta(days=14 * i), "time_slot": slot,
+             "score": (i + slot) % 5, "category": "عمل, \"منزل\"" if slot == 1 else "Work",
+             "notes": "سطر\nثانٍ" if i % 9 == 0 else None}
+            for i in range(80) for slot in (0, 1, 47)
+        ])
+
+    def test_formats_match_stored_logs(self, backend, temp_data_dir):
+        import csv
+        import io
+        import json
+        from database import export_logs, get_logs_by_range
+        from storage import export
+
+        self._seed("export_user")
+        expected = get_logs_by_range("export_user", date(2000, 1, 1), date(2100, 1, 1))
+        expected = [{c: log.get(c) for c in export.COLUMNS} for log in expected]
+        assert len(expected) == 240
+
+        for fmt in export.available():
+            path = temp_data_dir / f"export.{fmt}"
+            with open(path, "wb") as sink:
+                result = export_logs("export_user", fmt, sink)
+            assert result["status"] == "success", result
+            assert result["data"] == 240
+
+            if fmt == "csv":
+                text = path.read_bytes().decode("utf-8-sig")
+                rows = list(csv.DictReader(io.StringIO(text, newline="")))
+                assert [r["id"] for r in rows] == [str(l["id"]) for l in expected]
+                assert [r["category"] for r in rows] == [l["category"] for l in expected]
+                assert [r["notes"] or None for r in rows] == [l["notes"] for l in expected]
+            elif fmt == "jsonl":
+                rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+                assert rows == json.loads(json.dumps(expected, default=str))
+            else:
+                import pyarrow.parquet as pq
+                table = pq.read_table(path)
+                assert table.column("log_date").to_pylist() == [date.fromisoformat(str(l["log_date"])) for l in expected]
+                assert table.column("score").to_pylist() == [l["score"] for l in expected]
+
+    def test_range_export_and_chunks(self, backend, temp_data_dir):
+        from database import export_logs, iter_logs
+
+        self._seed("export_user")
+        chunks = list(iter_logs("export_user"))
+        # دفعة لكل شهر على الأكثر (أو دفعة مؤشر SQLite)
+        assert max(len(c) for c in chunks) <= 31 * 48
+        assert sum(len(c) for c in chunks) == 240
+        if backend == "sqlite":
+            from database import _get_log_store
+            batches = list(_get_log_store().iter_range("export_user", "2023-01-01", "2100-01-01", chunk_size=50))
+            assert [len(b) for b in batches] == [50, 50, 50, 50, 40]
+        else:
+            assert len(chunks) > 1
+
+        with open(temp_data_dir / "range.csv", "wb") as sink:
+            result = export_logs("export_user", "csv", sink, date(2023, 1, 1), date(2023, 1, 31))
+        assert result["data"] == 9
+        assert list(iter_logs("nobody")) == []
+
+    def test_partitioned_export_does_not_fill_cache(self, mock_local_data_dir):
+        from database import export_logs, _get_log_store
+
+        self._seed("export_user")
+        store = _get_log_store()
+        store.invalidate()
+        with open(mock_local_data_dir / "all.jsonl", "wb") as sink:
+            assert export_logs("export_user", "jsonl", sink)["data"] == 240
+        assert store._cache == {}
+
+    def test_unknown_format_is_an_error(self, mock_local_data_dir, temp_data_dir):
+        from database import export_logs
+
+        with open(temp_data_dir / "x.bin", "wb") as sink:
+            assert export_logs("export_user", "xlsx", sink)["status"] == "error"
+
+
+class TestImport:
+    """
+    الاستيراد يتحقق عمودياً ويحل التعارض حسب السياسة ثم يكتب دفعة واحدة
+    """
+
+    CSV = (
+        "log_date,time_slot,score,category,notes\n"
+        "2024-03-01,0,3,Work,صباح\n"
+        "2024-03-01,1,4,العمل,\n"        # الاسم العربي للفئة
+        "2024-03-01,1,2,work,مكرر\n"      # تكرار في الملف لنفس الفترة
+        "2024-03-02,48,2,Work,\n"         # فترة خارج النطاق
+        "2024-03-02,5,5,Work,\n"          # تقييم خارج النطاق
+        "2024-03-02,6,2.5,Work,\n"        # تقييم غير صحيح
+        "2024-02-30,7,1,Work,\n"          # تاريخ غير موجود
+        "2024-03-02,8,1,Unknown,\n"       # فئة غير معروفة
+        "2024-03-02,9,1,Study,\n"
+    )
+
+    def _import(self, data: str, fmt: str = "csv", policy: str = "overwrite", **kwargs):
+        import io
+        from database import import_logs
+
+        return import_logs("import_user", io.BytesIO(data.encode("utf-8")), fmt, policy, **kwargs)
+
+    def test_validation_and_file_duplicates(self, backend):
+        from database import get_logs_by_range, get_daily_rollup
+
+        result = self._import(self.CSV)
+        assert result["status"] == "success", result
+        summary = result["data"]
+        assert summary["rows"] == 9
+        assert summary["invalid"] == 5
+        assert summary["rejected"] == {"log_date": 1, "time_slot": 1, "score": 2, "category": 1}
+        assert summary["duplicates"] == 1
+        assert summary["imported"] == 3
+
+        logs = get_logs_by_range("import_user", date(2024, 3, 1), date(2024, 3, 31))
+        assert [(str(l["log_date"]), l["time_slot"], l["score"], l["category"], l["notes"]) for l in logs] == [
+            ("2024-03-01", 0, 3, "Work", "صباح"),
+            ("2024-03-01", 1, 2, "Work", "مكرر"),
+            ("2024-03-02", 9, 1, "Study", None),
+        ]
+        rollup = get_daily_rollup("import_user", date(2024, 3, 1), date(2024, 3, 31))
+        assert rollup[date(2024, 3, 1)]["score"] == 5
+        assert rollup[date(2024, 3, 2)]["slots"] == 1
+
+    @pytest.mark.parametrize("policy,expected", [
+        ("overwrite", {0: 1, 1: 1, 2: 4}),
+        ("keep", {0: 3, 1: 0, 2: 2}),
+        ("max", {0: 3, 1: 1, 2: 4}),
+    ])
+    def test_conflict_policies(self, backend, policy, expected):
+        from database import log_productivity_bulk, get_logs_by_date, get_daily_scores
+
+        log_productivity_bulk("import_user", [
+            {"log_date": date(2024, 3, 1), "time_slot": 0, "score": 3, "category": "Work"},
+            {"log_date": date(2024, 3, 1), "time_slot": 1, "score": 0, "category": "Work"},
+        ])
+        ids = {l["time_slot"]: l["id"] for l in get_logs_by_date("import_user", date(2024, 3, 1))}
+        data = (
+            "log_date,time_slot,score,category\n"
+            "2024-03-01,0,1,Work\n"
+            "2024-03-01,1,1,Work\n"
+            "2024-03-01,2,2,Work\n"
+            "2024-03-01,2,4,Work\n"
+        )
+        result = self._import(data, policy=policy)
+        assert result["status"] == "success", result
+
+        logs = get_logs_by_date("import_user", date(2024, 3, 1))
+        assert {l["time_slot"]: l["score"] for l in logs} == expected
+        # الفترات المسجلة مسبقاً تحتفظ بمعرفها
+        assert {l["time_slot"]: l["id"] for l in logs if l["time_slot"] in ids} == ids
+        assert get_daily_scores("import_user", date(2024, 3, 1), date(2024, 3, 1))[date(2024, 3, 1)] == sum(expected.values())
+
+    def test_export_round_trip_is_unchanged(self, mock_local_data_dir, temp_data_dir):
+        import io
+        from database import export_logs, import_logs, log_productivity_bulk, _get_log_store
+
+        log_productivity_bulk("import_user", [
+            {"log_date": date(2023, 1, 1) + timedelta(days=d), "time_slot": slot, "score": (d + slot) % 5,
+             "category": "Study" if slot % 2 else "Work", "notes": "ملاحظة, \"مقتبسة\"" if d == 3 else None}
+            for d in range(60) for slot in (0, 1, 30)
+        ])
+        for fmt in ("csv", "jsonl"):
+            sink = io.BytesIO()
+            assert export_logs("import_user", fmt, sink)["data"] == 180
+            version = _get_log_store().version("import_user")
+
+            sink.seek(0)
+            result = import_logs("import_user", sink, fmt)
+            assert result["status"] == "success", result
+            assert result["data"]["unchanged"] == 180
+            assert result["data"]["imported"] == 0
+            assert _get_log_store().version("import_user") == version
+
+    def test_jsonl_dry_run_and_errors(self, mock_local_data_dir):
+        from database import get_logs_by_range
+
+        data = (
+            '{"log_date": "2024-03-01", "time_slot": 4, "score": 2, "category": "Health"}\n'
+            '{"log_date": "2024-03-01T10:00:00", "time_slot": 5, "score": 3, "category": "الصحة"}\n'
+        )
+        result = self._import(data, "jsonl", dry_run=True)
+        assert result["status"] == "success", result
+        assert result["data"]["imported"] == 2
+        assert get_logs_by_range("import_user", date(2024, 1, 1), date(2024, 12, 31)) == []
+
+        assert self._import(data, "jsonl")["data"]["imported"] == 2
+        assert len(get_logs_by_range("import_user", date(2024, 1, 1), date(2024, 12, 31))) == 2
+
+        assert self._import("log_date,score\n2024-03-01,2\n")["status"] == "error"
+        assert self._import(data, "xlsx")["status"] == "error"
+        assert self._import(data, "jsonl", policy="newest")["status"] == "error"
+
+    def test_cli(self, mock_local_data_dir, temp_data_dir, capsys):
+        import import_logs
+        from auth import sign_up
+        from database import get_logs_by_range
+
+        user_id = sign_up("importer@example.com", "secret1")["user"].id
+        path = temp_data_dir / "history.csv"
+        path.write_text(self.CSV, encoding="utf-8")
+
+        assert import_logs.main(["importer@example.com", str(path), "--dry-run"]) == 0
+        assert get_logs_by_range(user_id, date(2024, 3, 1), date(2024, 3, 31)) == []
+        assert import_logs.main(["importer@example.com", str(path), "--policy", "keep"]) == 0
+        logs = get_logs_by_range(user_id, date(2024, 3, 1), date(2024, 3, 31))
+        # keep: أول صف مكرر في الملف يفوز
+        assert [(l["time_slot"], l["score"]) for l in logs] == [(0, 3), (1, 4), (9, 1)]
+        assert "3" in capsys.readouterr().out
+
+        # المعرف المسجل يُقبل كالبريد
+        assert import_logs.main([user_id, str(path), "--dry-run"]) == 0
+
+    def test_cli_rejects_unknown_user(self, mock_local_data_dir, temp_data_dir, capsys):
+        import import_logs
+        import database
+
+        path = temp_data_dir / "history.csv"
+        path.write_text(self.CSV, encoding="utf-8")
+
+        assert import_logs.main(["nobody@example.com", str(path)]) == 1
+        assert "nobody@example.com" in capsys.readouterr().err
+        # لا مجلد يتيم باسم بريد غير مسجل
+        assert not database._user_path("nobody@example.com").exists()
+
+
+class TestUserStore:
+    """
+    تشغيل واحد للصفحة يقرأ كل ملف مستخدم مرة واحدة ويكتب المعدل في نهايته
+    """
+
+    def test_rerun_reads_each_file_once(self, mock_local_data_dir):
+        import database
+        from database import (user_request, get_categories, get_user_profile, get_tasks,
+                              add_task, add_category, create_user_profile)
+
+        create_user_profile("uow_user", "أحمد")
+        add_category("uow_user", "Reading", "قراءة", "#000", "📖")
+        add_task("uow_user", "مهمة")
+
+        loads = []
+        original = database._load_json
+        with patch("database._load_json", side_effect=lambda p, d=None: loads.append(p.name) or original(p, d)):
+            with user_request("uow_user") as files:
+                # نفس القراءات المتكررة في لوحة التحكم والشريط الجانبي ونموذج التقييم
+                for _ in range(3):
+                    assert get_user_profile("uow_user")["display_name"] == "أحمد"
+                    assert any(c["name"] == "Reading" for c in get_categories("uow_user"))
+                    assert len(get_tasks("uow_user")) == 1
+        assert sorted(loads) == ["categories.json", "hidden_defaults.json", "profile.json", "tasks.json"]
+        assert files.reads == 4
+
+    def test_writes_are_deferred_to_end_of_rerun(self, mock_local_data_dir):
+        from database import user_request, get_categories, add_category, add_task, get_tasks
+        from database import _get_categories_file, _load_json
+
+        with user_request("uow_user"):
+            add_category("uow_user", "Reading", "قراءة", "#000", "📖")
+            add_category("uow_user", "Music", "موسيقى", "#111", "🎵")
+            # القراءة في نفس التشغيل ترى التعديل قبل كتابته
+            assert {"Reading", "Music"} <= {c["name"] for c in get_categories("uow_user")}
+            assert not _get_categories_file("uow_user").exists()
+            add_task("uow_user", "مهمة")
+        assert [c["name"] for c in _load_json(_get_categories_file("uow_user"), [])] == ["Reading", "Music"]
+        assert [t["title"] for t in get_tasks("uow_user")] == ["مهمة"]
+
+        # الكتابة تتم حتى عند الخروج باستثناء (st.rerun / st.stop)
+        with pytest.raises(RuntimeError):
+            with user_request("uow_user"):
+                add_task("uow_user", "قبل rerun")
+                raise RuntimeError("rerun")
+        assert len(get_tasks("uow_user")) == 2
+
+    def test_concurrent_session_changes_are_replayed(self, mock_local_data_dir):
+        import threading
+        from database import user_request, add_task, get_tasks, toggle_task
+
+        first = add_task("uow_user", "قديمة")["data"]
+        with user_request("uow_user"):
+            assert len(get_tasks("uow_user")) == 1
+            toggle_task("uow_user", first["id"])
+            # جلسة أخرى (خيط آخر بلا تشغيل نشط) تكتب الملف مباشرة في الأثناء
+            other = threading.Thread(target=add_task, args=("uow_user", "من جلسة أخرى"))
+            other.start()
+            other.join()
+            add_task("uow_user", "جديدة")
+        tasks = get_tasks("uow_user")
+        assert [t["title"] for t in tasks] == ["قديمة", "من جلسة أخرى", "جديدة"]
+        assert tasks[0]["completed"] is True
+
+    def test_user_dir_created_once(self, mock_local_data_dir):
+        from database import _get_profile_file, _get_categories_file, _get_logs_file
+
+        original = Path.mkdir
+        with patch.object(Path, "mkdir", autospec=True, side_effect=original) as mkdir:
+            for _ in range(5):
+                _get_profile_file("uow_user")
+                _get_categories_file("uow_user")
+                _get_logs_file("uow_user")
+        assert mkdir.call_count == 1
+        assert (mock_local_data_dir / "uow_user").is_dir()
+
+
+class TestShardedLayout:
+    """
+    local_data/ab/cd/<user_id>: المجلدات القديمة تبقى مقروءة حتى تُنقل أثناء العمل
+    """
+
+    @pytest.fixture
+    def sharded(self, mock_local_data_dir):
+        with patch('database.LOCAL_DATA_LAYOUT', "sharded"):
+            yield mock_local_data_dir
+
+    def test_new_users_are_sharded(self, sharded):
+        from database import log_productivity, update_user_profile, get_logs_by_date
+
+        user_id = "0123456789abcdef0123456789abcdef"
+        update_user_profile(user_id, {"display_name": "مقسم"})
+        log_productivity(user_id, date(2026, 3, 1), 4, 3, "Work")
+
+        assert (sharded / "01" / "23" / user_id / "profile.json").exists()
+        assert not (sharded / user_id).exists()
+        assert len(get_logs_by_date(user_id, date(2026, 3, 1))) == 1
+
+    def test_online_migration_keeps_data_reachable(self, mock_local_data_dir):
+        from database import (
+            log_productivity, get_logs_by_range, get_user_profile, update_user_profile,
+            migrate_data_layout, user_request, add_task, get_tasks
+        )
+        from storage import layout
+
+        users = ["flat_a", "flat_b"]
+        for i, user_id in enumerate(users):
+            update_user_profile(user_id, {"display_name": user_id})
+            log_productivity(user_id, date(2026, 4, 1), i, 2, "Work")
+        assert migrate_data_layout()["status"] == "error"
+
+        with patch('database.LOCAL_DATA_LAYOUT', "sharded"):
+            # قبل النقل: المكان القديم يُقرأ كما هو
+            assert get_user_profile("flat_a")["display_name"] == "flat_a"
+
+            # النقل في منتصف تشغيل يحفظ تعديلاته في المكان الجديد
+            with user_request("flat_a"):
+                get_tasks("flat_a")
+                assert migrate_data_layout()["data"] == users
+                add_task("flat_a", "بعد النقل")
+
+            assert migrate_data_layout()["data"] == []
+            for i, user_id in enumerate(users):
+                assert not (mock_local_data_dir / user_id).exists()
+                assert layout.sharded_dir(mock_local_data_dir, user_id).is_dir()
+                assert get_user_profile(user_id)["display_name"] == user_id
+                assert [l["time_slot"] for l in get_logs_by_range(user_id, date(2026, 1, 1), date(2026, 12, 31))] == [i]
+            assert [t["title"] for t in get_tasks("flat_a")] == ["بعد النقل"]
+            assert sorted(u for u, _ in layout.iter_users(mock_local_data_dir)) == users
+
+    def test_shard_prefix(self, temp_data_dir):
+        from storage import layout
+
+        assert layout.shard_prefix("ffee" + "0" * 28) == ("ff", "ee")
+        # المعرفات غير md5 تُقسم حسب md5 لها
+        assert layout.shard_prefix("demo") == ("fe", "01")
+        with pytest.raises(ValueError):
+            layout.resolve(temp_data_dir, "demo", "nested")
+
+
+class TestUserRegistry:
+    """
+    سجل المستخدمين: بحث مفهرس بالبريد والمعرف وإضافة صف واحد لكل حساب
+    """
+
+    def test_sign_up_and_lookups_do_not_scan(self, mock_local_data_dir):
+        from auth import sign_up, sign_in, _get_registry
+
+        registry = _get_registry()
+        with patch.object(type(registry), "iter_users", side_effect=AssertionError("scan")), \
+             patch.object(type(registry), "import_users", side_effect=AssertionError("rewrite")), \
+             patch("auth.st") as mock_st:
+            mock_st.session_state = MagicMock()
+            assert sign_up("reg@test.com", "secret1", "مسجل")["status"] == "success"
+            assert sign_up("reg@test.com", "secret2")["status"] == "error"
+            assert sign_in("reg@test.com", "secret1")["status"] == "success"
+            assert sign_in("reg@test.com", "wrong")["status"] == "error"
+
+        user = registry.get_by_email("reg@test.com")
+        assert registry.get_by_id(user["id"])["metadata"] == {"display_name": "مسجل"}
+        assert registry.get_by_id("missing") is None
+        # إضافة مباشرة لبريد مسجل يرفضها القيد الفريد (تسجيلان متزامنان)
+        assert registry.add(dict(user, id="other")) is False
+
+    def test_enumeration_streams_in_pages(self, mock_local_data_dir):
+        from auth import _get_registry
+        from database import _all_user_ids
+        from storage import user_registry
+
+        registry = _get_registry()
+        for i in range(7):
+            registry.add({"id": f"id{i}", "email": f"u{i}@test.com", "password": "x"})
+
+        with patch.object(user_registry, "PAGE", 3):
+            assert list(_all_user_ids()) == [f"id{i}" for i in range(7)]
+            assert [u["email"] for u in registry.iter_users()] == [f"u{i}@test.com" for i in range(7)]
+        assert registry.count() == 7
+        with patch.object(user_registry, "IN_BATCH", 2):
+            assert sorted(registry.get_many(["id1", "id5", "id6", "nope"])) == ["id1", "id5", "id6"]
+
+    def test_imports_legacy_users_file_once(self, mock_local_data_dir):
+        import json
+        import auth
+
+        users = {"old@test.com": {"id": "old", "email": "old@test.com", "password": "h",
+                                  "metadata": {"display_name": "قديم"}, "created_at": "2025-01-01T00:00:00"}}
+        (mock_local_data_dir / "users.json").write_text(json.dumps(users), encoding="utf-8")
+
+        assert auth._get_registry().get_by_email("old@test.com") == users["old@test.com"]
+        assert not (mock_local_data_dir / "users.json").exists()
+        assert (mock_local_data_dir / "users.json.imported").exists()
+
+        auth._registries.clear()
+        assert auth._load_users() == users
+
+
+class TestSessionTokens:
+    """
+    رمز جلسة موقع ينتهي: تحديث الصفحة يستعيد الدخول دون كلمة المرور
+    """
+
+    class _State(dict):
+        """session_state يدعم الوصول بالخاصية والمفتاح مثل Streamlit"""
+        __getattr__ = dict.__getitem__
+        __setattr__ = dict.__setitem__
+
+    def _browser(self, cookies=None, query=None):
+        """متصفح جديد: جلسة فارغة مع كوكيز ومعاملات الرابط"""
+        fake = MagicMock()
+        fake.session_state = self._State()
+        fake.context.cookies = cookies or {}
+        fake.query_params = query or {}
+        return fake
+
+    def test_sign_verify_expire_and_revoke(self, temp_data_dir):
+        from storage.session_tokens import SessionTokens
+
+        now = [1_000_000.0]
+        tokens = SessionTokens(temp_data_dir / "users.db", b"secret", ttl=60, clock=lambda: now[0])
+        token = tokens.issue("u1")
+        assert tokens.verify(token) == "u1"
+
+        token_id, expires, signature = token.split(".")
+        assert tokens.verify(f"{token_id}.{int(expires) + 3600}.{signature}") is None
+        assert tokens.verify("garbage") is None
+        assert SessionTokens(temp_data_dir / "users.db", b"other", ttl=60).verify(token) is None
+
+        other = tokens.issue("u2")
+        tokens.revoke(other)
+        assert tokens.verify(other) is None
+
+        now[0] += 61
+        assert tokens.verify(token) is None
+        tokens.issue("u3")
+        assert tokens.evict() == 0
+        now[0] += 61
+        assert tokens.evict() == 1
+
+    def test_refresh_restores_session_from_cookie(self, mock_local_data_dir):
+        import auth
+
+        auth.sign_up("tok@test.com", "secret1", "رمز")
+        with patch("auth.st", self._browser()) as browser:
+            assert auth.sign_in("tok@test.com", "secret1")["status"] == "success"
+            token = browser.session_state.access_token
+            auth.init_auth_state()
+            assert browser.session_state.session_cookie is None
+
+        # تحديث الصفحة: جلسة جديدة بنفس الكوكي، دون البحث بالبريد أو كلمة المرور
+        registry = auth._get_registry()
+        with patch("auth.st", self._browser(cookies={auth.SESSION_COOKIE: token})) as browser, \
+             patch.object(type(registry), "get_by_email", side_effect=AssertionError("credentials")):
+            auth.init_auth_state()
+            assert browser.session_state.user.email == "tok@test.com"
+            auth.sign_out()
+
+        # الرمز ملغى بعد الخروج (ولو بقي الكوكي في متصفح آخر)
+        with patch("auth.st", self._browser(cookies={auth.SESSION_COOKIE: token})) as browser:
+            auth.init_auth_state()
+            assert browser.session_state.user is None
+
+    def test_query_param_is_consumed(self, mock_local_data_dir):
+        import auth
+
+        auth.sign_up("param@test.com", "secret1")
+        user_id = auth._get_registry().get_by_email("param@test.com")["id"]
+        token = auth._get_session_tokens().issue(user_id)
+
+        query = {auth.SESSION_PARAM: token}
+        with patch("auth.st", self._browser(query=query)) as browser:
+            auth.init_auth_state()
+            assert browser.session_state.user.id == user_id
+            assert query == {}
+            assert (mock_local_data_dir / ".session_secret").stat().st_mode & 0o077 == 0
+
+    def test_secret_is_created_once_and_never_empty(self, mock_local_data_dir):
+        import auth
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            secrets_seen = set(pool.map(lambda _: auth._session_secret(), range(32)))
+
+        assert len(secrets_seen) == 1
+        assert len(secrets_seen.pop()) == 32
+        assert [p.name for p in mock_local_data_dir.iterdir() if p.name.startswith(".session_secret")] == [
+            ".session_secret"
+        ]
+
+        (mock_local_data_dir / ".session_secret").write_bytes(b"")
+        with pytest.raises(ValueError):
+            auth._session_secret()